@@ -0,0 +1,128 @@
+"""Full-frame versus damage-driven capture of a 1920x1080 display.
+
+Runs against a private Xvfb (skipped if Xvfb is not installed). A second
+X client scripts window activity: typing (a few glyph-sized cells per
+frame), scrolling (a whole 800x600 window repainted per frame) and idle.
+For each capture mode it reports the capture time, the bytes copied out
+of the X server and the damaged share of the display per frame. After
+each run the damage-tracked frame is compared with a fresh full grab;
+any difference is reported as a failure.
+"""
+import sys
+import ctypes
+import numpy as np
+from benchmarks.common import summarize, print_result
+from benchmarks.xvfb import start_xvfb, stop_xvfb
+from core.capture import ScreenCapture, load_library
+
+WIDTH, HEIGHT = 1920, 1080
+FRAMES = 120
+MODES = (
+    ('XGetImage full', False, False),
+    ('XShmGetImage full', True, False),
+    ('XGetImage + damage', False, True),
+    ('XShmGetImage + damage', True, True),
+)
+
+class ScriptedClient:
+    """Draws into a window on its own X connection to generate damage."""
+
+    def __init__(self, display_name):
+        x11 = load_library('X11')
+        for name, restype, argtypes in (
+            ('XCreateSimpleWindow', ctypes.c_ulong, [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+                                                     ctypes.c_uint, ctypes.c_uint, ctypes.c_uint,
+                                                     ctypes.c_ulong, ctypes.c_ulong]),
+            ('XMapWindow', ctypes.c_int, [ctypes.c_void_p, ctypes.c_ulong]),
+            ('XCreateGC', ctypes.c_void_p, [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_void_p]),
+            ('XSetForeground', ctypes.c_int, [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_ulong]),
+            ('XFillRectangle', ctypes.c_int, [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_void_p, ctypes.c_int,
+                                              ctypes.c_int, ctypes.c_uint, ctypes.c_uint]),
+            ('XFreeGC', ctypes.c_int, [ctypes.c_void_p, ctypes.c_void_p]),
+            ('XDestroyWindow', ctypes.c_int, [ctypes.c_void_p, ctypes.c_ulong]),
+        ):
+            fn = getattr(x11, name)
+            fn.restype = restype
+            fn.argtypes = argtypes
+        self._x11 = x11
+        self._display = x11.XOpenDisplay(display_name.encode())
+        root = x11.XRootWindow(self._display, x11.XDefaultScreen(self._display))
+        self._window = x11.XCreateSimpleWindow(self._display, root, 200, 150, 800, 600, 0, 0, 0xffffff)
+        x11.XMapWindow(self._display, self._window)
+        self._gc = x11.XCreateGC(self._display, self._window, 0, None)
+        x11.XSync(self._display, 0)
+        self._step = 0
+
+    def draw(self, activity):
+        x11 = self._x11
+        self._step += 1
+        if activity == 'typing':
+            for i in range(3):
+                cell = self._step * 3 + i
+                x11.XSetForeground(self._display, self._gc, (cell * 2654435761) & 0xffffff)
+                x11.XFillRectangle(self._display, self._window, self._gc,
+                                   (cell % 90) * 8, (cell // 90 % 35) * 16, 8, 16)
+        elif activity == 'scrolling':
+            x11.XSetForeground(self._display, self._gc, (self._step * 40503) & 0xffffff)
+            x11.XFillRectangle(self._display, self._window, self._gc, 0, 0, 800, 600)
+        x11.XSync(self._display, 0)
+
+    def close(self):
+        self._x11.XFreeGC(self._display, self._gc)
+        self._x11.XDestroyWindow(self._display, self._window)
+        self._x11.XCloseDisplay(self._display)
+
+def run(display_name, client, activity, use_shm, use_damage):
+    capture = ScreenCapture(display_name, use_shm=use_shm, use_damage=use_damage)
+    if not capture.open():
+        return None, 0
+    capture.capture()
+    times, copied, ratios = [], [], []
+    for _ in range(FRAMES):
+        client.draw(activity)
+        capture.capture()
+        times.append(capture.last_capture_s)
+        copied.append(capture.last_bytes_copied)
+        ratios.append(capture.last_damage_ratio)
+    result = summarize(times)
+    result['mb_per_frame'] = float(np.mean(copied)) / 1e6
+    result['damage_ratio'] = float(np.mean(ratios))
+    result['shm'] = capture.uses_shm
+    result['damage'] = capture.uses_damage
+
+    mismatched = 0
+    if capture.uses_damage:
+        reference = ScreenCapture(display_name, use_shm=False, use_damage=False)
+        if reference.open() and reference.capture():
+            mismatched = int(np.count_nonzero(np.any(reference.frame[..., :3] != capture.frame[..., :3], axis=-1)))
+        reference.close()
+    capture.close()
+    return result, mismatched
+
+def main():
+    server = start_xvfb(WIDTH, HEIGHT)
+    if server is None:
+        print("Xvfb not available, skipping capture benchmark")
+        return 0
+    process, display_name = server
+    failures = 0
+    client = ScriptedClient(display_name)
+    try:
+        for activity in ('typing', 'scrolling', 'idle'):
+            for name, use_shm, use_damage in MODES:
+                result, mismatched = run(display_name, client, activity, use_shm, use_damage)
+                if result is None:
+                    print(f"{activity}, {name}: could not open display")
+                    failures += 1
+                    continue
+                if mismatched:
+                    print(f"{activity}, {name}: {mismatched} pixels differ from a full grab")
+                    failures += 1
+                print_result(f"{activity}, {name}", result)
+    finally:
+        client.close()
+        stop_xvfb(process)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""Config persistence during a simulated 2-second slider drag.
+
+The drag moves the primary display through a DisplayRegistry, which
+saves the displays to the config as XRManager's does. Compares the
+write-behind Config against writing on every change (the old behaviour,
+emulated with flush() after each set()). Reports the number of file
+writes and the time spent in the UI-thread calls.
+"""
+import time
+import tempfile
+from benchmarks.common import summarize, print_result
+from core.displays import DisplayRegistry, PRIMARY_DISPLAY
+from utils.config import Config
+
+DRAG_SECONDS = 2.0
+EVENT_RATE_HZ = 60
+
+def simulate_drag(config, displays, flush_each):
+    """Feed slider value-changed events at EVENT_RATE_HZ for DRAG_SECONDS."""
+    events = int(DRAG_SECONDS * EVENT_RATE_HZ)
+    samples = []
+    for i in range(events):
+        start = time.perf_counter()
+        displays.set(PRIMARY_DISPLAY, distance=0.5 + 2.5 * i / events)
+        if flush_each:
+            config.flush()
+        samples.append(time.perf_counter() - start)
+        time.sleep(1.0 / EVENT_RATE_HZ)
+    config.flush()
+    return samples
+
+def main():
+    for name, flush_each in (('write-per-change', True), ('write-behind', False)):
+        with tempfile.TemporaryDirectory() as config_dir:
+            config = Config(config_dir=config_dir)
+            displays = DisplayRegistry(config=config)
+            displays.add(PRIMARY_DISPLAY)
+            config.flush()
+            saves_before = config.save_count
+            samples = simulate_drag(config, displays, flush_each)
+            result = summarize(samples)
+            result['file_writes'] = config.save_count - saves_before
+            print_result(name, result)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Commands lost by the control file versus the control ring.
+
+A stand-in driver process polls at 1 kHz, as the driver would, while
+this process issues a burst of distinct follow-threshold commands back
+to back. With the control file every write replaces the previous one,
+so the driver only sees whatever was there when it polled; with the
+ring every command is delivered in order.
+"""
+import sys
+import time
+import multiprocessing
+from benchmarks.common import summarize, print_result
+from benchmarks.fake_driver import FakeDriver, run_ring_consumer
+from core.control_ring import ControlRing
+
+COMMANDS = 2000
+CAPACITY = 64
+KEY = 'breezy_desktop_follow_threshold'
+
+def run_file_poller(path, duration_s, results, poll_interval_s=0.001):
+    """Stand-in for today's driver: read the control file when it changed."""
+    last = None
+    end = time.monotonic() + duration_s
+    while time.monotonic() < end:
+        try:
+            with open(path, 'r') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = None
+        if data and data != last:
+            last = data
+            results.put(data)
+        time.sleep(poll_interval_s)
+    results.put(None)
+
+def drain(results):
+    items = []
+    while True:
+        item = results.get()
+        if item is None:
+            return items
+        items.append(item)
+
+def bench_file(driver):
+    results = multiprocessing.Queue()
+    poller = multiprocessing.Process(target=run_file_poller, args=(driver.control_path, 2.0, results))
+    poller.start()
+    time.sleep(0.2)
+    samples = []
+    for i in range(COMMANDS):
+        start = time.perf_counter()
+        with open(driver.control_path, 'w') as f:
+            f.write(f"{KEY}={i}\n")
+        samples.append(time.perf_counter() - start)
+    seen = drain(results)
+    poller.join()
+    print_result('control file write', summarize(samples))
+    print(f"control file: {len(seen)} of {COMMANDS} commands seen by the driver")
+
+def bench_ring(driver):
+    results = multiprocessing.Queue()
+    consumer = multiprocessing.Process(target=run_ring_consumer,
+                                       args=(driver.control_ring_path, CAPACITY, 2.0, results))
+    consumer.start()
+    ring = ControlRing(driver.control_ring_path)
+    while not ring.open():
+        time.sleep(0.01)
+    samples = []
+    full_waits = 0
+    for i in range(COMMANDS):
+        start = time.perf_counter()
+        seq = ring.enqueue(KEY, i)
+        samples.append(time.perf_counter() - start)
+        while seq is None:
+            # Backpressure: what ControlQueue handles by keeping the command pending
+            full_waits += 1
+            time.sleep(0.0005)
+            seq = ring.enqueue(KEY, i)
+    last_seq = ring.write_seq
+    while not ring.applied(last_seq):
+        time.sleep(0.001)
+    seen = drain(results)
+    consumer.join()
+    ring.close()
+    in_order = [int(value) for _, _, value in seen] == list(range(COMMANDS))
+    print_result('ring enqueue', summarize(samples))
+    print(f"control ring: {len(seen)} of {COMMANDS} commands applied, in order: {in_order}, "
+          f"waits on a full ring: {full_waits}")
+
+def main():
+    driver = FakeDriver()
+    try:
+        bench_file(driver)
+        bench_ring(driver)
+    finally:
+        driver.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Round-trip latency of xfce4-xr-ctl commands against a headless instance.
+
+Starts ``main.py --headless`` against a fake driver, then measures the
+time from invoking the client until the driver control file holds the
+new value, both for a fresh client process (what a keyboard shortcut
+runs) and for an in-process client call.
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+from benchmarks.common import summarize, print_result
+from benchmarks.fake_driver import FakeDriver
+from utils.control_client import send_commands
+
+ITERATIONS = 50
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_for(predicate, timeout=10.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if predicate():
+            return True
+        time.sleep(0.0002)
+    return False
+
+def main():
+    driver = FakeDriver()
+    driver.write_state({'device_connected': 'true'})
+    config_dir = tempfile.mkdtemp(prefix='bench_ctl_config_')
+    socket_path = os.path.join(driver.shm_dir, 'control.sock')
+    server = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'main.py'), '--headless',
+                               '--shm-dir', driver.shm_dir, '--driver-cli', driver.cli_path,
+                               '--socket', socket_path, '--config-dir', config_dir],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for(lambda: os.path.exists(socket_path)):
+            print("headless instance did not start")
+            return 1
+        # Let the driver handshake finish so it does not overlap the measurements
+        time.sleep(1.0)
+
+        process_samples = []
+        for i in range(ITERATIONS):
+            value = f"{1.0 + i / 1000:.3f}"
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-m', 'utils.control_client', '--socket', socket_path,
+                            'set-distance', value], cwd=REPO_ROOT, check=True)
+            wait_for(lambda: f"breezy_desktop_display_distance={float(value)}" in driver.read_control())
+            process_samples.append(time.perf_counter() - start)
+        print_result('client process -> control file', summarize(process_samples))
+
+        call_samples = []
+        for i in range(ITERATIONS):
+            value = 2.0 + i / 1000
+            start = time.perf_counter()
+            send_commands([{'cmd': 'set_distance', 'value': value}], socket_path)
+            wait_for(lambda: f"breezy_desktop_display_distance={value}" in driver.read_control())
+            call_samples.append(time.perf_counter() - start)
+        print_result('in-process call -> control file', summarize(call_samples))
+    finally:
+        server.terminate()
+        server.wait()
+        driver.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
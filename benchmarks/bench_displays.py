@@ -0,0 +1,86 @@
+"""Display registry scaling from 1 to 32 virtual displays.
+
+Per frame, the transforms of every display are updated for a new head
+orientation: once in the registry's vectorized pass, and once display
+by display as a per-object model would. A change set touching every
+display is applied inside one batch and field by field; each commit
+is one config write and one driver batch.
+"""
+import math
+import numpy as np
+from benchmarks.common import summarize, time_calls, print_result
+from core import pose_math
+from core.displays import DisplayRegistry
+
+DISPLAY_COUNTS = (1, 2, 4, 8, 16, 32)
+FRAMES = 2000
+
+def make_registry(count):
+    registry = DisplayRegistry()
+    for i in range(count):
+        yaw = math.radians(30 * (i - count / 2))
+        registry.add(offset=(0.0, math.sin(yaw / 2), 0.0, math.cos(yaw / 2)),
+                     distance=1.0 + 0.05 * i, follow=i % 2 == 0)
+    return registry
+
+def head_orientations(frames):
+    angles = np.linspace(0, 0.5, frames)
+    return [(0.0, math.sin(a / 2), 0.0, math.cos(a / 2)) for a in angles]
+
+def main():
+    heads = head_orientations(FRAMES)
+    for count in DISPLAY_COUNTS:
+        registry = make_registry(count)
+        frame = iter(range(FRAMES * 2))
+
+        def vectorized():
+            registry.update_transforms(heads[next(frame) % FRAMES])
+
+        displays = [registry.display(display_id) for display_id in registry.ids]
+        rotations = np.empty((count, 3, 3))
+        centers = np.empty((count, 3))
+        per_display_frame = iter(range(FRAMES * 2))
+
+        def per_display():
+            head = heads[next(per_display_frame) % FRAMES]
+            for i, display in enumerate(displays):
+                orientation = display['offset']
+                if display['follow']:
+                    orientation = pose_math.quaternion_multiply(head, orientation)
+                pose_math.quaternion_to_matrix(orientation, out=rotations[i])
+                centers[i] = rotations[i][:, 2] * -display['distance']
+
+        vectorized_result = summarize(time_calls(vectorized, FRAMES))
+        per_display_result = summarize(time_calls(per_display, FRAMES))
+        # Both paths must agree
+        head = heads[0]
+        expected_rotations, expected_centers = registry.update_transforms(head)
+        frame = iter(range(FRAMES * 2))
+        per_display_frame = iter(range(FRAMES * 2))
+        per_display()
+        if not (np.allclose(rotations, expected_rotations) and np.allclose(centers, expected_centers)):
+            raise SystemExit(f"{count} displays: vectorized and per-display transforms differ")
+
+        print_result(f"transforms, vectorized  {count:2d} displays", vectorized_result)
+        print_result(f"transforms, per display {count:2d} displays", per_display_result)
+
+        values = iter(np.linspace(0.1, 2.0, 200 * count * 4).tolist())
+
+        def batched():
+            with registry.batch():
+                for display_id in registry.ids:
+                    registry.set(display_id, distance=next(values), follow_threshold=next(values))
+
+        def unbatched():
+            for display_id in registry.ids:
+                registry.set(display_id, distance=next(values))
+                registry.set(display_id, follow_threshold=next(values))
+
+        for name, fn in (('batched', batched), ('per field', unbatched)):
+            commits = registry.commits
+            result = summarize(time_calls(fn, 200))
+            result['commits_per_change_set'] = (registry.commits - commits) / 200
+            print_result(f"change set, {name:9s} {count:2d} displays", result)
+
+if __name__ == '__main__':
+    main()
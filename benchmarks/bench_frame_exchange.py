@@ -0,0 +1,105 @@
+"""Stress test and throughput of the triple-buffered FrameExchange.
+
+A synthetic capture thread fills 1920x1080 BGRA frames at 30-120 Hz while
+a render thread acquires at 60 or 72 Hz, CPU only. Every frame is stamped
+with its sequence number in its first and last pixel; the consumer checks
+both against the exchange's sequence number, so a buffer shared by the
+two threads shows up as a torn frame. A final unpaced run on small frames
+hammers the index swaps.
+"""
+import sys
+import time
+import threading
+import numpy as np
+from benchmarks.common import print_result
+from core.frame_exchange import FrameExchange
+
+WIDTH, HEIGHT = 1920, 1080
+DURATION_S = 1.5
+PRODUCER_RATES_HZ = (30, 60, 90, 120)
+CONSUMER_RATES_HZ = (60, 72)
+
+def produce(exchange, rate_hz, stop):
+    period = 1.0 / rate_hz if rate_hz else 0.0
+    next_time = time.monotonic()
+    while not stop.is_set():
+        back = exchange.back
+        sequence = exchange.produced + 1
+        back.fill(sequence & 0xff)
+        stamp = back.view('<u4')
+        stamp[0, 0, 0] = sequence
+        stamp[-1, -1, 0] = sequence
+        exchange.publish()
+        if period:
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            time.sleep(0)  # Let the other thread have the GIL
+
+def consume(exchange, rate_hz, stop, result):
+    period = 1.0 / rate_hz if rate_hz else 0.0
+    next_time = time.monotonic()
+    last_sequence = 0
+    while not stop.is_set():
+        if exchange.acquire():
+            sequence = exchange.front_sequence
+            stamp = exchange.front.view('<u4')
+            if stamp[0, 0, 0] != sequence or stamp[-1, -1, 0] != sequence:
+                result['torn'] += 1
+            if sequence <= last_sequence:
+                result['out_of_order'] += 1
+            last_sequence = sequence
+        if period:
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            time.sleep(0)  # Let the other thread have the GIL
+
+def run(width, height, producer_hz, consumer_hz, duration_s):
+    exchange = FrameExchange(width, height)
+    result = {'torn': 0, 'out_of_order': 0}
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=produce, args=(exchange, producer_hz, stop)),
+        threading.Thread(target=consume, args=(exchange, consumer_hz, stop, result)),
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration_s)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    stats = exchange.stats()
+    return {
+        'produced': stats['produced'],
+        'consumed': stats['consumed'],
+        'dropped': stats['dropped'],
+        'age_p50_ms': stats['p50_ms'],
+        'age_p99_ms': stats['p99_ms'],
+        'torn': result['torn'],
+        'out_of_order': result['out_of_order'],
+    }
+
+def main():
+    failures = 0
+    for consumer_hz in CONSUMER_RATES_HZ:
+        for producer_hz in PRODUCER_RATES_HZ:
+            result = run(WIDTH, HEIGHT, producer_hz, consumer_hz, DURATION_S)
+            failures += result['torn'] + result['out_of_order']
+            print_result(f"capture {producer_hz} Hz -> render {consumer_hz} Hz", result)
+
+    result = run(64, 64, 0, 0, DURATION_S)
+    failures += result['torn'] + result['out_of_order']
+    result['swaps_per_s'] = (result['produced'] + result['consumed']) / DURATION_S
+    print_result('unpaced stress, 64x64', result)
+    if failures:
+        print(f"FAILED: {failures} torn or out-of-order frames")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Frame pacing under synthetic render loads, on a deterministic clock.
+
+Every scenario runs on FakeClock: the render callback advances time by
+its simulated cost, so results are identical on any machine, including
+headless CI. Capture competes with rendering for the CPU, so each frame
+costs its render time plus a capture share proportional to the capture
+rate the scheduler has set. Reports missed deadlines, presentation
+jitter, how long before presentation the pose was latched, and the
+capture rate the scheduler settled on, then checks the expected
+behaviour and exits non-zero if it is wrong. A final run on the real
+clock shows the scheduling overhead of this machine.
+"""
+import sys
+import random
+from benchmarks.common import print_result
+from core.frame_scheduler import FrameScheduler, FakeClock
+
+FRAMES = 900
+
+def steady(cost_ms):
+    return lambda frame, rng: cost_ms
+
+def noisy(mean_ms, sigma_ms):
+    return lambda frame, rng: max(0.1, rng.gauss(mean_ms, sigma_ms))
+
+def spiky(cost_ms, spike_ms, every):
+    return lambda frame, rng: spike_ms if frame % every == every - 1 else cost_ms
+
+def phases(heavy_ms, light_ms, switch_frame):
+    return lambda frame, rng: heavy_ms if frame < switch_frame else light_ms
+
+# name, render cost, capture cost at full rate (ms)
+SCENARIOS = (
+    ('steady 4 ms', steady(4.0), 2.0),
+    ('noisy 6 +/- 1 ms', noisy(6.0, 1.0), 2.0),
+    ('4 ms with 25 ms spikes', spiky(4.0, 25.0, 60), 2.0),
+    ('8 ms then 3 ms', phases(8.0, 3.0, FRAMES // 3), 6.0),
+)
+
+def run_scenario(refresh_hz, render_cost, capture_cost_ms):
+    clock = FakeClock()
+    rng = random.Random(1)
+    state = {'frame': 0, 'rates': []}
+
+    def render(pose, deadline):
+        capture_share = scheduler.capture_rate_hz / scheduler.refresh_hz
+        clock.advance((render_cost(state['frame'], rng) + capture_cost_ms * capture_share) / 1000.0)
+        state['frame'] += 1
+
+    scheduler = FrameScheduler(render, refresh_hz=refresh_hz, clock=clock,
+                               pose_sampler=lambda deadline: clock.now(),
+                               on_capture_rate_changed=state['rates'].append)
+    scheduler.run(FRAMES)
+    return scheduler, state['rates']
+
+def main():
+    failures = []
+    for refresh_hz in (60, 72):
+        for name, render_cost, capture_cost_ms in SCENARIOS:
+            scheduler, rates = run_scenario(refresh_hz, render_cost, capture_cost_ms)
+            label = f"{refresh_hz} Hz, {name}"
+            print_result(label, dict(scheduler.stats(), capture_rates=rates))
+            if name.startswith('steady') and (scheduler.missed_deadlines or rates):
+                failures.append(f"{label}: steady load should be paced without misses or rate changes")
+            if name.startswith('noisy') and rates:
+                failures.append(f"{label}: in-budget noise should not lower the capture rate")
+            if name.startswith('8 ms') and (not rates or rates[-1] != refresh_hz):
+                failures.append(f"{label}: capture rate should drop under load and recover")
+
+    scheduler = FrameScheduler(lambda pose, deadline: None, refresh_hz=240)
+    scheduler.run(240)
+    print_result('real clock, empty render at 240 Hz', scheduler.stats())
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
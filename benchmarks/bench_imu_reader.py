@@ -0,0 +1,53 @@
+"""IMU segment read cost against a stand-in writer process.
+
+A separate process writes synthetic samples at WRITER_RATE_HZ while this
+process reads as fast as it can, reporting per-read cost, read rate and
+how often torn reads had to be retried.
+"""
+import os
+import time
+import tempfile
+import multiprocessing
+from benchmarks.common import summarize, print_result
+from benchmarks.fake_driver import FakeIMUWriter, run_imu_writer, shm_dir
+from core.imu_reader import IMUReader
+
+WRITER_RATE_HZ = 1000
+DURATION_S = 2.0
+
+def main():
+    fd, path = tempfile.mkstemp(prefix='bench_imu_', dir=shm_dir())
+    os.close(fd)
+    try:
+        FakeIMUWriter(path).close()
+        writer = multiprocessing.Process(target=run_imu_writer, args=(path, WRITER_RATE_HZ, DURATION_S + 0.5))
+        writer.start()
+        reader = IMUReader(path)
+        reader.open()
+        time.sleep(0.2)
+
+        samples = []
+        ages = []
+        clock = time.perf_counter
+        end = time.monotonic() + DURATION_S
+        while time.monotonic() < end:
+            start = clock()
+            reader.read()
+            samples.append(clock() - start)
+            if len(samples) % 1000 == 0:
+                ages.append(reader.age_ms)
+        writer.join()
+        reader.close()
+
+        result = summarize(samples)
+        result['reads_per_s'] = len(samples) / DURATION_S
+        result['retries'] = reader.retries
+        result['failed_reads'] = reader.failed_reads
+        result['samples_seen'] = reader.samples_seen
+        result['mean_age_ms'] = sum(ages) / len(ages) if ages else 0.0
+        print_result('imu read', result)
+    finally:
+        os.unlink(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Cost of a log call on the hot path, before and after the logging pipeline.
+
+Times a disabled debug call (with %-style arguments and with an eager
+f-string), an enabled one kept in the ring, one sent through the queue
+to the listener thread, and one written synchronously by a
+StreamHandler, as main.py used to do. Then checks that an error dumps
+the ring and that a log storm is rate limited, and exits non-zero if
+either fails or a ring call costs more than a synchronous write.
+"""
+import os
+import sys
+import shutil
+import logging
+import tempfile
+from benchmarks.common import summarize, time_calls, print_result
+from utils.log import LoggingPipeline, LOG_FORMAT, RATE_LIMIT_BURST, RATE_LIMIT_PER_S
+
+ITERATIONS = 20000
+HOT_LOGGER = 'xfce4_xr_desktop.frame_scheduler'
+FRAME = {'deadline': 12.3456, 'pose': (0.0, 0.1, 0.0, 0.99)}
+
+def log_percent(logger):
+    return lambda: logger.debug("Frame at %.4f, pose %s", FRAME['deadline'], FRAME['pose'])
+
+def log_fstring(logger):
+    return lambda: logger.debug(f"Frame at {FRAME['deadline']:.4f}, pose {FRAME['pose']}")
+
+def time_sync(root):
+    logger = logging.getLogger('bench_logging.sync')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    handler = logging.StreamHandler(open(os.path.join(root, 'sync.log'), 'w'))
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(handler)
+    try:
+        return summarize(time_calls(log_percent(logger), ITERATIONS))
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+def main():
+    failures = []
+    root = tempfile.mkdtemp(prefix='xr_bench_logging_')
+    pipeline = LoggingPipeline(log_path=os.path.join(root, 'xfce4-xr-desktop.log'), console=False).start()
+    try:
+        hot = logging.getLogger(HOT_LOGGER)
+        hot.setLevel(logging.INFO)
+        disabled = summarize(time_calls(log_percent(hot), ITERATIONS))
+        print_result('disabled debug, %-style', disabled)
+        print_result('disabled debug, f-string', summarize(time_calls(log_fstring(hot), ITERATIONS)))
+
+        hot.setLevel(logging.NOTSET)
+        ring = summarize(time_calls(log_percent(hot), ITERATIONS))
+        print_result('enabled debug, ring', ring)
+
+        # The queue is rate limited per logger; lift the limit to time the queue itself
+        pipeline.rate_limit.rate_per_s = float('inf')
+        queued = logging.getLogger('xfce4_xr_desktop.bench')
+        print_result('enabled debug, queue + listener', summarize(time_calls(log_percent(queued), ITERATIONS)))
+        pipeline.rate_limit.rate_per_s = RATE_LIMIT_PER_S
+
+        sync = time_sync(root)
+        print_result('enabled debug, synchronous StreamHandler', sync)
+        if ring['median_us'] > sync['median_us']:
+            failures.append("a ring call should cost less than a synchronous write")
+        if disabled['median_us'] > ring['median_us']:
+            failures.append("a disabled call should cost less than a ring call")
+
+        # An error dumps the buffered history, once per failure burst
+        pipeline.ring.records.clear()
+        for i in range(10):
+            hot.debug("frame %d", i)
+        dumps = pipeline.ring.dumps
+        hot.error("device lost")
+        if pipeline.ring.dumps != dumps + 1 or pipeline.ring.records:
+            failures.append("an error should dump the ring")
+
+        # A disconnected device failing every frame
+        storm = logging.getLogger('xfce4_xr_desktop.storm')
+        suppressed = pipeline.rate_limit.suppressed
+        for _ in range(1000):
+            storm.error("Error reading state: device not found")
+        dropped = pipeline.rate_limit.suppressed - suppressed
+        print_result('log storm', {'records': 1000, 'written': 1000 - dropped, 'suppressed': dropped})
+        if 1000 - dropped > RATE_LIMIT_BURST:
+            failures.append(f"{1000 - dropped} storm records written, limit is {RATE_LIMIT_BURST}")
+    finally:
+        pipeline.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Display mesh generation: geometry checks, cold vs cached cost, slider drag.
+
+First checks generated meshes against known geometry (the flat corners
+lie on the diagonal FOV at the reference distance, the display keeps
+its size at other distances, every column of a fully curved display is
+at the display distance, and the arc keeps the flat width) and exits
+non-zero on a mismatch. Then times cold generation against cache hits,
+and replays a distance-slider drag with prefetching to report the hit
+rate and memory held.
+"""
+import sys
+import math
+import time
+import numpy as np
+from benchmarks.common import summarize, time_calls, print_result
+from core.mesh import MeshCache, generate_mesh, mesh_nbytes, REFERENCE_DISTANCE_M, SLIDER_STEP_M
+
+RESOLUTION = (1920, 1080)
+FOV_DEG = 46.0
+SUBDIVISIONS = (16, 32, 64, 128)
+
+def check_geometry():
+    errors = []
+    reference = generate_mesh(RESOLUTION, FOV_DEG, REFERENCE_DISTANCE_M, 0.0, 32)
+    corner = reference.vertices[0].astype(np.float64)
+    corner_angle = math.atan(math.hypot(corner[0], corner[1]) / -corner[2])
+    if not math.isclose(2 * corner_angle, math.radians(FOV_DEG), rel_tol=1e-5):
+        errors.append(f"flat corner at {math.degrees(2 * corner_angle):.4f} deg diagonal")
+
+    distance = 2 * REFERENCE_DISTANCE_M
+    flat = generate_mesh(RESOLUTION, FOV_DEG, distance, 0.0, 32)
+    if not np.allclose(flat.vertices[:, :2], reference.vertices[:, :2]):
+        errors.append("flat mesh changes size with the distance")
+    if not np.allclose(flat.vertices[:, 2], -distance):
+        errors.append("flat mesh is not planar at the display distance")
+    if not math.isclose(-corner[0] / corner[1], RESOLUTION[0] / RESOLUTION[1], rel_tol=1e-5):
+        errors.append("flat mesh does not keep the display aspect ratio")
+
+    curved = generate_mesh(RESOLUTION, FOV_DEG, distance, 1.0, 32)
+    radial = np.hypot(curved.vertices[:, 0], curved.vertices[:, 2])
+    if not np.allclose(radial, distance, rtol=1e-5):
+        errors.append(f"curved columns at {radial.min():.5f}-{radial.max():.5f} m, expected {distance}")
+    top_row = curved.vertices[:33].astype(np.float64)
+    arc = np.sum(np.hypot(np.diff(top_row[:, 0]), np.diff(top_row[:, 2])))
+    flat_width = -2 * corner[0]
+    if not math.isclose(arc, flat_width, rel_tol=1e-3):
+        errors.append(f"curved arc {arc:.5f} m, flat width {flat_width:.5f} m")
+
+    vertex_count = 33 * 33
+    if flat.indices.shape != (32 * 32 * 2, 3) or flat.indices.max() != vertex_count - 1:
+        errors.append("unexpected index buffer")
+    if flat.uvs[0].tolist() != [0.0, 0.0] or flat.uvs[-1].tolist() != [1.0, 1.0]:
+        errors.append("UVs do not span the texture")
+    return errors
+
+def main():
+    errors = check_geometry()
+    for error in errors:
+        print(f"geometry check failed: {error}")
+
+    for subdivisions in SUBDIVISIONS:
+        samples = time_calls(lambda: generate_mesh(RESOLUTION, FOV_DEG, 1.05, 0.5, subdivisions), 50)
+        result = summarize(samples)
+        result['bytes'] = mesh_nbytes(generate_mesh(RESOLUTION, FOV_DEG, 1.05, 0.5, subdivisions))
+        print_result(f"cold, {subdivisions}x{subdivisions}", result)
+        cache = MeshCache()
+        cache.get(RESOLUTION, FOV_DEG, 1.05, 0.5, subdivisions)
+        print_result(f"cached, {subdivisions}x{subdivisions}",
+                     summarize(time_calls(lambda: cache.get(RESOLUTION, FOV_DEG, 1.05, 0.5, subdivisions), 1000)))
+
+    # A drag across the slider range and back, one step every 30 ms,
+    # prefetching around each new position as the bound XRManager would.
+    # Lookups here run cold after each sleep, so compare hit rates, not times
+    cache = MeshCache()
+    positions = [round(0.5 + i * SLIDER_STEP_M, 2) for i in range(51)]
+    positions += positions[::-1]
+    geometry = dict(resolution=RESOLUTION, fov_deg=FOV_DEG, curvature=0.5, subdivisions=64)
+    samples = []
+    for distance in positions:
+        start = time.perf_counter()
+        cache.get(distance=distance, **geometry)
+        samples.append(time.perf_counter() - start)
+        cache.prefetch_around(distance, **geometry)
+        time.sleep(0.03)
+    cache.wait_idle()
+    result = summarize(samples)
+    result.update(cache.stats())
+    print_result('slider drag with prefetch', result)
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
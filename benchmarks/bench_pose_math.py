@@ -0,0 +1,61 @@
+"""Per-frame cost of the pose math for 1, 4 and 16 virtual displays.
+
+Each frame rotates every display's vertex grid by that display's
+quaternion, converts the result to renderer axes and recomputes the
+displays' cross FOVs. A scalar per-vertex port is timed for comparison.
+"""
+import math
+import numpy as np
+from benchmarks.common import summarize, time_calls, print_result
+from core import pose_math
+
+GRID = (17, 9)
+FRAMES = 500
+
+def scalar_rotate(q, v):
+    """Straight per-vertex port of applyQuaternionToVector."""
+    qx, qy, qz, qw = q
+    vx, vy, vz = v
+    ix = qw * vx + qy * vz - qz * vy
+    iy = qw * vy + qz * vx - qx * vz
+    iz = qw * vz + qx * vy - qy * vx
+    iw = -qx * vx - qy * vy - qz * vz
+    return (ix * qw + iw * -qx + iy * -qz - iz * -qy,
+            iy * qw + iw * -qy + iz * -qx - ix * -qz,
+            iz * qw + iw * -qz + ix * -qy - iy * -qx)
+
+def make_inputs(displays):
+    rng = np.random.default_rng(0)
+    quaternions = rng.normal(size=(displays, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1)[:, np.newaxis]
+    u, v = np.meshgrid(np.linspace(-1, 1, GRID[0]), np.linspace(-0.5625, 0.5625, GRID[1]))
+    vertices = np.stack([np.full(u.size, 1.05), -u.ravel(), v.ravel()], axis=1)
+    return quaternions, vertices
+
+def main():
+    for displays in (1, 4, 16):
+        quaternions, vertices = make_inputs(displays)
+        workspace = pose_math.Workspace()
+        fovs = np.empty((displays, 2))
+        diagonal = np.full(displays, math.radians(46))
+        aspect = np.full(displays, 16 / 9)
+
+        def frame():
+            rotated = workspace.rotate(quaternions, vertices)
+            pose_math.nwu_to_esu(rotated, out=rotated)
+            pose_math.diagonal_to_cross_fovs(diagonal, aspect, out=fovs)
+
+        print_result(f"vectorized {displays:2d} displays", summarize(time_calls(frame, FRAMES)))
+
+        vertex_list = vertices.tolist()
+        quaternion_list = quaternions.tolist()
+
+        def scalar_frame():
+            for q in quaternion_list:
+                for vertex in vertex_list:
+                    scalar_rotate(q, vertex)
+
+        print_result(f"scalar     {displays:2d} displays", summarize(time_calls(scalar_frame, FRAMES // 10)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Cost per call of reading the driver state file.
+
+Compares the old approach (read and split the whole file on every call)
+with StateParser forced to re-parse, and with StateParser on an
+unchanged file, where only a stat is done and the previous snapshot is
+returned.
+"""
+import os
+import sys
+import tempfile
+from benchmarks.common import summarize, time_calls, print_result
+from core.driver_state import StateParser
+
+ITERATIONS = 20000
+
+# What the driver writes with glasses connected and Breezy Desktop active
+STATE = {
+    'heartbeat': '1718049632',
+    'hardware_id': '3f2a9c1e',
+    'device_connected': 'true',
+    'connected_device_brand': 'XREAL',
+    'connected_device_model': 'Air 2 Pro',
+    'external_mode': 'breezy_desktop',
+    'calibration_setup': 'AUTOMATIC',
+    'calibration_state': 'CALIBRATED',
+    'sbs_mode_supported': 'true',
+    'sbs_mode_enabled': 'false',
+    'firmware_update_recommended': 'false',
+    'breezy_desktop_smooth_follow_enabled': 'true',
+    'breezy_desktop_smooth_follow_origin': '0.012,-0.003,0.707,0.707',
+    'breezy_desktop_display_distance': '1.05',
+    'breezy_desktop_follow_threshold': '0.1',
+    'is_gamescope_reshade_ipc_connected': 'false',
+}
+
+def legacy_read(path):
+    """The parsing XRManager used to do on every call."""
+    with open(path, 'r') as f:
+        return dict(line.strip().split('=') for line in f if line.strip())
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'xr_driver_state')
+        with open(path, 'w') as f:
+            f.write(''.join(f"{key}={value}\n" for key, value in STATE.items()))
+
+        print_result('legacy full read', summarize(time_calls(lambda: legacy_read(path), ITERATIONS)))
+
+        parser = StateParser(path)
+
+        def forced_parse():
+            parser.invalidate()
+            return parser.read()
+        print_result('StateParser parse', summarize(time_calls(forced_parse, ITERATIONS)))
+
+        parser.read()
+        hits_before = parser.cache_hits
+        result = summarize(time_calls(parser.read, ITERATIONS))
+        result['cache_hits'] = parser.cache_hits - hits_before
+        print_result('StateParser unchanged file', result)
+
+        snapshot = parser.snapshot
+        print_result('snapshot attribute access',
+                     summarize(time_calls(lambda: snapshot.device_connected, ITERATIONS)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
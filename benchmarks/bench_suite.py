@@ -0,0 +1,322 @@
+"""Regression suite for XRManager, Config and the driver I/O paths.
+
+Runs the application's own classes against a FakeDriver (a temporary
+tmpfs directory standing in for /dev/shm, plus a stub xr_driver_cli)
+and measures:
+
+- ``config``: Config.set alone, and Config.set followed by the save
+- ``driver_io``: driver state reads, after a change and when the file
+  is unchanged, and the old naive read of the changed file
+- ``xr_manager``: XRManager.initialize() wall time, the time until
+  'driver-ready', setter throughput through XRManager._write_control,
+  and a submit followed by the control file write
+- ``main_window``: MainWindow construction, on a private Xvfb (skipped
+  without Xvfb)
+
+The first two groups do not need GObject; the others import it only
+when they run. tests/test_bench_suite.py runs each group under pytest,
+skipping the GObject ones where gi is not installed.
+
+Each metric is the median of its samples, in microseconds. With
+``--save-baseline`` the results are written as the baseline JSON;
+otherwise they are compared with it, and the run exits non-zero if any
+metric is slower than the baseline by more than ``--threshold`` (and
+by more than NOISE_US, so sub-microsecond jitter on the fastest metrics
+is not reported). Independently of the baseline, the run also fails if
+a RELATIVE_CHECKS metric is slower than its reference in the same run,
+such as StateParser's changed-file read against the naive read.
+Baselines are machine specific, so the default lives in
+``~/.cache/xfce4-xr-desktop``::
+
+    python -m benchmarks.bench_suite --save-baseline
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --groups config,driver_io
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import importlib.util
+from benchmarks.common import summarize, time_calls, print_result
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.bench_state_parser import STATE, legacy_read
+from benchmarks.xvfb import start_xvfb, stop_xvfb
+from core.driver_state import StateParser
+from utils.config import Config
+
+DEFAULT_THRESHOLD = 0.25
+# Slowdowns smaller than this are timer and scheduling noise
+NOISE_US = 5.0
+INIT_ITERATIONS = 20
+SETTER_ITERATIONS = 2000
+WRITE_ITERATIONS = 200
+STATE_ITERATIONS = 500
+CONFIG_ITERATIONS = 200
+WINDOW_ITERATIONS = 10
+READY_TIMEOUT_S = 5.0
+
+# Alternate full driver states; the sizes differ so every rewrite is seen as a change
+STATES = (
+    dict(STATE, sbs_mode_enabled='false'),
+    dict(STATE, sbs_mode_enabled='true'),
+)
+# (metric, reference): the metric's median must not exceed the reference
+# median of the same run by more than RELATIVE_TOLERANCE
+RELATIVE_CHECKS = (
+    ('state_read_changed', 'state_read_legacy'),
+)
+RELATIVE_TOLERANCE = 0.1
+
+def default_baseline_path():
+    return os.path.expanduser('~/.cache/xfce4-xr-desktop/bench_baseline.json')
+
+def spin_until(predicate, timeout=READY_TIMEOUT_S):
+    """Run the default GLib main context until predicate() holds. Returns False on timeout."""
+    from gi.repository import GLib
+    context = GLib.MainContext.default()
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            return False
+        context.iteration(False)
+        time.sleep(0.0005)
+    return True
+
+def make_manager(driver, config_dir):
+    """An XRManager on the fake driver, and its Config; saves only happen on flush()."""
+    from core.xr_manager import XRManager
+    config = Config(config_dir=config_dir, save_delay=3600)
+    return XRManager(shm_dir=driver.shm_dir, cli_path=driver.cli_path, config=config), config
+
+def bench_initialize(driver, config_dir):
+    """initialize() itself, and until the stub CLI has put the driver in Breezy Desktop mode."""
+    init_samples = []
+    ready_samples = []
+    for _ in range(INIT_ITERATIONS):
+        driver.write_state({'device_connected': 'true'})
+        manager, config = make_manager(driver, config_dir)
+        ready = []
+        manager.connect('driver-ready', lambda *args: ready.append(time.perf_counter()))
+        start = time.perf_counter()
+        if not manager.initialize():
+            raise RuntimeError("XRManager.initialize() failed against the fake driver")
+        init_samples.append(time.perf_counter() - start)
+        if not spin_until(lambda: ready):
+            raise RuntimeError("driver-ready was not emitted")
+        ready_samples.append(ready[0] - start)
+        manager.cleanup()
+        config.flush()
+    return {'xr_manager_initialize': init_samples, 'xr_manager_driver_ready': ready_samples}
+
+def bench_control(manager):
+    """_write_control at a slider's pace, and a submit that is written out at once."""
+    from core.xr_manager import CONTROL_DISPLAY_DISTANCE
+    values = [f"{1.0 + i / SETTER_ITERATIONS:.4f}" for i in range(SETTER_ITERATIONS)]
+    iterator = iter(values)
+    setter = time_calls(lambda: manager._write_control(CONTROL_DISPLAY_DISTANCE, next(iterator)),
+                        SETTER_ITERATIONS)
+    queue = manager.control_queue
+    queue.flush()
+
+    def write_now():
+        manager._write_control(CONTROL_DISPLAY_DISTANCE, f"{time.perf_counter():.6f}")
+        queue.flush()
+    return {'write_control': setter, 'write_control_flush': time_calls(write_now, WRITE_ITERATIONS)}
+
+def bench_xr_manager(driver, config_dir):
+    """XRManager start-up, then its control writes on a ready driver."""
+    samples = bench_initialize(driver, config_dir)
+    driver.write_state(STATES[0])
+    manager, config = make_manager(driver, config_dir)
+    manager.initialize()
+    if not spin_until(lambda: manager.driver_ready):
+        raise RuntimeError("driver-ready was not emitted")
+    samples.update(bench_control(manager))
+    manager.cleanup()
+    config.flush()
+    return samples
+
+def bench_state(driver, config_dir):
+    """StateParser.read() after the driver rewrote the file, and with the file unchanged.
+
+    The old naive read and split of the whole file is timed on the same
+    rewrites, as the reference for the changed-file read.
+    """
+    parser = StateParser(driver.state_path)
+    changed = []
+    legacy = []
+    for i in range(STATE_ITERATIONS):
+        driver.write_state(STATES[i % 2])
+        # Take turns at reading first, since the second read finds the file cached
+        reads = [(parser.read, changed), (lambda: legacy_read(driver.state_path), legacy)]
+        if i % 4 >= 2:
+            reads.reverse()
+        for read, samples in reads:
+            start = time.perf_counter()
+            read()
+            samples.append(time.perf_counter() - start)
+    return {'state_read_changed': changed,
+            'state_read_legacy': legacy,
+            'state_read_unchanged': time_calls(parser.read, STATE_ITERATIONS)}
+
+def bench_config(driver, config_dir):
+    """Config.set as called from the UI thread, and followed by the save."""
+    config = Config(config_dir=config_dir, save_delay=3600)
+    config.get('control_rate_hz')
+    values = iter(range(CONFIG_ITERATIONS * 2))
+    set_only = time_calls(lambda: config.set('control_rate_hz', 30 + next(values)), CONFIG_ITERATIONS)
+
+    def set_and_save():
+        config.set('control_rate_hz', 30 + next(values))
+        config.flush()
+    return {'config_set': set_only, 'config_set_save': time_calls(set_and_save, CONFIG_ITERATIONS)}
+
+def bench_main_window(driver, config_dir):
+    """MainWindow construction on a private Xvfb; empty if Xvfb is not installed."""
+    xvfb = start_xvfb(1280, 1024)
+    if xvfb is None:
+        print("Xvfb not found, skipping MainWindow construction")
+        return {}
+    process, display_name = xvfb
+    os.environ['DISPLAY'] = display_name
+    try:
+        # Gtk connects to the display when it is first imported
+        from gi.repository import Gtk
+        from ui.main_window import MainWindow
+        manager, config = make_manager(driver, config_dir)
+        samples = []
+        for _ in range(WINDOW_ITERATIONS):
+            start = time.perf_counter()
+            window = MainWindow(manager, config, hide_on_close=True)
+            samples.append(time.perf_counter() - start)
+            window.destroy()
+            while Gtk.events_pending():
+                Gtk.main_iteration()
+        manager.cleanup()
+        config.flush()
+        return {'main_window_construct': samples}
+    finally:
+        stop_xvfb(process)
+
+# Measurement groups, in run order
+GROUPS = {
+    'config': bench_config,
+    'driver_io': bench_state,
+    'xr_manager': bench_xr_manager,
+    'main_window': bench_main_window,
+}
+
+# Groups that need GObject
+GI_GROUPS = ('xr_manager', 'main_window')
+
+def run_suite(groups=tuple(GROUPS)):
+    """Run the measurements of the given groups and return {metric: summary}."""
+    driver = FakeDriver()
+    config_dir = tempfile.mkdtemp(prefix='xr_bench_suite_')
+    samples = {}
+    try:
+        for group in groups:
+            samples.update(GROUPS[group](driver, config_dir))
+    finally:
+        driver.close()
+        shutil.rmtree(config_dir, ignore_errors=True)
+    return {name: summarize(values) for name, values in samples.items()}
+
+def compare(results, baseline, threshold):
+    """Return a list of regression messages: medians above baseline * (1 + threshold) and baseline + NOISE_US."""
+    regressions = []
+    for name, summary in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name}: no baseline")
+            continue
+        ratio = summary['median_us'] / reference['median_us'] if reference['median_us'] else 1.0
+        print(f"{name}: {summary['median_us']:.1f} us vs {reference['median_us']:.1f} us baseline ({ratio:.2f}x)")
+        if ratio > 1 + threshold and summary['median_us'] - reference['median_us'] > NOISE_US:
+            regressions.append(f"{name} is {ratio:.2f}x its baseline median")
+    return regressions
+
+def check_relative(results, tolerance=RELATIVE_TOLERANCE):
+    """Return a message for each RELATIVE_CHECKS metric slower than its reference in the same run."""
+    failures = []
+    for name, reference_name in RELATIVE_CHECKS:
+        if name not in results or reference_name not in results:
+            continue
+        median = results[name]['median_us']
+        reference = results[reference_name]['median_us']
+        print(f"{name}: {median:.1f} us vs {reference_name} {reference:.1f} us")
+        if median > reference * (1 + tolerance):
+            failures.append(f"{name} ({median:.1f} us) is slower than {reference_name} ({reference:.1f} us)")
+    return failures
+
+def load_baseline(path):
+    """The metrics of the baseline at path, or None if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)['metrics']
+    except FileNotFoundError:
+        return None
+
+def save_baseline(path, results):
+    """Write results over the baseline at path, keeping the metrics of groups that did not run."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    data = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'metrics': dict(load_baseline(path) or {}, **results),
+    }
+    fd, tmp_path = tempfile.mkstemp(prefix='.bench_baseline.', suffix='.tmp', dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_suite',
+                                     description='Benchmark XRManager, Config and the driver I/O paths '
+                                                 'against a fake driver and check for regressions.')
+    parser.add_argument('--baseline', default=default_baseline_path(), help='baseline JSON path')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown of a median, as a fraction (default: 0.25)')
+    parser.add_argument('--groups', type=lambda text: text.split(','), default=list(GROUPS),
+                        help=f"comma-separated groups to run (default: {','.join(GROUPS)})")
+    args = parser.parse_args(argv)
+    unknown = [group for group in args.groups if group not in GROUPS]
+    if unknown:
+        parser.error(f"unknown group {', '.join(unknown)}")
+
+    groups = args.groups
+    if importlib.util.find_spec('gi') is None:
+        skipped = [group for group in groups if group in GI_GROUPS]
+        if skipped:
+            print(f"gi not found, skipping {', '.join(skipped)}")
+        groups = [group for group in groups if group not in GI_GROUPS]
+
+    results = run_suite(groups)
+    for name, summary in results.items():
+        print_result(name, summary)
+    failures = check_relative(results)
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+        return 1 if failures else 0
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return 1 if failures else 0
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions or failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
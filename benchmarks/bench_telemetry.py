@@ -0,0 +1,73 @@
+"""Telemetry sampling: rate checks and the cost of one panel refresh's sample.
+
+Drives TelemetrySampler with stand-in counters on a fake clock, checks
+the rates it reports and exits non-zero on a mismatch, then times
+sample() with latency tracing off and on.
+"""
+import sys
+from types import SimpleNamespace
+from benchmarks.common import summarize, time_calls, print_result
+from utils.latency import LatencyTracer, STAGE_UI, STAGE_WRITTEN
+from utils.telemetry import TelemetrySampler
+
+def make_sources():
+    queue = SimpleNamespace(submitted_count=0, write_count=0, pending_count=0, ring=None)
+    xr_manager = SimpleNamespace(control_queue=queue, state_watcher=SimpleNamespace(parse_count=0))
+    return xr_manager, SimpleNamespace(save_count=0), SimpleNamespace(samples_seen=0)
+
+def check_rates():
+    errors = []
+    xr_manager, config, imu_reader = make_sources()
+    clock = SimpleNamespace(now=0.0)
+    tracer = LatencyTracer()
+    sampler = TelemetrySampler(xr_manager, config, imu_reader=imu_reader, tracer=tracer,
+                               clock=lambda: clock.now)
+    first = sampler.sample()
+    if first['imu_hz'] is not None or first['commands_hz'] is not None:
+        errors.append("the first sample should have no rates")
+
+    # Half a second at 1 kHz IMU, 60 Hz state updates and a 30 Hz slider drag
+    clock.now += 0.5
+    imu_reader.samples_seen += 500
+    xr_manager.state_watcher.parse_count += 30
+    xr_manager.control_queue.submitted_count += 15
+    xr_manager.control_queue.write_count += 15
+    xr_manager.control_queue.pending_count = 2
+    config.save_count = 1
+    tracer.enabled = True
+    for i in range(10):
+        tracer.mark('display_distance', STAGE_UI, now=i)
+        tracer.mark('display_distance', STAGE_WRITTEN, now=i + 0.002)
+    metrics = sampler.sample()
+    expected = {'imu_hz': 1000.0, 'state_updates_hz': 60.0, 'commands_hz': 30.0,
+                'control_writes_hz': 30.0, 'queue_depth': 2, 'config_saves': 1}
+    for name, value in expected.items():
+        if metrics[name] is None or abs(metrics[name] - value) > 1e-6:
+            errors.append(f"{name} is {metrics[name]}, expected {value}")
+    if not metrics['latency'] or metrics['latency']['count'] != 10:
+        errors.append(f"latency summary is {metrics['latency']}")
+
+    sampler.reset()
+    if sampler.sample()['commands_hz'] is not None:
+        errors.append("rates should restart after reset()")
+    return errors
+
+def main():
+    errors = check_rates()
+    for error in errors:
+        print(f"rate check failed: {error}")
+
+    xr_manager, config, imu_reader = make_sources()
+    tracer = LatencyTracer()
+    sampler = TelemetrySampler(xr_manager, config, imu_reader=imu_reader, tracer=tracer)
+    print_result('sample, tracing off', summarize(time_calls(sampler.sample, 10000)))
+    tracer.enabled = True
+    for key in ('display_distance', 'sbs_mode', 'enable_breezy_desktop_smooth_follow', 'recenter_screen'):
+        for i in range(100):
+            tracer.mark(key, STAGE_UI, now=i)
+            tracer.mark(key, STAGE_WRITTEN, now=i + 0.001 * (i % 7 + 1))
+    print_result('sample, tracing on, 4 keys', summarize(time_calls(sampler.sample, 10000)))
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
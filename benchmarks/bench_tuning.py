@@ -0,0 +1,106 @@
+"""Follow-threshold sweep over a synthetic head-motion trace.
+
+A minute of 1 kHz head motion (slow drift, quick glances and sensor
+noise) is written as a trace and loaded back with core.tuning. The
+sweep runs in this process, in a process pool reading the trace from
+shared memory, and in a pool that pickles the trace into every task;
+all three must rank the same results, and the recommended setting must
+keep the display in view (off view at most ``tuning.MAX_OFF_VIEW`` of
+the time).
+"""
+import os
+import sys
+import math
+import time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from benchmarks.common import print_result
+from core import tuning
+from core.imu_reader import IMU_DTYPE
+from core.trace import SOURCE_IMU, TraceWriter
+
+DURATION_S = 60
+RATE_HZ = 1000
+THRESHOLDS = [round(0.02 * i, 2) for i in range(1, 26)]
+DISTANCES = [1.05, 1.25, 1.5, 2.0, 3.0]
+TIME_CONSTANTS = [0.1, tuning.DEFAULT_TIME_CONSTANT_S]
+
+def head_motion(duration_s=DURATION_S, rate_hz=RATE_HZ, seed=3):
+    """Yaw/pitch of a user reading with occasional glances to the side."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(0, duration_s, 1.0 / rate_hz)
+    yaw = 0.05 * np.sin(2 * np.pi * 0.1 * t)
+    pitch = 0.02 * np.sin(2 * np.pi * 0.07 * t + 1.0)
+    for start in rng.uniform(0, duration_s - 3, size=12):
+        # Glance: turn by up to 0.6 rad in ~0.3 s, hold, come back
+        amplitude = rng.uniform(-0.6, 0.6)
+        hold = rng.uniform(0.5, 2.0)
+        ramp_in = np.clip((t - start) / 0.3, 0, 1)
+        ramp_out = np.clip((t - start - 0.3 - hold) / 0.3, 0, 1)
+        yaw += amplitude * (ramp_in - ramp_out) * (1 - np.cos(np.pi * (ramp_in - ramp_out))) / 2
+    yaw += rng.normal(0, 0.0005, t.size)
+    pitch += rng.normal(0, 0.0005, t.size)
+    # NWU: yaw about up (z), then pitch about the rotated west axis (y)
+    cy, sy, cp, sp = np.cos(yaw / 2), np.sin(yaw / 2), np.cos(pitch / 2), np.sin(pitch / 2)
+    quaternions = np.stack([-sy * sp, cy * sp, sy * cp, cy * cp], axis=1)
+    return t, quaternions
+
+def write_trace(path, timestamps, quaternions):
+    writer = TraceWriter(path)
+    sample = np.zeros(1, dtype=IMU_DTYPE)
+    for i, (timestamp, quaternion) in enumerate(zip(timestamps, quaternions)):
+        sample['epoch_ms'] = i + 1
+        sample['imu_quat_data'][0, 0] = quaternion
+        writer.write(SOURCE_IMU, float(timestamp), sample.tobytes())
+    writer.close()
+
+def simulate_pickled(task):
+    timestamps, quaternions, threshold, time_constant, distances = task
+    displays, triggers = tuning.simulate_follow(timestamps, quaternions, threshold, time_constant)
+    rows = tuning.score_follow(timestamps, quaternions, displays, triggers, distances)
+    return [dict(row, follow_threshold=threshold, time_constant=time_constant) for row in rows]
+
+def sweep_pickled(timestamps, quaternions, jobs):
+    distances = tuning.feasible_distances(DISTANCES)
+    tasks = [(timestamps, quaternions, threshold, time_constant, distances)
+             for threshold in THRESHOLDS for time_constant in TIME_CONSTANTS]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        rows = [row for rows in pool.map(simulate_pickled, tasks) for row in rows]
+    return tuning.rank(rows)
+
+def main():
+    jobs = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'head.trace')
+        write_trace(path, *head_motion())
+        start = time.perf_counter()
+        timestamps, quaternions = tuning.load_imu_trace(path)
+        print_result('load trace', {'samples': len(timestamps), 'ms': (time.perf_counter() - start) * 1e3})
+
+    runs = {}
+    for name, run in (('in process',
+                       lambda: tuning.sweep(timestamps, quaternions, THRESHOLDS, DISTANCES, TIME_CONSTANTS, jobs=1)),
+                      (f'pool of {jobs}, shared memory',
+                       lambda: tuning.sweep(timestamps, quaternions, THRESHOLDS, DISTANCES, TIME_CONSTANTS,
+                                            jobs=jobs)),
+                      (f'pool of {jobs}, pickled trace', lambda: sweep_pickled(timestamps, quaternions, jobs))):
+        start = time.perf_counter()
+        runs[name] = run()
+        print_result(f"sweep, {name}", {'combinations': len(runs[name]),
+                                         'seconds': time.perf_counter() - start})
+
+    print()
+    results = next(iter(runs.values()))
+    print(tuning.format_table(results, 10))
+    reference = [tuple(result) for result in results]
+    failures = [name for name, rows in runs.items() if [tuple(result) for result in rows] != reference]
+    for name in failures:
+        print(f"FAIL: {name} ranked differently from the in-process sweep")
+    if results[0].off_view > tuning.MAX_OFF_VIEW:
+        failures.append('recommendation')
+        print(f"FAIL: the recommended setting is off view {results[0].off_view:.1%} of the time")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
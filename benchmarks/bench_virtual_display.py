@@ -0,0 +1,117 @@
+"""Virtual display provisioning: one xrandr step at a time vs one batched run.
+
+Runs against benchmarks.fake_xrandr, a stub xrandr whose screen changes
+take RECONFIGURE_S, so results do not depend on the X server. Compares
+running --newmode, --addmode and --output as separate xrandr commands per
+display with VirtualDisplayProvisioner's single batched run, and times a
+restart that finds everything already in place. Also checks the CVT
+modelines against known ``cvt`` output and times the modeline cache.
+If Xvfb and a real xrandr are installed, the query parser is run on
+Xvfb's output too.
+"""
+import os
+import sys
+import time
+import shutil
+import subprocess
+from benchmarks.common import summarize, time_calls, print_result
+from benchmarks.fake_xrandr import FakeXrandr
+from benchmarks.xvfb import start_xvfb, stop_xvfb
+from core.virtual_display import (VirtualDisplay, VirtualDisplayProvisioner, ModelineCache,
+                                  cvt_modeline, parse_xrandr_query)
+
+RECONFIGURE_S = 0.03
+
+# Output of `cvt W H R` (and `cvt -r`), timings only
+CVT_REFERENCE = {
+    (1920, 1080, 60, False): '173.00 1920 2048 2248 2576 1080 1083 1088 1120 -hsync +vsync',
+    (3840, 2160, 60, False): '712.75 3840 4160 4576 5312 2160 2163 2168 2237 -hsync +vsync',
+    (1920, 1080, 60, True): '138.50 1920 1968 2000 2080 1080 1083 1088 1111 +hsync -vsync',
+    (1280, 1024, 60, False): '109.00 1280 1368 1496 1712 1024 1027 1034 1063 -hsync +vsync',
+}
+
+def layout(count):
+    return [VirtualDisplay(f'VIRTUAL{i + 1}', 1920, 1080, 60, 1920 * i, 0) for i in range(count)]
+
+def provision_step_by_step(xrandr_path, displays, cache):
+    defined = set()
+    for display in displays:
+        modeline = cache.get(display.width, display.height, display.refresh_hz)
+        steps = []
+        if modeline.name not in defined:
+            steps.append(['--newmode', *modeline.xrandr_args()])
+            defined.add(modeline.name)
+        steps.append(['--addmode', display.output, modeline.name])
+        steps.append(['--output', display.output, '--mode', modeline.name, '--pos', f'{display.x}x{display.y}'])
+        for args in steps:
+            subprocess.run([xrandr_path, *args], check=True, capture_output=True)
+
+def check_cvt():
+    failures = []
+    for (width, height, rate, reduced), expected in CVT_REFERENCE.items():
+        timings = ' '.join(cvt_modeline(width, height, rate, reduced).xrandr_args()[1:])
+        if timings != expected:
+            failures.append(f"cvt {width}x{height}@{rate}{' -r' if reduced else ''}: {timings} != {expected}")
+    return failures
+
+def main():
+    failures = check_cvt()
+    print(f"CVT modelines: {len(CVT_REFERENCE) - len(failures)}/{len(CVT_REFERENCE)} match cvt")
+
+    fake = FakeXrandr(outputs=[f'VIRTUAL{i + 1}' for i in range(4)], delay_s=RECONFIGURE_S)
+    try:
+        cache_path = os.path.join(fake.root, 'modelines.json')
+        print_result('modeline cache, cold', summarize(
+            time_calls(lambda: ModelineCache(cache_path).get(3840, 2160, 60), 1)))
+        print_result('modeline cache, from disk', summarize(
+            time_calls(lambda: ModelineCache(cache_path).get(3840, 2160, 60), 100)))
+        cache = ModelineCache(cache_path)
+
+        for count in (1, 2, 4):
+            displays = layout(count)
+            for name in ('step by step', 'batched', 'restart'):
+                if name != 'restart':
+                    fake.remove()
+                    fake = FakeXrandr(outputs=[f'VIRTUAL{i + 1}' for i in range(4)], delay_s=RECONFIGURE_S)
+                provisioner = VirtualDisplayProvisioner(fake.path, cache=cache)
+                before = len(fake.invocations())
+                start = time.perf_counter()
+                if name == 'step by step':
+                    provision_step_by_step(fake.path, displays, cache)
+                    ok = True
+                else:
+                    ok = provisioner.provision(displays)
+                elapsed = time.perf_counter() - start
+                if name == 'step by step':
+                    expected_state = fake.state()
+                elif fake.state() != expected_state:
+                    failures.append(f"{count} displays, {name}: RandR state differs from step by step")
+                if not ok:
+                    failures.append(f"{count} displays, {name}: provisioning failed")
+                print_result(f"{count} displays, {name}",
+                             {'xrandr_runs': len(fake.invocations()) - before, 'total_ms': elapsed * 1e3})
+    finally:
+        fake.remove()
+
+    if shutil.which('xrandr'):
+        xvfb = start_xvfb()
+        if xvfb is not None:
+            process, display_name = xvfb
+            try:
+                provisioner = VirtualDisplayProvisioner(display_name=display_name)
+                outputs = provisioner.query()
+                if not outputs:
+                    failures.append("Xvfb: no outputs parsed from xrandr --query")
+                else:
+                    for state in outputs.values():
+                        print(f"Xvfb output {state.name}: geometry={state.geometry}, "
+                              f"current={state.current_mode}, {len(state.modes)} modes")
+            finally:
+                stop_xvfb(process)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Small helpers shared by the benchmark scripts.
+
+Benchmarks are plain scripts, run from the repository root, e.g.::
+
+    python -m benchmarks.bench_config
+"""
+import time
+import statistics
+
+def summarize(samples):
+    """Return min/median/p95/max of a list of durations in seconds, as microseconds."""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        'count': len(ordered),
+        'min_us': ordered[0] * 1e6,
+        'median_us': statistics.median(ordered) * 1e6,
+        'p95_us': p95 * 1e6,
+        'max_us': ordered[-1] * 1e6,
+        'total_ms': sum(ordered) * 1e3,
+    }
+
+def time_calls(fn, iterations):
+    """Call fn() iterations times and return the per-call durations."""
+    samples = []
+    clock = time.perf_counter
+    for _ in range(iterations):
+        start = clock()
+        fn()
+        samples.append(clock() - start)
+    return samples
+
+def print_result(name, result):
+    fields = ', '.join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                       for key, value in result.items())
+    print(f"{name}: {fields}")
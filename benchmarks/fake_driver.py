@@ -0,0 +1,191 @@
+"""Stand-ins for the XR driver side of the shared-memory interfaces.
+
+Used by the benchmarks to exercise the readers and writers in ``core``
+without glasses plugged in.
+"""
+import os
+import sys
+import math
+import mmap
+import time
+import shutil
+import tempfile
+import numpy as np
+from core.imu_reader import IMU_DTYPE, IMU_LAYOUT_VERSION, imu_parity
+from core.control_ring import (RING_MAGIC, RING_LAYOUT_VERSION, RING_RECORD_DTYPE,
+                               ring_size, map_ring)
+from core.trace import SOURCE_FILES, SOURCE_STATE, SOURCE_CONTROL, SOURCE_IMU
+
+# Stub xr_driver_cli: records its arguments next to the state file and
+# exits successfully after an optional delay (XR_STUB_CLI_DELAY seconds).
+# --breezy-desktop reports the mode in the state file like the driver.
+STUB_CLI = """#!{python}
+import os, sys, time
+time.sleep(float(os.environ.get('XR_STUB_CLI_DELAY', '0')))
+with open({log_path!r}, 'a') as f:
+    f.write(' '.join(sys.argv[1:]) + '\\n')
+if '--breezy-desktop' in sys.argv:
+    try:
+        with open({state_path!r}) as f:
+            lines = [line for line in f if not line.startswith('external_mode=')]
+    except FileNotFoundError:
+        lines = []
+    with open({state_path!r}, 'w') as f:
+        f.write(''.join(lines) + 'external_mode=breezy_desktop\\n')
+"""
+
+def shm_dir():
+    """Directory for synthetic segments, preferring tmpfs."""
+    return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+class FakeDriver:
+    """A fake /dev/shm directory plus a stub xr_driver_cli.
+
+    Pass ``shm_dir`` and ``cli_path`` to XRManager to run it headless.
+    """
+
+    def __init__(self, root=None):
+        self.shm_dir = tempfile.mkdtemp(prefix='xr_fake_shm_', dir=root or shm_dir())
+        self.state_path = os.path.join(self.shm_dir, SOURCE_FILES[SOURCE_STATE])
+        self.control_path = os.path.join(self.shm_dir, SOURCE_FILES[SOURCE_CONTROL])
+        self.imu_path = os.path.join(self.shm_dir, SOURCE_FILES[SOURCE_IMU])
+        self.control_ring_path = os.path.join(self.shm_dir, 'xr_driver_control_ring')
+        self.cli_path = os.path.join(self.shm_dir, 'xr_driver_cli')
+        self.cli_log_path = os.path.join(self.shm_dir, 'xr_driver_cli.log')
+        with open(self.cli_path, 'w') as f:
+            f.write(STUB_CLI.format(python=sys.executable, log_path=self.cli_log_path,
+                                    state_path=self.state_path))
+        os.chmod(self.cli_path, 0o755)
+
+    def write_state(self, state):
+        """Rewrite the state file in place from a dict, like the driver does."""
+        with open(self.state_path, 'w') as f:
+            f.write(''.join(f"{key}={value}\n" for key, value in state.items()))
+
+    def read_control(self):
+        try:
+            with open(self.control_path, 'r') as f:
+                return f.read()
+        except FileNotFoundError:
+            return ''
+
+    def cli_calls(self):
+        try:
+            with open(self.cli_log_path, 'r') as f:
+                return f.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def close(self):
+        shutil.rmtree(self.shm_dir, ignore_errors=True)
+
+class FakeIMUWriter:
+    """Writes synthetic samples into an IMU segment file."""
+
+    def __init__(self, path):
+        self._file = open(path, 'w+b')
+        self._file.truncate(IMU_DTYPE.itemsize)
+        self._mmap = mmap.mmap(self._file.fileno(), IMU_DTYPE.itemsize)
+        self._raw = np.frombuffer(self._mmap, dtype=np.uint8)
+        self._record = self._raw.view(IMU_DTYPE).reshape(())
+        self._record['version'] = IMU_LAYOUT_VERSION
+        self._record['enabled'] = 1
+        self._record['display_res'] = (1920, 1080)
+        self._record['display_fov'] = 46.0
+
+    def write(self, quaternion, position=(0.0, 0.0, 0.0), epoch_ms=None):
+        """Publish one sample; the parity byte is written last."""
+        record = self._record
+        record['epoch_ms'] = int(time.time() * 1000) if epoch_ms is None else epoch_ms
+        record['imu_quat_data'][1:] = record['imu_quat_data'][:-1]
+        record['imu_quat_data'][0] = quaternion
+        record['pose_position'] = position
+        record['parity'] = imu_parity(self._raw)
+
+    def close(self):
+        self._record = None
+        self._raw = None
+        self._mmap.close()
+        self._file.close()
+
+class FakeRingConsumer:
+    """Driver side of the control ring: creates the segment and consumes it."""
+
+    def __init__(self, path, capacity=64):
+        self._file = open(path, 'w+b')
+        self._file.truncate(ring_size(capacity))
+        self._mmap = mmap.mmap(self._file.fileno(), ring_size(capacity))
+        self._header, records = map_ring(self._mmap, capacity)
+        self._seqs = records['seq']
+        self._keys = records['key']
+        self._values = records['value']
+        self._capacity = capacity
+        header = self._header
+        header['capacity'] = capacity
+        header['record_size'] = RING_RECORD_DTYPE.itemsize
+        header['version'] = RING_LAYOUT_VERSION
+        # Magic last: producers ignore the segment until it is complete
+        header['magic'] = RING_MAGIC
+
+    def poll(self, apply=None):
+        """Take every published command off the ring, apply it and acknowledge.
+
+        Returns the list of (seq, key, value) consumed.
+        """
+        header = self._header
+        read_seq = int(header['read_seq'])
+        write_seq = int(header['write_seq'])
+        commands = []
+        while read_seq < write_seq:
+            slot = read_seq % self._capacity
+            if self._seqs[slot] != read_seq + 1:
+                break  # Cursor moved before the record landed; pick it up next time
+            read_seq += 1
+            commands.append((read_seq, self._keys[slot].decode(), self._values[slot].decode()))
+            header['read_seq'] = read_seq
+        if commands:
+            if apply is not None:
+                for seq, key, value in commands:
+                    apply(key, value)
+            header['ack_seq'] = read_seq
+        return commands
+
+    def close(self):
+        self._header = None
+        self._seqs = self._keys = self._values = None
+        self._mmap.close()
+        self._file.close()
+
+def run_ring_consumer(path, capacity, duration_s, results, poll_interval_s=0.001):
+    """Consume a control ring for duration_s, putting (seq, key, value) tuples on results (process target)."""
+    consumer = FakeRingConsumer(path, capacity)
+    end = time.monotonic() + duration_s
+    try:
+        while time.monotonic() < end:
+            for command in consumer.poll():
+                results.put(command)
+            time.sleep(poll_interval_s)
+        for command in consumer.poll():
+            results.put(command)
+    finally:
+        results.put(None)
+        consumer.close()
+
+def run_imu_writer(path, rate_hz, duration_s):
+    """Write a slowly yawing head pose at rate_hz for duration_s (process target)."""
+    writer = FakeIMUWriter(path)
+    period = 1.0 / rate_hz
+    start = time.monotonic()
+    next_time = start
+    n = 0
+    try:
+        while next_time - start < duration_s:
+            yaw = 0.5 * math.sin(n * period)
+            writer.write((0.0, 0.0, math.sin(yaw / 2), math.cos(yaw / 2)))
+            n += 1
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    finally:
+        writer.close()
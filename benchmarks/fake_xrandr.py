@@ -0,0 +1,161 @@
+"""A stand-in for xrandr that keeps the RandR state in a JSON file.
+
+Understands the subset used by core.virtual_display: --query, --newmode,
+--addmode, --rmmode, --delmode and --output with --mode, --pos and
+--off. Like xrandr, all modes are defined before outputs are changed,
+and an invocation that fails changes nothing. Each invocation is logged,
+and one that changes the screen sleeps for ``delay_s`` to stand in for
+the reconfiguration.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+STUB_XRANDR = """#!{python} -S
+import sys
+sys.path.insert(0, {root!r})
+from benchmarks.fake_xrandr import main
+sys.exit(main({state_path!r}, {log_path!r}, sys.argv[1:], {delay_s!r}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class FakeXrandr:
+    """A stub xrandr executable plus its state, in a temporary directory.
+
+    Pass ``path`` as the xrandr path of a VirtualDisplayProvisioner.
+    """
+
+    def __init__(self, outputs=('VIRTUAL1', 'VIRTUAL2'), delay_s=0.0):
+        self.root = tempfile.mkdtemp(prefix='xr_fake_xrandr_')
+        self.path = os.path.join(self.root, 'xrandr')
+        self.state_path = os.path.join(self.root, 'state.json')
+        self.log_path = os.path.join(self.root, 'xrandr.log')
+        self.delay_s = delay_s
+        state = {
+            'modes': {},
+            'outputs': {name: {'modes': [], 'current': None, 'pos': [0, 0]} for name in outputs},
+        }
+        with open(self.state_path, 'w') as f:
+            json.dump(state, f)
+        with open(self.path, 'w') as f:
+            f.write(STUB_XRANDR.format(python=sys.executable, root=ROOT, state_path=self.state_path,
+                                       log_path=self.log_path, delay_s=delay_s))
+        os.chmod(self.path, 0o755)
+
+    def state(self):
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def invocations(self):
+        """Argument lists of every run so far."""
+        try:
+            with open(self.log_path) as f:
+                return [json.loads(line) for line in f]
+        except FileNotFoundError:
+            return []
+
+    def remove(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+def format_query(state):
+    lines = ['Screen 0: minimum 8 x 8, current 1920 x 1080, maximum 32767 x 32767']
+    for name, output in state['outputs'].items():
+        current = output['current']
+        geometry = ''
+        if current:
+            width, height = state['modes'][current][1:3]
+            geometry = f" {width}x{height}+{output['pos'][0]}+{output['pos'][1]}"
+        lines.append(f"{name} disconnected{geometry} (normal left inverted right x axis y axis) 0mm x 0mm")
+        for mode in output['modes']:
+            clock, htotal, vtotal = state['modes'][mode][0], state['modes'][mode][3], state['modes'][mode][4]
+            rate = clock * 1e6 / (htotal * vtotal)
+            lines.append(f"  {mode}  {rate:.2f}{'*' if mode == current else ' '}")
+    return '\n'.join(lines) + '\n'
+
+def apply(state, args):
+    """Apply xrandr arguments to state. Returns (changed, error message or None)."""
+    modes = state['modes']
+    outputs = state['outputs']
+    mode_ops = []
+    output_ops = []
+    output = None
+    i = 0
+    try:
+        while i < len(args):
+            arg = args[i]
+            if arg == '--newmode':
+                mode_ops.append(('new', args[i + 1], args[i + 2:i + 13]))
+                i += 13
+            elif arg in ('--addmode', '--delmode'):
+                mode_ops.append((arg[2:5], args[i + 1], args[i + 2]))
+                i += 3
+            elif arg == '--rmmode':
+                mode_ops.append(('rm', args[i + 1], None))
+                i += 2
+            elif arg == '--output':
+                output = args[i + 1]
+                if output not in outputs:
+                    return False, f"warning: output {output} not found; ignoring"
+                i += 2
+            elif arg in ('--mode', '--pos') and output:
+                output_ops.append((output, arg[2:], args[i + 1]))
+                i += 2
+            elif arg == '--off' and output:
+                output_ops.append((output, 'off', None))
+                i += 1
+            else:
+                return False, f"unrecognized option '{arg}'"
+    except IndexError:
+        return False, f"{args[-1]} requires an argument"
+
+    for op, name, value in mode_ops:
+        if op == 'new':
+            if name in modes:
+                return False, 'X Error of failed request:  BadName (named color or font does not exist)'
+            # clock, hdisplay, vdisplay, htotal, vtotal
+            modes[name] = [float(value[0]), int(value[1]), int(value[5]), int(value[4]), int(value[8])]
+        elif op == 'rm':
+            modes.pop(name, None)
+        else:
+            target, mode = outputs.get(name), value
+            if target is None or mode not in modes:
+                return False, 'X Error of failed request:  BadMatch (invalid parameter attributes)'
+            if op == 'add' and mode not in target['modes']:
+                target['modes'].append(mode)
+            elif op == 'del' and mode in target['modes']:
+                target['modes'].remove(mode)
+    for name, op, value in output_ops:
+        target = outputs[name]
+        if op == 'mode':
+            if value not in target['modes']:
+                return False, f"cannot find mode {value}"
+            target['current'] = value
+        elif op == 'pos':
+            target['pos'] = [int(v) for v in value.split('x')]
+        else:
+            target['current'] = None
+    return bool(mode_ops or output_ops), None
+
+def main(state_path, log_path, args, delay_s=0.0):
+    with open(log_path, 'a') as f:
+        f.write(json.dumps(args) + '\n')
+    if args[:1] == ['--display']:
+        args = args[2:]
+    with open(state_path) as f:
+        state = json.load(f)
+    if not args or args == ['--query']:
+        sys.stdout.write(format_query(state))
+        return 0
+    changed, error = apply(state, args)
+    if error:
+        sys.stderr.write(error + '\n')
+        return 1
+    if changed:
+        time.sleep(delay_s)
+        with open(state_path, 'w') as f:
+            json.dump(state, f)
+    return 0
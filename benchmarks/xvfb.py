@@ -0,0 +1,25 @@
+"""Start a throwaway Xvfb server for headless capture benchmarks."""
+import os
+import shutil
+import subprocess
+
+def start_xvfb(width=1920, height=1080, depth=24):
+    """Start Xvfb on a free display. Returns (process, display_name), or None if Xvfb is missing."""
+    if shutil.which('Xvfb') is None:
+        return None
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen(['Xvfb', '-displayfd', str(write_fd), '-nolisten', 'tcp',
+                                '-screen', '0', f'{width}x{height}x{depth}'],
+                               pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        number = f.readline().strip()
+    if not number:
+        process.terminate()
+        process.wait()
+        return None
+    return process, f':{number}'
+
+def stop_xvfb(process):
+    process.terminate()
+    process.wait()
@@ -0,0 +1,460 @@
+"""Screen capture of virtual displays through Xlib.
+
+Uses MIT-SHM (XShmGetImage) so pixels travel through a shared segment
+instead of the X socket, and XDamage so only regions that changed since
+the previous capture are fetched. Falls back to plain XGetImage when an
+extension is missing, e.g. on a remote display. The libraries are
+loaded with ctypes; python-xlib has no MIT-SHM support.
+"""
+import time
+import ctypes
+import ctypes.util
+import logging
+import numpy as np
+
+ZPixmap = 2
+ALL_PLANES = 0xFFFFFFFFFFFFFFFF if ctypes.sizeof(ctypes.c_ulong) == 8 else 0xFFFFFFFF
+XDamageReportNonEmpty = 3
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+# Above this share of the display damaged, one full grab beats many small ones
+FULL_FRAME_DAMAGE_RATIO = 0.5
+MAX_DAMAGE_RECTS = 64
+
+class XImage(ctypes.Structure):
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+        ('red_mask', ctypes.c_ulong),
+        ('green_mask', ctypes.c_ulong),
+        ('blue_mask', ctypes.c_ulong),
+        ('obdata', ctypes.c_void_p),
+        ('f', ctypes.c_void_p * 6),
+    ]
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong),
+        ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p),
+        ('readOnly', ctypes.c_int),
+    ]
+
+class XRectangle(ctypes.Structure):
+    _fields_ = [
+        ('x', ctypes.c_short),
+        ('y', ctypes.c_short),
+        ('width', ctypes.c_ushort),
+        ('height', ctypes.c_ushort),
+    ]
+
+_PROTOTYPES = {
+    'X11': {
+        'XOpenDisplay': (ctypes.c_void_p, [ctypes.c_char_p]),
+        'XCloseDisplay': (ctypes.c_int, [ctypes.c_void_p]),
+        'XDefaultScreen': (ctypes.c_int, [ctypes.c_void_p]),
+        'XRootWindow': (ctypes.c_ulong, [ctypes.c_void_p, ctypes.c_int]),
+        'XDefaultVisual': (ctypes.c_void_p, [ctypes.c_void_p, ctypes.c_int]),
+        'XDefaultDepth': (ctypes.c_int, [ctypes.c_void_p, ctypes.c_int]),
+        'XDisplayWidth': (ctypes.c_int, [ctypes.c_void_p, ctypes.c_int]),
+        'XDisplayHeight': (ctypes.c_int, [ctypes.c_void_p, ctypes.c_int]),
+        'XGetImage': (ctypes.POINTER(XImage), [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+                                               ctypes.c_uint, ctypes.c_uint, ctypes.c_ulong, ctypes.c_int]),
+        'XDestroyImage': (ctypes.c_int, [ctypes.POINTER(XImage)]),
+        'XSync': (ctypes.c_int, [ctypes.c_void_p, ctypes.c_int]),
+        'XPending': (ctypes.c_int, [ctypes.c_void_p]),
+        'XNextEvent': (ctypes.c_int, [ctypes.c_void_p, ctypes.c_void_p]),
+        'XFree': (ctypes.c_int, [ctypes.c_void_p]),
+        'XSetErrorHandler': (ctypes.c_void_p, [ctypes.c_void_p]),
+    },
+    'Xext': {
+        'XShmQueryExtension': (ctypes.c_int, [ctypes.c_void_p]),
+        'XShmCreateImage': (ctypes.POINTER(XImage), [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                                                     ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo),
+                                                     ctypes.c_uint, ctypes.c_uint]),
+        'XShmAttach': (ctypes.c_int, [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]),
+        'XShmDetach': (ctypes.c_int, [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]),
+        'XShmGetImage': (ctypes.c_int, [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage),
+                                        ctypes.c_int, ctypes.c_int, ctypes.c_ulong]),
+    },
+    'Xdamage': {
+        'XDamageQueryExtension': (ctypes.c_int, [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int),
+                                                 ctypes.POINTER(ctypes.c_int)]),
+        'XDamageQueryVersion': (ctypes.c_int, [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int),
+                                               ctypes.POINTER(ctypes.c_int)]),
+        'XDamageCreate': (ctypes.c_ulong, [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int]),
+        'XDamageDestroy': (None, [ctypes.c_void_p, ctypes.c_ulong]),
+        'XDamageSubtract': (None, [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong]),
+    },
+    'Xfixes': {
+        'XFixesQueryExtension': (ctypes.c_int, [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int),
+                                                ctypes.POINTER(ctypes.c_int)]),
+        'XFixesQueryVersion': (ctypes.c_int, [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int),
+                                              ctypes.POINTER(ctypes.c_int)]),
+        'XFixesCreateRegion': (ctypes.c_ulong, [ctypes.c_void_p, ctypes.POINTER(XRectangle), ctypes.c_int]),
+        'XFixesDestroyRegion': (None, [ctypes.c_void_p, ctypes.c_ulong]),
+        'XFixesFetchRegion': (ctypes.POINTER(XRectangle), [ctypes.c_void_p, ctypes.c_ulong,
+                                                           ctypes.POINTER(ctypes.c_int)]),
+    },
+    'c': {
+        'shmget': (ctypes.c_int, [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]),
+        'shmat': (ctypes.c_void_p, [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]),
+        'shmdt': (ctypes.c_int, [ctypes.c_void_p]),
+        'shmctl': (ctypes.c_int, [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]),
+    },
+}
+
+_libraries = {}
+
+def load_library(name):
+    """Load one of the libraries above with prototypes set, or return None if missing."""
+    if name not in _libraries:
+        path = ctypes.util.find_library(name)
+        library = None
+        if path:
+            try:
+                library = ctypes.CDLL(path)
+                for function, (restype, argtypes) in _PROTOTYPES.get(name, {}).items():
+                    fn = getattr(library, function)
+                    fn.restype = restype
+                    fn.argtypes = argtypes
+            except (OSError, AttributeError):
+                library = None
+        _libraries[name] = library
+    return _libraries[name]
+
+def clip_damage(rects, left, top, width, height):
+    """Clip damage rectangles in root coordinates to the captured area.
+
+    Returns the non-empty intersections as (x, y, width, height)
+    relative to the area's top left corner.
+    """
+    right, bottom = left + width, top + height
+    clipped = []
+    for x, y, w, h in rects:
+        x0, y0 = max(x, left), max(y, top)
+        x1, y1 = min(x + w, right), min(y + h, bottom)
+        if x1 > x0 and y1 > y0:
+            clipped.append((x0 - left, y0 - top, x1 - x0, y1 - y0))
+    return clipped
+
+def coalesce_damage(rects, width, height):
+    """Decide how to fetch clipped damage rectangles of a width x height area.
+
+    Returns (rects, damage ratio): rects is None when one full grab is
+    cheaper than fetching the rectangles one by one, i.e. when more than
+    FULL_FRAME_DAMAGE_RATIO of the area is damaged or there are more
+    than MAX_DAMAGE_RECTS rectangles.
+    """
+    area = width * height
+    damaged = sum(w * h for _, _, w, h in rects)
+    ratio = damaged / area if area else 0.0
+    if ratio > FULL_FRAME_DAMAGE_RATIO or len(rects) > MAX_DAMAGE_RECTS:
+        return None, ratio
+    return rects, ratio
+
+# X errors (e.g. XShmAttach refused by a remote server) would otherwise
+# terminate the process through Xlib's default handler
+_XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+_x_error_count = 0
+
+@_XErrorHandler
+def _on_x_error(display, event):
+    global _x_error_count
+    _x_error_count += 1
+    return 0
+
+class ScreenCapture:
+    """Capture a rectangle of an X screen, e.g. one virtual display.
+
+    ``frame`` is a BGRA NumPy array of the captured area that is kept up
+    to date by capture(). With XDamage, each capture only fetches the
+    regions damaged since the previous one and lists them in
+    ``dirty_rects`` (x, y, width, height relative to the area), so
+    callers can upload just those; without it every capture is a full
+    grab. Per-frame cost is reported in ``last_capture_s``,
+    ``last_bytes_copied`` and ``last_damage_ratio``.
+    """
+
+    def __init__(self, display_name=None, geometry=None, use_shm=True, use_damage=True):
+        self.logger = logging.getLogger('xfce4_xr_desktop.capture')
+        self._display_name = display_name
+        self._geometry = geometry
+        self._want_shm = use_shm
+        self._want_damage = use_damage
+        self._x11 = None
+        self._xdamage = None
+        self._xfixes = None
+        self._display = None
+        self._root = 0
+        self._x = self._y = 0
+        self.width = self.height = 0
+
+        self._shm_info = None
+        self._shm_image = None
+        self._sub_image = None
+        self._shm_addr = None
+        self._scratch = None
+        self._damage = 0
+        self._region = 0
+        self._event = (ctypes.c_long * 24)()
+        self._nrects = ctypes.c_int()
+        self._full_pending = True
+
+        self.frame = None
+        self.dirty_rects = []
+
+        # Per-frame stats and totals
+        self.last_capture_s = 0.0
+        self.last_bytes_copied = 0
+        self.last_damage_ratio = 0.0
+        self.frames = 0
+        self.full_grabs = 0
+        self.bytes_copied = 0
+
+    @property
+    def uses_shm(self):
+        return self._shm_image is not None
+
+    @property
+    def uses_damage(self):
+        return bool(self._damage)
+
+    def open(self):
+        """Connect to the X server and set up SHM and damage where available."""
+        if self._display is not None:
+            return True
+        self._x11 = load_library('X11')
+        if self._x11 is None:
+            self.logger.error("libX11 not found, screen capture unavailable")
+            return False
+        self._x11.XSetErrorHandler(ctypes.cast(_on_x_error, ctypes.c_void_p))
+        name = self._display_name.encode() if self._display_name else None
+        self._display = self._x11.XOpenDisplay(name)
+        if not self._display:
+            self._display = None
+            self.logger.error("Cannot open X display %s", self._display_name or '(default)')
+            return False
+
+        screen = self._x11.XDefaultScreen(self._display)
+        self._root = self._x11.XRootWindow(self._display, screen)
+        if self._geometry is None:
+            self._geometry = (0, 0, self._x11.XDisplayWidth(self._display, screen),
+                              self._x11.XDisplayHeight(self._display, screen))
+        self._x, self._y, self.width, self.height = self._geometry
+
+        if not (self._want_shm and self._setup_shm(screen)):
+            self.frame = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        if self._want_damage:
+            self._setup_damage()
+        self.logger.info("Capturing %dx%d+%d+%d (%s, %s)", self.width, self.height, self._x, self._y,
+                         'MIT-SHM' if self.uses_shm else 'XGetImage',
+                         'damage tracking' if self.uses_damage else 'full frames')
+        self._full_pending = True
+        return True
+
+    def _setup_shm(self, screen):
+        xext = load_library('Xext')
+        libc = load_library('c')
+        if xext is None or libc is None or not xext.XShmQueryExtension(self._display):
+            self.logger.info("MIT-SHM unavailable, falling back to XGetImage")
+            return False
+        info = XShmSegmentInfo()
+        image = xext.XShmCreateImage(self._display, self._x11.XDefaultVisual(self._display, screen),
+                                     self._x11.XDefaultDepth(self._display, screen), ZPixmap, None,
+                                     ctypes.byref(info), self.width, self.height)
+        if not image:
+            return False
+        if image.contents.bits_per_pixel != 32:
+            self.logger.info("%s bpp visual, falling back to XGetImage", image.contents.bits_per_pixel)
+            self._x11.XDestroyImage(image)
+            return False
+        frame_size = image.contents.bytes_per_line * self.height
+        # The second half is scratch space for damaged rectangles
+        info.shmid = libc.shmget(IPC_PRIVATE, frame_size * 2, IPC_CREAT | 0o600)
+        if info.shmid < 0:
+            self._x11.XDestroyImage(image)
+            return False
+        address = libc.shmat(info.shmid, None, 0)
+        if address is None or address == ctypes.c_void_p(-1).value:
+            libc.shmctl(info.shmid, IPC_RMID, None)
+            self._x11.XDestroyImage(image)
+            return False
+        info.shmaddr = address
+        info.readOnly = 0
+        image.contents.data = address
+        errors = _x_error_count
+        attached = xext.XShmAttach(self._display, ctypes.byref(info))
+        self._x11.XSync(self._display, 0)
+        # Removed once both sides detach; nothing leaks if we crash
+        libc.shmctl(info.shmid, IPC_RMID, None)
+        if not attached or _x_error_count != errors:
+            self.logger.info("XShmAttach failed (remote display?), falling back to XGetImage")
+            image.contents.data = None
+            self._x11.XDestroyImage(image)
+            libc.shmdt(address)
+            return False
+
+        self._shm_info = info
+        self._shm_image = image
+        self._shm_addr = address
+        # Template for fetching a packed sub-rectangle into the scratch half
+        self._sub_image = XImage()
+        ctypes.memmove(ctypes.byref(self._sub_image), image, ctypes.sizeof(XImage))
+        self._sub_image.data = address + frame_size
+        segment = np.ctypeslib.as_array((ctypes.c_ubyte * (frame_size * 2)).from_address(address))
+        stride = image.contents.bytes_per_line
+        self.frame = segment[:frame_size].reshape(self.height, stride)[:, :self.width * 4] \
+            .reshape(self.height, self.width, 4)
+        self._scratch = segment[frame_size:]
+        return True
+
+    def _setup_damage(self):
+        xdamage = load_library('Xdamage')
+        xfixes = load_library('Xfixes')
+        if xdamage is None or xfixes is None:
+            self.logger.info("libXdamage/libXfixes not found, capturing full frames")
+            return False
+        event_base, error_base = ctypes.c_int(), ctypes.c_int()
+        major, minor = ctypes.c_int(1), ctypes.c_int(1)
+        if not xdamage.XDamageQueryExtension(self._display, ctypes.byref(event_base), ctypes.byref(error_base)):
+            self.logger.info("XDamage unavailable, capturing full frames")
+            return False
+        if not xfixes.XFixesQueryExtension(self._display, ctypes.byref(event_base), ctypes.byref(error_base)):
+            self.logger.info("XFixes unavailable, capturing full frames")
+            return False
+        # Both extensions refuse requests from clients that did not negotiate a version
+        xdamage.XDamageQueryVersion(self._display, ctypes.byref(major), ctypes.byref(minor))
+        major, minor = ctypes.c_int(2), ctypes.c_int(0)
+        xfixes.XFixesQueryVersion(self._display, ctypes.byref(major), ctypes.byref(minor))
+        self._xdamage = xdamage
+        self._xfixes = xfixes
+        self._region = xfixes.XFixesCreateRegion(self._display, None, 0)
+        self._damage = xdamage.XDamageCreate(self._display, self._root, XDamageReportNonEmpty)
+        return True
+
+    def close(self):
+        if self._display is None:
+            return
+        if self._damage:
+            self._xdamage.XDamageDestroy(self._display, self._damage)
+            self._xfixes.XFixesDestroyRegion(self._display, self._region)
+            self._damage = 0
+            self._region = 0
+        # Views into the segment must go before it is detached
+        self.frame = None
+        self._scratch = None
+        if self._shm_image is not None:
+            load_library('Xext').XShmDetach(self._display, ctypes.byref(self._shm_info))
+            self._x11.XSync(self._display, 0)
+            # The data belongs to the segment, not malloc
+            self._shm_image.contents.data = None
+            self._x11.XDestroyImage(self._shm_image)
+            load_library('c').shmdt(self._shm_addr)
+            self._shm_image = None
+            self._sub_image = None
+            self._shm_info = None
+            self._shm_addr = None
+        self._x11.XCloseDisplay(self._display)
+        self._display = None
+
+    def capture(self):
+        """Bring ``frame`` up to date. Returns False if the capture failed."""
+        if self._display is None and not self.open():
+            return False
+        start = time.perf_counter()
+        rects = self._fetch_damage() if self._damage else None
+        if self._full_pending or rects is None:
+            rects = None
+            self.last_damage_ratio = 1.0
+        else:
+            rects, self.last_damage_ratio = coalesce_damage(rects, self.width, self.height)
+        if rects is None:
+            ok = self._grab_full()
+            self.dirty_rects = [(0, 0, self.width, self.height)] if ok else []
+        else:
+            self.last_bytes_copied = 0
+            ok = all(self._grab_rect(*rect) for rect in rects)
+            self.dirty_rects = rects if ok else []
+        if ok:
+            self._full_pending = False
+        else:
+            self._full_pending = True
+        self.last_capture_s = time.perf_counter() - start
+        self.frames += 1
+        self.bytes_copied += self.last_bytes_copied
+        return ok
+
+    def _fetch_damage(self):
+        """Repair all damage and return it as rectangles clipped to the captured area."""
+        display = self._display
+        x11 = self._x11
+        # One NonEmpty event is queued per repair; drop them, the region is what matters
+        while x11.XPending(display):
+            x11.XNextEvent(display, self._event)
+        self._xdamage.XDamageSubtract(display, self._damage, 0, self._region)
+        self._nrects.value = 0
+        rects_ptr = self._xfixes.XFixesFetchRegion(display, self._region, ctypes.byref(self._nrects))
+        if not rects_ptr:
+            # An empty region may come back as NULL
+            return [] if self._nrects.value == 0 else None
+        rects = clip_damage(((r.x, r.y, r.width, r.height) for r in rects_ptr[:self._nrects.value]),
+                            self._x, self._y, self.width, self.height)
+        x11.XFree(rects_ptr)
+        return rects
+
+    def _grab_full(self):
+        self.full_grabs += 1
+        if self._shm_image is not None:
+            if not load_library('Xext').XShmGetImage(self._display, self._root, self._shm_image,
+                                                     self._x, self._y, ALL_PLANES):
+                return False
+            self.last_bytes_copied = self.frame.nbytes
+            return True
+        self.last_bytes_copied = 0
+        return self._grab_rect(0, 0, self.width, self.height)
+
+    def _grab_rect(self, x, y, width, height):
+        """Copy one rectangle (relative to the captured area) into frame."""
+        if self._shm_image is not None:
+            sub = self._sub_image
+            sub.width = width
+            sub.height = height
+            sub.bytes_per_line = width * 4
+            if not load_library('Xext').XShmGetImage(self._display, self._root, ctypes.byref(sub),
+                                                     self._x + x, self._y + y, ALL_PLANES):
+                return False
+            size = width * height * 4
+            self.frame[y:y + height, x:x + width] = self._scratch[:size].reshape(height, width, 4)
+            self.last_bytes_copied += size
+            return True
+
+        image = self._x11.XGetImage(self._display, self._root, self._x + x, self._y + y,
+                                    width, height, ALL_PLANES, ZPixmap)
+        if not image:
+            return False
+        try:
+            contents = image.contents
+            if contents.bits_per_pixel != 32:
+                self.logger.error("Unsupported %s bpp image", contents.bits_per_pixel)
+                return False
+            stride = contents.bytes_per_line
+            pixels = np.ctypeslib.as_array((ctypes.c_ubyte * (stride * height)).from_address(contents.data))
+            self.frame[y:y + height, x:x + width] = \
+                pixels.reshape(height, stride)[:, :width * 4].reshape(height, width, 4)
+            self.last_bytes_copied += stride * height
+            return True
+        finally:
+            self._x11.XDestroyImage(image)
@@ -0,0 +1,150 @@
+"""Requests and events of the control socket, independent of the transport.
+
+core.control_server owns the socket and the GLib main loop plumbing and
+hands the bytes it reads to ControlProtocol, which splits them into
+lines, runs the commands against XRManager and returns the response
+messages. Keeping this part free of GLib lets the protocol be exercised
+with a stand-in manager. See utils.control_client for the wire format.
+"""
+import json
+import math
+
+# Largest request line accepted from a client
+MAX_LINE = 64 * 1024
+
+def number_value(command):
+    """A command's 'value' as a finite float; ValueError if it is missing or not a number."""
+    value = command.get('value')
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"'{command.get('cmd')}' needs a number, got {value!r}")
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"'{command.get('cmd')}' needs a number, got {value!r}") from None
+    if not math.isfinite(number):
+        raise ValueError(f"'{command.get('cmd')}' needs a finite number, got {value!r}")
+    return number
+
+class Session:
+    """Per-connection protocol state."""
+
+    def __init__(self):
+        self.buffer = b''
+        self.subscription = None  # None: not subscribed, empty set: all keys
+
+class ControlProtocol:
+    """Handle request lines from control socket clients.
+
+    Each request line carries a batch of commands; the control commands
+    it produces are written to the driver in one write before the
+    response is returned.
+    """
+
+    def __init__(self, xr_manager, on_present=None):
+        self._xr_manager = xr_manager
+        self._on_present = on_present
+
+        # Counters
+        self.requests_handled = 0
+
+    def receive(self, session, data):
+        """Handle bytes read from a client.
+
+        Returns (responses, keep_open): the messages to send back, in
+        order, and False if the client must be disconnected.
+        """
+        session.buffer += data
+        responses = []
+        while b'\n' in session.buffer:
+            line, session.buffer = session.buffer.split(b'\n', 1)
+            if line.strip():
+                responses.append(self.handle_line(session, line))
+        if len(session.buffer) > MAX_LINE:
+            responses.append({'ok': False, 'error': 'request too large'})
+            return responses, False
+        return responses, True
+
+    def handle_line(self, session, line):
+        """Run one request line and return its response."""
+        self.requests_handled += 1
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {'ok': False, 'error': 'invalid JSON'}
+        if not isinstance(request, dict):
+            return {'ok': False, 'error': 'request must be a JSON object'}
+
+        if 'subscribe' in request:
+            keys = request['subscribe'] or []
+            if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+                return {'ok': False, 'error': "'subscribe' must be a list of state keys"}
+            session.subscription = set(keys)
+            state = self._xr_manager.state_watcher.state
+            if session.subscription:
+                state = {key: value for key, value in state.items() if key in session.subscription}
+            return {'ok': True, 'event': 'snapshot', 'state': state}
+
+        commands = request.get('commands', [])
+        if not isinstance(commands, list):
+            return {'ok': False, 'error': "'commands' must be a list"}
+        results = []
+        ok = True
+        for command in commands:
+            try:
+                if not isinstance(command, dict):
+                    raise ValueError("a command must be a JSON object")
+                results.append(self.run_command(command))
+            except Exception as e:
+                ok = False
+                results.append({'error': str(e)})
+        # One driver write for the whole batch
+        self._xr_manager.control_queue.flush()
+        response = {'ok': ok, 'results': results}
+        if not ok:
+            response['error'] = 'some commands failed'
+        return response
+
+    def run_command(self, command):
+        name = command.get('cmd')
+        xr_manager = self._xr_manager
+        if name == 'recenter':
+            xr_manager.recenter_display()
+        elif name == 'set_distance':
+            xr_manager.set_display_distance(number_value(command))
+        elif name == 'set_follow_threshold':
+            xr_manager.set_follow_threshold(number_value(command))
+        elif name == 'apply_profile':
+            profile = command.get('value')
+            if not isinstance(profile, str):
+                raise ValueError(f"'apply_profile' needs a profile name, got {profile!r}")
+            if not xr_manager.apply_profile(profile):
+                raise ValueError(f"cannot apply profile '{profile}'")
+        elif name == 'toggle_follow':
+            xr_manager.toggle_follow_mode()
+        elif name == 'toggle_widescreen':
+            xr_manager.toggle_widescreen_mode()
+        elif name == 'get_state':
+            return {
+                'driver_ready': xr_manager.driver_ready,
+                'device_connected': xr_manager.device_connected,
+                'display_distance': xr_manager.display_distance,
+                'follow_mode': xr_manager.follow_mode,
+                'follow_threshold': xr_manager.follow_threshold,
+                'widescreen_mode': xr_manager.widescreen_mode,
+                'driver_state': xr_manager.state_watcher.state,
+            }
+        elif name == 'present':
+            if self._on_present is None:
+                raise ValueError("this instance has no window")
+            self._on_present()
+        else:
+            raise ValueError(f"unknown command '{name}'")
+        return True
+
+    def state_event(self, session, key, value):
+        """The event to send a session for a driver state change, or None if it is not subscribed."""
+        if session.subscription is None:
+            return None
+        if session.subscription and key not in session.subscription:
+            return None
+        return {'event': 'state', 'key': key, 'value': value}
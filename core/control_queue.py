@@ -0,0 +1,317 @@
+import time
+import logging
+import collections
+from gi.repository import GLib
+from utils.latency import TRACER, STAGE_WRITTEN, STAGE_ACKNOWLEDGED
+
+# How often acknowledgements are polled while ring commands are outstanding
+ACK_POLL_MS = 10
+
+# Retry delay after a failed control file write
+WRITE_RETRY_MS = 500
+
+class ControlQueue:
+    """Coalescing, rate-limited queue in front of the driver control file.
+
+    Only the latest value per key is kept. Pending commands are written
+    together in one write, at most ``max_rate_hz`` times per second, from
+    the GLib main loop. Urgent commands (e.g. ``recenter_screen``) bypass
+    the rate limit and flush everything pending immediately.
+
+    When the driver provides a control ring (see core.control_ring),
+    pending commands are appended to it as sequenced records, so none is
+    lost to the next write; if the ring is full the rest stay pending and
+    are retried. Without a ring, the control file is overwritten as before.
+    The ring is looked for on the first flush; after that, check_ring()
+    follows it across driver restarts. Commands a replaced ring never
+    acknowledged are sent again, ahead of newer ones, so a restart loses
+    nothing (a command the old driver applied just before exiting may
+    be applied twice; all commands set a value, so that is harmless).
+
+    submit() returns a ticket; applied(ticket) tells whether the driver
+    has applied that command, using the ring's acknowledgements. A
+    command replaced by a newer value for the same key counts as applied
+    along with it. The control file has no acknowledgement, so there a
+    command counts as applied once written. on_applied, if given, is
+    called with ``applied_ticket`` whenever acknowledgements arrive.
+    """
+    URGENT_KEYS = frozenset(['recenter_screen'])
+
+    def __init__(self, path, max_rate_hz=30, urgent_keys=None, ring=None, on_applied=None):
+        self.logger = logging.getLogger('xfce4_xr_desktop.control_queue')
+        self._path = path
+        self._ring = ring
+        self._ring_probed = False
+        self._pending = {}
+        self._urgent_keys = self.URGENT_KEYS if urgent_keys is None else frozenset(urgent_keys)
+        self._last_flush = float('-inf')
+        self._flush_source = 0
+        self.max_rate_hz = max_rate_hz
+        self._on_applied = on_applied
+        self._ticket = 0
+        # key -> oldest ticket the pending value stands for
+        self._pending_tickets = {}
+        # (ring seq, ticket, key, value) written to the ring but not acknowledged, in seq order
+        self._unacked = collections.deque()
+        # key -> (value, ticket) taken back from a replaced ring, to be sent again
+        self._resend = {}
+        self._ack_source = 0
+
+        # Counters
+        self.submitted_count = 0
+        self.written_count = 0
+        self.write_count = 0
+        self.error_count = 0
+        self.backpressure_count = 0
+
+    @property
+    def max_rate_hz(self):
+        return self._max_rate_hz
+
+    @max_rate_hz.setter
+    def max_rate_hz(self, value):
+        self._max_rate_hz = float(value)
+        self._min_interval = 1.0 / self._max_rate_hz if self._max_rate_hz > 0 else 0.0
+
+    @property
+    def pending_count(self):
+        return len(self._pending) + len(self._resend.keys() - self._pending.keys())
+
+    @property
+    def ring(self):
+        """The control ring, or None if commands go to the control file."""
+        return self._ring if self._ring_ready() else None
+
+    def submit(self, key, value, urgent=False):
+        """Queue a command, replacing any pending value for the same key.
+
+        Returns the command's ticket, for applied().
+        """
+        self.submitted_count += 1
+        self._ticket += 1
+        ticket = self._ticket
+        # Re-insert so keys are written in the order they were last set
+        self._pending.pop(key, None)
+        self._pending[key] = value
+        self._pending_tickets.setdefault(key, ticket)
+
+        if urgent or key in self._urgent_keys:
+            self.flush()
+            return ticket
+
+        wait = self._min_interval - (time.monotonic() - self._last_flush)
+        if wait <= 0:
+            self.flush()
+        elif not self._flush_source:
+            self._flush_source = GLib.timeout_add(max(1, int(wait * 1000)), self._on_flush_timeout)
+        return ticket
+
+    @property
+    def last_ticket(self):
+        """Ticket of the most recently submitted command."""
+        return self._ticket
+
+    @property
+    def applied_ticket(self):
+        """Highest ticket such that it and every earlier command have been applied."""
+        outstanding = [ticket for _, ticket, _, _ in self._unacked]
+        outstanding.extend(self._pending_tickets.values())
+        outstanding.extend(ticket for _, ticket in self._resend.values())
+        return min(outstanding) - 1 if outstanding else self._ticket
+
+    def applied(self, ticket):
+        """Return True if the driver has applied the command with this ticket."""
+        self._collect_acks()
+        return ticket <= self.applied_ticket
+
+    def _collect_acks(self):
+        """Drop ring commands the driver acknowledged. Returns True if there were any."""
+        if not self._unacked or self._ring is None or not self._ring.is_open:
+            return False
+        ack_seq = self._ring.ack_seq
+        unacked = self._unacked
+        if unacked[0][0] > ack_seq:
+            return False
+        while unacked and unacked[0][0] <= ack_seq:
+            _, _, key, _ = unacked.popleft()
+            if TRACER.enabled:
+                TRACER.mark(key, STAGE_ACKNOWLEDGED)
+        return True
+
+    def flush(self):
+        """Write all pending commands now, in a single write.
+
+        Returns False if the write failed. Commands that could not be
+        written, because the ring is full or the control file write
+        failed, stay pending and are retried from a timeout; anything
+        submitted meanwhile still replaces them.
+        """
+        if self._flush_source:
+            GLib.source_remove(self._flush_source)
+            self._flush_source = 0
+        if self._resend:
+            self._merge_resend()
+        if not self._pending:
+            return True
+
+        pending = self._pending
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        if self._ring_ready():
+            written = self._write_ring(pending)
+        else:
+            written = self._write_file(pending)
+        if written is None:
+            return False
+        if written:
+            self.write_count += 1
+            self.written_count += len(written)
+            if TRACER.enabled:
+                for key in written:
+                    TRACER.mark(key, STAGE_WRITTEN)
+        if self._unacked:
+            if not self._ack_source:
+                self._ack_source = GLib.timeout_add(ACK_POLL_MS, self._on_ack_timeout)
+        elif written and self._on_applied is not None:
+            # Control file writes have no acknowledgement to wait for
+            self._on_applied(self.applied_ticket)
+        return True
+
+    def _ring_ready(self):
+        """Use the ring if the driver has one; only the first call touches the file system."""
+        ring = self._ring
+        if ring is None:
+            return False
+        if not self._ring_probed:
+            self._ring_probed = True
+            return ring.open()
+        return ring.is_open
+
+    def check_ring(self):
+        """Follow the driver's control ring across driver restarts.
+
+        Remaps the ring if the driver removed or recreated it, and maps it
+        if it appeared since the last check. This costs a stat or an open,
+        so it is called on the state watcher's poll and when the ring is
+        full, not on every flush. Returns True if commands go to the ring.
+        """
+        ring = self._ring
+        if ring is None:
+            return False
+        self._ring_probed = True
+        if ring.is_open and ring.replaced():
+            # The driver restarted: what it acknowledged on the old ring is
+            # done, the rest will never be and is sent again
+            self._collect_acks()
+            ring.close()
+            if self._unacked:
+                self.logger.warning("Control ring replaced with %d commands unacknowledged, sending them again",
+                                    len(self._unacked))
+                self._take_back_unacked()
+        return ring.is_open or ring.open()
+
+    def _take_back_unacked(self):
+        """Move the unacknowledged ring commands to _resend and schedule a flush for them."""
+        for _, ticket, key, value in self._unacked:
+            _, oldest = self._resend.pop(key, (None, ticket))
+            self._resend[key] = (value, min(oldest, ticket))
+        self._unacked.clear()
+        if not self._flush_source:
+            self._flush_source = GLib.timeout_add(1, self._on_flush_timeout)
+
+    def _merge_resend(self):
+        """Put commands taken back from a replaced ring ahead of the pending ones; pending values are newer."""
+        merged = {key: value for key, (value, _) in self._resend.items() if key not in self._pending}
+        for key, (_, ticket) in self._resend.items():
+            self._pending_tickets[key] = min(ticket, self._pending_tickets.get(key, ticket))
+        merged.update(self._pending)
+        self._pending = merged
+        self._resend = {}
+
+    def _write_ring(self, pending):
+        written = []
+        for key, value in pending.items():
+            try:
+                seq = self._ring.enqueue(key, value)
+            except ValueError as e:
+                self.error_count += 1
+                self.logger.error("Dropping control command: %s", e)
+                self._pending_tickets.pop(key, None)
+                continue
+            if seq is None:
+                # Full: either the driver is behind or it restarted with a new ring
+                self.check_ring()
+                break
+            written.append(key)
+            self._unacked.append((seq, self._pending_tickets.pop(key), key, value))
+        if len(written) < len(pending):
+            self.backpressure_count += 1
+            self._requeue(pending, written, max(1, int(self._min_interval * 1000)))
+        return written
+
+    def _requeue(self, pending, written, retry_ms):
+        """Keep commands that were not written, ahead of anything newer, and retry them."""
+        done = set(written)
+        remaining = {key: value for key, value in pending.items()
+                     if key not in done and key not in self._pending}
+        remaining.update(self._pending)
+        self._pending = remaining
+        if self._pending and not self._flush_source:
+            self._flush_source = GLib.timeout_add(retry_ms, self._on_flush_timeout)
+
+    def _write_file(self, pending):
+        data = ''.join(f"{key}={value}\n" for key, value in pending.items())
+        try:
+            with open(self._path, 'w') as f:
+                f.write(data)
+        except Exception as e:
+            self.error_count += 1
+            self.logger.error("Error writing control commands: %s", e)
+            # Their tickets stay outstanding until a retry gets them written
+            self._requeue(pending, (), WRITE_RETRY_MS)
+            return None
+        for key in pending:
+            self._pending_tickets.pop(key, None)
+        return list(pending)
+
+    def close(self):
+        """Write anything still pending, stop the timers and unmap the ring.
+
+        Commands the ring has no room for are written to the control file
+        instead of being dropped.
+        """
+        self.flush()
+        if self._resend:
+            self._merge_resend()
+        if self._pending:
+            self.logger.info("Writing %d control commands the ring could not take to the control file",
+                             len(self._pending))
+            pending = self._pending
+            self._pending = {}
+            written = self._write_file(pending)
+            if written is None:
+                self.logger.error("Dropping %d control commands on close", len(self._pending))
+            elif written:
+                self.write_count += 1
+                self.written_count += len(written)
+        if self._flush_source:
+            GLib.source_remove(self._flush_source)
+            self._flush_source = 0
+        if self._ack_source:
+            GLib.source_remove(self._ack_source)
+            self._ack_source = 0
+        if self._ring is not None:
+            self._ring.close()
+
+    def _on_flush_timeout(self):
+        self._flush_source = 0
+        self.flush()
+        return GLib.SOURCE_REMOVE
+
+    def _on_ack_timeout(self):
+        if self._collect_acks() and self._on_applied is not None:
+            self._on_applied(self.applied_ticket)
+        if self._unacked:
+            return GLib.SOURCE_CONTINUE
+        self._ack_source = 0
+        return GLib.SOURCE_REMOVE
@@ -0,0 +1,195 @@
+import os
+import mmap
+import logging
+import numpy as np
+
+CONTROL_RING_PATH = '/dev/shm/xr_driver_control_ring'
+
+# 'XRCR', and the layout version this writer understands
+RING_MAGIC = 0x52435258
+RING_LAYOUT_VERSION = 1
+
+# Segment header. The producer-owned write sequence and the consumer-owned
+# read/ack sequences sit on separate cache lines so the two sides do not
+# false-share. Sequence numbers start at 1; 0 means "none yet".
+RING_HEADER_DTYPE = np.dtype({
+    'names': ['magic', 'version', 'capacity', 'record_size', 'write_seq', 'read_seq', 'ack_seq'],
+    'formats': ['<u4', '<u2', '<u2', '<u4', '<u8', '<u8', '<u8'],
+    'offsets': [0, 4, 6, 8, 64, 128, 136],
+    'itemsize': 192,
+})
+
+# One command. Key and value are NUL-padded; seq is written last and is
+# what marks the slot as holding that sequence number.
+RING_RECORD_DTYPE = np.dtype({
+    'names': ['seq', 'key', 'value'],
+    'formats': ['<u8', 'S48', 'S72'],
+    'offsets': [0, 8, 56],
+    'itemsize': 128,
+})
+
+def ring_size(capacity):
+    """Size in bytes of a ring segment holding capacity records."""
+    return RING_HEADER_DTYPE.itemsize + capacity * RING_RECORD_DTYPE.itemsize
+
+def map_ring(buffer, capacity):
+    """Return (header, records) structured views over a mapped ring segment."""
+    header = np.frombuffer(buffer, dtype=RING_HEADER_DTYPE, count=1).reshape(())
+    records = np.frombuffer(buffer, dtype=RING_RECORD_DTYPE, count=capacity,
+                            offset=RING_HEADER_DTYPE.itemsize)
+    return header, records
+
+class ControlRing:
+    """Producer side of the sequenced shared-memory control channel.
+
+    The driver owns the segment: it creates it, consumes records in
+    sequence order and advances ``read_seq`` as it takes them and
+    ``ack_seq`` once they have been applied. Unlike the control file,
+    nothing is overwritten before the driver has read it, so back-to-back
+    commands are never lost. Enqueueing never blocks; when the driver
+    falls behind and the ring is full, ``enqueue`` returns None and the
+    caller keeps the command for later.
+
+    There must be a single producer per ring.
+    """
+
+    def __init__(self, path=CONTROL_RING_PATH):
+        self.logger = logging.getLogger('xfce4_xr_desktop.control_ring')
+        self._path = path
+        self._file = None
+        self._mmap = None
+        self._inode = None
+        self._header = None
+        self._seqs = None
+        self._keys = None
+        self._values = None
+        self._capacity = 0
+        self._write_seq = 0
+
+        # Counters
+        self.enqueued_count = 0
+        self.rejected_count = 0
+
+    def open(self):
+        """Map the ring if the driver provides one. Returns False otherwise."""
+        if self._mmap is not None:
+            return True
+        try:
+            self._file = open(self._path, 'r+b')
+        except FileNotFoundError:
+            # Driver without ring support; the caller falls back to the control file
+            return False
+        except OSError as e:
+            self.logger.error("Error opening control ring %s: %s", self._path, e)
+            return False
+        try:
+            st = os.fstat(self._file.fileno())
+            if st.st_size < RING_HEADER_DTYPE.itemsize:
+                raise ValueError(f"segment is {st.st_size} bytes, too small for the header")
+            self._mmap = mmap.mmap(self._file.fileno(), st.st_size)
+            header = np.frombuffer(self._mmap, dtype=RING_HEADER_DTYPE, count=1).reshape(())
+            magic, version = int(header['magic']), int(header['version'])
+            capacity, record_size = int(header['capacity']), int(header['record_size'])
+            del header
+            if magic != RING_MAGIC or version != RING_LAYOUT_VERSION:
+                raise ValueError(f"unsupported ring (magic {magic:#x}, version {version})")
+            if record_size != RING_RECORD_DTYPE.itemsize or not capacity or st.st_size < ring_size(capacity):
+                raise ValueError(f"inconsistent ring geometry ({capacity} x {record_size} bytes)")
+            self._header, records = map_ring(self._mmap, capacity)
+            self._seqs = records['seq']
+            self._keys = records['key']
+            self._values = records['value']
+            self._capacity = capacity
+            self._inode = st.st_ino
+            # Carry on from where a previous producer stopped
+            self._write_seq = int(self._header['write_seq'])
+            self.logger.info("Using control ring %s (%s slots)", self._path, capacity)
+            return True
+        except Exception as e:
+            self.logger.error("Error opening control ring %s: %s", self._path, e)
+            self.close()
+            return False
+
+    def close(self):
+        # numpy views must go before the mmap can be closed
+        self._header = None
+        self._seqs = None
+        self._keys = None
+        self._values = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._inode = None
+        self._capacity = 0
+
+    @property
+    def is_open(self):
+        return self._mmap is not None
+
+    def replaced(self):
+        """Return True if the driver removed or recreated the segment since it was mapped."""
+        try:
+            return os.stat(self._path).st_ino != self._inode
+        except OSError:
+            return True
+
+    def enqueue(self, key, value):
+        """Append a command without blocking.
+
+        Returns its sequence number, or None if the ring is not open or
+        full. Raises ValueError if the key or value does not fit a record.
+        """
+        if self._header is None:
+            return None
+        key_bytes = key.encode()
+        value_bytes = str(value).encode()
+        if len(key_bytes) > self._keys.itemsize or len(value_bytes) > self._values.itemsize:
+            raise ValueError(f"control command '{key}' does not fit a ring record")
+        seq = self._write_seq + 1
+        if seq - int(self._header['read_seq']) > self._capacity:
+            self.rejected_count += 1
+            return None
+        slot = (seq - 1) % self._capacity
+        self._keys[slot] = key_bytes
+        self._values[slot] = value_bytes
+        # Publish: the slot's sequence number first, then the write cursor
+        self._seqs[slot] = seq
+        self._header['write_seq'] = seq
+        self._write_seq = seq
+        self.enqueued_count += 1
+        return seq
+
+    def applied(self, seq):
+        """Return True if the driver has applied the command with this sequence number."""
+        return self._header is not None and seq <= int(self._header['ack_seq'])
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def write_seq(self):
+        """Sequence number of the last enqueued command."""
+        return self._write_seq
+
+    @property
+    def read_seq(self):
+        """Sequence number of the last command the driver took off the ring."""
+        return int(self._header['read_seq']) if self._header is not None else 0
+
+    @property
+    def ack_seq(self):
+        """Sequence number of the last command the driver applied."""
+        return int(self._header['ack_seq']) if self._header is not None else 0
+
+    @property
+    def backlog(self):
+        """Number of commands enqueued but not yet taken by the driver."""
+        return self._write_seq - self.read_seq if self._header is not None else 0
+
+    @property
+    def free_slots(self):
+        return self._capacity - self.backlog
@@ -0,0 +1,239 @@
+import os
+import json
+import errno
+import fcntl
+import socket
+import logging
+from gi.repository import GLib
+from core.control_protocol import ControlProtocol, Session
+from utils.control_client import socket_path
+
+# A client whose unsent output grows past this is dropped
+MAX_PENDING_OUTPUT = 1024 * 1024
+
+def bind_socket(path):
+    """Create the listening control socket at path.
+
+    Returns the socket, or None if another instance is listening on it;
+    raises OSError on other errors. Binding comes first, and replacing a
+    socket file left by an instance that did not shut down cleanly is
+    serialized with a lock file, so of two launches racing for the path
+    exactly one gets it.
+    """
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        sock = _listen(path)
+        if sock is None and not ControlServer.instance_running(path):
+            # Nobody is listening: the file is stale
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            sock = _listen(path)
+        return sock
+
+def _listen(path):
+    """A non-blocking socket listening at path, or None if the path is in use."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(path)
+        os.chmod(path, 0o600)
+        sock.listen(16)
+        sock.setblocking(False)
+    except OSError as e:
+        sock.close()
+        if e.errno == errno.EADDRINUSE:
+            return None
+        raise
+    return sock
+
+class _Client(Session):
+    def __init__(self, sock):
+        super().__init__()
+        self.sock = sock
+        self.source = 0
+        # Output the socket did not take yet, sent from an IO_OUT watch
+        self.output = bytearray()
+        self.output_source = 0
+        self.closing = False
+
+class ControlServer:
+    """Unix socket API for controlling a running instance.
+
+    Runs in the GLib main loop and passes what clients send to a
+    ControlProtocol (see core.control_protocol), which runs the requests
+    and produces the responses. Clients may also subscribe to driver
+    state changes. See utils.control_client for the protocol.
+    """
+
+    def __init__(self, xr_manager, path=None, on_present=None):
+        self.logger = logging.getLogger('xfce4_xr_desktop.control_server')
+        self._xr_manager = xr_manager
+        self._protocol = ControlProtocol(xr_manager, on_present=on_present)
+        self._path = path or socket_path()
+        self._sock = None
+        self._source = 0
+        self._clients = []
+        self._state_handler = 0
+
+    @property
+    def requests_handled(self):
+        return self._protocol.requests_handled
+
+    @staticmethod
+    def instance_running(path=None):
+        """Return True if another instance is listening on the socket."""
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(path or socket_path())
+            return True
+        except OSError:
+            return False
+
+    def start(self, sock=None):
+        """Accept connections on sock, or on a socket bound with bind_socket().
+
+        Returns False if another instance owns the socket or it cannot be
+        created.
+        """
+        if sock is None:
+            try:
+                sock = bind_socket(self._path)
+            except OSError as e:
+                self.logger.error("Error creating control socket %s: %s", self._path, e)
+                return False
+            if sock is None:
+                self.logger.error("Another instance is listening on %s", self._path)
+                return False
+        self._sock = sock
+        self._source = GLib.io_add_watch(self._sock.fileno(), GLib.PRIORITY_DEFAULT,
+                                         GLib.IO_IN, self._on_accept)
+        self._state_handler = self._xr_manager.state_watcher.connect('state-changed', self._on_state_changed)
+        self.logger.info("Listening for commands on %s", self._path)
+        return True
+
+    def stop(self):
+        for client in list(self._clients):
+            self._close_client(client)
+        if self._state_handler:
+            self._xr_manager.state_watcher.disconnect(self._state_handler)
+            self._state_handler = 0
+        if self._source:
+            GLib.source_remove(self._source)
+            self._source = 0
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+
+    def _on_accept(self, fd, condition):
+        try:
+            sock, _ = self._sock.accept()
+        except BlockingIOError:
+            return GLib.SOURCE_CONTINUE
+        except OSError as e:
+            self.logger.error("Error accepting control connection: %s", e)
+            return GLib.SOURCE_CONTINUE
+        sock.setblocking(False)
+        client = _Client(sock)
+        client.source = GLib.io_add_watch(sock.fileno(), GLib.PRIORITY_DEFAULT,
+                                          GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR,
+                                          self._on_client_data, client)
+        self._clients.append(client)
+        return GLib.SOURCE_CONTINUE
+
+    def _on_client_data(self, fd, condition, client):
+        try:
+            data = client.sock.recv(65536)
+        except BlockingIOError:
+            return GLib.SOURCE_CONTINUE
+        except OSError:
+            data = b''
+        if not data:
+            client.source = 0
+            self._close_client(client)
+            return GLib.SOURCE_REMOVE
+
+        responses, keep_open = self._protocol.receive(client, data)
+        for response in responses:
+            self._send(client, response)
+            if client not in self._clients:
+                return GLib.SOURCE_REMOVE
+        if not keep_open:
+            client.source = 0
+            self._close_client_when_sent(client)
+            return GLib.SOURCE_REMOVE
+        return GLib.SOURCE_CONTINUE
+
+    def _on_state_changed(self, watcher, key, value):
+        for client in list(self._clients):
+            if client.closing:
+                continue
+            event = self._protocol.state_event(client, key, value)
+            if event is not None:
+                self._send(client, event)
+
+    def _send(self, client, message):
+        """Queue a message for a client and send what the socket takes now.
+
+        Returns False if the client was dropped.
+        """
+        client.output += json.dumps(message).encode() + b'\n'
+        if not client.output_source and not self._send_output(client):
+            return False
+        if client.output and not client.output_source:
+            client.output_source = GLib.io_add_watch(client.sock.fileno(), GLib.PRIORITY_DEFAULT,
+                                                     GLib.IO_OUT | GLib.IO_HUP | GLib.IO_ERR,
+                                                     self._on_client_writable, client)
+        if len(client.output) > MAX_PENDING_OUTPUT:
+            # A client that does not read its events is dropped rather
+            # than buffered without bound
+            self.logger.warning("Dropping a control client with %d bytes unread", len(client.output))
+            self._close_client(client)
+            return False
+        return True
+
+    def _send_output(self, client):
+        """Write as much pending output as the socket takes. Returns False if the client was dropped."""
+        try:
+            sent = client.sock.send(client.output)
+        except BlockingIOError:
+            return True
+        except OSError:
+            self._close_client(client)
+            return False
+        del client.output[:sent]
+        return True
+
+    def _on_client_writable(self, fd, condition, client):
+        # Returning SOURCE_REMOVE removes this watch; only keep its id while it stays
+        source, client.output_source = client.output_source, 0
+        if not self._send_output(client):
+            return GLib.SOURCE_REMOVE
+        if client.output:
+            client.output_source = source
+            return GLib.SOURCE_CONTINUE
+        if client.closing:
+            self._close_client(client)
+        return GLib.SOURCE_REMOVE
+
+    def _close_client_when_sent(self, client):
+        """Stop reading from a client and close it once its pending output is sent."""
+        if client.output and client in self._clients:
+            client.closing = True
+        else:
+            self._close_client(client)
+
+    def _close_client(self, client):
+        if client in self._clients:
+            self._clients.remove(client)
+        for source in (client.source, client.output_source):
+            if source:
+                GLib.source_remove(source)
+        client.source = 0
+        client.output_source = 0
+        client.sock.close()
@@ -0,0 +1,315 @@
+"""Registry of virtual displays, stored as parallel arrays.
+
+Each display has an orientation offset (a quaternion in ``(x, y, z, w)``
+order, like the IMU segment), a distance in metres, a curvature (see
+``core.mesh``) and its own follow settings. Displays are addressed by a
+stable integer id, while their fields live at a dense index in
+preallocated arrays, so the transforms of all displays are updated in
+one vectorized pass per frame.
+
+Changes made inside ``batch()`` are committed together: the change
+callback runs once and the config is written once per change set, not
+once per field.
+"""
+import logging
+from contextlib import contextmanager
+import numpy as np
+from core.pose_math import quaternion_multiply, quaternion_to_matrix
+
+# The display mirrored to the driver's single-display controls
+PRIMARY_DISPLAY = 0
+
+DISPLAY_DEFAULTS = {
+    'offset': (0.0, 0.0, 0.0, 1.0),
+    'distance': 1.05,
+    'curvature': 0.0,
+    'follow': True,
+    'follow_threshold': 0.1,
+}
+
+DISPLAY_FIELDS = tuple(DISPLAY_DEFAULTS)
+
+# Offsets whose norm is this close to 1 are stored without renormalizing
+UNIT_TOLERANCE = 1e-12
+
+# The per-field arrays, in DISPLAY_FIELDS order
+_ARRAYS = ('_offsets', '_distances', '_curvatures', '_follow', '_follow_thresholds')
+
+class DisplayRegistry:
+    """Per-display state for N virtual displays.
+
+    on_changed is called after each committed change set with a dict
+    mapping display ids to the set of fields that changed; added
+    displays list every field and removed ones map to None. If config is
+    given, the displays are persisted under its 'displays' key.
+    """
+
+    def __init__(self, capacity=4, on_changed=None, config=None):
+        self.logger = logging.getLogger('xfce4_xr_desktop.displays')
+        self._on_changed = on_changed
+        self._config = config
+        self._ids = []
+        self._index = {}
+        self._next_id = PRIMARY_DISPLAY
+        self._allocate(capacity)
+        self._pending = {}
+        self._batch_depth = 0
+        # Per-frame outputs, reallocated only when the display count changes
+        self._orientations = None
+        self._rotations = None
+        self._centers = None
+
+        # Counters
+        self.commits = 0
+        self.field_changes = 0
+
+    def _allocate(self, capacity):
+        count = len(self._ids)
+        arrays = {
+            '_offsets': np.zeros((capacity, 4)),
+            '_distances': np.zeros(capacity),
+            '_curvatures': np.zeros(capacity),
+            '_follow': np.zeros(capacity, dtype=bool),
+            '_follow_thresholds': np.zeros(capacity),
+        }
+        for name, array in arrays.items():
+            if count:
+                array[:count] = getattr(self, name)[:count]
+            setattr(self, name, array)
+        self._capacity = capacity
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, display_id):
+        return display_id in self._index
+
+    @property
+    def ids(self):
+        """Display ids, in array order."""
+        return list(self._ids)
+
+    def index_of(self, display_id):
+        """Array index of a display; indices change when displays are removed."""
+        return self._index[display_id]
+
+    def _view(self, array):
+        view = array[:len(self._ids)]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def offsets(self):
+        return self._view(self._offsets)
+
+    @property
+    def distances(self):
+        return self._view(self._distances)
+
+    @property
+    def curvatures(self):
+        return self._view(self._curvatures)
+
+    @property
+    def follow(self):
+        return self._view(self._follow)
+
+    @property
+    def follow_thresholds(self):
+        return self._view(self._follow_thresholds)
+
+    def add(self, display_id=None, **fields):
+        """Add a display and return its id. Unspecified fields take DISPLAY_DEFAULTS."""
+        self._check_fields(fields)
+        return self._add(self._next_id if display_id is None else int(display_id), fields)
+
+    def _add(self, display_id, fields):
+        if display_id in self._index:
+            raise ValueError(f"display {display_id} already exists")
+        values = {name: self._normalize(name, value) for name, value in dict(DISPLAY_DEFAULTS, **fields).items()}
+        if len(self._ids) == self._capacity:
+            self._allocate(self._capacity * 2)
+        self._next_id = max(self._next_id, display_id + 1)
+        self._index[display_id] = len(self._ids)
+        self._ids.append(display_id)
+        self._store(self._index[display_id], values)
+        self._record(display_id, set(DISPLAY_FIELDS))
+        return display_id
+
+    def remove(self, display_id):
+        """Remove a display; the last display takes its slot, keeping the arrays dense."""
+        index = self._index.pop(display_id)
+        last = len(self._ids) - 1
+        if index != last:
+            moved_id = self._ids[last]
+            for name in _ARRAYS:
+                array = getattr(self, name)
+                array[index] = array[last]
+            self._ids[index] = moved_id
+            self._index[moved_id] = index
+        self._ids.pop()
+        self._pending[display_id] = None
+        self._commit_unless_batched()
+
+    def set(self, display_id, **fields):
+        """Change fields of a display. Returns the set of fields whose value changed."""
+        self._check_fields(fields)
+        index = self._index[display_id]
+        # Compared as stored, e.g. offsets once normalized
+        values = {name: self._normalize(name, value) for name, value in fields.items()}
+        changed = {name for name, value in values.items() if self._field(index, name) != value}
+        if changed:
+            self._store(index, {name: values[name] for name in changed})
+            self._record(display_id, changed)
+        return changed
+
+    def get(self, display_id, field):
+        if field not in DISPLAY_DEFAULTS:
+            raise ValueError(f"unknown display field: {field}")
+        return self._field(self._index[display_id], field)
+
+    def display(self, display_id):
+        """All fields of a display, as a dict."""
+        return self._values(self._index[display_id])
+
+    @contextmanager
+    def batch(self):
+        """Commit every change made inside the block as one change set.
+
+        If the block raises, the displays are put back as they were on
+        entry and none of the block's changes are committed.
+        """
+        state = self._save_state()
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._restore_state(state)
+            raise
+        finally:
+            self._batch_depth -= 1
+            self._commit_unless_batched()
+
+    def _save_state(self):
+        arrays = {name: getattr(self, name).copy() for name in _ARRAYS}
+        pending = {display_id: None if fields is None else set(fields)
+                   for display_id, fields in self._pending.items()}
+        return arrays, list(self._ids), dict(self._index), self._next_id, pending
+
+    def _restore_state(self, state):
+        arrays, self._ids, self._index, self._next_id, self._pending = state
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self._capacity = len(self._distances)
+
+    def update_transforms(self, head_orientation=(0.0, 0.0, 0.0, 1.0)):
+        """Compute every display's world orientation, rotation matrix and centre.
+
+        Following displays are placed relative to head_orientation, the
+        others are anchored in the world. Returns ``(rotations, centers)``
+        as ``(N, 3, 3)`` and ``(N, 3)`` arrays in renderer axes, reused
+        between calls; the display centre is ``distance`` along -z of the
+        display's orientation.
+        """
+        count = len(self._ids)
+        if self._rotations is None or self._rotations.shape[0] != count:
+            self._orientations = np.empty((count, 4))
+            self._rotations = np.empty((count, 3, 3))
+            self._centers = np.empty((count, 3))
+        offsets = self._offsets[:count]
+        orientations = self._orientations
+        quaternion_multiply(head_orientation, offsets, out=orientations)
+        np.copyto(orientations, offsets, where=~self._follow[:count, np.newaxis])
+        quaternion_to_matrix(orientations, out=self._rotations)
+        np.multiply(self._rotations[:, :, 2], -self._distances[:count, np.newaxis], out=self._centers)
+        return self._rotations, self._centers
+
+    def to_config(self):
+        """The displays as a JSON-serializable list, in array order."""
+        entries = []
+        for display_id in self._ids:
+            values = self.display(display_id)
+            values['offset'] = list(values['offset'])
+            entries.append(dict(id=display_id, **values))
+        return entries
+
+    def load_config(self, entries):
+        """Replace the displays with saved entries (as returned by to_config())."""
+        with self.batch():
+            for display_id in list(self._ids):
+                self.remove(display_id)
+            self._next_id = PRIMARY_DISPLAY
+            for entry in entries:
+                fields = {name: entry[name] for name in DISPLAY_FIELDS if name in entry}
+                self._check_fields(fields)
+                self._add(int(entry.get('id', self._next_id)), fields)
+
+    def _check_fields(self, fields):
+        unknown = set(fields) - set(DISPLAY_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown display fields: {', '.join(sorted(unknown))}")
+        if 'offset' in fields and len(fields['offset']) != 4:
+            raise ValueError(f"offset must be an (x, y, z, w) quaternion, got {fields['offset']}")
+
+    def _field(self, index, name):
+        if name == 'offset':
+            return tuple(self._offsets[index].tolist())
+        if name == 'distance':
+            return float(self._distances[index])
+        if name == 'curvature':
+            return float(self._curvatures[index])
+        if name == 'follow':
+            return bool(self._follow[index])
+        return float(self._follow_thresholds[index])
+
+    def _values(self, index):
+        return {name: self._field(index, name) for name in DISPLAY_FIELDS}
+
+    def _normalize(self, name, value):
+        """A field value as _field() reads it back once stored."""
+        if name == 'offset':
+            offset = np.asarray(value, dtype=np.float64)
+            norm = np.linalg.norm(offset)
+            if norm == 0:
+                return DISPLAY_DEFAULTS['offset']
+            # Dividing a unit quaternion by its norm can still move the last
+            # bit; kept as is, a stored offset set again is not a change
+            if abs(norm - 1.0) > UNIT_TOLERANCE:
+                offset = offset / norm
+            return tuple(offset.tolist())
+        if name == 'follow':
+            return bool(value)
+        return float(value)
+
+    def _store(self, index, values):
+        """Write field values, as returned by _normalize()."""
+        if 'offset' in values:
+            self._offsets[index] = values['offset']
+        if 'distance' in values:
+            self._distances[index] = values['distance']
+        if 'curvature' in values:
+            self._curvatures[index] = values['curvature']
+        if 'follow' in values:
+            self._follow[index] = values['follow']
+        if 'follow_threshold' in values:
+            self._follow_thresholds[index] = values['follow_threshold']
+
+    def _record(self, display_id, fields):
+        self.field_changes += len(fields)
+        pending = self._pending.get(display_id)
+        self._pending[display_id] = fields if pending is None else pending | fields
+        self._commit_unless_batched()
+
+    def _commit_unless_batched(self):
+        if self._batch_depth or not self._pending:
+            return
+        changes = self._pending
+        self._pending = {}
+        self.commits += 1
+        if self._config is not None:
+            try:
+                self._config.set('displays', self.to_config())
+            except Exception as e:
+                self.logger.error("Error saving displays: %s", e)
+        if self._on_changed is not None:
+            self._on_changed(changes)
@@ -0,0 +1,260 @@
+import os
+import logging
+from collections import namedtuple
+from types import MappingProxyType
+
+STATE_PATH = '/dev/shm/xr_driver_state'
+# Bytes read beyond the size the file had when opened
+READ_SLACK = 4096
+
+_BOOLS = {'true': True, 'false': False}
+
+def parse_bool(value):
+    """Parse the driver's 'true'/'false' flags."""
+    try:
+        return _BOOLS[value.lower()]
+    except KeyError:
+        raise ValueError(f"not a boolean: {value!r}") from None
+
+def parse_float_list(value):
+    return tuple(float(item) for item in value.split(',')) if value else ()
+
+# A known key of the driver state file: how to parse its value, the unit
+# of the parsed value (None if unitless) and the value assumed while the
+# driver has not written the key.
+StateField = namedtuple('StateField', 'name parse unit default')
+
+STATE_SCHEMA = {field.name: field for field in (
+    StateField('heartbeat', int, 's', 0),
+    StateField('device_connected', parse_bool, None, False),
+    StateField('hardware_id', str, None, ''),
+    StateField('connected_device_brand', str, None, ''),
+    StateField('connected_device_model', str, None, ''),
+    StateField('external_mode', str, None, ''),
+    StateField('calibration_setup', str, None, ''),
+    StateField('calibration_state', str, None, ''),
+    StateField('sbs_mode_supported', parse_bool, None, False),
+    StateField('sbs_mode_enabled', parse_bool, None, False),
+    StateField('firmware_update_recommended', parse_bool, None, False),
+    StateField('breezy_desktop_smooth_follow_enabled', parse_bool, None, False),
+    StateField('breezy_desktop_smooth_follow_origin', parse_float_list, 'quaternion', ()),
+    StateField('breezy_desktop_display_distance', float, 'm', 1.05),
+    StateField('breezy_desktop_follow_threshold', float, 'rad', 0.1),
+)}
+
+def _fields_by_parser():
+    groups = {}
+    for name, field in STATE_SCHEMA.items():
+        groups.setdefault(field.parse, []).append(name)
+    return tuple((parse, tuple(names)) for parse, names in groups.items())
+
+# (parse function, schema keys), so each type is parsed in one pass
+FIELDS_BY_PARSER = _fields_by_parser()
+
+class DriverState:
+    """Immutable, typed snapshot of the driver state file.
+
+    Every schema key is an attribute holding its parsed value, or the
+    schema default if the driver did not write it. ``raw`` maps every key
+    in the file, known or not, to its string value.
+    """
+    __slots__ = tuple(STATE_SCHEMA) + ('raw',)
+
+    def __init__(self, raw=None, values=None):
+        values = values or {}
+        for set_slot, name, default in _SCHEMA_SLOTS:
+            set_slot(self, values.get(name, default))
+        _RAW_SLOT(self, MappingProxyType(dict(raw or {})))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DriverState snapshots are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("DriverState snapshots are immutable")
+
+    def get(self, key, default=None):
+        """Typed value for schema keys, raw string for other keys present in the file."""
+        if key in STATE_SCHEMA:
+            return getattr(self, key)
+        return self.raw.get(key, default)
+
+    def __contains__(self, key):
+        return key in self.raw
+
+    def __eq__(self, other):
+        return isinstance(other, DriverState) and self.raw == other.raw
+
+    def __hash__(self):
+        return hash(frozenset(self.raw.items()))
+
+    def __repr__(self):
+        return f"DriverState({dict(self.raw)!r})"
+
+# The slots' own setters, which bypass the blocked __setattr__
+_SCHEMA_SLOTS = tuple((getattr(DriverState, name).__set__, name, field.default)
+                      for name, field in STATE_SCHEMA.items())
+_RAW_SLOT = DriverState.raw.__set__
+
+EMPTY_STATE = DriverState()
+
+class StateParser:
+    """Parse the driver state file, re-reading it only when it changed.
+
+    The file's (inode, mtime, size) signature is checked first; when it
+    matches the last parse the previous snapshot is returned as is.
+    Otherwise the file is opened and its signature taken with fstat
+    before reading, so a parse is cached under the signature of a file no
+    newer than the content it parsed. The driver rewrites the file in place, so a read can catch it truncated
+    or half-written: content that does not end in a newline, an empty
+    file after a non-empty state, or a known key whose value does not
+    parse, is re-read up to ``max_retries`` times. If the file kept the
+    same signature over those reads, it is not being written: the last
+    read is taken as it is, and values that still do not parse fall back
+    to their schema defaults. Otherwise the previous snapshot is kept and
+    the next call parses again.
+    """
+
+    def __init__(self, path=STATE_PATH, max_retries=3):
+        self.logger = logging.getLogger('xfce4_xr_desktop.driver_state')
+        self._path = path
+        self._max_retries = max_retries
+        self._snapshot = EMPTY_STATE
+        self._signature = None
+
+        # Counters
+        self.parse_count = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.invalid_reads = 0
+
+    @property
+    def snapshot(self):
+        """The last consistent snapshot, without touching the file."""
+        return self._snapshot
+
+    def invalidate(self):
+        """Force the next read() to parse the file."""
+        self._signature = None
+
+    def read(self):
+        """Return the current snapshot, parsing the file only if it changed."""
+        signature = self._stat()
+        if signature is not None and signature == self._signature:
+            self.cache_hits += 1
+            return self._snapshot
+        self._signature = None
+        if signature is None:
+            self._snapshot = EMPTY_STATE
+            return self._snapshot
+
+        stable = True
+        previous_signature = None
+        for attempt in range(self._max_retries + 1):
+            result = self._read_content()
+            if result is None:
+                return self._snapshot
+            signature, content = result
+            if signature is None:
+                self._snapshot = EMPTY_STATE
+                return self._snapshot
+            if previous_signature is not None:
+                stable = stable and signature == previous_signature
+            previous_signature = signature
+            # On the last attempt, a file that did not change over the
+            # retries is the driver's real output rather than a torn write
+            parsed = self._parse(content, strict=attempt < self._max_retries or not stable)
+            if parsed is not None:
+                if attempt:
+                    self.retries += attempt
+                self.parse_count += 1
+                raw, values = parsed
+                # The signature was taken from the open file before reading it:
+                # a rewrite during the read changes the file's signature, so
+                # the next read() parses again rather than hitting the cache
+                self._signature = signature
+                self._snapshot = DriverState(raw, values)
+                return self._snapshot
+        self.retries += self._max_retries
+        self.invalid_reads += 1
+        self.logger.debug("State file still inconsistent after retries, keeping the previous state")
+        return self._snapshot
+
+    def _stat(self):
+        try:
+            st = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            self.logger.error("Error checking state file: %s", e)
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read_content(self):
+        """Return (signature, content) of the file, signature None if it is gone, or None on error."""
+        try:
+            fd = os.open(self._path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None, ''
+        except OSError as e:
+            self.logger.error("Error reading state: %s", e)
+            return None
+        try:
+            st = os.fstat(fd)
+            # Ask for more than the size from fstat, so that one read
+            # normally returns the whole file even if it grew since
+            size = st.st_size + READ_SLACK
+            chunks = []
+            while True:
+                chunk = os.read(fd, size)
+                chunks.append(chunk)
+                # A short read of a regular file is its end
+                if len(chunk) < size:
+                    break
+            content = b''.join(chunks).decode()
+        except (OSError, UnicodeDecodeError) as e:
+            self.logger.error("Error reading state: %s", e)
+            return None
+        finally:
+            os.close(fd)
+        return (st.st_ino, st.st_mtime_ns, st.st_size), content
+
+    def _parse(self, content, strict=True):
+        """Return (raw, typed values), or None if strict and the content looks torn."""
+        if strict:
+            # The driver truncates before rewriting; an empty file is only
+            # believable if the state was already empty
+            if not content and self._snapshot.raw:
+                return None
+            if content and not content.endswith('\n'):
+                return None
+        raw = {}
+        for line in content.splitlines():
+            # Values may themselves contain '='
+            key, sep, value = line.strip().partition('=')
+            if sep:
+                raw[key] = value
+        values = self._typed(raw, strict)
+        return None if values is None else (raw, values)
+
+    def _typed(self, raw, strict=True):
+        """Parse schema values; None if one fails and strict, else it keeps its default."""
+        values = {}
+        # The driver rewrites every key but mostly changes the heartbeat:
+        # values equal to the previous snapshot's are taken from it
+        previous = self._snapshot
+        previous_raw = previous.raw
+        for parse, keys in FIELDS_BY_PARSER:
+            for key in keys:
+                value = raw.get(key)
+                if value is None:
+                    continue
+                if value == previous_raw.get(key):
+                    values[key] = getattr(previous, key)
+                    continue
+                try:
+                    values[key] = parse(value)
+                except ValueError:
+                    if strict:
+                        return None
+                    self.logger.warning("Ignoring unexpected value for state key '%s': %r", key, value)
+        return values
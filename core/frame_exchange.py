@@ -0,0 +1,111 @@
+import time
+import threading
+import numpy as np
+from utils.latency import LatencyHistogram
+
+class FrameExchange:
+    """Triple-buffered hand-off of frames from a capture thread to a render thread.
+
+    One exchange per virtual display. Three preallocated buffers rotate
+    between the producer (the back buffer it fills), the consumer (the
+    front buffer it reads) and a middle slot holding the newest complete
+    frame. Publishing and acquiring only swap buffer indices, so neither
+    side ever waits for the other's copy or paint, and no memory is
+    allocated per frame. A frame published before the previous one was
+    acquired replaces it and is counted as dropped.
+
+    CPython has no compare-and-swap, and an exchange built from GIL-atomic
+    list operations can hand the consumer an older buffer when it races a
+    publish, which would change the front between acquires. So the index
+    swap runs under a lock held for a few bytecodes; it is never held
+    while pixels are touched.
+    """
+
+    def __init__(self, width, height, channels=4, dtype=np.uint8, clock=time.monotonic):
+        self.width = width
+        self.height = height
+        self._clock = clock
+        self._buffers = [np.zeros((height, width, channels), dtype=dtype) for _ in range(3)]
+        self._memoryviews = [memoryview(buffer) for buffer in self._buffers]
+        self._sequences = [0, 0, 0]
+        self._timestamps = [0.0, 0.0, 0.0]
+        self._swap_lock = threading.Lock()
+        self._back = 0
+        self._middle = 1
+        self._front = 2
+        self._fresh = False
+
+        # Counters
+        self.produced = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.age_histogram = LatencyHistogram()
+
+    @property
+    def back(self):
+        """The buffer the producer fills next, as a NumPy view (producer thread only)."""
+        return self._buffers[self._back]
+
+    def publish(self, timestamp=None):
+        """Make the back buffer the newest frame (producer thread only).
+
+        timestamp is when the frame was captured, on the exchange's clock;
+        it defaults to now. Returns the frame's sequence number.
+        """
+        self.produced += 1
+        back = self._back
+        self._sequences[back] = self.produced
+        self._timestamps[back] = self._clock() if timestamp is None else timestamp
+        with self._swap_lock:
+            self._back = self._middle
+            self._middle = back
+            replaced_fresh = self._fresh
+            self._fresh = True
+        if replaced_fresh:
+            self.dropped += 1
+        return self.produced
+
+    def acquire(self):
+        """Take the newest frame if one arrived since the last call (consumer thread only).
+
+        Returns True if the front buffer now holds a new frame. The front
+        buffer stays valid and unchanged until the next acquire().
+        """
+        with self._swap_lock:
+            if not self._fresh:
+                return False
+            front = self._middle
+            self._middle = self._front
+            self._front = front
+            self._fresh = False
+        self.consumed += 1
+        self.age_histogram.record(self._clock() - self._timestamps[front])
+        return True
+
+    @property
+    def front(self):
+        """The last acquired frame, as a NumPy view (consumer thread only)."""
+        return self._buffers[self._front]
+
+    @property
+    def front_memoryview(self):
+        """The last acquired frame as a zero-copy memoryview (consumer thread only)."""
+        return self._memoryviews[self._front]
+
+    @property
+    def front_sequence(self):
+        """Sequence number of the last acquired frame; 0 before the first."""
+        return self._sequences[self._front]
+
+    @property
+    def front_timestamp(self):
+        return self._timestamps[self._front]
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self._buffers)
+
+    def stats(self):
+        """Counters and age-at-consumption percentiles, for diagnostics."""
+        return dict(self.age_histogram.summary(), produced=self.produced,
+                    consumed=self.consumed, dropped=self.dropped)
@@ -0,0 +1,157 @@
+import numpy as np
+
+# Pixels converted per pass, so that the destination rows and the scratch
+# stay in cache across the swizzle's passes over them
+CHUNK_PIXELS = 32768
+
+class FramePrep:
+    """Turn captured BGRA frames into per-eye images for the glasses.
+
+    In widescreen (side-by-side) mode the source frame holds the left eye
+    in its left half and the right eye in its right half; otherwise the
+    whole frame is shown to both eyes. Each eye is cropped, downscaled by
+    an integer factor (nearest sample, as a strided view) and, if
+    ``swizzle`` is set, converted from BGRA to RGBA.
+
+    Without swizzling, process() returns views into the source frame and
+    copies nothing. With it, pixels are written into destinations
+    preallocated here. Given the damaged rectangles of the source,
+    only the destination pixels sampled from them are rewritten, and
+    ``dirty_rects`` lists them per eye in eye coordinates.
+    """
+
+    def __init__(self, src_width, src_height, sbs=False, crop=None, scale=1, swizzle=True):
+        half_width = src_width // 2 if sbs else src_width
+        crop_x, crop_y, crop_width, crop_height = crop or (0, 0, half_width, src_height)
+        if crop_x < 0 or crop_y < 0 or crop_x + crop_width > half_width or crop_y + crop_height > src_height:
+            raise ValueError(f"crop {crop} does not fit a {half_width}x{src_height} eye")
+        if scale < 1 or crop_width % scale or crop_height % scale:
+            raise ValueError(f"{crop_width}x{crop_height} is not divisible by scale {scale}")
+
+        self.src_width = src_width
+        self.src_height = src_height
+        self.sbs = sbs
+        self.scale = scale
+        self.swizzle = swizzle
+        self.eye_width = crop_width // scale
+        self.eye_height = crop_height // scale
+        self._crop_width = crop_width
+        self._crop_height = crop_height
+        # Top-left source pixel of each eye
+        eye_offsets = (0, half_width) if sbs else (0,)
+        self._origins = [(offset + crop_x, crop_y) for offset in eye_offsets]
+
+        self.outputs = None
+        self._outputs32 = None
+        self._scratch = None
+        if swizzle:
+            self.outputs = [np.empty((self.eye_height, self.eye_width, 4), dtype=np.uint8)
+                            for _ in self._origins]
+            self._outputs32 = [output.view(np.uint32)[..., 0] for output in self.outputs]
+            self._scratch = (np.empty(CHUNK_PIXELS, dtype=np.uint32), np.empty(CHUNK_PIXELS, dtype=np.uint32))
+        self.dirty_rects = [[] for _ in self._origins]
+        self._source = None
+        self._source32 = None
+        self._views = None
+
+        # Counters
+        self.frames = 0
+        self.pixels_written = 0
+
+    def process(self, frame, dirty_rects=None):
+        """Prepare one frame and return the list of eye images (one, or two in SBS mode).
+
+        dirty_rects are (x, y, width, height) rectangles of frame that
+        changed since the previous call with the same frame buffer; None
+        means the whole frame.
+        """
+        if frame.shape != (self.src_height, self.src_width, 4):
+            raise ValueError(f"expected a {self.src_width}x{self.src_height} BGRA frame, got {frame.shape}")
+        if frame is not self._source:
+            # A capture engine keeps updating the same buffer; only a new one needs new views
+            self._source = frame
+            self._source32 = frame.view(np.uint32)[..., 0]
+            self._views = [self._eye_view(frame, origin) for origin in self._origins]
+            dirty_rects = None
+        self.frames += 1
+        if not self.swizzle:
+            self._update_dirty(dirty_rects)
+            return self._views
+
+        for eye, origin in enumerate(self._origins):
+            if dirty_rects is None:
+                self._convert(eye, origin, 0, 0, self.eye_width, self.eye_height)
+                self.dirty_rects[eye] = [(0, 0, self.eye_width, self.eye_height)]
+                continue
+            rects = self._eye_rects(origin, dirty_rects)
+            for x, y, width, height in rects:
+                self._convert(eye, origin, x, y, width, height)
+            self.dirty_rects[eye] = rects
+        return self.outputs
+
+    def _eye_view(self, frame, origin):
+        x, y = origin
+        scale = self.scale
+        return frame[y:y + self._crop_height:scale, x:x + self._crop_width:scale]
+
+    def _convert(self, eye, origin, x, y, width, height):
+        """Write eye pixels [x, x+width) x [y, y+height) from the source, as RGBA."""
+        scale = self.scale
+        src_x, src_y = origin[0] + x * scale, origin[1] + y * scale
+        cols = slice(src_x, src_x + width * scale, scale)
+        if width < self.eye_width:
+            # Ufuncs would buffer the strided destination of a partial row
+            # and their per-call cost dominates on small rectangles: copy
+            # whole pixels, then the two swapped bytes
+            rows = slice(src_y, src_y + height * scale, scale)
+            np.copyto(self._outputs32[eye][y:y + height, x:x + width], self._source32[rows, cols])
+            output = self.outputs[eye][y:y + height, x:x + width]
+            np.copyto(output[..., 0], self._source[rows, cols, 2])
+            np.copyto(output[..., 2], self._source[rows, cols, 0])
+            self.pixels_written += width * height
+            return
+        output = self._outputs32[eye]
+        chunk_rows = max(1, CHUNK_PIXELS // width)
+        for row in range(y, y + height, chunk_rows):
+            rows = min(chunk_rows, y + height - row)
+            first = src_y + (row - y) * scale
+            dst = output[row:row + rows]
+            # Downscale first: gather whole pixels straight into the destination
+            np.copyto(dst, self._source32[first:first + rows * scale:scale, cols])
+            # Then swap B and R in place. On the little-endian uint32 view
+            # BGRA reads 0xAARRGGBB and RGBA 0xAABBGGRR
+            blue_red = self._scratch[0][:rows * width].reshape(rows, width)
+            shifted = self._scratch[1][:rows * width].reshape(rows, width)
+            np.bitwise_and(dst, 0x00FF00FF, out=blue_red)
+            np.bitwise_xor(dst, blue_red, out=dst)
+            np.left_shift(blue_red, 16, out=shifted)
+            np.bitwise_or(dst, shifted, out=dst)
+            np.right_shift(blue_red, 16, out=blue_red)
+            np.bitwise_or(dst, blue_red, out=dst)
+        self.pixels_written += width * height
+
+    def _update_dirty(self, dirty_rects):
+        for eye, origin in enumerate(self._origins):
+            if dirty_rects is None:
+                self.dirty_rects[eye] = [(0, 0, self.eye_width, self.eye_height)]
+            else:
+                self.dirty_rects[eye] = self._eye_rects(origin, dirty_rects)
+
+    def _eye_rects(self, origin, dirty_rects):
+        """Map source rectangles to the eye pixels whose samples fall inside them."""
+        scale = self.scale
+        left, top = origin
+        rects = []
+        for x, y, width, height in dirty_rects:
+            x0 = max(x, left) - left
+            y0 = max(y, top) - top
+            x1 = min(x + width, left + self._crop_width) - left
+            y1 = min(y + height, top + self._crop_height) - top
+            if x1 <= x0 or y1 <= y0:
+                continue
+            # Eye pixel i samples source column i * scale
+            ex0, ey0 = -(-x0 // scale), -(-y0 // scale)
+            ex1, ey1 = -(-x1 // scale), -(-y1 // scale)
+            if ex1 > ex0 and ey1 > ey0:
+                rects.append((ex0, ey0, ex1 - ex0, ey1 - ey0))
+        return rects
@@ -0,0 +1,198 @@
+import time
+import logging
+from utils.latency import LatencyHistogram
+
+class MonotonicClock:
+    """Wall-clock time source for the scheduler."""
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep_until(self, deadline):
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+class FakeClock:
+    """Deterministic clock for tests and benchmarks.
+
+    Time only moves when the scheduler sleeps or when the code under
+    test calls advance(), e.g. to simulate the cost of rendering.
+    """
+
+    def __init__(self, start=0.0):
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def sleep_until(self, deadline):
+        if deadline > self._now:
+            self._now = deadline
+
+    def advance(self, seconds):
+        self._now += seconds
+
+class FrameScheduler:
+    """Pace a render callback to the glasses' refresh and account for every deadline.
+
+    Deadlines are the presentation times of a fixed grid at
+    ``refresh_hz``. Each frame the scheduler sleeps until just before
+    the deadline, leaving the estimated render time plus
+    ``latch_margin_s``, and only then samples the pose. This is late
+    latching: the pose is as close to presentation as the render cost
+    allows. A frame finishing after its deadline is a miss, and it is
+    presented at the next vsync.
+
+    The render-time estimate is mean + 2 deviations of recent frames.
+    When it stays above ``budget_fraction`` of the period, or frames keep
+    missing, for a quarter of a second, the capture rate is halved to
+    free CPU for rendering. It is doubled again after two seconds
+    comfortably within budget. ``on_capture_rate_changed`` is called
+    with each new rate.
+    """
+
+    def __init__(self, render, refresh_hz=60.0, clock=None, pose_sampler=None,
+                 latch_margin_s=0.001, budget_fraction=0.75, on_capture_rate_changed=None,
+                 max_capture_divisor=8):
+        self.logger = logging.getLogger('xfce4_xr_desktop.frame_scheduler')
+        self._render = render
+        self._clock = clock or MonotonicClock()
+        self._pose_sampler = pose_sampler
+        self._latch_margin = latch_margin_s
+        self._budget_fraction = budget_fraction
+        self._on_capture_rate_changed = on_capture_rate_changed
+        self._max_capture_divisor = max_capture_divisor
+        self.refresh_hz = refresh_hz
+
+        self._deadline = None
+        self._last_present = None
+        # Until the first frame is measured, assume it takes the whole budget
+        self._cost_mean = budget_fraction * self._period
+        self._cost_deviation = 0.0
+        self._overloaded_frames = 0
+        self._relaxed_frames = 0
+        self.capture_divisor = 1
+
+        # Counters and histograms
+        self.frames = 0
+        self.missed_deadlines = 0
+        self.skipped_vsyncs = 0
+        self.render_histogram = LatencyHistogram()
+        self.jitter_histogram = LatencyHistogram()
+        self.latch_histogram = LatencyHistogram()
+
+    @property
+    def refresh_hz(self):
+        return self._refresh_hz
+
+    @refresh_hz.setter
+    def refresh_hz(self, value):
+        self._refresh_hz = float(value)
+        self._period = 1.0 / self._refresh_hz
+        self._deadline = None
+
+    @property
+    def period(self):
+        return self._period
+
+    @property
+    def render_estimate(self):
+        """Conservative render time estimate, in seconds."""
+        return self._cost_mean + 2 * self._cost_deviation
+
+    @property
+    def capture_rate_hz(self):
+        return self._refresh_hz / self.capture_divisor
+
+    def run(self, frames=None, should_stop=None):
+        """Run frames until `frames` have been rendered or should_stop() returns True."""
+        count = 0
+        while (frames is None or count < frames) and not (should_stop and should_stop()):
+            self.run_frame()
+            count += 1
+
+    def run_frame(self):
+        """Render one frame against the next deadline. Returns True if it made it."""
+        clock = self._clock
+        period = self._period
+        if self._deadline is None:
+            self._deadline = clock.now() + period
+        deadline = self._deadline
+
+        # Late latch: wake as late as the render estimate allows
+        wake = deadline - self.render_estimate - self._latch_margin
+        if clock.now() < wake:
+            clock.sleep_until(wake)
+        latch = clock.now()
+        pose = self._pose_sampler(deadline) if self._pose_sampler is not None else None
+        self._render(pose, deadline)
+        end = clock.now()
+
+        cost = end - latch
+        self._update_estimate(cost)
+        self.render_histogram.record(cost)
+        self.latch_histogram.record(max(0.0, deadline - latch))
+        self.frames += 1
+
+        made_it = end <= deadline
+        present = deadline
+        if not made_it:
+            self.missed_deadlines += 1
+            # Shown at the first vsync after the frame is done
+            missed_vsyncs = int((end - deadline) // period) + 1
+            self.skipped_vsyncs += missed_vsyncs
+            present = deadline + missed_vsyncs * period
+        if self._last_present is not None:
+            self.jitter_histogram.record(abs((present - self._last_present) - period))
+        self._last_present = present
+        self._deadline = present + period
+        self._adapt_capture_rate(made_it)
+        return made_it
+
+    def _update_estimate(self, cost):
+        if self.frames == 0:
+            self._cost_mean = cost
+            self._cost_deviation = cost / 2
+            return
+        # Same smoothing as TCP's RTT estimator
+        self._cost_deviation += 0.25 * (abs(cost - self._cost_mean) - self._cost_deviation)
+        self._cost_mean += 0.125 * (cost - self._cost_mean)
+
+    def _adapt_capture_rate(self, made_it):
+        budget = self._budget_fraction * self._period
+        estimate = self.render_estimate
+        if not made_it or estimate > budget:
+            self._relaxed_frames = 0
+            self._overloaded_frames += 1
+            if self._overloaded_frames >= self._refresh_hz / 4 and self.capture_divisor < self._max_capture_divisor:
+                self._set_capture_divisor(self.capture_divisor * 2)
+                self._overloaded_frames = 0
+        elif estimate < budget * 0.6:
+            self._overloaded_frames = 0
+            self._relaxed_frames += 1
+            if self._relaxed_frames >= 2 * self._refresh_hz and self.capture_divisor > 1:
+                self._set_capture_divisor(self.capture_divisor // 2)
+                self._relaxed_frames = 0
+        else:
+            self._overloaded_frames = 0
+            self._relaxed_frames = 0
+
+    def _set_capture_divisor(self, divisor):
+        self.capture_divisor = divisor
+        self.logger.debug("Capture rate now %.1f Hz", self.capture_rate_hz)
+        if self._on_capture_rate_changed is not None:
+            self._on_capture_rate_changed(self.capture_rate_hz)
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'missed_deadlines': self.missed_deadlines,
+            'skipped_vsyncs': self.skipped_vsyncs,
+            'capture_rate_hz': self.capture_rate_hz,
+            'render_p50_ms': self.render_histogram.percentile(50) * 1000,
+            'render_p99_ms': self.render_histogram.percentile(99) * 1000,
+            'jitter_p50_ms': self.jitter_histogram.percentile(50) * 1000,
+            'jitter_p99_ms': self.jitter_histogram.percentile(99) * 1000,
+            'latch_p50_ms': self.latch_histogram.percentile(50) * 1000,
+        }
@@ -0,0 +1,193 @@
+import os
+import mmap
+import time
+import logging
+import numpy as np
+
+IMU_PATH = '/dev/shm/breezy_desktop_imu'
+
+# Layout version this reader understands; bumped by the driver whenever
+# the segment layout changes.
+IMU_LAYOUT_VERSION = 1
+
+# While the segment is missing, read() tries to map it at most this often
+REOPEN_INTERVAL_S = 1.0
+
+# Binary layout of the IMU segment: packed, little-endian. The four
+# (x, y, z, w) quaternions are snapshots at increasing ages, the first
+# being the latest; the parity byte is the XOR of all quaternion bytes and is
+# written last, so a mismatch means the writer was mid-update.
+IMU_DTYPE = np.dtype([
+    ('version', '<u1'),
+    ('enabled', '<u1'),
+    ('look_ahead_cfg', '<f4', (4,)),
+    ('display_res', '<u4', (2,)),
+    ('display_fov', '<f4'),
+    ('lens_distance_ratio', '<f4'),
+    ('sbs_enabled', '<u1'),
+    ('custom_banner_enabled', '<u1'),
+    ('smooth_follow_enabled', '<u1'),
+    ('smooth_follow_origin', '<f4', (16,)),
+    ('pose_position', '<f4', (3,)),
+    ('epoch_ms', '<u8'),
+    ('imu_quat_data', '<f4', (4, 4)),
+    ('parity', '<u1'),
+], align=False)
+
+_QUAT_OFFSET = IMU_DTYPE.fields['imu_quat_data'][1]
+_QUAT_END = _QUAT_OFFSET + IMU_DTYPE.fields['imu_quat_data'][0].itemsize
+_EPOCH_OFFSET = IMU_DTYPE.fields['epoch_ms'][1]
+
+def imu_parity(raw):
+    """Compute the parity byte for a raw record (any uint8 buffer of IMU_DTYPE.itemsize)."""
+    return int(np.bitwise_xor.reduce(raw[_QUAT_OFFSET:_QUAT_END]))
+
+class IMUReader:
+    """Zero-copy reader for the driver's IMU shared-memory segment.
+
+    The segment is mapped once; each read copies the record into a
+    preallocated structured array and validates it, retrying when the
+    writer was caught mid-update. The field views (``quaternion``,
+    ``position``, ...) are created once and always reflect the last valid
+    read, so callers must copy them if they need to keep a sample.
+    ``raw`` is the whole record as bytes (uint8).
+
+    While the segment cannot be mapped (the driver is not running),
+    read() retries at most once per ``reopen_interval_s`` and returns
+    False in between, and a failure is only logged when it differs from
+    the previous one.
+    """
+
+    def __init__(self, path=IMU_PATH, max_retries=8, reopen_interval_s=REOPEN_INTERVAL_S, clock=time.monotonic):
+        self.logger = logging.getLogger('xfce4_xr_desktop.imu_reader')
+        self._path = path
+        self._max_retries = max_retries
+        self._reopen_interval = reopen_interval_s
+        self._clock = clock
+        self._next_open = 0.0
+        self._open_error = None
+        self._file = None
+        self._mmap = None
+        self._source = None
+        self._source_epoch = None
+
+        # Preallocated destination and views into it
+        self._sample = np.zeros((), dtype=IMU_DTYPE)
+        self._sample_raw = self._sample.reshape(1).view(np.uint8)
+        self.raw = self._sample_raw
+        self.quaternions = self._sample['imu_quat_data']
+        self.quaternion = self.quaternions[0]
+        self.position = self._sample['pose_position']
+        self.look_ahead_cfg = self._sample['look_ahead_cfg']
+        self.smooth_follow_origin = self._sample['smooth_follow_origin']
+        self.timestamp_ms = 0
+
+        # Counters
+        self.reads = 0
+        self.retries = 0
+        self.failed_reads = 0
+        self.samples_seen = 0
+        self.open_attempts = 0
+
+    def open(self):
+        """Map the IMU segment. Returns False if it is missing or unusable."""
+        if self._mmap is not None:
+            return True
+        self.open_attempts += 1
+        try:
+            self._file = open(self._path, 'rb')
+            size = os.fstat(self._file.fileno()).st_size
+            if size < IMU_DTYPE.itemsize:
+                raise ValueError(f"segment is {size} bytes, expected at least {IMU_DTYPE.itemsize}")
+            self._mmap = mmap.mmap(self._file.fileno(), IMU_DTYPE.itemsize, access=mmap.ACCESS_READ)
+            self._source = np.frombuffer(self._mmap, dtype=np.uint8, count=IMU_DTYPE.itemsize)
+            self._source_epoch = self._source[_EPOCH_OFFSET:_EPOCH_OFFSET + 8].view('<u8')
+            version = int(self._source[0])
+            if version != IMU_LAYOUT_VERSION:
+                self.logger.warning("IMU layout version %s, expected %s", version, IMU_LAYOUT_VERSION)
+            if self._open_error is not None:
+                self.logger.info("IMU segment %s mapped", self._path)
+                self._open_error = None
+            return True
+        except Exception as e:
+            self.close()
+            self._next_open = self._clock() + self._reopen_interval
+            # Log each kind of failure once rather than on every retry
+            error = (type(e), str(e))
+            if error != self._open_error:
+                self._open_error = error
+                if isinstance(e, FileNotFoundError):
+                    self.logger.info("IMU segment %s not found, waiting for the driver", self._path)
+                else:
+                    self.logger.error("Error opening IMU segment %s: %s", self._path, e)
+            return False
+
+    @property
+    def is_open(self):
+        return self._mmap is not None
+
+    def close(self):
+        """Unmap the segment. Views handed out by read() stay valid."""
+        # numpy views must go before the mmap can be closed
+        self._source = None
+        self._source_epoch = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read(self):
+        """Copy the latest consistent record from the segment.
+
+        Returns True if a valid record was read. The record is torn if the
+        timestamp changed during the copy or the parity does not match; in
+        that case the read is retried up to ``max_retries`` times.
+        """
+        if self._source is None:
+            if self._clock() < self._next_open or not self.open():
+                return False
+        self.reads += 1
+        source = self._source
+        epoch = self._source_epoch
+        for attempt in range(self._max_retries + 1):
+            before = epoch[0]
+            np.copyto(self._sample_raw, source)
+            if epoch[0] == before and imu_parity(self._sample_raw) == self._sample_raw[-1]:
+                if attempt:
+                    self.retries += attempt
+                timestamp_ms = int(before)
+                if timestamp_ms != self.timestamp_ms:
+                    self.samples_seen += 1
+                    self.timestamp_ms = timestamp_ms
+                return True
+        self.retries += self._max_retries
+        self.failed_reads += 1
+        return False
+
+    @property
+    def age_ms(self):
+        """Age of the last valid sample in milliseconds, by the wall clock."""
+        return time.time() * 1000.0 - self.timestamp_ms
+
+    @property
+    def version(self):
+        return int(self._sample['version'])
+
+    @property
+    def enabled(self):
+        return bool(self._sample['enabled'])
+
+    @property
+    def smooth_follow_enabled(self):
+        return bool(self._sample['smooth_follow_enabled'])
+
+    @property
+    def display_fov(self):
+        return float(self._sample['display_fov'])
+
+    @property
+    def display_res(self):
+        res = self._sample['display_res']
+        return int(res[0]), int(res[1])
@@ -0,0 +1,242 @@
+"""Tessellated display meshes for flat and curved virtual displays.
+
+A mesh is a grid of vertices in the renderer's axes (x right, y up, z
+towards the viewer; see ``pose_math.nwu_to_esu``) with the display
+centred on -z at the display distance. A display has a fixed physical
+size, the size that exactly fills the glasses' diagonal FOV at
+``REFERENCE_DISTANCE_M``, so moving it away makes it smaller in view
+and moving it closer makes it overflow the view. Curved displays bend around a
+vertical axis so that the screen keeps its flat width along the arc;
+``curvature`` 1 puts every column at the display distance from the
+viewer, 0 is flat. UVs have v = 0 at the top row, matching captured
+frames.
+"""
+import math
+import queue
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+from core.pose_math import diagonal_to_cross_fovs
+
+# Quantization of the cache key; parameters are rounded to these steps
+# before generating, so nearby slider positions share a mesh
+FOV_STEP_DEG = 0.01
+DISTANCE_STEP_M = 0.005
+CURVATURE_STEP = 0.01
+
+# The distance slider's step, used to prefetch the positions around it
+SLIDER_STEP_M = 0.05
+
+# Distance at which a display exactly fills the glasses' diagonal FOV
+REFERENCE_DISTANCE_M = 1.0
+
+Mesh = namedtuple('Mesh', 'vertices uvs indices')
+
+MeshKey = namedtuple('MeshKey', 'width height fov distance curvature subdivisions')
+
+def mesh_nbytes(mesh):
+    return mesh.vertices.nbytes + mesh.uvs.nbytes + mesh.indices.nbytes
+
+def quantize(resolution, fov_deg, distance, curvature, subdivisions):
+    """Cache key for the given geometry: integer steps, so it hashes exactly."""
+    width, height = resolution
+    return MeshKey(int(width), int(height), int(round(fov_deg / FOV_STEP_DEG)),
+                   int(round(distance / DISTANCE_STEP_M)), int(round(curvature / CURVATURE_STEP)),
+                   int(subdivisions))
+
+def display_size(resolution, fov_deg):
+    """Physical (width, height) in metres of a display with this resolution on glasses with this diagonal FOV."""
+    width, height = resolution
+    horizontal_fov, vertical_fov = diagonal_to_cross_fovs(math.radians(fov_deg), width / height)
+    return (2 * REFERENCE_DISTANCE_M * math.tan(horizontal_fov / 2),
+            2 * REFERENCE_DISTANCE_M * math.tan(vertical_fov / 2))
+
+def generate_mesh(resolution, fov_deg, distance, curvature=0.0, subdivisions=32):
+    """Build the mesh of one display.
+
+    resolution is (width, height) in pixels, fov_deg the diagonal FOV,
+    distance the distance of the display centre in metres; the display's
+    size is ``display_size(resolution, fov_deg)`` whatever the distance.
+    Returns read-only float32 (N, 3) vertices, float32 (N, 2) UVs and
+    (subdivisions^2 * 2, 3) triangle indices (uint16 when they fit).
+    """
+    columns = rows = int(subdivisions)
+    display_width, display_height = display_size(resolution, fov_deg)
+    half_width = display_width / 2
+    half_height = display_height / 2
+
+    u = np.linspace(0.0, 1.0, columns + 1)
+    v = np.linspace(0.0, 1.0, rows + 1)
+    # Horizontal position along the screen, as an arc length from the centre
+    arc = (u - 0.5) * 2 * half_width
+    if curvature > 0:
+        radius = distance / curvature
+        theta = arc / radius
+        xs = radius * np.sin(theta)
+        zs = -distance + radius * (1 - np.cos(theta))
+    else:
+        xs = arc
+        zs = np.full_like(arc, -distance)
+    ys = (0.5 - v) * 2 * half_height
+
+    vertices = np.empty((rows + 1, columns + 1, 3), dtype=np.float32)
+    vertices[..., 0] = xs
+    vertices[..., 1] = ys[:, np.newaxis]
+    vertices[..., 2] = zs
+    uvs = np.empty((rows + 1, columns + 1, 2), dtype=np.float32)
+    uvs[..., 0] = u
+    uvs[..., 1] = v[:, np.newaxis]
+
+    index_type = np.uint16 if (rows + 1) * (columns + 1) <= 0x10000 else np.uint32
+    grid = np.arange((rows + 1) * (columns + 1), dtype=index_type).reshape(rows + 1, columns + 1)
+    top_left = grid[:-1, :-1].ravel()
+    top_right = grid[:-1, 1:].ravel()
+    bottom_left = grid[1:, :-1].ravel()
+    bottom_right = grid[1:, 1:].ravel()
+    indices = np.empty((rows * columns * 2, 3), dtype=index_type)
+    # Counter-clockwise as seen from the viewer
+    indices[0::2] = np.stack([top_left, bottom_left, top_right], axis=1)
+    indices[1::2] = np.stack([top_right, bottom_left, bottom_right], axis=1)
+
+    mesh = Mesh(vertices.reshape(-1, 3), uvs.reshape(-1, 2), indices)
+    for array in mesh:
+        array.flags.writeable = False
+    return mesh
+
+class MeshCache:
+    """Bounded LRU of generated meshes, with prefetching on a worker thread.
+
+    Keys are quantized geometry, so repeated slider positions are hits.
+    The cache is bounded both in entries and in bytes. Once bound to an
+    XRManager, a change of display distance queues the meshes for the
+    slider positions around it, so that dragging finds them ready.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=64 * 1024 * 1024):
+        self.logger = logging.getLogger('xfce4_xr_desktop.mesh')
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._meshes = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._xr_manager = None
+        self._handlers = []
+        self._geometry = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetched = 0
+        self.nbytes = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._meshes)
+
+    def get(self, resolution, fov_deg, distance, curvature=0.0, subdivisions=32):
+        """Return the mesh for this geometry, generating it on a miss."""
+        key = quantize(resolution, fov_deg, distance, curvature, subdivisions)
+        with self._lock:
+            mesh = self._meshes.get(key)
+            if mesh is not None:
+                self._meshes.move_to_end(key)
+                self.hits += 1
+                return mesh
+            self.misses += 1
+        mesh = self._generate(key)
+        self._store(key, mesh)
+        return mesh
+
+    def prefetch(self, resolution, fov_deg, distance, curvature=0.0, subdivisions=32):
+        """Queue generation of a mesh on the worker thread, if it is not cached."""
+        key = quantize(resolution, fov_deg, distance, curvature, subdivisions)
+        with self._lock:
+            if key in self._meshes:
+                return
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run_worker, name='mesh-prefetch', daemon=True)
+            self._worker.start()
+        self._queue.put(key)
+
+    def prefetch_around(self, distance, radius=2, step=SLIDER_STEP_M, **geometry):
+        """Prefetch the meshes for the slider positions within radius steps of distance."""
+        for offset in sorted(range(-radius, radius + 1), key=abs):
+            if distance + offset * step > 0:
+                self.prefetch(distance=distance + offset * step, **geometry)
+
+    def wait_idle(self):
+        """Block until every queued prefetch has been generated."""
+        self._queue.join()
+
+    def clear(self):
+        with self._lock:
+            self._meshes.clear()
+            self.nbytes = 0
+
+    def bind(self, xr_manager, resolution, fov_deg, curvature=0.0, subdivisions=32):
+        """Prefetch around XRManager's display distance whenever it changes."""
+        self.unbind()
+        self._xr_manager = xr_manager
+        self._geometry = dict(resolution=resolution, fov_deg=fov_deg, curvature=curvature,
+                              subdivisions=subdivisions)
+        self._handlers = [
+            xr_manager.connect('display-distance-changed', self._on_display_distance_changed),
+        ]
+        self.prefetch_around(xr_manager.display_distance, **self._geometry)
+
+    def unbind(self):
+        for handler in self._handlers:
+            self._xr_manager.disconnect(handler)
+        self._handlers = []
+        self._xr_manager = None
+
+    def _on_display_distance_changed(self, xr_manager, distance):
+        self.prefetch_around(distance, **self._geometry)
+
+    def _generate(self, key):
+        return generate_mesh((key.width, key.height), key.fov * FOV_STEP_DEG,
+                             key.distance * DISTANCE_STEP_M, key.curvature * CURVATURE_STEP,
+                             key.subdivisions)
+
+    def _store(self, key, mesh):
+        with self._lock:
+            if key in self._meshes:
+                return
+            self._meshes[key] = mesh
+            self.nbytes += mesh_nbytes(mesh)
+            while self._meshes and (len(self._meshes) > self._max_entries or self.nbytes > self._max_bytes):
+                _, evicted = self._meshes.popitem(last=False)
+                self.nbytes -= mesh_nbytes(evicted)
+                self.evictions += 1
+
+    def _run_worker(self):
+        while True:
+            key = self._queue.get()
+            try:
+                with self._lock:
+                    cached = key in self._meshes
+                if not cached:
+                    self._store(key, self._generate(key))
+                    self.prefetched += 1
+            except Exception as e:
+                self.logger.error("Error generating mesh: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        return {
+            'entries': len(self._meshes),
+            'bytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'evictions': self.evictions,
+            'prefetched': self.prefetched,
+        }
@@ -0,0 +1,189 @@
+"""Vectorized pose and FOV math, ported from Breezy Desktop's math.js.
+
+Every function works on batches: quaternions are ``(N, 4)`` arrays in
+``(x, y, z, w)`` order (the order used in the IMU segment), vectors are
+``(M, 3)`` arrays, and scalars may be arrays of any broadcastable shape so
+that all virtual displays are processed in one call. Functions accept an
+``out`` array and write into it instead of allocating; use ``Workspace``
+to keep those buffers between frames.
+"""
+import numpy as np
+
+def diagonal_to_cross_fovs(diagonal_fov, aspect_ratio, out=None):
+    """Split diagonal FOVs (radians) into horizontal and vertical FOVs.
+
+    FOV in radians is spherical, so it doesn't follow Pythagoras; the
+    tangents of the half angles do. Returns an array of shape
+    ``broadcast(diagonal_fov, aspect_ratio).shape + (2,)`` holding
+    (horizontal, vertical).
+    """
+    diagonal_fov = np.asarray(diagonal_fov, dtype=np.float64)
+    aspect_ratio = np.asarray(aspect_ratio, dtype=np.float64)
+    shape = np.broadcast_shapes(diagonal_fov.shape, aspect_ratio.shape)
+    if out is None:
+        out = np.empty(shape + (2,))
+    half_tan = np.tan(diagonal_fov / 2)
+    diagonal_to_vertical = np.sqrt(aspect_ratio * aspect_ratio + 1)
+    diagonal_to_horizontal = diagonal_to_vertical / aspect_ratio
+    np.arctan(half_tan / diagonal_to_horizontal, out=out[..., 0])
+    np.arctan(half_tan / diagonal_to_vertical, out=out[..., 1])
+    out *= 2
+    return out
+
+def quaternion_conjugate(quaternions, out=None):
+    """Conjugate (inverse rotation) of unit quaternions."""
+    quaternions = np.asarray(quaternions)
+    if out is None:
+        out = np.empty_like(quaternions, dtype=np.float64)
+    np.negative(quaternions[..., :3], out=out[..., :3])
+    out[..., 3] = quaternions[..., 3]
+    return out
+
+def quaternion_multiply(a, b, out=None):
+    """Hamilton product a * b of quaternions (rotate by b, then by a), broadcasting."""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if out is None:
+        out = np.empty(np.broadcast_shapes(a.shape, b.shape))
+    ax, ay, az, aw = a[..., 0], a[..., 1], a[..., 2], a[..., 3]
+    bx, by, bz, bw = b[..., 0], b[..., 1], b[..., 2], b[..., 3]
+    # Components are computed before any is stored, so out may alias a or b
+    x = aw * bx + ax * bw + ay * bz - az * by
+    y = aw * by - ax * bz + ay * bw + az * bx
+    z = aw * bz + ax * by - ay * bx + az * bw
+    w = aw * bw - ax * bx - ay * by - az * bz
+    out[..., 0] = x
+    out[..., 1] = y
+    out[..., 2] = z
+    out[..., 3] = w
+    return out
+
+def quaternion_to_matrix(quaternions, out=None):
+    """Convert ``(N, 4)`` unit quaternions to ``(N, 3, 3)`` rotation matrices."""
+    q = np.asarray(quaternions, dtype=np.float64)
+    if out is None:
+        out = np.empty(q.shape[:-1] + (3, 3))
+    x, y, z, w = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    out[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    out[..., 0, 1] = 2 * (x * y - z * w)
+    out[..., 0, 2] = 2 * (x * z + y * w)
+    out[..., 1, 0] = 2 * (x * y + z * w)
+    out[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    out[..., 1, 2] = 2 * (y * z - x * w)
+    out[..., 2, 0] = 2 * (x * z - y * w)
+    out[..., 2, 1] = 2 * (y * z + x * w)
+    out[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return out
+
+def apply_quaternion_to_vector(quaternions, vectors, out=None, matrices=None):
+    """Rotate M vectors by each of N quaternions.
+
+    ``quaternions`` is ``(N, 4)`` and ``vectors`` is ``(M, 3)``; the result
+    is ``(N, M, 3)``. A single quaternion ``(4,)`` gives ``(M, 3)``.
+    ``matrices`` is an optional ``(N, 3, 3)`` scratch buffer.
+    """
+    quaternions = np.asarray(quaternions, dtype=np.float64)
+    vectors = np.asarray(vectors, dtype=np.float64)
+    matrices = quaternion_to_matrix(quaternions, out=matrices)
+    # v' = R v, done as v @ R^T for all rows at once
+    rotation = np.swapaxes(matrices, -1, -2)
+    if quaternions.ndim == 1:
+        return np.matmul(vectors, rotation, out=out)
+    return np.matmul(vectors[np.newaxis], rotation, out=out)
+
+def nwu_to_esu(vectors, out=None):
+    """Convert north-west-up vectors to the renderer's axes.
+
+    Named after Breezy's shader function: the result is (east, up, south),
+    i.e. OpenGL's right, up and towards-the-viewer axes.
+    """
+    vectors = np.asarray(vectors)
+    if out is None:
+        out = np.empty_like(vectors, dtype=np.float64)
+    # Copy first so out may alias vectors
+    x = vectors[..., 0].copy()
+    np.negative(vectors[..., 1], out=out[..., 0])
+    out[..., 1] = vectors[..., 2]
+    np.negative(x, out=out[..., 2])
+    return out
+
+def normalize_vector(vectors, out=None):
+    """Scale vectors along the last axis to unit length (zero vectors stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float64)
+    if out is None:
+        out = np.empty_like(vectors)
+    norms = np.sqrt(np.einsum('...i,...i->...', vectors, vectors))[..., np.newaxis]
+    np.divide(vectors, norms, out=out, where=norms > 0)
+    out[np.broadcast_to(norms == 0, out.shape)] = 0
+    return out
+
+class FlatFOV:
+    """FOV conversions for a flat display plane at a given distance."""
+
+    @staticmethod
+    def center_to_fov_edge_distance(center_distance, fov_length):
+        return np.sqrt(np.square(center_distance) + np.square(np.divide(fov_length, 2)))
+
+    @staticmethod
+    def fov_edge_to_screen_center_distance(edge_distance, fov_length):
+        return np.sqrt(np.square(edge_distance) - np.square(np.divide(fov_length, 2)))
+
+    @staticmethod
+    def length_to_radians(fov_radians, fov_length, screen_edge_distance, to_length):
+        center_distance = FlatFOV.fov_edge_to_screen_center_distance(screen_edge_distance, fov_length)
+        return 2 * np.arctan(np.divide(to_length, 2) / center_distance)
+
+    @staticmethod
+    def radians_to_length(fov_radians, fov_length, screen_edge_distance, to_radians):
+        center_distance = FlatFOV.fov_edge_to_screen_center_distance(screen_edge_distance, fov_length)
+        return 2 * center_distance * np.tan(np.divide(to_radians, 2))
+
+class CurvedFOV:
+    """FOV conversions for a display curved around the viewer.
+
+    Every point of a curved display is at the same distance, so lengths
+    along the display map linearly to angles.
+    """
+
+    @staticmethod
+    def center_to_fov_edge_distance(center_distance, fov_length):
+        return np.broadcast_to(np.asarray(center_distance, dtype=np.float64),
+                               np.broadcast_shapes(np.shape(center_distance), np.shape(fov_length)))
+
+    @staticmethod
+    def fov_edge_to_screen_center_distance(edge_distance, fov_length):
+        return CurvedFOV.center_to_fov_edge_distance(edge_distance, fov_length)
+
+    @staticmethod
+    def length_to_radians(fov_radians, fov_length, screen_edge_distance, to_length):
+        return np.divide(to_length, fov_length) * fov_radians
+
+    @staticmethod
+    def radians_to_length(fov_radians, fov_length, screen_edge_distance, to_radians):
+        return np.divide(to_radians, fov_radians) * fov_length
+
+FOV_CONVERSION_FNS = {
+    'flat': FlatFOV,
+    'curved': CurvedFOV,
+}
+
+class Workspace:
+    """Preallocated buffers for rotating vectors by a batch of quaternions.
+
+    Buffers are (re)allocated only when the batch shape changes, so a
+    render loop with a stable display count does not allocate per frame.
+    """
+
+    def __init__(self):
+        self._matrices = None
+        self._rotated = None
+
+    def rotate(self, quaternions, vectors):
+        """Rotate ``(M, 3)`` vectors by ``(N, 4)`` quaternions into a reused ``(N, M, 3)`` buffer."""
+        n = quaternions.shape[0]
+        m = vectors.shape[0]
+        if self._matrices is None or self._matrices.shape[0] != n:
+            self._matrices = np.empty((n, 3, 3))
+        if self._rotated is None or self._rotated.shape[:2] != (n, m):
+            self._rotated = np.empty((n, m, 3))
+        return apply_quaternion_to_vector(quaternions, vectors, out=self._rotated, matrices=self._matrices)
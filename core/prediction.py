@@ -0,0 +1,338 @@
+"""Head-pose look-ahead prediction.
+
+Recent IMU samples are kept in a fixed-size, array-backed ring buffer;
+predictors extrapolate the head orientation to the time a frame will be
+displayed. Quaternions are ``(x, y, z, w)`` like the IMU segment.
+
+The prediction error on a recorded trace (see core.trace) is reported
+per horizon next to the error of showing the latest sample as is; the
+command exits non-zero if the predictor does worse than that::
+
+    python -m core.prediction session.trace --predictor angular_acceleration --horizons 8,16,33
+"""
+import sys
+import math
+import logging
+import argparse
+import numpy as np
+
+def _quat_multiply(a, b):
+    ax, ay, az, aw = a
+    bx, by, bz, bw = b
+    return (aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+            aw * bw - ax * bx - ay * by - az * bz)
+
+def _quat_conjugate(q):
+    return (-q[0], -q[1], -q[2], q[3])
+
+def _quat_to_rotvec(q):
+    """Rotation vector (axis * angle) of a unit quaternion, shortest path."""
+    x, y, z, w = q
+    if w < 0:
+        x, y, z, w = -x, -y, -z, -w
+    sin_half = math.sqrt(x * x + y * y + z * z)
+    if sin_half < 1e-12:
+        return (2 * x, 2 * y, 2 * z)
+    scale = 2 * math.atan2(sin_half, w) / sin_half
+    return (x * scale, y * scale, z * scale)
+
+def _rotvec_to_quat(v):
+    angle = math.sqrt(v[0] * v[0] + v[1] * v[1] + v[2] * v[2])
+    if angle < 1e-12:
+        return (v[0] / 2, v[1] / 2, v[2] / 2, 1.0)
+    scale = math.sin(angle / 2) / angle
+    return (v[0] * scale, v[1] * scale, v[2] * scale, math.cos(angle / 2))
+
+def quaternion_angle(a, b):
+    """Angle in radians between two orientations (tolerates unnormalized input)."""
+    x, y, z, w = _quat_multiply(a, _quat_conjugate(b))
+    return 2 * math.atan2(math.sqrt(x * x + y * y + z * z), abs(w))
+
+def slerp(a, b, fraction):
+    """Spherical linear interpolation between two unit quaternions."""
+    delta = _quat_to_rotvec(_quat_multiply(b, _quat_conjugate(a)))
+    step = _rotvec_to_quat((delta[0] * fraction, delta[1] * fraction, delta[2] * fraction))
+    return _quat_multiply(step, a)
+
+class PoseHistory:
+    """Fixed-size ring buffer of timestamped orientation samples.
+
+    Storage is preallocated; ``push`` only writes into the arrays. Index 0
+    is the newest sample, 1 the one before it, and so on.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity)
+        self.quaternions = np.zeros((capacity, 4))
+        self._head = -1
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, timestamp, quaternion):
+        """Append a sample; timestamps are seconds and must increase."""
+        if self._count and timestamp <= self.timestamps[self._head]:
+            return False
+        self._head = (self._head + 1) % self.capacity
+        self.timestamps[self._head] = timestamp
+        self.quaternions[self._head] = quaternion
+        if self._count < self.capacity:
+            self._count += 1
+        return True
+
+    def clear(self):
+        self._head = -1
+        self._count = 0
+
+    def timestamp(self, age):
+        return float(self.timestamps[(self._head - age) % self.capacity])
+
+    def quaternion(self, age):
+        return tuple(self.quaternions[(self._head - age) % self.capacity].tolist())
+
+    def span(self, duration, age=0):
+        """Number of samples back from ``age`` covering at least ``duration`` seconds.
+
+        Capped by the history length; at least 1 when there are two samples.
+        """
+        newest = self.timestamp(age)
+        available = self._count - 1 - age
+        for steps in range(1, available + 1):
+            if newest - self.timestamp(age + steps) >= duration:
+                return steps
+        return max(available, 0)
+
+    def angular_velocity(self, age=0, steps=1):
+        """Angular velocity (rad/s rotation vector) from sample age+steps to sample age."""
+        newer = self.quaternion(age)
+        older = self.quaternion(age + steps)
+        dt = self.timestamp(age) - self.timestamp(age + steps)
+        delta = _quat_to_rotvec(_quat_multiply(newer, _quat_conjugate(older)))
+        return (delta[0] / dt, delta[1] / dt, delta[2] / dt)
+
+class NoPrediction:
+    """Show the latest sample as is; the baseline predictors are compared with."""
+    min_samples = 1
+
+    def rotation(self, history, horizon):
+        return (0.0, 0.0, 0.0)
+
+class ConstantVelocityPredictor:
+    """Extrapolate with the angular velocity over the last ``window_s`` seconds.
+
+    Differentiating consecutive 1 kHz samples amplifies sensor noise past
+    the motion being predicted, so the velocity is taken over a window.
+    """
+    min_samples = 2
+
+    def __init__(self, window_s=0.01):
+        self.window_s = window_s
+
+    def rotation(self, history, horizon):
+        velocity = history.angular_velocity(0, history.span(self.window_s))
+        return (velocity[0] * horizon, velocity[1] * horizon, velocity[2] * horizon)
+
+class AngularAccelerationPredictor:
+    """Extrapolate with angular velocity and acceleration.
+
+    Velocity is measured over the last ``window_s`` seconds and over the
+    window before it; their difference gives the acceleration. Noise is
+    amplified once more by the second difference, so only ``1 -
+    smoothing`` of the estimated acceleration is applied (0 applies all of
+    it, 1 makes this a constant velocity predictor).
+    """
+
+    def __init__(self, smoothing=0.5, window_s=0.02):
+        self.smoothing = smoothing
+        self.window_s = window_s
+        self.min_samples = 3
+
+    def rotation(self, history, horizon):
+        steps = history.span(self.window_s)
+        velocity = history.angular_velocity(0, steps)
+        older_steps = history.span(self.window_s, steps)
+        if not older_steps:
+            return tuple(v * horizon for v in velocity)
+        previous = history.angular_velocity(steps, older_steps)
+        # Each velocity is the mean over its window, i.e. the velocity at its midpoint
+        dt = 0.5 * (history.timestamp(0) - history.timestamp(steps + older_steps))
+        gain = 1.0 - self.smoothing
+        acceleration = tuple(gain * (v - p) / dt for v, p in zip(velocity, previous))
+        # Bring the velocity from the middle of the window to the latest sample
+        lag = 0.5 * (history.timestamp(0) - history.timestamp(steps))
+        half_h2 = 0.5 * horizon * horizon
+        return tuple((v + a * lag) * horizon + a * half_h2 for v, a in zip(velocity, acceleration))
+
+PREDICTORS = {
+    'none': NoPrediction,
+    'constant_velocity': ConstantVelocityPredictor,
+    'angular_acceleration': AngularAccelerationPredictor,
+}
+
+class PosePredictor:
+    """Predict the head orientation at a target display time.
+
+    While the driver's smooth follow is enabled, the display already
+    chases the head once it turns past the follow threshold, so the
+    predicted rotation is clamped to that threshold to avoid compensating
+    for the same motion twice. Use ``bind()`` to track XRManager's
+    follow settings.
+    """
+
+    def __init__(self, predictor=None, capacity=64, max_horizon_ms=100.0):
+        self.logger = logging.getLogger('xfce4_xr_desktop.prediction')
+        self.history = PoseHistory(capacity)
+        self.predictor = predictor or ConstantVelocityPredictor()
+        self.max_horizon = max_horizon_ms / 1000.0
+        self.follow_mode = False
+        self.follow_threshold = 0.1
+        self._handlers = []
+        self._xr_manager = None
+
+    def bind(self, xr_manager):
+        """Follow XRManager's follow mode and threshold."""
+        self.unbind()
+        self._xr_manager = xr_manager
+        self.follow_mode = xr_manager.follow_mode
+        self.follow_threshold = xr_manager.follow_threshold
+        self._handlers = [
+            xr_manager.connect('follow-mode-changed', self._on_follow_mode_changed),
+            xr_manager.connect('follow-threshold-changed', self._on_follow_threshold_changed),
+        ]
+
+    def unbind(self):
+        for handler in self._handlers:
+            self._xr_manager.disconnect(handler)
+        self._handlers = []
+        self._xr_manager = None
+
+    def push(self, timestamp, quaternion):
+        """Add an IMU sample (timestamp in seconds)."""
+        return self.history.push(timestamp, quaternion)
+
+    def push_from_reader(self, imu_reader):
+        """Read the IMU segment and add the sample if it is new."""
+        if not imu_reader.read():
+            return False
+        return self.history.push(imu_reader.timestamp_ms / 1000.0, imu_reader.quaternion)
+
+    def predict(self, target_time):
+        """Return the predicted (x, y, z, w) orientation at target_time (seconds).
+
+        Falls back to the latest sample when there is not enough history.
+        """
+        history = self.history
+        if not len(history):
+            return (0.0, 0.0, 0.0, 1.0)
+        latest = history.quaternion(0)
+        if len(history) < self.predictor.min_samples:
+            return latest
+        horizon = min(max(target_time - history.timestamp(0), 0.0), self.max_horizon)
+        rotation = self.predictor.rotation(history, horizon)
+        if self.follow_mode:
+            angle = math.sqrt(rotation[0] ** 2 + rotation[1] ** 2 + rotation[2] ** 2)
+            if angle > self.follow_threshold:
+                scale = self.follow_threshold / angle
+                rotation = (rotation[0] * scale, rotation[1] * scale, rotation[2] * scale)
+        return _quat_multiply(_rotvec_to_quat(rotation), latest)
+
+    def _on_follow_mode_changed(self, xr_manager, enabled):
+        self.follow_mode = enabled
+
+    def _on_follow_threshold_changed(self, xr_manager, threshold):
+        self.follow_threshold = threshold
+
+def evaluate(timestamps, quaternions, predictor, horizons_ms, follow_mode=False, follow_threshold=0.1):
+    """Replay a recorded trace and measure prediction error per horizon.
+
+    For every sample, the pose predicted ``horizon`` ahead is compared with
+    the trace's own (slerp-interpolated) pose at that time. Returns a dict
+    mapping each horizon in ms to mean, p95 and max error in degrees.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    quaternions = np.asarray(quaternions, dtype=np.float64)
+    results = {}
+    for horizon_ms in horizons_ms:
+        horizon = horizon_ms / 1000.0
+        pose_predictor = PosePredictor(predictor, max_horizon_ms=max(horizon_ms, 1.0))
+        pose_predictor.follow_mode = follow_mode
+        pose_predictor.follow_threshold = follow_threshold
+        targets = timestamps + horizon
+        upper = np.searchsorted(timestamps, targets)
+        errors = []
+        for i in range(len(timestamps)):
+            pose_predictor.push(timestamps[i], quaternions[i])
+            j = upper[i]
+            if j >= len(timestamps) or i < 1:
+                continue
+            t0 = timestamps[j - 1]
+            fraction = (targets[i] - t0) / (timestamps[j] - t0)
+            actual = slerp(tuple(quaternions[j - 1]), tuple(quaternions[j]), fraction)
+            predicted = pose_predictor.predict(targets[i])
+            errors.append(quaternion_angle(predicted, actual))
+        if errors:
+            errors_deg = np.degrees(np.array(errors))
+            results[horizon_ms] = {
+                'samples': len(errors),
+                'mean_deg': float(errors_deg.mean()),
+                'p95_deg': float(np.percentile(errors_deg, 95)),
+                'max_deg': float(errors_deg.max()),
+            }
+    return results
+
+def compare(timestamps, quaternions, predictor, horizons_ms, follow_mode=False, follow_threshold=0.1):
+    """evaluate() for predictor and for NoPrediction on the same trace.
+
+    Returns {horizon_ms: (predicted, unpredicted)} with the two result
+    dicts of each horizon.
+    """
+    predicted = evaluate(timestamps, quaternions, predictor, horizons_ms, follow_mode, follow_threshold)
+    unpredicted = evaluate(timestamps, quaternions, NoPrediction(), horizons_ms, follow_mode, follow_threshold)
+    return {horizon: (predicted[horizon], unpredicted[horizon]) for horizon in predicted}
+
+def format_comparison(comparison):
+    lines = [f"{'horizon_ms':>10} {'samples':>8} {'mean_deg':>9} {'p95_deg':>8} {'max_deg':>8} "
+             f"{'none_mean':>9} {'none_p95':>8}"]
+    for horizon, (predicted, unpredicted) in comparison.items():
+        lines.append(f"{horizon:>10g} {predicted['samples']:>8} {predicted['mean_deg']:>9.3f} "
+                     f"{predicted['p95_deg']:>8.3f} {predicted['max_deg']:>8.3f} "
+                     f"{unpredicted['mean_deg']:>9.3f} {unpredicted['p95_deg']:>8.3f}")
+    return '\n'.join(lines)
+
+def _parse_horizons(text):
+    return [float(part) for part in text.split(',')]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m core.prediction',
+                                     description='Replay a recorded trace through a pose predictor and '
+                                                 'compare its error with no prediction.')
+    parser.add_argument('trace')
+    parser.add_argument('--predictor', choices=sorted(PREDICTORS), default='constant_velocity')
+    parser.add_argument('--horizons', type=_parse_horizons, default=[8.0, 16.0, 33.0],
+                        help='look-ahead horizons in ms, a,b,c')
+    parser.add_argument('--follow-threshold', type=float, default=None,
+                        help='clamp predictions as smooth follow with this threshold (radians) would')
+    args = parser.parse_args(argv)
+
+    # Imported here: core.tuning pulls in the process pool machinery
+    from core.tuning import load_imu_trace
+    timestamps, quaternions = load_imu_trace(args.trace)
+    if len(timestamps) < 4:
+        print(f"{args.trace} has too few IMU samples", file=sys.stderr)
+        return 1
+    follow_mode = args.follow_threshold is not None
+    comparison = compare(timestamps, quaternions, PREDICTORS[args.predictor](), args.horizons,
+                         follow_mode, args.follow_threshold if follow_mode else 0.1)
+    print(format_comparison(comparison))
+    worse = [horizon for horizon, (predicted, unpredicted) in comparison.items()
+             if predicted['mean_deg'] > unpredicted['mean_deg']]
+    for horizon in worse:
+        print(f"{args.predictor} is worse than no prediction at {horizon:g} ms", file=sys.stderr)
+    return 1 if worse else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import time
+import logging
+from gi.repository import GObject, GLib, Gio
+from core.driver_state import StateParser
+from utils.latency import TRACER
+
+class StateWatcher(GObject.Object):
+    """Watch the XR driver state file from the GLib main loop.
+
+    The file is monitored with inotify (through Gio.FileMonitor) and read
+    through a StateParser, which only re-parses it when its inode, mtime or
+    size changed and hands out typed snapshots. Bursts of driver
+    updates are coalesced so that at most one parse happens per
+    ``min_interval_ms``, and ``state-changed`` is emitted once per key whose
+    value actually changed. A slow stat-only poll covers the cases inotify
+    cannot see (e.g. /dev/shm being remounted).
+    """
+    __gsignals__ = {
+        # Detailed by key, e.g. 'state-changed::device_connected'.
+        # A key that disappears is reported with an empty value.
+        'state-changed': (GObject.SignalFlags.RUN_FIRST | GObject.SignalFlags.DETAILED,
+                          None, (str, str)),
+        # Every slow poll, whether or not anything changed
+        'polled': (GObject.SignalFlags.RUN_FIRST, None, ()),
+    }
+
+    def __init__(self, path, min_interval_ms=10, poll_interval_s=2):
+        super().__init__()
+        self.logger = logging.getLogger('xfce4_xr_desktop.state_watcher')
+        self._path = path
+        self._min_interval = min_interval_ms / 1000.0
+        self._poll_interval_s = poll_interval_s
+        self._parser = StateParser(path)
+        self._snapshot = self._parser.snapshot
+        self._last_parse = 0.0
+        self._monitor = None
+        self._poll_source = 0
+        self._pending_source = 0
+
+        # Counters, cheap enough to keep unconditionally
+        self.events_received = 0
+        self.changes_emitted = 0
+
+    def start(self):
+        """Start monitoring the state file and schedule an initial read."""
+        if self._monitor is not None:
+            return
+        try:
+            gfile = Gio.File.new_for_path(self._path)
+            self._monitor = gfile.monitor_file(Gio.FileMonitorFlags.WATCH_MOVES, None)
+            # The default rate limit (800 ms) would delay plug/unplug events
+            self._monitor.set_rate_limit(max(1, int(self._min_interval * 1000)))
+            self._monitor.connect('changed', self._on_file_changed)
+        except Exception as e:
+            self.logger.warning("inotify monitor unavailable, polling only: %s", e)
+            self._monitor = None
+        self._poll_source = GLib.timeout_add_seconds(self._poll_interval_s, self._on_poll)
+        self._schedule_check()
+
+    def stop(self):
+        """Stop monitoring and drop any pending checks."""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        if self._poll_source:
+            GLib.source_remove(self._poll_source)
+            self._poll_source = 0
+        if self._pending_source:
+            GLib.source_remove(self._pending_source)
+            self._pending_source = 0
+
+    def check(self):
+        """Re-read the state file now if it changed on disk.
+
+        Returns True if the state changed.
+        """
+        parse_count = self._parser.parse_count
+        snapshot = self._parser.read()
+        if self._parser.parse_count != parse_count:
+            self._last_parse = time.monotonic()
+        if snapshot is self._snapshot:
+            return False
+        old_snapshot = self._snapshot
+        self._snapshot = snapshot
+        if snapshot == old_snapshot:
+            return False
+        self._apply(old_snapshot.raw, snapshot.raw)
+        return True
+
+    def get(self, key, default=None):
+        """Get the last known raw string value of a state key."""
+        return self._snapshot.raw.get(key, default)
+
+    @property
+    def state(self):
+        return dict(self._snapshot.raw)
+
+    @property
+    def snapshot(self):
+        """The last typed DriverState snapshot; immutable, so safe to keep."""
+        return self._snapshot
+
+    @property
+    def parser(self):
+        return self._parser
+
+    @property
+    def parse_count(self):
+        return self._parser.parse_count
+
+    def _apply(self, old_state, new_state):
+        for key, value in new_state.items():
+            if old_state.get(key) != value:
+                self.changes_emitted += 1
+                if TRACER.enabled:
+                    TRACER.state_changed(key)
+                self.emit(f'state-changed::{key}', key, value)
+        for key in old_state:
+            if key not in new_state:
+                self.changes_emitted += 1
+                self.emit(f'state-changed::{key}', key, '')
+
+    def _schedule_check(self):
+        """Coalesce a burst of events into one check, at most once per interval."""
+        if self._pending_source:
+            return
+        wait = self._min_interval - (time.monotonic() - self._last_parse)
+        if wait <= 0:
+            self._pending_source = GLib.idle_add(self._on_pending_check)
+        else:
+            self._pending_source = GLib.timeout_add(max(1, int(wait * 1000)), self._on_pending_check)
+
+    def _on_pending_check(self):
+        self._pending_source = 0
+        self.check()
+        return GLib.SOURCE_REMOVE
+
+    def _on_file_changed(self, monitor, gfile, other_file, event_type):
+        self.events_received += 1
+        self._schedule_check()
+
+    def _on_poll(self):
+        self._schedule_check()
+        self.emit('polled')
+        return GLib.SOURCE_CONTINUE
@@ -0,0 +1,242 @@
+"""Record and replay the XR driver's shared-memory interfaces.
+
+A trace is an append-only binary file: an 8-byte magic followed by
+records of ``<source:u8><timestamp:f64><length:u32><payload>``, where the
+timestamp is seconds since the start of the recording and the payload is
+the full content of the state file, control file or IMU segment. A
+record is only written when its source changed, so idle periods cost
+nothing.
+
+Usage::
+
+    python -m core.trace record session.trace --duration 30
+    python -m core.trace replay session.trace /tmp/fake_shm --speed 2
+"""
+import os
+import sys
+import time
+import struct
+import logging
+import argparse
+from core.imu_reader import IMUReader
+
+TRACE_MAGIC = b'XRTRACE1'
+RECORD_HEADER = struct.Struct('<BdI')
+
+SOURCE_STATE = 0
+SOURCE_CONTROL = 1
+SOURCE_IMU = 2
+
+# File names of the sources inside a /dev/shm-like directory
+SOURCE_FILES = {
+    SOURCE_STATE: 'xr_driver_state',
+    SOURCE_CONTROL: 'xr_driver_control',
+    SOURCE_IMU: 'breezy_desktop_imu',
+}
+
+def source_paths(shm_dir='/dev/shm'):
+    """Map each trace source to its path inside shm_dir."""
+    return {source: os.path.join(shm_dir, name) for source, name in SOURCE_FILES.items()}
+
+class TraceWriter:
+    """Append records to a trace file."""
+
+    def __init__(self, path):
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(TRACE_MAGIC)
+        self.records = 0
+
+    def write(self, source, timestamp, payload):
+        self._file.write(RECORD_HEADER.pack(source, timestamp, len(payload)))
+        self._file.write(payload)
+        self.records += 1
+
+    def close(self):
+        self._file.close()
+
+def read_trace(path):
+    """Yield (source, timestamp, payload) records from a trace file."""
+    with open(path, 'rb') as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a trace file")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            source, timestamp, length = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                # Truncated by a crash while recording
+                return
+            yield source, timestamp, payload
+
+class TraceRecorder:
+    """Sample the driver's files and append every change to a trace.
+
+    The state and control files are checked by stat signature and only
+    read when it changed. The IMU segment is read at ``imu_rate_hz``
+    through IMUReader, which validates the timestamp and parity of each
+    record, and recorded when its bytes differ from the last record;
+    reads that stay torn after the reader's retries are skipped and
+    counted in ``torn_skips``.
+    """
+
+    def __init__(self, output, shm_dir='/dev/shm', imu_rate_hz=1000, file_rate_hz=200):
+        self.logger = logging.getLogger('xfce4_xr_desktop.trace')
+        self._writer = TraceWriter(output)
+        self._paths = source_paths(shm_dir)
+        # A missing segment is looked for again at the file rate
+        self._imu_reader = IMUReader(self._paths[SOURCE_IMU], reopen_interval_s=1.0 / file_rate_hz)
+        self._imu_period = 1.0 / imu_rate_hz
+        self._file_period = 1.0 / file_rate_hz
+        self._signatures = {}
+        self._last_payload = {}
+        self._running = False
+
+        # Counters
+        self.torn_skips = 0
+
+    def run(self, duration=None):
+        """Record until stop() is called or duration seconds have passed."""
+        self._running = True
+        start = time.monotonic()
+        next_file_check = start
+        try:
+            while self._running:
+                now = time.monotonic()
+                elapsed = now - start
+                if duration is not None and elapsed >= duration:
+                    break
+                self._sample_imu(elapsed)
+                if now >= next_file_check:
+                    self._sample_file(SOURCE_STATE, elapsed)
+                    self._sample_file(SOURCE_CONTROL, elapsed)
+                    next_file_check = now + self._file_period
+                time.sleep(self._imu_period)
+        finally:
+            self._imu_reader.close()
+            self._writer.close()
+        if self.torn_skips:
+            self.logger.warning("Skipped %d torn IMU reads", self.torn_skips)
+        return self._writer.records
+
+    def stop(self):
+        self._running = False
+
+    def _sample_file(self, source, elapsed):
+        path = self._paths[source]
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if self._signatures.get(source) == signature:
+            return
+        self._signatures[source] = signature
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            self.logger.error("Error sampling %s: %s", path, e)
+            return
+        self._record(source, elapsed, payload)
+
+    def _sample_imu(self, elapsed):
+        reader = self._imu_reader
+        if not reader.read():
+            if reader.is_open:
+                self.torn_skips += 1
+            return
+        self._record(SOURCE_IMU, elapsed, reader.raw.tobytes())
+
+    def _record(self, source, elapsed, payload):
+        if self._last_payload.get(source) == payload:
+            return
+        self._last_payload[source] = payload
+        self._writer.write(source, elapsed, payload)
+
+class TraceReplayer:
+    """Write a recorded trace back into a /dev/shm-like directory.
+
+    ``speed`` scales the recorded timing: 1.0 is real time, 2.0 twice as
+    fast, and 0 replays as fast as possible. The control file is only
+    replayed when ``include_control`` is set, since during a benchmark it
+    is normally written by the code under test.
+    """
+
+    def __init__(self, trace_path, shm_dir, speed=1.0, include_control=False):
+        self.logger = logging.getLogger('xfce4_xr_desktop.trace')
+        self._trace_path = trace_path
+        self._paths = source_paths(shm_dir)
+        self._speed = speed
+        self._include_control = include_control
+        self._running = False
+        os.makedirs(shm_dir, exist_ok=True)
+
+    def run(self):
+        """Replay the whole trace; returns the number of records written."""
+        self._running = True
+        start = time.monotonic()
+        count = 0
+        for source, timestamp, payload in read_trace(self._trace_path):
+            if not self._running:
+                break
+            if source == SOURCE_CONTROL and not self._include_control:
+                continue
+            if self._speed > 0:
+                delay = start + timestamp / self._speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            self._write(source, payload)
+            count += 1
+        return count
+
+    def stop(self):
+        self._running = False
+
+    def _write(self, source, payload):
+        path = self._paths[source]
+        if source == SOURCE_IMU and os.path.exists(path):
+            # Readers keep the segment mapped, so update it in place
+            with open(path, 'r+b') as f:
+                f.write(payload)
+            return
+        with open(path, 'wb') as f:
+            f.write(payload)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m core.trace',
+                                     description='Record or replay XR driver shared memory traces.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', help='record the driver files into a trace')
+    record.add_argument('output')
+    record.add_argument('--shm-dir', default='/dev/shm')
+    record.add_argument('--duration', type=float, default=None, help='seconds (default: until Ctrl+C)')
+    record.add_argument('--imu-rate', type=float, default=1000.0, help='IMU sampling rate in Hz')
+
+    replay = subparsers.add_parser('replay', help='replay a trace into a directory')
+    replay.add_argument('trace')
+    replay.add_argument('shm_dir')
+    replay.add_argument('--speed', type=float, default=1.0, help='1 = real time, 0 = as fast as possible')
+    replay.add_argument('--include-control', action='store_true')
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'record':
+            recorder = TraceRecorder(args.output, args.shm_dir, imu_rate_hz=args.imu_rate)
+            count = recorder.run(args.duration)
+            print(f"Recorded {count} records to {args.output} ({recorder.torn_skips} torn IMU reads skipped)")
+        else:
+            replayer = TraceReplayer(args.trace, args.shm_dir, args.speed, args.include_control)
+            count = replayer.run()
+            print(f"Replayed {count} records into {args.shm_dir}")
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
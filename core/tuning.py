@@ -0,0 +1,324 @@
+"""Offline tuning of the follow threshold and display distance.
+
+Replays the head orientations of a recorded trace (see core.trace)
+through a model of the driver's smooth follow: once the head turns
+further than the follow threshold from the display, the display slides
+back to the centre of view with an exponential time constant. Every
+combination of threshold, time constant and display distance is scored:
+
+- ``off_view``: fraction of the time part of the display is outside the
+  glasses' field of view (this is where the distance matters: displays
+  have the fixed physical size of ``core.mesh.display_size``, so a
+  farther display is smaller in view and has more room to lag behind)
+- ``triggers_per_min``: how often follow starts moving the display
+- ``jerk``: RMS angular jerk of the display in deg/s^3
+
+Rows are ranked by a weighted sum of the three metrics, each scaled to
+0..1 over the sweep; keeping the display in view weighs double by
+default. Rows with the display off view more than ``MAX_OFF_VIEW`` of
+the time rank after all the others whatever their score, so the
+recommendation only trades view for smoothness when every setting has
+to. Distances at which the display does not fit in the field of
+view at all (closer than ``core.mesh.REFERENCE_DISTANCE_M``) would be
+off view all the time whatever the threshold; they are dropped before
+the sweep rather than ranked. The simulations run in a process pool; the trace is put
+in shared memory once and attached by each worker instead of being
+pickled with every task.
+
+Usage::
+
+    python -m core.tuning session.trace --thresholds 0.01:0.5:0.01 --distances 1.05,1.25,1.5
+    python -m core.tuning session.trace --profile calm
+"""
+import sys
+import math
+import logging
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from core.imu_reader import IMU_DTYPE
+from core.mesh import display_size
+from core.pose_math import (diagonal_to_cross_fovs, quaternion_conjugate, quaternion_multiply,
+                            quaternion_to_matrix)
+from core.trace import SOURCE_IMU, read_trace
+from utils.config import Config
+
+# Follow stops once the display is this close to the centre of view
+FOLLOW_DONE_RAD = 0.005
+
+DEFAULT_TIME_CONSTANT_S = 0.25
+
+DEFAULT_FOV_DEG = 46.0
+DEFAULT_ASPECT = 16 / 9
+
+# Fraction of the time off view above which a row is not recommended
+MAX_OFF_VIEW = 0.01
+
+METRICS = ('off_view', 'triggers_per_min', 'jerk')
+DEFAULT_WEIGHTS = {'off_view': 2.0, 'triggers_per_min': 1.0, 'jerk': 1.0}
+
+logger = logging.getLogger('xfce4_xr_desktop.tuning')
+
+TuningResult = namedtuple('TuningResult', 'follow_threshold time_constant distance off_view '
+                                          'triggers_per_min jerk mean_offset_deg score')
+
+def load_imu_trace(path):
+    """Head orientations of a recorded trace: (timestamps, (N, 4) quaternions)."""
+    timestamps = []
+    quaternions = []
+    last_epoch = None
+    for source, timestamp, payload in read_trace(path):
+        if source != SOURCE_IMU or len(payload) < IMU_DTYPE.itemsize:
+            continue
+        sample = np.frombuffer(payload, dtype=IMU_DTYPE, count=1)[0]
+        epoch = int(sample['epoch_ms'])
+        if epoch == last_epoch or (timestamps and timestamp <= timestamps[-1]):
+            continue
+        last_epoch = epoch
+        timestamps.append(timestamp)
+        quaternions.append(sample['imu_quat_data'][0])
+    return np.array(timestamps, dtype=np.float64), np.array(quaternions, dtype=np.float64).reshape(-1, 4)
+
+def simulate_follow(timestamps, quaternions, follow_threshold, time_constant=DEFAULT_TIME_CONSTANT_S):
+    """Display orientation at every sample under smooth follow, and the number of follow triggers."""
+    display = tuple(quaternions[0].tolist())
+    displays = np.empty_like(quaternions)
+    displays[0] = display
+    dx, dy, dz, dw = display
+    following = False
+    triggers = 0
+    samples = quaternions.tolist()
+    times = timestamps.tolist()
+    for i in range(1, len(samples)):
+        qx, qy, qz, qw = samples[i]
+        dot = dx * qx + dy * qy + dz * qz + dw * qw
+        if dot < 0:
+            qx, qy, qz, qw, dot = -qx, -qy, -qz, -qw, -dot
+        angle = 2 * math.acos(min(dot, 1.0))
+        if following:
+            following = angle > FOLLOW_DONE_RAD
+        elif angle > follow_threshold:
+            following = True
+            triggers += 1
+        if following:
+            # Steps are small, so normalized lerp is as good as slerp here
+            fraction = 1 - math.exp(-(times[i] - times[i - 1]) / time_constant)
+            dx += (qx - dx) * fraction
+            dy += (qy - dy) * fraction
+            dz += (qz - dz) * fraction
+            dw += (qw - dw) * fraction
+            norm = math.sqrt(dx * dx + dy * dy + dz * dz + dw * dw)
+            dx, dy, dz, dw = dx / norm, dy / norm, dz / norm, dw / norm
+        displays[i] = (dx, dy, dz, dw)
+    return displays, triggers
+
+def view_margins(distances, fov_deg=DEFAULT_FOV_DEG, aspect=DEFAULT_ASPECT):
+    """(N, 2) horizontal and vertical angles a display can move before leaving the view."""
+    fov = diagonal_to_cross_fovs(math.radians(fov_deg), aspect)
+    half_size = np.array(display_size((aspect, 1.0), fov_deg)) / 2
+    distances = np.asarray(distances, dtype=np.float64)[:, np.newaxis]
+    return fov / 2 - np.arctan(half_size / distances)
+
+def feasible_distances(distances, fov_deg=DEFAULT_FOV_DEG, aspect=DEFAULT_ASPECT):
+    """The distances at which the whole display fits in the field of view."""
+    if not len(distances):
+        return []
+    margins = view_margins(distances, fov_deg, aspect)
+    return [float(distance) for distance, margin in zip(distances, margins) if margin.min() > 0]
+
+def score_follow(timestamps, quaternions, displays, triggers, distances, fov_deg=DEFAULT_FOV_DEG,
+                 aspect=DEFAULT_ASPECT):
+    """Metrics of one follow simulation at each distance, as a list of dicts."""
+    # Display centre in head coordinates: north (forward) of the display, seen from the head
+    relative = quaternion_multiply(quaternion_conjugate(quaternions), displays)
+    forward = quaternion_to_matrix(relative)[:, :, 0]
+    yaw = np.abs(np.arctan2(forward[:, 1], forward[:, 0]))
+    pitch = np.abs(np.arctan2(forward[:, 2], np.hypot(forward[:, 0], forward[:, 1])))
+    offset = np.arccos(np.clip(forward[:, 0], -1.0, 1.0))
+
+    dt = np.diff(timestamps)
+    duration = timestamps[-1] - timestamps[0]
+    dots = np.abs(np.einsum('ij,ij->i', displays[1:], displays[:-1]))
+    speed = 2 * np.arccos(np.clip(dots, 0.0, 1.0)) / dt
+    acceleration = np.diff(speed) / dt[1:]
+    jerk = np.diff(acceleration) / dt[2:]
+    jerk_rms = float(np.degrees(np.sqrt(np.mean(jerk * jerk)))) if len(jerk) else 0.0
+
+    rows = []
+    for distance, (yaw_margin, pitch_margin) in zip(distances, view_margins(distances, fov_deg, aspect)):
+        off_view = (yaw[1:] > yaw_margin) | (pitch[1:] > pitch_margin)
+        rows.append({
+            'distance': float(distance),
+            'off_view': float(dt[off_view].sum() / duration),
+            'triggers_per_min': triggers * 60.0 / duration,
+            'jerk': jerk_rms,
+            'mean_offset_deg': float(np.degrees(offset.mean())),
+        })
+    return rows
+
+def rank(rows, weights=None, max_off_view=MAX_OFF_VIEW):
+    """TuningResults sorted best first by the weighted sum of the 0..1-scaled METRICS.
+
+    Rows off view more than max_off_view of the time come last.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    scores = np.zeros(len(rows))
+    for metric in METRICS:
+        values = np.array([row[metric] for row in rows])
+        spread = values.max() - values.min()
+        if spread > 0:
+            scores += weights.get(metric, 0.0) * (values - values.min()) / spread
+    results = [TuningResult(score=float(score), **row) for row, score in zip(rows, scores)]
+    return sorted(results, key=lambda result: (result.off_view > max_off_view, result.score))
+
+# Trace attached by each pool worker: (N, 5) rows of timestamp and quaternion
+_trace = None
+_trace_memory = None
+
+def _attach_trace(name, shape):
+    global _trace, _trace_memory
+    # Pool workers share the parent's resource tracker, so the parent's
+    # unlink() is the only cleanup needed
+    _trace_memory = shared_memory.SharedMemory(name=name)
+    _trace = np.ndarray(shape, dtype=np.float64, buffer=_trace_memory.buf)
+
+def _simulate(task):
+    follow_threshold, time_constant, distances, fov_deg, aspect = task
+    timestamps = _trace[:, 0]
+    quaternions = _trace[:, 1:]
+    displays, triggers = simulate_follow(timestamps, quaternions, follow_threshold, time_constant)
+    rows = score_follow(timestamps, quaternions, displays, triggers, distances, fov_deg, aspect)
+    return [dict(row, follow_threshold=follow_threshold, time_constant=time_constant) for row in rows]
+
+def sweep(timestamps, quaternions, thresholds, distances, time_constants=(DEFAULT_TIME_CONSTANT_S,),
+          jobs=None, fov_deg=DEFAULT_FOV_DEG, aspect=DEFAULT_ASPECT, weights=None, max_off_view=MAX_OFF_VIEW):
+    """Simulate every threshold and time constant, score every distance, and rank the results.
+
+    Distances at which the display does not fit in the field of view
+    are left out; ValueError is raised if none is left. jobs is the
+    number of worker processes (None: one per CPU; 1 runs in this
+    process).
+    """
+    global _trace
+    feasible = feasible_distances(distances, fov_deg, aspect)
+    dropped = [float(d) for d in distances if float(d) not in feasible]
+    if dropped:
+        logger.warning("Skipping distances %s: the display does not fit in a %.0f degree field of view",
+                       ', '.join(f"{d:g}" for d in dropped), fov_deg)
+    if not feasible:
+        raise ValueError("no display distance in the sweep fits in the field of view")
+    trace_shape = (len(timestamps), 5)
+    tasks = [(float(threshold), float(time_constant), feasible, fov_deg, aspect)
+             for threshold in thresholds for time_constant in time_constants]
+    if jobs == 1:
+        _trace = np.empty(trace_shape)
+        _trace[:, 0] = timestamps
+        _trace[:, 1:] = quaternions
+        try:
+            rows = [row for task in tasks for row in _simulate(task)]
+        finally:
+            _trace = None
+        return rank(rows, weights, max_off_view)
+
+    memory = shared_memory.SharedMemory(create=True, size=int(np.prod(trace_shape)) * 8)
+    try:
+        trace = np.ndarray(trace_shape, dtype=np.float64, buffer=memory.buf)
+        trace[:, 0] = timestamps
+        trace[:, 1:] = quaternions
+        del trace
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_attach_trace,
+                                 initargs=(memory.name, trace_shape)) as pool:
+            rows = [row for rows in pool.map(_simulate, tasks) for row in rows]
+    finally:
+        memory.close()
+        memory.unlink()
+    return rank(rows, weights, max_off_view)
+
+def format_table(results, limit=None):
+    lines = [f"{'rank':>4} {'threshold':>9} {'tau_s':>6} {'distance':>8} {'off_view':>8} "
+             f"{'triggers/min':>12} {'jerk':>10} {'offset_deg':>10} {'score':>6}"]
+    for i, r in enumerate(results[:limit], 1):
+        lines.append(f"{i:>4} {r.follow_threshold:>9.3f} {r.time_constant:>6.2f} {r.distance:>8.2f} "
+                     f"{r.off_view:>8.1%} {r.triggers_per_min:>12.1f} {r.jerk:>10.0f} "
+                     f"{r.mean_offset_deg:>10.2f} {r.score:>6.3f}")
+    return '\n'.join(lines)
+
+def save_profile(config, name, result):
+    """Store a result as a named Config profile of follow_threshold and display_distance."""
+    config.set_profile(name, {
+        'follow_threshold': result.follow_threshold,
+        'display_distance': result.distance,
+        'tuning': {
+            'follow_time_constant': result.time_constant,
+            'off_view': result.off_view,
+            'triggers_per_min': result.triggers_per_min,
+            'jerk': result.jerk,
+        },
+    })
+    config.flush()
+
+def _parse_values(text):
+    """'a,b,c' or 'start:stop:step' (stop included) as a list of floats."""
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        count = int(round((stop - start) / step)) + 1
+        return [round(start + i * step, 10) for i in range(count)]
+    return [float(part) for part in text.split(',')]
+
+def _parse_weights(text):
+    """'metric=weight,...' on top of DEFAULT_WEIGHTS."""
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in text.split(','):
+        metric, _, value = part.partition('=')
+        if metric not in METRICS:
+            raise argparse.ArgumentTypeError(f"unknown metric {metric}, expected one of {', '.join(METRICS)}")
+        weights[metric] = float(value)
+    return weights
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m core.tuning',
+                                     description='Sweep follow settings over a recorded trace.')
+    parser.add_argument('trace')
+    parser.add_argument('--thresholds', type=_parse_values, default=_parse_values('0.01:0.5:0.01'),
+                        help='follow thresholds in radians, a,b,c or start:stop:step')
+    parser.add_argument('--distances', type=_parse_values, default=_parse_values('1.05,1.25,1.5,2.0'),
+                        help='display distances in metres; those where the display overflows the view are skipped')
+    parser.add_argument('--time-constants', type=_parse_values, default=[DEFAULT_TIME_CONSTANT_S],
+                        help='follow time constants in seconds')
+    parser.add_argument('--weights', type=_parse_weights, default=None,
+                        help='ranking weights, e.g. off_view=2,triggers_per_min=1,jerk=0.5')
+    parser.add_argument('--max-off-view', type=float, default=MAX_OFF_VIEW,
+                        help='rank rows off view more than this fraction of the time last (default: 0.01)')
+    parser.add_argument('--fov', type=float, default=DEFAULT_FOV_DEG, help='diagonal FOV of the glasses')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--top', type=int, default=20, help='rows to print (0: all)')
+    parser.add_argument('--profile', help='save the best result as this config profile')
+    parser.add_argument('--config-dir', default=None,
+                        help='configuration directory (default: ~/.config/xfce4-xr-desktop)')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    timestamps, quaternions = load_imu_trace(args.trace)
+    if len(timestamps) < 4:
+        print(f"{args.trace} has too few IMU samples", file=sys.stderr)
+        return 1
+    try:
+        results = sweep(timestamps, quaternions, args.thresholds, args.distances, args.time_constants,
+                        jobs=args.jobs, fov_deg=args.fov, weights=args.weights,
+                        max_off_view=args.max_off_view)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(format_table(results, args.top or None))
+    if results[0].off_view > args.max_off_view:
+        print(f"No setting keeps the display in view {1 - args.max_off_view:.0%} of the time; "
+              f"try farther distances or shorter time constants", file=sys.stderr)
+    if args.profile:
+        save_profile(Config(config_dir=args.config_dir), args.profile, results[0])
+        print(f"Saved profile '{args.profile}'")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Virtual display provisioning through xrandr.
+
+RandR is the source of truth: every provision() queries the current
+outputs and modes, diffs them against the desired layout and applies
+whatever is missing in a single xrandr invocation, so a display costs
+one screen reconfiguration rather than one per --newmode, --addmode and
+--output step. When nothing differs (e.g. after a restart) no change
+is made at all. Modelines are computed with the VESA CVT formula, as
+``cvt`` does, and cached on disk by resolution and refresh rate.
+"""
+import os
+import re
+import json
+import logging
+import tempfile
+import subprocess
+from collections import namedtuple
+
+XRANDR_TIMEOUT_S = 10
+
+# CVT constants, as in the X server's xf86CVTMode()
+CVT_H_GRANULARITY = 8
+CVT_MIN_V_PORCH = 3
+CVT_MIN_V_BPORCH = 6
+CVT_MIN_VSYNC_BP = 550.0
+CVT_HSYNC_PERCENTAGE = 8
+CVT_M_PRIME = 600 * 128 / 256
+CVT_C_PRIME = (40 - 20) * 128 / 256 + 20
+CVT_CLOCK_STEP = 250
+CVT_RB_MIN_VBLANK = 460.0
+CVT_RB_H_SYNC = 32
+CVT_RB_H_BLANK = 160
+CVT_RB_VFPORCH = 3
+
+class Modeline(namedtuple('Modeline', 'name clock_mhz hdisplay hsync_start hsync_end htotal '
+                                      'vdisplay vsync_start vsync_end vtotal flags')):
+    __slots__ = ()
+
+    def xrandr_args(self):
+        """Arguments of ``xrandr --newmode`` for this mode."""
+        return [self.name, f'{self.clock_mhz:.2f}',
+                *(str(value) for value in self[2:10]), *self.flags]
+
+    @property
+    def refresh_hz(self):
+        return self.clock_mhz * 1e6 / (self.htotal * self.vtotal)
+
+VirtualDisplay = namedtuple('VirtualDisplay', 'output width height refresh_hz x y', defaults=(0, 0))
+
+OutputState = namedtuple('OutputState', 'name connected geometry modes current_mode')
+
+def _cvt_vsync_width(width, height):
+    """Vertical sync width, which CVT uses to encode the aspect ratio."""
+    if height % 3 == 0 and height * 4 // 3 == width:
+        return 4
+    if height % 9 == 0 and height * 16 // 9 == width:
+        return 5
+    if height % 10 == 0 and height * 16 // 10 == width:
+        return 6
+    if (height % 4 == 0 and height * 5 // 4 == width) or (height % 9 == 0 and height * 15 // 9 == width):
+        return 7
+    return 10
+
+def cvt_modeline(width, height, refresh_hz, reduced=False):
+    """Compute a CVT modeline, with the timings of ``cvt width height refresh_hz`` (``-r`` if reduced)."""
+    hdisplay = width - width % CVT_H_GRANULARITY
+    vsync = _cvt_vsync_width(width, height)
+    if reduced:
+        hperiod = (1000000.0 / refresh_hz - CVT_RB_MIN_VBLANK) / height
+        vblank_lines = max(int(CVT_RB_MIN_VBLANK / hperiod) + 1, CVT_RB_VFPORCH + vsync + CVT_MIN_V_BPORCH)
+        vtotal = height + vblank_lines
+        htotal = hdisplay + CVT_RB_H_BLANK
+        hsync_end = hdisplay + CVT_RB_H_BLANK // 2
+        hsync_start = hsync_end - CVT_RB_H_SYNC
+        vsync_start = height + CVT_RB_VFPORCH
+        flags = ('+hsync', '-vsync')
+        # cvt names these WxHR; the rate keeps names of different rates apart
+        name = f'{width}x{height}R_{refresh_hz:.2f}'
+    else:
+        hperiod = (1000000.0 / refresh_hz - CVT_MIN_VSYNC_BP) / (height + CVT_MIN_V_PORCH)
+        vsync_and_back_porch = max(int(CVT_MIN_VSYNC_BP / hperiod) + 1, vsync + CVT_MIN_V_BPORCH)
+        vtotal = height + vsync_and_back_porch + CVT_MIN_V_PORCH
+        hblank_percentage = max(CVT_C_PRIME - CVT_M_PRIME * hperiod / 1000.0, 20)
+        hblank = int(hdisplay * hblank_percentage / (100.0 - hblank_percentage))
+        hblank -= hblank % (2 * CVT_H_GRANULARITY)
+        htotal = hdisplay + hblank
+        hsync_end = hdisplay + hblank // 2
+        hsync_start = hsync_end - htotal * CVT_HSYNC_PERCENTAGE // 100
+        hsync_start += CVT_H_GRANULARITY - hsync_start % CVT_H_GRANULARITY
+        vsync_start = height + CVT_MIN_V_PORCH
+        flags = ('-hsync', '+vsync')
+        name = f'{width}x{height}_{refresh_hz:.2f}'
+    clock_khz = int(htotal * 1000.0 / hperiod)
+    clock_khz -= clock_khz % CVT_CLOCK_STEP
+    return Modeline(name, clock_khz / 1000.0, hdisplay, hsync_start, hsync_end, htotal,
+                    height, vsync_start, vsync_start + vsync, vtotal, flags)
+
+class ModelineCache:
+    """Modelines by resolution and refresh rate, persisted as JSON."""
+
+    def __init__(self, path=None, compute=cvt_modeline):
+        self.logger = logging.getLogger('xfce4_xr_desktop.virtual_display')
+        self._path = path or os.path.expanduser('~/.cache/xfce4-xr-desktop/modelines.json')
+        self._compute = compute
+        self._modelines = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(width, height, refresh_hz, reduced=False):
+        return f"{width}x{height}@{refresh_hz:.2f}{'R' if reduced else ''}"
+
+    def get(self, width, height, refresh_hz, reduced=False):
+        if self._modelines is None:
+            self._modelines = self._load()
+        key = self.key(width, height, refresh_hz, reduced)
+        modeline = self._modelines.get(key)
+        if modeline is not None:
+            self.hits += 1
+            return modeline
+        self.misses += 1
+        modeline = self._compute(width, height, refresh_hz, reduced)
+        self._modelines[key] = modeline
+        self._save()
+        return modeline
+
+    def _load(self):
+        try:
+            with open(self._path) as f:
+                entries = json.load(f)
+            return {key: Modeline(*entry[:-1], tuple(entry[-1])) for key, entry in entries.items()}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.logger.warning("Ignoring modeline cache %s: %s", self._path, e)
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self._path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.modelines.', suffix='.tmp', dir=directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({key: list(modeline) for key, modeline in self._modelines.items()}, f)
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            self.logger.warning("Could not save modeline cache: %s", e)
+
+_OUTPUT_RE = re.compile(r'^(\S+) (connected|disconnected|unknown connection)(?: primary)?'
+                        r'(?: (\d+)x(\d+)\+(\d+)\+(\d+))?')
+_MODE_RE = re.compile(r'^\s+(\S+)\s*(.*)$')
+
+def parse_xrandr_query(text):
+    """Parse ``xrandr --query`` output into {output name: OutputState}."""
+    outputs = {}
+    current = None
+    for line in text.splitlines():
+        match = _OUTPUT_RE.match(line)
+        if match:
+            name, connection = match.group(1), match.group(2)
+            geometry = tuple(int(value) for value in match.group(3, 4, 5, 6)) if match.group(3) else None
+            current = outputs[name] = OutputState(name, connection == 'connected', geometry, [], None)
+            continue
+        match = _MODE_RE.match(line)
+        if current is None or not match or line.startswith('Screen'):
+            continue
+        mode, rates = match.groups()
+        current.modes.append(mode)
+        if '*' in rates:
+            outputs[current.name] = current = current._replace(current_mode=mode)
+    return outputs
+
+def plan_changes(displays, outputs, modelines):
+    """xrandr arguments that bring the outputs to the desired displays, or [] if they match.
+
+    displays is a list of VirtualDisplay, outputs the parsed RandR state
+    and modelines the Modeline of each display. Modes are defined and
+    attached first, then the outputs are configured.
+    """
+    mode_args = []
+    output_args = []
+    # Modes attached to some output are known to exist
+    defined = {mode for state in outputs.values() for mode in state.modes}
+    for display, modeline in zip(displays, modelines):
+        state = outputs.get(display.output)
+        if state is None:
+            raise ValueError(f"output {display.output} not found")
+        if modeline.name not in state.modes:
+            if modeline.name not in defined:
+                mode_args += ['--newmode', *modeline.xrandr_args()]
+                defined.add(modeline.name)
+            mode_args += ['--addmode', display.output, modeline.name]
+        position = (display.x, display.y)
+        if state.current_mode != modeline.name or state.geometry is None or state.geometry[2:] != position:
+            output_args += ['--output', display.output, '--mode', modeline.name,
+                            '--pos', f'{display.x}x{display.y}']
+    return mode_args + output_args
+
+def _without_newmodes(args, modelines):
+    """args with the --newmode steps of modelines dropped, for modes that exist but are not attached."""
+    lengths = {modeline.name: len(modeline.xrandr_args()) for modeline in modelines}
+    result = []
+    i = 0
+    while i < len(args):
+        if args[i] == '--newmode':
+            # The step is the modeline's own arguments, named by the first
+            i += 1 + lengths[args[i + 1]]
+        else:
+            result.append(args[i])
+            i += 1
+    return result
+
+class VirtualDisplayProvisioner:
+    """Create, update and remove virtual displays with as few xrandr runs as possible."""
+
+    def __init__(self, xrandr_path='xrandr', display_name=None, cache=None):
+        self.logger = logging.getLogger('xfce4_xr_desktop.virtual_display')
+        self._xrandr_path = xrandr_path
+        self._display_args = ['--display', display_name] if display_name else []
+        self.cache = cache or ModelineCache()
+
+        # Counters
+        self.invocations = 0
+        self.applied_count = 0
+        self.noop_count = 0
+
+    def _run(self, args):
+        self.invocations += 1
+        return subprocess.run([self._xrandr_path, *self._display_args, *args], capture_output=True,
+                              text=True, timeout=XRANDR_TIMEOUT_S)
+
+    def query(self):
+        """Current RandR outputs, or None if xrandr failed."""
+        try:
+            result = self._run(['--query'])
+        except Exception as e:
+            self.logger.error("Error running xrandr: %s", e)
+            return None
+        if result.returncode != 0:
+            self.logger.error("xrandr --query failed: %s", result.stderr.strip())
+            return None
+        return parse_xrandr_query(result.stdout)
+
+    def provision(self, displays):
+        """Make the given VirtualDisplays active. Returns False on failure."""
+        outputs = self.query()
+        if outputs is None:
+            return False
+        try:
+            modelines = [self.cache.get(d.width, d.height, d.refresh_hz) for d in displays]
+            args = plan_changes(displays, outputs, modelines)
+        except ValueError as e:
+            self.logger.error("Cannot provision virtual displays: %s", e)
+            return False
+        if not args:
+            self.noop_count += 1
+            return True
+        return self._apply(args, modelines)
+
+    def remove(self, output_names):
+        """Turn off the given outputs, if they are active. Returns False on failure."""
+        outputs = self.query()
+        if outputs is None:
+            return False
+        args = []
+        for name in output_names:
+            state = outputs.get(name)
+            if state is not None and state.geometry is not None:
+                args += ['--output', name, '--off']
+        if not args:
+            self.noop_count += 1
+            return True
+        return self._apply(args)
+
+    def _apply(self, args, modelines=()):
+        try:
+            result = self._run(args)
+            if result.returncode != 0 and '--newmode' in args:
+                # The mode may survive from an earlier session without being
+                # attached to any output, in which case --newmode fails
+                self.logger.debug("xrandr failed (%s), retrying without --newmode", result.stderr.strip())
+                result = self._run(_without_newmodes(args, modelines))
+        except Exception as e:
+            self.logger.error("Error running xrandr: %s", e)
+            return False
+        if result.returncode != 0:
+            self.logger.error("xrandr failed: %s", result.stderr.strip())
+            return False
+        self.applied_count += 1
+        return True
@@ -1,124 +1,366 @@
 import os
 import logging
-from gi.repository import GObject
+from gi.repository import GObject, GLib, Gio
+from core.state_watcher import StateWatcher
+from core.control_queue import ControlQueue
+from core.control_ring import ControlRing
+from core.displays import DisplayRegistry, PRIMARY_DISPLAY
+from core.imu_reader import IMUReader
+from utils.latency import TRACER, STAGE_QUEUED
+
+# Control keys understood by XRLinuxDriver
+CONTROL_DISPLAY_DISTANCE = 'breezy_desktop_display_distance'
+CONTROL_SMOOTH_FOLLOW = 'enable_breezy_desktop_smooth_follow'
+CONTROL_FOLLOW_THRESHOLD = 'breezy_desktop_follow_threshold'
+CONTROL_SBS_MODE = 'sbs_mode'
+CONTROL_RECENTER = 'recenter_screen'
+
+# State key/value through which the driver reports Breezy Desktop mode
+DRIVER_MODE_KEY = 'external_mode'
+BREEZY_DESKTOP_MODE = 'breezy_desktop'
+
+# How long to wait for the CLI, and how long after it finished to wait for
+# the state file to report the mode before treating the driver as ready
+CLI_TIMEOUT_S = 5
+READY_FALLBACK_MS = 500
+
+# Primary display fields that have a driver control
+PRIMARY_DISPLAY_CONTROLS = ('distance', 'follow', 'follow_threshold')
+
+# Top-level config keys that held the primary display's settings before
+# the display registry, and the display fields they became. Profiles
+# (see core.tuning) use the same names.
+LEGACY_DISPLAY_KEYS = {
+    'display_distance': 'distance',
+    'follow_mode': 'follow',
+    'follow_threshold': 'follow_threshold',
+}
 
 class XRManager(GObject.Object):
     __gsignals__ = {
         'device-connected': (GObject.SignalFlags.RUN_FIRST, None, (bool,)),
+        'driver-ready': (GObject.SignalFlags.RUN_FIRST, None, ()),
         'display-distance-changed': (GObject.SignalFlags.RUN_FIRST, None, (float,)),
         'widescreen-mode-changed': (GObject.SignalFlags.RUN_FIRST, None, (bool,)),
+        'follow-mode-changed': (GObject.SignalFlags.RUN_FIRST, None, (bool,)),
+        'follow-threshold-changed': (GObject.SignalFlags.RUN_FIRST, None, (float,)),
+        # Committed display change set: {display id: set of changed fields, or None if removed}
+        'displays-changed': (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        # Every control command up to this ticket has been applied by the driver
+        'commands-applied': (GObject.SignalFlags.RUN_FIRST, None, (GObject.TYPE_UINT64,)),
     }
 
-    def __init__(self):
+    def __init__(self, control_rate_hz=30, shm_dir='/dev/shm', cli_path=None, config=None):
         super().__init__()
         self.logger = logging.getLogger('xfce4_xr_desktop.xr_manager')
+        self._config = config
         self._device_connected = False
-        self._display_distance = 1.05  # Default distance in meters
-        self._widescreen_mode = False
-        self._follow_mode = True
-        self._follow_threshold = 0.1  # Default threshold in radians
-        
-        # Paths for XR driver communication
-        self._control_path = '/dev/shm/xr_driver_control'
-        self._state_path = '/dev/shm/xr_driver_state'
-        self._cli_path = os.path.expanduser('~/.local/bin/xr_driver_cli')
+        self._widescreen_mode = bool(config.get('widescreen_mode', False)) if config is not None else False
+        self._driver_ready = False
+        self._cleaned_up = False
+        self._cli_cancellable = None
+        self._cli_timeout_source = 0
+        self._ready_fallback_source = 0
+
+        # Paths for XR driver communication; overridable so a recorded
+        # trace can be replayed into a fake shm directory (see core.trace)
+        self._control_path = os.path.join(shm_dir, 'xr_driver_control')
+        self._control_ring_path = os.path.join(shm_dir, 'xr_driver_control_ring')
+        self._state_path = os.path.join(shm_dir, 'xr_driver_state')
+        self._imu_path = os.path.join(shm_dir, 'breezy_desktop_imu')
+        self._cli_path = cli_path or os.path.expanduser('~/.local/bin/xr_driver_cli')
+
+        # Coalesces control commands and caps the write rate; uses the
+        # driver's control ring when it has one, else the control file
+        self._control_queue = ControlQueue(self._control_path, max_rate_hz=control_rate_hz,
+                                           ring=ControlRing(self._control_ring_path),
+                                           on_applied=self._on_commands_applied)
+
+        # Maps the IMU segment on its first read; nothing here reads it,
+        # it is shared with whoever displays or records the pose
+        self._imu_reader = IMUReader(self._imu_path)
+
+        # Watches the state file from the main loop, started in initialize()
+        self._state_watcher = StateWatcher(self._state_path)
+        self._state_watcher.connect('state-changed::device_connected',
+                                    self._on_device_connected_changed)
+        self._state_watcher.connect(f'state-changed::{DRIVER_MODE_KEY}',
+                                    self._on_driver_mode_changed)
+        # A restarted driver recreates its control ring
+        self._state_watcher.connect('polled', self._on_state_polled)
+
+        # Per-display state; the primary display's distance and follow
+        # settings are mirrored to the driver. The registry is the only
+        # writer of display settings to the config
+        self._displays = DisplayRegistry(on_changed=self._on_displays_changed, config=config)
+        legacy_fields = self._take_legacy_display_fields(config)
+        saved_displays = config.get('displays') if config is not None else None
+        if saved_displays:
+            try:
+                self._displays.load_config(saved_displays)
+            except (KeyError, TypeError, ValueError) as e:
+                self.logger.warning("Ignoring invalid saved displays: %s", e)
+        if PRIMARY_DISPLAY not in self._displays:
+            # Defaults: 1.05 m, smooth follow on with a 0.1 rad threshold,
+            # unless a config from before the registry had other values
+            fields = dict(distance=1.05, follow=True, follow_threshold=0.1)
+            fields.update(legacy_fields)
+            self._displays.add(PRIMARY_DISPLAY, **fields)
+
+    def _take_legacy_display_fields(self, config):
+        """Remove the pre-registry display keys from config; returns them as primary display fields."""
+        fields = {}
+        if config is None:
+            return fields
+        for key, field in LEGACY_DISPLAY_KEYS.items():
+            value = config.get(key)
+            if value is not None:
+                fields[field] = value
+                config.remove(key)
+        if fields:
+            self.logger.info("Migrating %s from the top level of the config to the displays",
+                             ', '.join(sorted(fields)))
+        return fields
 
     def initialize(self):
-        """Initialize the XR manager and check for device connection."""
+        """Initialize the XR manager and start the driver handshake.
+
+        Returns as soon as the handshake is started; 'driver-ready' is
+        emitted once the driver is in Breezy Desktop mode and the initial
+        control values have been sent.
+        """
         try:
             # Check if XR driver CLI exists
             if not os.path.exists(self._cli_path):
-                self.logger.error(f"XR driver CLI not found at {self._cli_path}")
+                self.logger.error("XR driver CLI not found at %s", self._cli_path)
                 return False
 
-            # Check if device is connected
-            self._check_device_connection()
-            
+            # Watch the driver state for device connection and mode changes
+            self._state_watcher.start()
+
             # Enable Breezy Desktop mode (required for smooth_follow commands to work)
             # This sets output_mode=external_only and external_mode=breezy_desktop
-            import subprocess
-            try:
-                result = subprocess.run([self._cli_path, '--breezy-desktop'],
-                                      capture_output=True, text=True, timeout=5)
-                if result.returncode == 0:
-                    self.logger.info("Breezy Desktop mode enabled")
-                else:
-                    self.logger.warning(f"Failed to enable Breezy Desktop mode: {result.stderr}")
-            except Exception as e:
-                self.logger.warning(f"Could not enable Breezy Desktop mode: {str(e)}")
-
-            # Wait a moment for mode to activate
-            import time
-            time.sleep(0.5)
-
-            # Set up initial state
-            self._write_control('breezy_desktop_display_distance', str(self._display_distance))
-            self._write_control('enable_breezy_desktop_smooth_follow', 'true' if self._follow_mode else 'false')
-            self._write_control('breezy_desktop_follow_threshold', str(self._follow_threshold))
-            
+            self._enable_breezy_desktop()
             return True
         except Exception as e:
-            self.logger.error(f"Failed to initialize XR manager: {str(e)}")
+            self.logger.error("Failed to initialize XR manager: %s", e)
             return False
 
+    def _enable_breezy_desktop(self):
+        """Run the driver CLI asynchronously to switch to Breezy Desktop mode."""
+        try:
+            process = Gio.Subprocess.new([self._cli_path, '--breezy-desktop'],
+                                         Gio.SubprocessFlags.STDOUT_PIPE | Gio.SubprocessFlags.STDERR_PIPE)
+            self._cli_cancellable = Gio.Cancellable()
+            process.communicate_utf8_async(None, self._cli_cancellable, self._on_cli_finished)
+            self._cli_timeout_source = GLib.timeout_add_seconds(CLI_TIMEOUT_S, self._on_cli_timeout, process)
+        except Exception as e:
+            self.logger.warning("Could not enable Breezy Desktop mode: %s", e)
+            self._start_ready_fallback()
+
+    def _on_cli_finished(self, process, result):
+        if self._cli_timeout_source:
+            GLib.source_remove(self._cli_timeout_source)
+            self._cli_timeout_source = 0
+        try:
+            _, _, stderr = process.communicate_utf8_finish(result)
+        except GLib.Error as e:
+            if not e.matches(Gio.io_error_quark(), Gio.IOErrorEnum.CANCELLED):
+                self.logger.warning("Could not enable Breezy Desktop mode: %s", e.message)
+                self._start_ready_fallback()
+            return
+        if process.get_successful():
+            self.logger.info("Breezy Desktop mode enabled")
+        else:
+            self.logger.warning("Failed to enable Breezy Desktop mode: %s", stderr)
+        self._start_ready_fallback()
+
+    def _on_cli_timeout(self, process):
+        self._cli_timeout_source = 0
+        self.logger.warning("XR driver CLI did not finish within %ss", CLI_TIMEOUT_S)
+        process.force_exit()
+        return GLib.SOURCE_REMOVE
+
+    def _start_ready_fallback(self):
+        """Treat the driver as ready shortly after the CLI, if the state never reports the mode."""
+        if self._driver_ready or self._ready_fallback_source:
+            return
+        self._ready_fallback_source = GLib.timeout_add(READY_FALLBACK_MS, self._on_ready_fallback)
+
+    def _on_ready_fallback(self):
+        self._ready_fallback_source = 0
+        self.logger.debug("Driver did not report its mode, assuming it is ready")
+        self._set_driver_ready()
+        return GLib.SOURCE_REMOVE
+
+    def _on_driver_mode_changed(self, watcher, key, value):
+        if value == BREEZY_DESKTOP_MODE:
+            self._set_driver_ready()
+
+    def _set_driver_ready(self):
+        if self._driver_ready:
+            return
+        if self._ready_fallback_source:
+            GLib.source_remove(self._ready_fallback_source)
+            self._ready_fallback_source = 0
+        self._driver_ready = True
+
+        # Set up initial state, in a single write
+        self._write_primary_controls(PRIMARY_DISPLAY_CONTROLS)
+        if self._widescreen_mode:
+            self._write_control(CONTROL_SBS_MODE, 'enable')
+        self._control_queue.flush()
+        self.emit('driver-ready')
+
     def cleanup(self):
-        """Clean up resources and disable XR mode."""
+        """Clean up resources and disable XR mode. Only the first call does anything."""
+        if self._cleaned_up:
+            return
+        self._cleaned_up = True
+        self._state_watcher.stop()
+        self._imu_reader.close()
+        if self._cli_cancellable:
+            self._cli_cancellable.cancel()
+        for source in (self._cli_timeout_source, self._ready_fallback_source):
+            if source:
+                GLib.source_remove(source)
+        self._cli_timeout_source = 0
+        self._ready_fallback_source = 0
         try:
             # XRLinuxDriver doesn't have a disable_xr command via control flags
             # The driver can be disabled via config file or CLI, but not via control flags
             # For now, just disable follow mode
-            self._write_control('enable_breezy_desktop_smooth_follow', 'false')
+            self._write_control(CONTROL_SMOOTH_FOLLOW, 'false')
+            self._control_queue.close()
         except Exception as e:
-            self.logger.error(f"Error during cleanup: {str(e)}")
+            self.logger.error("Error during cleanup: %s", e)
 
     def _check_device_connection(self):
-        """Check if a supported XR device is connected."""
+        """Check if a supported XR device is connected.
+
+        The state watcher already tracks the file; this only forces a
+        re-check, and device-connected is emitted only if it changed.
+        """
         try:
-            if not os.path.exists(self._state_path):
-                self._device_connected = False
-                self.emit('device-connected', False)
-                return
-
-            with open(self._state_path, 'r') as f:
-                state = dict(line.strip().split('=') for line in f if '=' in line)
-            
-            self._device_connected = state.get('device_connected', 'false').lower() == 'true'
-            self.emit('device-connected', self._device_connected)
-            
+            self._state_watcher.check()
         except Exception as e:
-            self.logger.error(f"Error checking device connection: {str(e)}")
-            self._device_connected = False
-            self.emit('device-connected', False)
+            self.logger.error("Error checking device connection: %s", e)
+
+    def _on_state_polled(self, watcher):
+        self._control_queue.check_ring()
+
+    def _on_device_connected_changed(self, watcher, key, value):
+        """Handle device_connected changes reported by the state watcher."""
+        self._control_queue.check_ring()
+        connected = watcher.snapshot.device_connected
+        if connected != self._device_connected:
+            self._device_connected = connected
+            self.emit('device-connected', connected)
+
+    def _write_control(self, key, value, urgent=False):
+        """Queue a control command for the XR driver.
+
+        Commands are coalesced per key and written by the control queue at
+        a capped rate; urgent commands are written immediately. Returns
+        the command's ticket, for command_applied().
+        """
+        if TRACER.enabled:
+            TRACER.mark(key, STAGE_QUEUED)
+        return self._control_queue.submit(key, value, urgent=urgent)
+
+    def command_applied(self, ticket):
+        """Return True once the driver has applied the command with this ticket.
+
+        Tickets come from _write_control(), or from control_queue.last_ticket
+        right after a setter. 'commands-applied' is emitted as the driver
+        acknowledges commands.
+        """
+        return self._control_queue.applied(ticket)
+
+    def _on_commands_applied(self, applied_ticket):
+        self.emit('commands-applied', applied_ticket)
 
-    def _write_control(self, key, value):
-        """Write a control command to the XR driver."""
+    def _read_state(self):
+        """Read the current state from the XR driver, as a raw key/value dict."""
+        return dict(self.driver_state.raw)
+
+    def _on_displays_changed(self, changes):
+        """Send a committed change set of the primary display to the driver, then notify."""
+        primary_fields = changes.get(PRIMARY_DISPLAY) or set()
+        if self._driver_ready:
+            # Queued together, so the control queue writes them in one batch
+            self._write_primary_controls(primary_fields)
+        self.emit('displays-changed', changes)
+        if 'distance' in primary_fields:
+            self.emit('display-distance-changed', self.display_distance)
+        if 'follow' in primary_fields:
+            self.emit('follow-mode-changed', self.follow_mode)
+        if 'follow_threshold' in primary_fields:
+            self.emit('follow-threshold-changed', self.follow_threshold)
+
+    def _write_primary_controls(self, fields):
+        if 'distance' in fields:
+            self._write_control(CONTROL_DISPLAY_DISTANCE, str(self.display_distance))
+        if 'follow' in fields:
+            self._write_control(CONTROL_SMOOTH_FOLLOW, 'true' if self.follow_mode else 'false')
+        if 'follow_threshold' in fields:
+            self._write_control(CONTROL_FOLLOW_THRESHOLD, str(self.follow_threshold))
+
+    def update_displays(self, changes):
+        """Apply {display id: {field: value}} as one change set.
+
+        The driver and the config each get one batch for the whole set.
+        """
         try:
-            with open(self._control_path, 'w') as f:
-                f.write(f"{key}={value}\n")
+            with self._displays.batch():
+                for display_id, fields in changes.items():
+                    self._displays.set(display_id, **fields)
+            return True
         except Exception as e:
-            self.logger.error(f"Error writing control command: {str(e)}")
-            raise
+            self.logger.error("Error updating displays: %s", e)
+            return False
 
-    def _read_state(self):
-        """Read the current state from the XR driver."""
+    def apply_profile(self, name):
+        """Apply a config profile's settings to the primary display, as one change set.
+
+        Returns False if there is no such profile.
+        """
+        profile = self._config.get_profile(name) if self._config is not None else None
+        if profile is None:
+            self.logger.error("No profile named '%s'", name)
+            return False
+        fields = {field: profile[key] for key, field in LEGACY_DISPLAY_KEYS.items() if key in profile}
+        if not fields:
+            self.logger.warning("Profile '%s' has no display settings", name)
+            return True
+        return self.update_displays({PRIMARY_DISPLAY: fields})
+
+    def add_display(self, **fields):
+        """Add a virtual display; returns its id, or None on error."""
         try:
-            if not os.path.exists(self._state_path):
-                return {}
-            
-            with open(self._state_path, 'r') as f:
-                return dict(line.strip().split('=') for line in f if '=' in line)
+            return self._displays.add(**fields)
         except Exception as e:
-            self.logger.error(f"Error reading state: {str(e)}")
-            return {}
+            self.logger.error("Error adding display: %s", e)
+            return None
+
+    def remove_display(self, display_id):
+        """Remove a virtual display. The primary display cannot be removed."""
+        if display_id == PRIMARY_DISPLAY:
+            self.logger.error("The primary display cannot be removed")
+            return False
+        try:
+            self._displays.remove(display_id)
+            return True
+        except KeyError:
+            self.logger.error("No display with id %s", display_id)
+            return False
 
     def set_display_distance(self, distance):
         """Set the display distance in meters."""
         try:
-            self._display_distance = float(distance)
-            self._write_control('breezy_desktop_display_distance', str(self._display_distance))
-            self.emit('display-distance-changed', self._display_distance)
+            self._displays.set(PRIMARY_DISPLAY, distance=float(distance))
         except Exception as e:
-            self.logger.error(f"Error setting display distance: {str(e)}")
+            self.logger.error("Error setting display distance: %s", e)
 
     def toggle_widescreen_mode(self):
         """Toggle widescreen mode."""
@@ -126,42 +368,75 @@ class XRManager(GObject.Object):
             self._widescreen_mode = not self._widescreen_mode
             # XRLinuxDriver uses sbs_mode with "enable" or "disable" values
             sbs_value = 'enable' if self._widescreen_mode else 'disable'
-            self._write_control('sbs_mode', sbs_value)
+            self._write_control(CONTROL_SBS_MODE, sbs_value)
+            if self._config is not None:
+                self._config.widescreen_mode = self._widescreen_mode
             self.emit('widescreen-mode-changed', self._widescreen_mode)
         except Exception as e:
-            self.logger.error(f"Error toggling widescreen mode: {str(e)}")
+            self.logger.error("Error toggling widescreen mode: %s", e)
 
     def toggle_follow_mode(self):
         """Toggle smooth follow mode."""
         try:
-            self._follow_mode = not self._follow_mode
             # XRLinuxDriver uses enable_breezy_desktop_smooth_follow with true/false
-            self._write_control('enable_breezy_desktop_smooth_follow', 'true' if self._follow_mode else 'false')
+            self._displays.set(PRIMARY_DISPLAY, follow=not self.follow_mode)
         except Exception as e:
-            self.logger.error(f"Error toggling follow mode: {str(e)}")
+            self.logger.error("Error toggling follow mode: %s", e)
 
     def set_follow_threshold(self, threshold):
         """Set the follow threshold in radians."""
         try:
-            self._follow_threshold = float(threshold)
-            self._write_control('breezy_desktop_follow_threshold', str(self._follow_threshold))
+            self._displays.set(PRIMARY_DISPLAY, follow_threshold=float(threshold))
         except Exception as e:
-            self.logger.error(f"Error setting follow threshold: {str(e)}")
+            self.logger.error("Error setting follow threshold: %s", e)
 
     def recenter_display(self):
         """Recenter the display position."""
         try:
-            self._write_control('recenter_screen', 'true')
+            self._write_control(CONTROL_RECENTER, 'true')
         except Exception as e:
-            self.logger.error(f"Error recentering display: {str(e)}")
+            self.logger.error("Error recentering display: %s", e)
+
+    @property
+    def state_watcher(self):
+        return self._state_watcher
+
+    @property
+    def driver_state(self):
+        """Typed snapshot of the driver state (core.driver_state.DriverState).
+
+        Re-reads the state file only if it changed since the last check.
+        """
+        try:
+            self._state_watcher.check()
+        except Exception as e:
+            self.logger.error("Error reading state: %s", e)
+        return self._state_watcher.snapshot
+
+    @property
+    def imu_reader(self):
+        return self._imu_reader
+
+    @property
+    def control_queue(self):
+        return self._control_queue
+
+    @property
+    def driver_ready(self):
+        return self._driver_ready
 
     @property
     def device_connected(self):
         return self._device_connected
 
+    @property
+    def displays(self):
+        """The DisplayRegistry of all virtual displays."""
+        return self._displays
+
     @property
     def display_distance(self):
-        return self._display_distance
+        return self._displays.get(PRIMARY_DISPLAY, 'distance')
 
     @property
     def widescreen_mode(self):
@@ -169,4 +444,8 @@ class XRManager(GObject.Object):
 
     @property
     def follow_mode(self):
-        return self._follow_mode 
\ No newline at end of file
+        return self._displays.get(PRIMARY_DISPLAY, 'follow')
+
+    @property
+    def follow_threshold(self):
+        return self._displays.get(PRIMARY_DISPLAY, 'follow_threshold')
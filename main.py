@@ -1,57 +1,112 @@
 #!/usr/bin/env python3
 import sys
 import logging
+import argparse
 import signal
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk
+from gi.repository import Gtk, Gdk, GLib
 from core.xr_manager import XRManager
+from core.control_server import ControlServer, bind_socket
 from ui.main_window import MainWindow
 from utils.config import Config
+from utils.startup_timer import StartupTimer
+from utils.control_client import send_commands, socket_path
+from utils.latency import TRACER, default_export_path
+from utils.log import LoggingPipeline
 
 class XFCE4XRDesktop:
-    def __init__(self):
+    def __init__(self, args):
         self.logger = self._setup_logging()
-        self.config = Config()
-        self.xr_manager = XRManager()
+        self.startup_timer = StartupTimer()
+        self.args = args
+        self.config = Config(config_dir=args.config_dir)
+        TRACER.enabled = args.trace_latency or self.config.get('latency_tracing', False)
+        # Created in run() once this is known to be the only instance
+        self.xr_manager = None
         self.main_window = None
+        self.control_server = None
+        self.main_loop = None
         
         # Set up signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
+        signal.signal(signal.SIGUSR1, self._dump_log_ring)
 
     def _signal_handler(self, signum, frame):
         """Handle interrupt signals gracefully."""
-        self.logger.info(f"Received signal {signum}, shutting down...")
+        self.logger.info("Received signal %s, shutting down...", signum)
+        self.config.flush()
         if self.main_window:
             self.main_window.destroy()
-        Gtk.main_quit()
+        self._quit()
+
+    def _quit(self):
+        if self.main_loop:
+            self.main_loop.quit()
+        else:
+            Gtk.main_quit()
 
     def _setup_logging(self):
-        logger = logging.getLogger('xfce4_xr_desktop')
-        logger.setLevel(logging.DEBUG)
-        
-        # Console handler
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        
-        # Formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        ch.setFormatter(formatter)
-        
-        logger.addHandler(ch)
-        return logger
+        # Console and file output happen on the pipeline's listener thread
+        self.logging = LoggingPipeline().start()
+        return logging.getLogger('xfce4_xr_desktop')
+
+    def _dump_log_ring(self, signum, frame):
+        """Write out the per-frame log history on SIGUSR1."""
+        self.logging.dump_ring('SIGUSR1')
 
     def run(self):
+        # Only one instance talks to the driver, and owning the control
+        # socket decides which; a second launch just brings up the
+        # running instance's window, without touching the config
+        path = self.args.socket or socket_path()
+        try:
+            listener = bind_socket(path)
+            running = listener is None
+        except OSError as e:
+            self.logger.warning("Control socket unavailable, shortcuts via xfce4-xr-ctl will not work: %s", e)
+            listener = None
+            running = False
+        if running:
+            if self.args.headless:
+                self.logger.error("xfce4-xr-desktop is already running")
+                return False
+            self.logger.info("xfce4-xr-desktop is already running, presenting its window")
+            try:
+                return send_commands([{'cmd': 'present'}], path).get('ok', False)
+            except OSError as e:
+                self.logger.error("Could not reach the running instance: %s", e)
+                return False
+
         try:
-            # Initialize XR manager
+            # Migrates settings from older configs, so only built by the instance that owns them
+            self.xr_manager = XRManager(control_rate_hz=self.config.get('control_rate_hz', 30),
+                                        shm_dir=self.args.shm_dir,
+                                        cli_path=self.args.driver_cli,
+                                        config=self.config)
+            # Accept commands from xfce4-xr-ctl (e.g. bound to keyboard shortcuts)
+            self.control_server = ControlServer(self.xr_manager, path=path, on_present=self._present_window)
+            if listener is not None:
+                self.control_server.start(listener)
+
+            # Initialize XR manager; the driver handshake completes in the background
+            self.xr_manager.connect('driver-ready', lambda manager: self.startup_timer.mark('driver-ready'))
             if not self.xr_manager.initialize():
                 self.logger.error("Failed to initialize XR manager")
                 return False
 
+            if self.args.headless:
+                # No window until one is requested with 'xfce4-xr-ctl present'
+                self.main_loop = GLib.MainLoop()
+                self.main_loop.run()
+                return True
+
             # Create and show main window
             self.main_window = MainWindow(self.xr_manager, self.config)
             self.main_window.show_all()
+            self.startup_timer.mark('window-shown')
+            self.startup_timer.mark_first_frame(self.main_window)
 
             # Start the GTK main loop
             Gtk.main()
@@ -61,20 +116,57 @@ class XFCE4XRDesktop:
             self.logger.info("Interrupted by user")
             return True
         except Exception as e:
-            self.logger.error(f"Error running application: {str(e)}")
+            self.logger.error("Error running application: %s", e)
             return False
         finally:
             self.cleanup()
 
+    def _present_window(self):
+        """Show the window, creating it on demand in headless mode."""
+        if self.main_window is None:
+            # Closing a window opened on demand only hides it
+            self.main_window = MainWindow(self.xr_manager, self.config, hide_on_close=True)
+            self.main_window.show_all()
+        self.main_window.present()
+
     def cleanup(self):
+        self.startup_timer.save()
+        if TRACER.enabled:
+            try:
+                TRACER.export_json(default_export_path('json'))
+                TRACER.export_prometheus(default_export_path('prom'))
+            except Exception as e:
+                self.logger.error("Error exporting latency histograms: %s", e)
+        if self.control_server:
+            self.control_server.stop()
+        if self.config:
+            self.config.flush()
         if self.xr_manager:
             self.xr_manager.cleanup()
         if self.main_window:
             self.main_window.destroy()
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='XR desktop integration for XFCE4')
+    parser.add_argument('--shm-dir', default='/dev/shm',
+                        help='directory holding the XR driver state and control files')
+    parser.add_argument('--driver-cli', default=None,
+                        help='path to xr_driver_cli (default: ~/.local/bin/xr_driver_cli)')
+    parser.add_argument('--headless', action='store_true',
+                        help='run without a window, controlled through xfce4-xr-ctl')
+    parser.add_argument('--socket', default=None,
+                        help='control socket path (default: $XDG_RUNTIME_DIR/xfce4-xr-desktop.sock)')
+    parser.add_argument('--trace-latency', action='store_true',
+                        help='record command latency histograms (exported to ~/.cache/xfce4-xr-desktop on exit)')
+    parser.add_argument('--config-dir', default=None,
+                        help='configuration directory (default: ~/.config/xfce4-xr-desktop)')
+    return parser.parse_args(argv)
+
 def main():
-    app = XFCE4XRDesktop()
+    app = XFCE4XRDesktop(parse_args())
     success = app.run()
+    # Flush queued records; run() can return before cleanup()
+    app.logging.stop()
     sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
@@ -14,6 +14,7 @@ setup(
     entry_points={
         'console_scripts': [
             'xfce4-xr-desktop=main:main',
+            'xfce4-xr-ctl=utils.control_client:main',
         ],
     },
     author="Your Name",
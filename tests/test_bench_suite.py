@@ -0,0 +1,38 @@
+"""The regression suite's groups, compared with a baseline when XR_BENCH_BASELINE names one.
+
+Timings are only compared on request, since a baseline is only valid on
+the machine and load it was recorded with::
+
+    python -m benchmarks.bench_suite --save-baseline --baseline bench.json
+    XR_BENCH_BASELINE=bench.json python -m pytest tests/test_bench_suite.py
+
+The same-run checks of RELATIVE_CHECKS are made then too. Without it
+the groups still run, as a smoke test of the paths they measure.
+"""
+import os
+import pytest
+from benchmarks import bench_suite
+
+def check_against_baseline(results):
+    assert results
+    path = os.environ.get('XR_BENCH_BASELINE')
+    if not path:
+        return
+    failures = bench_suite.check_relative(results)
+    assert not failures, '; '.join(failures)
+    baseline = bench_suite.load_baseline(path)
+    assert baseline is not None, f"no baseline at {path}"
+    regressions = bench_suite.compare(results, baseline, bench_suite.DEFAULT_THRESHOLD)
+    assert not regressions, '; '.join(regressions)
+
+@pytest.mark.parametrize('group', [group for group in bench_suite.GROUPS if group not in bench_suite.GI_GROUPS])
+def test_group(group):
+    check_against_baseline(bench_suite.run_suite([group]))
+
+@pytest.mark.parametrize('group', bench_suite.GI_GROUPS)
+def test_gi_group(group):
+    pytest.importorskip('gi')
+    results = bench_suite.run_suite([group])
+    if not results:
+        pytest.skip(f"{group} did not run (no Xvfb)")
+    check_against_baseline(results)
@@ -0,0 +1,68 @@
+"""Damage handling of ScreenCapture, and its SHM path on a private Xvfb."""
+import pytest
+from core.capture import (ScreenCapture, clip_damage, coalesce_damage, load_library,
+                          FULL_FRAME_DAMAGE_RATIO, MAX_DAMAGE_RECTS)
+from benchmarks.xvfb import start_xvfb, stop_xvfb
+
+def test_damage_is_clipped_to_the_captured_area():
+    # Captured area: 100x50 at (200, 100)
+    rects = [
+        (210, 110, 10, 5),     # inside
+        (190, 90, 20, 20),     # overlaps the top left corner
+        (290, 140, 50, 50),    # overlaps the bottom right corner
+        (0, 0, 100, 100),      # left of the area
+        (300, 100, 10, 10),    # touches the right edge only
+    ]
+    assert clip_damage(rects, 200, 100, 100, 50) == [
+        (10, 10, 10, 5),
+        (0, 0, 10, 10),
+        (90, 40, 10, 10),
+    ]
+
+def test_small_damage_is_fetched_rect_by_rect():
+    rects = [(0, 0, 10, 10), (50, 20, 4, 8)]
+    grabs, ratio = coalesce_damage(rects, 100, 100)
+    assert grabs == rects
+    assert ratio == pytest.approx((100 + 32) / 10000)
+
+def test_no_damage_fetches_nothing():
+    assert coalesce_damage([], 100, 100) == ([], 0.0)
+
+def test_large_damage_becomes_a_full_grab():
+    # Just over the ratio, in two rectangles
+    height = int(100 * FULL_FRAME_DAMAGE_RATIO) + 1
+    grabs, ratio = coalesce_damage([(0, 0, 50, height), (50, 0, 50, height)], 100, 100)
+    assert grabs is None
+    assert ratio == pytest.approx(height / 100)
+
+def test_many_rects_become_a_full_grab():
+    rects = [(i, 0, 1, 1) for i in range(MAX_DAMAGE_RECTS + 1)]
+    grabs, ratio = coalesce_damage(rects, 1000, 1000)
+    assert grabs is None
+    assert ratio < FULL_FRAME_DAMAGE_RATIO
+    assert coalesce_damage(rects[:-1], 1000, 1000)[0] == rects[:-1]
+
+@pytest.fixture
+def xvfb_display():
+    if load_library('X11') is None:
+        pytest.skip("libX11 not found")
+    xvfb = start_xvfb(320, 240)
+    if xvfb is None:
+        pytest.skip("Xvfb not found")
+    process, display_name = xvfb
+    yield display_name
+    stop_xvfb(process)
+
+def test_shm_capture_of_an_area(xvfb_display):
+    capture = ScreenCapture(xvfb_display, geometry=(16, 8, 64, 32), use_damage=False)
+    try:
+        assert capture.open()
+        if not capture.uses_shm:
+            pytest.skip("MIT-SHM unavailable on Xvfb")
+        assert capture.capture()
+        assert capture.frame.shape == (32, 64, 4)
+        assert capture.dirty_rects == [(0, 0, 64, 32)]
+        assert capture.last_bytes_copied == 64 * 32 * 4
+        assert capture.full_grabs == 1
+    finally:
+        capture.close()
@@ -0,0 +1,99 @@
+"""Config's write-behind saves, atomic writes and default merging."""
+import os
+import json
+import time
+from utils import config as config_module
+from utils.config import Config
+
+def config_path(config_dir):
+    return os.path.join(config_dir, 'config.json')
+
+def read(config_dir):
+    with open(config_path(config_dir)) as f:
+        return json.load(f)
+
+def write(config_dir, data):
+    with open(config_path(config_dir), 'w') as f:
+        json.dump(data, f)
+
+def test_sets_are_coalesced_into_one_write(tmp_path):
+    write(tmp_path, {})
+    config = Config(config_dir=str(tmp_path), save_delay=0.05)
+    for i in range(50):
+        config.set('control_rate_hz', i + 1)
+    assert config.save_count == 0
+    deadline = time.monotonic() + 5
+    while config.save_count == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert config.save_count == 1
+    assert read(tmp_path)['control_rate_hz'] == 50
+    assert not config.dirty
+
+def test_flush_writes_synchronously_and_only_when_dirty(tmp_path):
+    write(tmp_path, {})
+    config = Config(config_dir=str(tmp_path), save_delay=3600)
+    config.set('latency_tracing', True)
+    config.flush()
+    assert read(tmp_path)['latency_tracing'] is True
+    config.flush()
+    config.set('latency_tracing', True)
+    config.flush()
+    assert config.save_count == 1
+
+def failing_replace(src, dst):
+    raise OSError("disk full")
+
+def test_failed_write_leaves_the_config_dirty(tmp_path, monkeypatch):
+    write(tmp_path, {})
+    config = Config(config_dir=str(tmp_path), save_delay=3600)
+    config.set('control_rate_hz', 60)
+    monkeypatch.setattr(config_module.os, 'replace', failing_replace)
+    config.flush()
+    assert config.dirty
+    assert config.save_count == 0
+    assert read(tmp_path) == {}
+
+    monkeypatch.undo()
+    config.flush()
+    assert not config.dirty
+    assert read(tmp_path)['control_rate_hz'] == 60
+
+def test_no_temp_files_are_left_behind(tmp_path, monkeypatch):
+    write(tmp_path, {})
+    config = Config(config_dir=str(tmp_path), save_delay=3600)
+    config.set('control_rate_hz', 60)
+    config.flush()
+    monkeypatch.setattr(config_module.os, 'replace', failing_replace)
+    config.set('control_rate_hz', 90)
+    config.flush()
+    assert sorted(os.listdir(tmp_path)) == ['config.json']
+
+def test_missing_file_is_written_with_the_defaults(tmp_path):
+    config = Config(config_dir=str(tmp_path / 'new'), save_delay=3600)
+    assert config.get('control_rate_hz') == 30
+    config.flush()
+    assert read(tmp_path / 'new')['keybindings']['recenter'] == '<Control><Super>space'
+
+def test_partial_nested_settings_are_merged_with_the_defaults(tmp_path):
+    write(tmp_path, {'keybindings': {'recenter': '<Super>r'}, 'unknown_key': 1})
+    config = Config(config_dir=str(tmp_path), save_delay=3600)
+    assert config.get_keybinding('recenter') == '<Super>r'
+    assert config.get_keybinding('toggle_follow') == '<Control><Super>f'
+    assert config.get('unknown_key') == 1
+    assert config.get('control_rate_hz') == 30
+
+def test_deep_merge_does_not_share_the_defaults():
+    defaults = {'a': {'b': 1, 'c': {'d': 2}}}
+    merged = config_module._deep_merge(defaults, {'a': {'c': {'e': 3}}})
+    assert merged == {'a': {'b': 1, 'c': {'d': 2, 'e': 3}}}
+    merged['a']['c']['d'] = 5
+    assert defaults['a']['c']['d'] == 2
+
+def test_keybinding_update_does_not_touch_saved_snapshots(tmp_path):
+    write(tmp_path, {})
+    config = Config(config_dir=str(tmp_path), save_delay=3600)
+    before = config.get('keybindings')
+    config.set_keybinding('recenter', '<Super>c')
+    assert before['recenter'] == '<Control><Super>space'
+    config.flush()
+    assert read(tmp_path)['keybindings']['recenter'] == '<Super>c'
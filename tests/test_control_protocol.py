@@ -0,0 +1,211 @@
+"""Control socket protocol: utils.control_client against ControlProtocol, without GTK."""
+import os
+import json
+import socket
+import threading
+from types import SimpleNamespace
+import pytest
+from core.control_protocol import MAX_LINE, ControlProtocol, Session
+from utils import control_client
+
+class FakeQueue:
+    def __init__(self, manager):
+        self._manager = manager
+        self.flushes = []
+
+    def flush(self):
+        self.flushes.append(list(self._manager.queued))
+        self._manager.queued.clear()
+        return True
+
+class FakeManager:
+    """The XRManager surface the protocol uses; control commands are only queued until flush()."""
+
+    def __init__(self):
+        self.queued = []
+        self.control_queue = FakeQueue(self)
+        self.state_watcher = SimpleNamespace(state={'device_connected': 'true', 'sbs_mode_enabled': 'false'})
+        self.driver_ready = True
+        self.device_connected = True
+        self.display_distance = 1.05
+        self.follow_mode = True
+        self.follow_threshold = 0.1
+        self.widescreen_mode = False
+
+    def recenter_display(self):
+        self.queued.append(('recenter_screen', 'true'))
+
+    def set_display_distance(self, distance):
+        self.display_distance = float(distance)
+        self.queued.append(('breezy_desktop_display_distance', self.display_distance))
+
+    def set_follow_threshold(self, threshold):
+        self.follow_threshold = float(threshold)
+        self.queued.append(('breezy_desktop_follow_threshold', self.follow_threshold))
+
+    def toggle_follow_mode(self):
+        self.follow_mode = not self.follow_mode
+        self.queued.append(('enable_breezy_desktop_smooth_follow', self.follow_mode))
+
+    def toggle_widescreen_mode(self):
+        self.widescreen_mode = not self.widescreen_mode
+        self.queued.append(('sbs_mode', self.widescreen_mode))
+
+    def apply_profile(self, name):
+        if name != 'calm':
+            return False
+        self.set_display_distance(1.5)
+        self.set_follow_threshold(0.2)
+        return True
+
+@pytest.fixture
+def manager():
+    return FakeManager()
+
+@pytest.fixture
+def protocol(manager):
+    return ControlProtocol(manager)
+
+class LineServer:
+    """Serve one connection on a Unix socket with a ControlProtocol, from a thread."""
+
+    def __init__(self, protocol, path):
+        self.protocol = protocol
+        self.session = Session()
+        self.connection = None
+        self.subscribed = threading.Event()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(path)
+        self._sock.listen(1)
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        self.connection, _ = self._sock.accept()
+        while True:
+            data = self.connection.recv(65536)
+            if not data:
+                break
+            responses, keep_open = self.protocol.receive(self.session, data)
+            for response in responses:
+                self.connection.sendall(json.dumps(response).encode() + b'\n')
+            if self.session.subscription is not None:
+                self.subscribed.set()
+            if not keep_open:
+                break
+        self.connection.close()
+
+    def publish(self, key, value):
+        event = self.protocol.state_event(self.session, key, value)
+        if event is not None:
+            self.connection.sendall(json.dumps(event).encode() + b'\n')
+
+    def close(self):
+        self._thread.join(timeout=2)
+        self._sock.close()
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return os.path.join(tmp_path, 'control.sock')
+
+def test_batch_is_flushed_once(protocol, manager, socket_path):
+    server = LineServer(protocol, socket_path)
+    commands = control_client.parse_commands(['set-distance', '1.3', 'toggle-follow', 'recenter'])
+    response = control_client.send_commands(commands, path=socket_path)
+    server.close()
+    assert response == {'ok': True, 'results': [True, True, True]}
+    assert manager.control_queue.flushes == [[('breezy_desktop_display_distance', 1.3),
+                                              ('enable_breezy_desktop_smooth_follow', False),
+                                              ('recenter_screen', 'true')]]
+
+def test_failed_command_does_not_stop_the_batch(protocol, manager, socket_path):
+    server = LineServer(protocol, socket_path)
+    response = control_client.send_commands([{'cmd': 'bogus'}, {'cmd': 'set_follow_threshold', 'value': 0.2},
+                                             {'cmd': 'present'}], path=socket_path)
+    server.close()
+    assert not response['ok']
+    assert response['results'][0] == {'error': "unknown command 'bogus'"}
+    assert response['results'][1] is True
+    assert 'error' in response['results'][2]
+    assert manager.control_queue.flushes == [[('breezy_desktop_follow_threshold', 0.2)]]
+
+def test_apply_profile(protocol, manager, socket_path):
+    server = LineServer(protocol, socket_path)
+    commands = control_client.parse_commands(['apply-profile', 'calm', 'apply-profile', 'missing'])
+    response = control_client.send_commands(commands, path=socket_path)
+    server.close()
+    assert response['results'] == [True, {'error': "cannot apply profile 'missing'"}]
+    assert manager.control_queue.flushes == [[('breezy_desktop_display_distance', 1.5),
+                                              ('breezy_desktop_follow_threshold', 0.2)]]
+
+def test_get_state(protocol, socket_path):
+    server = LineServer(protocol, socket_path)
+    response = control_client.send_commands([{'cmd': 'get_state'}], path=socket_path)
+    server.close()
+    state = response['results'][0]
+    assert state['display_distance'] == 1.05
+    assert state['driver_state']['device_connected'] == 'true'
+
+def test_subscribe_streams_matching_keys(protocol, socket_path):
+    server = LineServer(protocol, socket_path)
+    events = control_client.subscribe(['device_connected'], path=socket_path)
+    assert next(events) == {'ok': True, 'event': 'snapshot', 'state': {'device_connected': 'true'}}
+    assert server.subscribed.wait(2)
+    server.publish('sbs_mode_enabled', 'true')
+    server.publish('device_connected', 'false')
+    assert next(events) == {'event': 'state', 'key': 'device_connected', 'value': 'false'}
+    events.close()
+    server.close()
+
+def test_unsubscribed_session_gets_no_events(protocol):
+    session = Session()
+    assert protocol.state_event(session, 'device_connected', 'true') is None
+    protocol.handle_line(session, b'{"subscribe": []}')
+    assert protocol.state_event(session, 'anything', '1') == {'event': 'state', 'key': 'anything', 'value': '1'}
+
+@pytest.mark.parametrize('line, error', [
+    (b'{"commands": [', 'invalid JSON'),
+    (b'\xff\xfe', 'invalid JSON'),
+    (b'[1, 2]', 'request must be a JSON object'),
+    (b'{"commands": "recenter"}', "'commands' must be a list"),
+    (b'{"subscribe": 5}', "'subscribe' must be a list of state keys"),
+])
+def test_malformed_line(protocol, manager, line, error):
+    responses, keep_open = protocol.receive(Session(), line + b'\n')
+    assert responses == [{'ok': False, 'error': error}]
+    assert keep_open
+    assert manager.control_queue.flushes == []
+
+@pytest.mark.parametrize('command, error', [
+    ({'cmd': 'set_distance', 'value': 'abc'}, "'set_distance' needs a number, got 'abc'"),
+    ({'cmd': 'set_distance'}, "'set_distance' needs a number, got None"),
+    ({'cmd': 'set_distance', 'value': True}, "'set_distance' needs a number, got True"),
+    ({'cmd': 'set_follow_threshold', 'value': [0.1]}, "'set_follow_threshold' needs a number, got [0.1]"),
+    ({'cmd': 'set_follow_threshold', 'value': 'nan'}, "'set_follow_threshold' needs a finite number, got 'nan'"),
+    ({'cmd': 'apply_profile', 'value': 3}, "'apply_profile' needs a profile name, got 3"),
+])
+def test_bad_value_fails_the_command(protocol, manager, command, error):
+    response = protocol.handle_line(Session(), json.dumps({'commands': [command]}).encode())
+    assert response == {'ok': False, 'results': [{'error': error}], 'error': 'some commands failed'}
+    assert manager.control_queue.flushes == [[]]
+
+def test_numeric_string_value_is_converted(protocol, manager):
+    response = protocol.handle_line(Session(), b'{"commands": [{"cmd": "set_distance", "value": "1.4"}]}')
+    assert response['ok']
+    assert manager.display_distance == 1.4
+
+def test_command_that_is_not_an_object(protocol):
+    assert protocol.handle_line(Session(), b'{"commands": ["recenter"]}')['results'] == [
+        {'error': 'a command must be a JSON object'}]
+
+def test_lines_split_across_reads(protocol, manager):
+    session = Session()
+    assert protocol.receive(session, b'{"commands": [{"cmd": "rece') == ([], True)
+    responses, _ = protocol.receive(session, b'nter"}]}\n\n{"commands": []}\n')
+    assert responses == [{'ok': True, 'results': [True]}, {'ok': True, 'results': []}]
+    assert protocol.requests_handled == 2
+
+def test_oversized_line_closes_the_session(protocol):
+    responses, keep_open = protocol.receive(Session(), b'x' * (MAX_LINE + 1))
+    assert responses == [{'ok': False, 'error': 'request too large'}]
+    assert not keep_open
@@ -0,0 +1,143 @@
+"""ControlQueue against a control file and a fake driver ring."""
+import os
+import pytest
+
+pytest.importorskip('gi')
+
+from benchmarks.fake_driver import FakeRingConsumer
+from core.control_queue import ControlQueue
+from core.control_ring import ControlRing
+
+@pytest.fixture
+def paths(tmp_path):
+    return os.path.join(tmp_path, 'xr_driver_control'), os.path.join(tmp_path, 'xr_driver_control_ring')
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+def test_flush_does_not_look_for_the_ring_again(paths):
+    control_path, ring_path = paths
+    queue = ControlQueue(control_path, max_rate_hz=0, ring=ControlRing(ring_path))
+    queue.submit('sbs_mode', 'true')
+    assert read(control_path) == 'sbs_mode=true\n'
+
+    # The driver starts providing a ring: only check_ring() picks it up
+    consumer = FakeRingConsumer(ring_path)
+    queue.submit('sbs_mode', 'false')
+    assert read(control_path) == 'sbs_mode=false\n'
+    assert queue.check_ring()
+    queue.submit('sbs_mode', 'true')
+    assert consumer.poll() == [(1, 'sbs_mode', 'true')]
+    queue.close()
+    consumer.close()
+
+def replace_ring(consumer, ring_path, capacity=64):
+    """Driver restart: the old ring goes away and a new, empty one appears."""
+    consumer.close()
+    os.unlink(ring_path)
+    return FakeRingConsumer(ring_path, capacity=capacity)
+
+def test_check_ring_follows_a_replaced_ring(paths):
+    control_path, ring_path = paths
+    consumer = FakeRingConsumer(ring_path)
+    queue = ControlQueue(control_path, max_rate_hz=0, ring=ControlRing(ring_path))
+    ticket = queue.submit('breezy_desktop_display_distance', '1.2')
+    assert not queue.applied(ticket)
+
+    consumer = replace_ring(consumer, ring_path)
+    assert queue.check_ring()
+    queue.submit('breezy_desktop_display_distance', '1.3')
+    assert consumer.poll() == [(1, 'breezy_desktop_display_distance', '1.3')]
+    assert queue.applied(ticket)
+    queue.close()
+    consumer.close()
+
+def test_unacknowledged_commands_are_sent_again_on_a_new_ring(paths):
+    control_path, ring_path = paths
+    consumer = FakeRingConsumer(ring_path)
+    queue = ControlQueue(control_path, max_rate_hz=0, ring=ControlRing(ring_path))
+    applied = queue.submit('sbs_mode', 'enable')
+    assert consumer.poll() == [(1, 'sbs_mode', 'enable')]
+    first = queue.submit('breezy_desktop_display_distance', '1.2')
+    second = queue.submit('enable_breezy_desktop_smooth_follow', 'true')
+    third = queue.submit('breezy_desktop_display_distance', '1.4')
+    assert queue.applied(applied)
+
+    # The driver restarts before taking the last three commands
+    consumer = replace_ring(consumer, ring_path)
+    assert queue.check_ring()
+    assert not queue.applied(first)
+    assert queue.pending_count == 2
+    queue.flush()
+    # In their original order, one per key with the latest value
+    assert consumer.poll() == [(1, 'enable_breezy_desktop_smooth_follow', 'true'),
+                               (2, 'breezy_desktop_display_distance', '1.4')]
+    assert queue.applied(first) and queue.applied(second) and queue.applied(third)
+    queue.close()
+    consumer.close()
+
+def test_newer_value_wins_over_one_taken_back(paths):
+    control_path, ring_path = paths
+    consumer = FakeRingConsumer(ring_path)
+    queue = ControlQueue(control_path, max_rate_hz=1, ring=ControlRing(ring_path))
+    queue.submit('breezy_desktop_display_distance', '1.2')
+    consumer = replace_ring(consumer, ring_path)
+    queue.check_ring()
+    # Submitted after the restart, before the retry flush
+    queue.submit('breezy_desktop_display_distance', '1.5')
+    queue.flush()
+    assert consumer.poll() == [(1, 'breezy_desktop_display_distance', '1.5')]
+    queue.close()
+    consumer.close()
+
+def test_close_writes_what_the_full_ring_cannot_take(paths):
+    control_path, ring_path = paths
+    consumer = FakeRingConsumer(ring_path, capacity=2)
+    queue = ControlQueue(control_path, max_rate_hz=0, ring=ControlRing(ring_path))
+    for i in range(4):
+        queue.submit(f'key{i}', i)
+    assert queue.pending_count == 2
+    queue.close()
+    assert queue.pending_count == 0
+    assert read(control_path) == 'key2=2\nkey3=3\n'
+    assert consumer.poll() == [(1, 'key0', '0'), (2, 'key1', '1')]
+    consumer.close()
+
+def test_full_ring_is_checked_for_replacement(paths):
+    control_path, ring_path = paths
+    consumer = FakeRingConsumer(ring_path, capacity=2)
+    queue = ControlQueue(control_path, max_rate_hz=0, ring=ControlRing(ring_path))
+    for i in range(3):
+        queue.submit(f'key{i}', i)
+    assert queue.pending_count == 1 and queue.backpressure_count == 1
+
+    consumer.close()
+    os.unlink(ring_path)
+    consumer = FakeRingConsumer(ring_path, capacity=2)
+    queue.submit('key3', 3)
+    # The full ring was found replaced: the commands the old one never
+    # acknowledged go to the new one first, then what was held back
+    queue.flush()
+    assert consumer.poll() == [(1, 'key0', '0'), (2, 'key1', '1')]
+    queue.flush()
+    assert consumer.poll() == [(3, 'key2', '2'), (4, 'key3', '3')]
+    queue.close()
+    consumer.close()
+
+def test_failed_file_write_keeps_commands(paths, tmp_path):
+    control_path = os.path.join(tmp_path, 'missing', 'xr_driver_control')
+    queue = ControlQueue(control_path, max_rate_hz=0)
+    first = queue.submit('sbs_mode', 'true')
+    second = queue.submit('breezy_desktop_display_distance', '1.2')
+    assert queue.error_count == 2
+    assert queue.pending_count == 2
+    assert not queue.applied(first)
+
+    # Coalesced with what is still pending, in the order last set
+    third = queue.submit('sbs_mode', 'false')
+    os.mkdir(os.path.dirname(control_path))
+    assert queue.flush()
+    assert read(control_path) == 'breezy_desktop_display_distance=1.2\nsbs_mode=false\n'
+    assert queue.applied(first) and queue.applied(second) and queue.applied(third)
+    queue.close()
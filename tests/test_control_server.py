@@ -0,0 +1,129 @@
+"""ControlServer's socket plumbing: binding, partial writes and slow clients."""
+import os
+import json
+import socket
+import time
+import threading
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('gi')
+
+from gi.repository import GLib
+from core import control_server
+from core.control_server import ControlServer, _Client, bind_socket
+
+def spin(seconds=0.01):
+    context = GLib.MainContext.default()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        context.iteration(False)
+
+def connected_client(server):
+    """A _Client registered with the server, and the peer end of its socket."""
+    ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    ours.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    ours.setblocking(False)
+    client = _Client(ours)
+    server._clients.append(client)
+    return client, theirs
+
+@pytest.fixture
+def server(tmp_path):
+    return ControlServer(SimpleNamespace(state_watcher=None), path=str(tmp_path / 'control.sock'))
+
+def read_line(sock, timeout=5.0):
+    sock.setblocking(False)
+    data = b''
+    end = time.monotonic() + timeout
+    while not data.endswith(b'\n'):
+        assert time.monotonic() < end, f"only {len(data)} bytes arrived"
+        spin()
+        try:
+            data += sock.recv(65536)
+        except BlockingIOError:
+            pass
+    return data
+
+def test_message_larger_than_the_socket_buffer_arrives_whole(server):
+    client, peer = connected_client(server)
+    state = {f'key_{i}': 'x' * 100 for i in range(2000)}
+    assert server._send(client, {'event': 'snapshot', 'state': state})
+    assert client.output_source
+    assert json.loads(read_line(peer)) == {'event': 'snapshot', 'state': state}
+    assert not client.output and not client.output_source
+    server._close_client(client)
+    peer.close()
+
+def test_messages_keep_their_order_while_output_is_pending(server):
+    client, peer = connected_client(server)
+    big = 'x' * 200000
+    for i in range(3):
+        server._send(client, {'event': 'state', 'key': str(i), 'value': big})
+    data = b''
+    while data.count(b'\n') < 3:
+        data += read_line(peer)
+    assert [json.loads(line)['key'] for line in data.splitlines()] == ['0', '1', '2']
+    server._close_client(client)
+    peer.close()
+
+def test_client_that_does_not_read_is_dropped(server, monkeypatch):
+    monkeypatch.setattr(control_server, 'MAX_PENDING_OUTPUT', 64 * 1024)
+    client, peer = connected_client(server)
+    for i in range(100):
+        if not server._send(client, {'event': 'state', 'key': str(i), 'value': 'x' * 4096}):
+            break
+    assert client not in server._clients
+    peer.close()
+
+def test_closing_client_gets_its_output_first(server):
+    client, peer = connected_client(server)
+    server._send(client, {'ok': False, 'error': 'x' * 100000})
+    server._close_client_when_sent(client)
+    assert client.closing
+    line = read_line(peer)
+    assert json.loads(line)['ok'] is False
+    spin(0.05)
+    assert client not in server._clients
+    assert peer.recv(1) == b''
+    peer.close()
+
+def test_second_bind_reports_the_running_instance(tmp_path):
+    path = str(tmp_path / 'control.sock')
+    first = bind_socket(path)
+    assert first is not None
+    assert bind_socket(path) is None
+    assert ControlServer.instance_running(path)
+    first.close()
+
+def test_stale_socket_file_is_replaced(tmp_path):
+    path = str(tmp_path / 'control.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    assert os.path.exists(path)
+    sock = bind_socket(path)
+    assert sock is not None
+    assert ControlServer.instance_running(path)
+    sock.close()
+
+def test_racing_launches_get_one_socket(tmp_path):
+    path = str(tmp_path / 'control.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    barrier = threading.Barrier(8)
+    results = []
+
+    def launch():
+        barrier.wait()
+        results.append(bind_socket(path))
+    threads = [threading.Thread(target=launch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    winners = [sock for sock in results if sock is not None]
+    assert len(winners) == 1
+    assert ControlServer.instance_running(path)
+    winners[0].close()
@@ -0,0 +1,81 @@
+"""DisplayRegistry's change detection and batch rollback."""
+import pytest
+from core.displays import DisplayRegistry, PRIMARY_DISPLAY
+
+class RecordingConfig:
+    def __init__(self):
+        self.saved = []
+
+    def set(self, key, value):
+        self.saved.append((key, value))
+
+def make_registry(**kwargs):
+    changes = []
+    config = RecordingConfig()
+    registry = DisplayRegistry(capacity=2, on_changed=changes.append, config=config, **kwargs)
+    registry.add()
+    changes.clear()
+    config.saved.clear()
+    return registry, changes, config
+
+def test_offsets_are_compared_once_normalized():
+    registry, changes, config = make_registry()
+    assert registry.set(PRIMARY_DISPLAY, offset=(0.0, 0.0, 0.0, 2.0)) == set()
+    assert registry.set(PRIMARY_DISPLAY, offset=(0.0, 0.0, 1.0, 1.0)) == {'offset'}
+    stored = registry.get(PRIMARY_DISPLAY, 'offset')
+    assert stored == pytest.approx((0.0, 0.0, 0.7071068, 0.7071068))
+    # The same unnormalized input again is not a change
+    assert registry.set(PRIMARY_DISPLAY, offset=[0.0, 0.0, 1.0, 1.0]) == set()
+    assert registry.set(PRIMARY_DISPLAY, offset=stored) == set()
+    assert len(changes) == 1 and len(config.saved) == 1
+
+def test_values_are_compared_as_stored():
+    registry, changes, config = make_registry()
+    assert registry.set(PRIMARY_DISPLAY, distance=1, follow=1, curvature=0) == {'distance'}
+    assert registry.get(PRIMARY_DISPLAY, 'distance') == 1.0
+    assert registry.set(PRIMARY_DISPLAY, distance=1.0, follow=True) == set()
+    assert changes == [{PRIMARY_DISPLAY: {'distance'}}]
+
+def test_failed_batch_restores_the_displays():
+    registry, changes, config = make_registry()
+    before = registry.display(PRIMARY_DISPLAY)
+    with pytest.raises(ValueError):
+        with registry.batch():
+            registry.set(PRIMARY_DISPLAY, distance=2.0, follow=False)
+            # Past the capacity, so the arrays are reallocated
+            registry.add(distance=1.5)
+            registry.add(distance=1.6)
+            registry.set(PRIMARY_DISPLAY, curvature='flat')
+    assert registry.ids == [PRIMARY_DISPLAY]
+    assert registry.display(PRIMARY_DISPLAY) == before
+    assert len(registry.distances) == 1
+    assert changes == [] and config.saved == []
+    # The registry stays usable, and ids are handed out as before
+    assert registry.add() == PRIMARY_DISPLAY + 1
+    assert changes == [{PRIMARY_DISPLAY + 1: set(before)}]
+
+def test_failed_inner_batch_keeps_the_outer_changes():
+    registry, changes, config = make_registry()
+    with registry.batch():
+        registry.set(PRIMARY_DISPLAY, distance=2.0)
+        with pytest.raises(KeyError):
+            with registry.batch():
+                registry.set(PRIMARY_DISPLAY, distance=3.0)
+                registry.remove(PRIMARY_DISPLAY)
+                registry.set(PRIMARY_DISPLAY, distance=4.0)
+        assert registry.get(PRIMARY_DISPLAY, 'distance') == 2.0
+    assert changes == [{PRIMARY_DISPLAY: {'distance'}}]
+    assert registry.get(PRIMARY_DISPLAY, 'distance') == 2.0
+
+def test_removal_rolled_back_with_the_batch():
+    registry, changes, config = make_registry()
+    second = registry.add(distance=1.5)
+    changes.clear()
+    with pytest.raises(RuntimeError):
+        with registry.batch():
+            registry.remove(PRIMARY_DISPLAY)
+            raise RuntimeError
+    assert registry.ids == [PRIMARY_DISPLAY, second]
+    assert registry.index_of(second) == 1
+    assert registry.get(second, 'distance') == 1.5
+    assert changes == []
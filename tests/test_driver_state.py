@@ -0,0 +1,75 @@
+"""StateParser caching and torn-read handling."""
+import os
+import pytest
+from core.driver_state import StateParser
+
+@pytest.fixture
+def state_path(tmp_path):
+    return os.path.join(tmp_path, 'xr_driver_state')
+
+def write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+def test_unchanged_file_is_not_parsed_again(state_path):
+    write(state_path, 'device_connected=true\nbreezy_desktop_display_distance=1.2\n')
+    parser = StateParser(state_path)
+    state = parser.read()
+    assert state.device_connected is True
+    assert state.breezy_desktop_display_distance == 1.2
+    assert parser.read() is state
+    assert parser.parse_count == 1 and parser.cache_hits == 1
+
+def test_rewrite_reparses_changed_values(state_path):
+    write(state_path, 'heartbeat=1\nsbs_mode_enabled=true\nbreezy_desktop_display_distance=1.2\n')
+    parser = StateParser(state_path)
+    first = parser.read()
+    write(state_path, 'heartbeat=2\nsbs_mode_enabled=true\nbreezy_desktop_display_distance=1.5\nnew_key=x\n')
+    state = parser.read()
+    assert state is not first
+    assert state.heartbeat == 2
+    assert state.sbs_mode_enabled is True
+    assert state.breezy_desktop_display_distance == 1.5
+    assert state.raw['new_key'] == 'x'
+    # Keys the driver dropped go back to their defaults
+    write(state_path, 'heartbeat=3\n')
+    state = parser.read()
+    assert state.sbs_mode_enabled is False
+    assert state.breezy_desktop_display_distance == 1.05
+
+def test_missing_trailing_newline_is_accepted_once_stable(state_path):
+    write(state_path, 'device_connected=true\nsbs_mode_enabled=true')
+    parser = StateParser(state_path, max_retries=3)
+    state = parser.read()
+    assert state.sbs_mode_enabled is True
+    assert parser.retries == 3 and parser.invalid_reads == 0
+    # Cached like any other parse
+    assert parser.read() is state
+
+def test_empty_file_after_state_is_accepted_once_stable(state_path):
+    write(state_path, 'device_connected=true\n')
+    parser = StateParser(state_path)
+    assert parser.read().device_connected is True
+    write(state_path, '')
+    state = parser.read()
+    assert state.raw == {}
+    assert state.device_connected is False
+
+def test_bad_value_falls_back_to_default(state_path):
+    write(state_path, 'device_connected=maybe\nheartbeat=12\n')
+    state = StateParser(state_path).read()
+    assert state.device_connected is False
+    assert state.heartbeat == 12
+    assert state.raw['device_connected'] == 'maybe'
+
+def test_file_changing_during_retries_keeps_previous_state(state_path, monkeypatch):
+    write(state_path, 'device_connected=true\n')
+    parser = StateParser(state_path, max_retries=2)
+    previous = parser.read()
+    write(state_path, 'device_connected=false')
+    # Every read sees a new signature, as if the driver were mid-write
+    signatures = iter(range(100))
+    monkeypatch.setattr(parser, '_read_content',
+                        lambda: ((0, next(signatures), 1), 'device_connected=false'))
+    assert parser.read() is previous
+    assert parser.invalid_reads == 1
@@ -0,0 +1,78 @@
+"""FrameExchange's newest-frame and no-tearing guarantees."""
+import numpy as np
+import pytest
+from core.frame_exchange import FrameExchange
+from core.frame_scheduler import FakeClock
+from benchmarks.bench_frame_exchange import run
+
+def publish(exchange, value, timestamp=None):
+    exchange.back.fill(value)
+    return exchange.publish(timestamp)
+
+def test_nothing_to_acquire_before_the_first_publish():
+    exchange = FrameExchange(4, 2)
+    assert not exchange.acquire()
+    assert exchange.front_sequence == 0
+    assert exchange.consumed == 0
+
+def test_acquire_returns_the_published_frame():
+    exchange = FrameExchange(4, 2)
+    assert publish(exchange, 7) == 1
+    assert exchange.acquire()
+    assert exchange.front_sequence == 1
+    assert (exchange.front == 7).all()
+    assert np.asarray(exchange.front_memoryview).tobytes() == exchange.front.tobytes()
+
+def test_only_the_newest_frame_is_acquired():
+    exchange = FrameExchange(4, 2)
+    for value in (1, 2, 3):
+        publish(exchange, value)
+    assert exchange.acquire()
+    assert exchange.front_sequence == 3
+    assert (exchange.front == 3).all()
+    assert exchange.dropped == 2
+    # Nothing newer: the front stays as it is
+    assert not exchange.acquire()
+    assert exchange.front_sequence == 3
+    assert exchange.consumed == 1
+
+def test_producer_never_writes_into_the_front_buffer():
+    exchange = FrameExchange(4, 2)
+    publish(exchange, 1)
+    exchange.acquire()
+    front = exchange.front
+    for value in range(2, 10):
+        assert not np.shares_memory(exchange.back, front)
+        publish(exchange, value)
+        assert (front == 1).all()
+    assert exchange.front_sequence == 1
+    assert exchange.acquire()
+    assert (exchange.front == 9).all()
+
+def test_three_distinct_buffers():
+    exchange = FrameExchange(4, 2, channels=4)
+    assert exchange.nbytes == 3 * 4 * 2 * 4
+    publish(exchange, 1)
+    exchange.acquire()
+    publish(exchange, 2)
+    assert not np.shares_memory(exchange.back, exchange.front)
+
+def test_age_is_measured_on_the_exchange_clock():
+    clock = FakeClock(10.0)
+    exchange = FrameExchange(4, 2, clock=clock.now)
+    publish(exchange, 1)
+    clock.advance(0.004)
+    exchange.acquire()
+    assert exchange.front_timestamp == 10.0
+    publish(exchange, 2, timestamp=9.99)
+    exchange.acquire()
+    stats = exchange.stats()
+    assert stats['count'] == 2
+    assert stats['max_ms'] == pytest.approx(14.0)
+    assert stats['produced'] == 2 and stats['consumed'] == 2 and stats['dropped'] == 0
+
+def test_threads_see_no_torn_or_reordered_frames():
+    result = run(64, 64, 0, 0, 0.3)
+    assert result['consumed'] > 0
+    assert result['torn'] == 0
+    assert result['out_of_order'] == 0
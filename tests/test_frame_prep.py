@@ -0,0 +1,75 @@
+"""FramePrep's eye layout, channel order and damaged-region updates."""
+import numpy as np
+import pytest
+from core.frame_prep import FramePrep
+
+WIDTH, HEIGHT = 16, 6
+
+def known_frame(width=WIDTH, height=HEIGHT):
+    """BGRA frame whose pixel (x, y) is B=x, G=y, R=100+x, A=200+y."""
+    frame = np.empty((height, width, 4), dtype=np.uint8)
+    xs = np.arange(width, dtype=np.uint8)[None, :]
+    ys = np.arange(height, dtype=np.uint8)[:, None]
+    frame[..., 0] = xs
+    frame[..., 1] = ys
+    frame[..., 2] = 100 + xs
+    frame[..., 3] = 200 + ys
+    return frame
+
+def rgba(x, y):
+    return [100 + x, y, x, 200 + y]
+
+def test_sbs_halves_go_to_each_eye_as_rgba():
+    prep = FramePrep(WIDTH, HEIGHT, sbs=True)
+    left, right = prep.process(known_frame())
+    assert left.shape == right.shape == (HEIGHT, WIDTH // 2, 4)
+    for y in range(HEIGHT):
+        for x in range(WIDTH // 2):
+            assert list(left[y, x]) == rgba(x, y)
+            assert list(right[y, x]) == rgba(WIDTH // 2 + x, y)
+
+def test_without_sbs_both_eyes_share_the_frame():
+    frame = known_frame()
+    (eye,) = FramePrep(WIDTH, HEIGHT).process(frame)
+    assert list(eye[2, 11]) == rgba(11, 2)
+    (view,) = FramePrep(WIDTH, HEIGHT, swizzle=False).process(frame)
+    assert np.shares_memory(view, frame)
+    assert list(view[2, 11]) == list(frame[2, 11])
+
+def test_crop_and_downscale_sample_every_scale_th_pixel():
+    prep = FramePrep(WIDTH, HEIGHT, sbs=True, crop=(2, 2, 4, 4), scale=2)
+    left, right = prep.process(known_frame())
+    assert left.shape == (2, 2, 4)
+    for y in range(2):
+        for x in range(2):
+            assert list(left[y, x]) == rgba(2 + 2 * x, 2 + 2 * y)
+            assert list(right[y, x]) == rgba(WIDTH // 2 + 2 + 2 * x, 2 + 2 * y)
+
+def test_only_damaged_pixels_are_rewritten():
+    frame = known_frame()
+    prep = FramePrep(WIDTH, HEIGHT, sbs=True)
+    prep.process(frame)
+    before = [eye.copy() for eye in prep.outputs]
+    frame[1:3, 9:11] = (1, 2, 3, 4)
+    # A full-width damaged row is converted too
+    frame[5, :] = (5, 6, 7, 8)
+    left, right = prep.process(frame, [(9, 1, 2, 2), (0, 5, WIDTH, 1)])
+    assert prep.dirty_rects == [[(0, 5, 8, 1)], [(1, 1, 2, 2), (0, 5, 8, 1)]]
+    assert (left[:5] == before[0][:5]).all()
+    assert (left[5] == (7, 6, 5, 8)).all()
+    assert (right[1:3, 1:3] == (3, 2, 1, 4)).all()
+    assert list(right[0, 1]) == rgba(9, 0)
+    assert (right[5] == (7, 6, 5, 8)).all()
+
+def test_full_eye_larger_than_a_chunk():
+    # Enough rows to span several conversion chunks
+    frame = np.random.default_rng(0).integers(0, 256, (300, 512, 4), dtype=np.uint8)
+    left, right = FramePrep(512, 300, sbs=True).process(frame)
+    assert (left == frame[:, :256][..., [2, 1, 0, 3]]).all()
+    assert (right == frame[:, 256:][..., [2, 1, 0, 3]]).all()
+
+def test_crop_outside_the_eye_is_rejected():
+    with pytest.raises(ValueError):
+        FramePrep(WIDTH, HEIGHT, sbs=True, crop=(4, 0, 8, HEIGHT))
+    with pytest.raises(ValueError):
+        FramePrep(WIDTH, HEIGHT, scale=4)
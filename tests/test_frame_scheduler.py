@@ -0,0 +1,115 @@
+"""FrameScheduler's late latching and capture rate adaptation, on FakeClock."""
+import pytest
+from core.frame_scheduler import FrameScheduler, FakeClock
+
+REFRESH_HZ = 60.0
+PERIOD = 1.0 / REFRESH_HZ
+BUDGET = 0.75 * PERIOD
+
+class Renderer:
+    """Render callback taking `cost` seconds of fake time; records what it was called with."""
+
+    def __init__(self, clock, cost):
+        self.clock = clock
+        self.cost = cost
+        self.calls = []
+
+    def __call__(self, pose, deadline):
+        self.calls.append((pose, deadline))
+        self.clock.advance(self.cost)
+
+def make_scheduler(cost, **kwargs):
+    clock = FakeClock(100.0)
+    renderer = Renderer(clock, cost)
+    latches = []
+
+    def sample_pose(deadline):
+        latches.append((clock.now(), deadline))
+        return ('pose', deadline)
+    rates = []
+    scheduler = FrameScheduler(renderer, refresh_hz=REFRESH_HZ, clock=clock, pose_sampler=sample_pose,
+                               on_capture_rate_changed=rates.append, **kwargs)
+    return scheduler, clock, renderer, latches, rates
+
+def test_deadlines_follow_the_refresh_grid():
+    scheduler, clock, renderer, latches, rates = make_scheduler(0.002)
+    scheduler.run(frames=10)
+    deadlines = [deadline for _, deadline in renderer.calls]
+    assert deadlines[0] == pytest.approx(100.0 + PERIOD)
+    for previous, deadline in zip(deadlines, deadlines[1:]):
+        assert deadline - previous == pytest.approx(PERIOD)
+    assert scheduler.missed_deadlines == 0
+
+def test_pose_is_latched_as_late_as_the_render_estimate_allows():
+    cost = 0.004
+    margin = 0.001
+    scheduler, clock, renderer, latches, rates = make_scheduler(cost, latch_margin_s=margin)
+    scheduler.run(frames=120)
+    # The renderer gets the pose sampled for its own deadline
+    assert renderer.calls[-1] == (('pose', latches[-1][1]), latches[-1][1])
+    # Once the estimate has converged on the constant cost, the pose is
+    # sampled just before cost + margin ahead of the deadline
+    latch, deadline = latches[-1]
+    assert scheduler.render_estimate == pytest.approx(cost, abs=1e-4)
+    assert deadline - latch == pytest.approx(cost + margin, abs=2e-4)
+    assert deadline - latch >= cost
+    assert scheduler.missed_deadlines == 0
+
+def test_first_frame_latches_at_once():
+    # Before any measurement the estimate is the whole budget
+    scheduler, clock, renderer, latches, rates = make_scheduler(0.002)
+    scheduler.run_frame()
+    latch, deadline = latches[0]
+    assert deadline - latch == pytest.approx(BUDGET + 0.001)
+
+def test_a_late_frame_is_presented_at_the_next_vsync():
+    scheduler, clock, renderer, latches, rates = make_scheduler(0.002)
+    scheduler.run(frames=5)
+    renderer.cost = 1.5 * PERIOD
+    assert not scheduler.run_frame()
+    assert scheduler.missed_deadlines == 1
+    assert scheduler.skipped_vsyncs == 2
+    late_deadline = renderer.calls[-1][1]
+    renderer.cost = 0.002
+    scheduler.run_frame()
+    # Presented two vsyncs late, the next frame aims one period after that
+    assert renderer.calls[-1][1] == pytest.approx(late_deadline + 3 * PERIOD)
+
+def test_capture_rate_halves_under_sustained_overload():
+    scheduler, clock, renderer, latches, rates = make_scheduler(0.9 * PERIOD)
+    # A quarter second of frames over budget before each step
+    frames_per_step = int(REFRESH_HZ / 4)
+    scheduler.run(frames=frames_per_step - 1)
+    assert scheduler.capture_divisor == 1
+    scheduler.run(frames=1)
+    assert scheduler.capture_divisor == 2
+    assert rates == [REFRESH_HZ / 2]
+    scheduler.run(frames=10 * frames_per_step)
+    # Stops at max_capture_divisor
+    assert scheduler.capture_divisor == 8
+    assert rates == [REFRESH_HZ / 2, REFRESH_HZ / 4, REFRESH_HZ / 8]
+
+def test_capture_rate_recovers_once_comfortably_within_budget():
+    scheduler, clock, renderer, latches, rates = make_scheduler(0.9 * PERIOD, max_capture_divisor=4)
+    scheduler.run(frames=int(REFRESH_HZ))
+    assert scheduler.capture_divisor == 4
+    rates.clear()
+    renderer.cost = 0.001
+    # Until the estimate is under 60% of the budget nothing changes, then
+    # two seconds of relaxed frames are needed for each step down
+    scheduler.run(frames=int(2 * REFRESH_HZ))
+    assert scheduler.capture_divisor == 4
+    scheduler.run(frames=int(2 * REFRESH_HZ))
+    assert scheduler.capture_divisor == 2
+    scheduler.run(frames=int(2 * REFRESH_HZ) + 1)
+    assert scheduler.capture_divisor == 1
+    assert rates == [REFRESH_HZ / 2, REFRESH_HZ]
+    assert scheduler.capture_rate_hz == REFRESH_HZ
+
+def test_capture_rate_holds_between_the_thresholds():
+    # Over 60% of the budget but under it: neither overloaded nor relaxed
+    scheduler, clock, renderer, latches, rates = make_scheduler(0.8 * BUDGET)
+    scheduler.run(frames=int(5 * REFRESH_HZ))
+    assert scheduler.capture_divisor == 1
+    assert rates == []
+    assert scheduler.missed_deadlines == 0
@@ -0,0 +1,107 @@
+"""IMUReader against a fake IMU segment: torn-read retries and reopening."""
+import os
+import logging
+from types import SimpleNamespace
+import pytest
+from benchmarks.fake_driver import FakeIMUWriter
+from core.imu_reader import IMUReader, REOPEN_INTERVAL_S
+
+QUATERNION = (0.0, 0.0, 0.0, 1.0)
+
+@pytest.fixture
+def path(tmp_path):
+    return os.path.join(tmp_path, 'breezy_desktop_imu')
+
+@pytest.fixture
+def writer(path):
+    writer = FakeIMUWriter(path)
+    writer.write(QUATERNION, epoch_ms=1000)
+    yield writer
+    writer.close()
+
+class ChangingEpoch:
+    """Stands in for the reader's epoch view: the writer bumps the epoch during the first copies."""
+
+    def __init__(self, values):
+        self._values = list(values)
+
+    def __getitem__(self, index):
+        return self._values.pop(0) if len(self._values) > 1 else self._values[0]
+
+def test_valid_record(writer, path):
+    reader = IMUReader(path)
+    assert reader.read()
+    assert reader.timestamp_ms == 1000
+    assert tuple(reader.quaternion) == QUATERNION
+    assert (reader.retries, reader.failed_reads, reader.samples_seen) == (0, 0, 1)
+    # The same sample again is not a new one
+    assert reader.read()
+    assert reader.samples_seen == 1
+    reader.close()
+
+def test_bad_parity_is_retried_then_fails(writer, path):
+    reader = IMUReader(path, max_retries=3)
+    assert reader.open()
+    with open(path, 'r+b') as f:
+        f.seek(os.path.getsize(path) - 1)
+        parity = f.read(1)[0]
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([parity ^ 0xFF]))
+    assert not reader.read()
+    assert (reader.retries, reader.failed_reads, reader.samples_seen) == (3, 1, 0)
+
+    # The writer completes its update
+    writer.write(QUATERNION, epoch_ms=1001)
+    assert reader.read()
+    assert (reader.failed_reads, reader.samples_seen, reader.timestamp_ms) == (1, 1, 1001)
+    reader.close()
+
+def test_epoch_change_during_the_copy_is_retried(writer, path):
+    reader = IMUReader(path, max_retries=3)
+    assert reader.open()
+    # Attempt 1 sees 999 -> 1000 (torn), attempt 2 sees 1000 twice
+    reader._source_epoch = ChangingEpoch([999, 1000, 1000])
+    assert reader.read()
+    assert (reader.retries, reader.failed_reads, reader.timestamp_ms) == (1, 0, 1000)
+
+    reader._source_epoch = ChangingEpoch(range(100))
+    assert not reader.read()
+    assert (reader.retries, reader.failed_reads) == (4, 1)
+    reader.close()
+
+def test_missing_segment_is_retried_at_most_once_per_interval(path, caplog):
+    clock = SimpleNamespace(now=100.0)
+    reader = IMUReader(path, clock=lambda: clock.now)
+    caplog.set_level(logging.DEBUG, logger='xfce4_xr_desktop.imu_reader')
+    for _ in range(100):
+        assert not reader.read()
+    assert reader.open_attempts == 1
+
+    clock.now += REOPEN_INTERVAL_S
+    assert not reader.read()
+    assert reader.open_attempts == 2
+    # Logged once, and not as an error
+    messages = [record for record in caplog.records if 'not found' in record.getMessage()]
+    assert len(messages) == 1 and messages[0].levelno == logging.INFO
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
+
+    writer = FakeIMUWriter(path)
+    writer.write(QUATERNION, epoch_ms=5)
+    assert not reader.read()
+    clock.now += REOPEN_INTERVAL_S
+    assert reader.read()
+    assert reader.open_attempts == 3
+    assert reader.timestamp_ms == 5
+    reader.close()
+    writer.close()
+
+def test_short_segment_is_logged_once(path, caplog):
+    with open(path, 'wb') as f:
+        f.write(b'\0' * 8)
+    clock = SimpleNamespace(now=0.0)
+    reader = IMUReader(path, clock=lambda: clock.now)
+    for _ in range(3):
+        assert not reader.read()
+        clock.now += REOPEN_INTERVAL_S
+    assert reader.open_attempts == 3
+    assert len([record for record in caplog.records if record.levelno == logging.ERROR]) == 1
@@ -0,0 +1,21 @@
+"""Latency tracing acknowledgements from the driver state."""
+import pytest
+from utils.latency import ACK_STATE_KEYS, LatencyTracer, STAGE_UI, STAGE_WRITTEN
+
+@pytest.mark.parametrize('control_key, state_key', sorted(ACK_STATE_KEYS.items()))
+def test_state_change_acknowledges_written_command(control_key, state_key):
+    tracer = LatencyTracer()
+    tracer.enabled = True
+    tracer.mark(control_key, STAGE_UI, now=1.0)
+    tracer.mark(control_key, STAGE_WRITTEN, now=1.002)
+    tracer.state_changed(state_key, now=1.010)
+    spans = tracer.summaries()[control_key]
+    assert spans['ui_to_acknowledged']['count'] == 1
+    assert spans['written_to_acknowledged']['count'] == 1
+
+def test_state_change_before_write_is_not_an_acknowledgement():
+    tracer = LatencyTracer()
+    tracer.enabled = True
+    tracer.mark('breezy_desktop_display_distance', STAGE_UI, now=1.0)
+    tracer.state_changed('breezy_desktop_display_distance', now=1.001)
+    assert 'ui_to_acknowledged' not in tracer.summaries().get('breezy_desktop_display_distance', {})
@@ -0,0 +1,124 @@
+"""Rate limiting, the in-memory ring and the logging pipeline's shutdown."""
+import logging
+import pytest
+from utils.log import APP_LOGGER, LoggingPipeline, RateLimitFilter, RingBufferHandler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class CollectingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    @property
+    def messages(self):
+        return [record.getMessage() for record in self.records]
+
+def make_record(message, *args, name='xfce4_xr_desktop.test', level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 0, message, args, None)
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    clock = FakeClock()
+    limit = RateLimitFilter(rate_per_s=2.0, burst=3, clock=clock)
+    assert [limit.filter(make_record('x')) for _ in range(5)] == [True, True, True, False, False]
+    assert limit.suppressed == 2
+    # Half a second buys one token at 2/s
+    clock.now = 0.5
+    assert limit.filter(make_record('x'))
+    assert not limit.filter(make_record('x'))
+    # A long pause refills only up to the burst
+    clock.now = 100.0
+    assert [limit.filter(make_record('x')) for _ in range(4)] == [True, True, True, False]
+
+def test_buckets_are_per_logger_and_critical_is_exempt():
+    clock = FakeClock()
+    limit = RateLimitFilter(rate_per_s=1.0, burst=1, clock=clock)
+    assert limit.filter(make_record('a', name='one'))
+    assert not limit.filter(make_record('a', name='one'))
+    assert limit.filter(make_record('a', name='two'))
+    assert limit.filter(make_record('a', name='one', level=logging.CRITICAL))
+
+def test_next_record_through_reports_the_suppressed_count():
+    clock = FakeClock()
+    limit = RateLimitFilter(rate_per_s=1.0, burst=1, clock=clock)
+    limit.filter(make_record('first'))
+    for _ in range(3):
+        limit.filter(make_record('dropped'))
+    clock.now = 1.0
+    record = make_record('device %s gone', 'imu', level=logging.WARNING)
+    assert limit.filter(record)
+    assert record.getMessage() == 'device imu gone (3 similar messages suppressed)'
+    # Reported once
+    clock.now = 2.0
+    record = make_record('again')
+    assert limit.filter(record)
+    assert record.getMessage() == 'again'
+
+def test_ring_keeps_history_until_an_error():
+    target = CollectingHandler()
+    ring = RingBufferHandler(capacity=3, target=target)
+    for i in range(5):
+        ring.handle(make_record(f'frame {i}', level=logging.DEBUG))
+    assert target.records == []
+    # Warnings are forwarded without the history
+    ring.handle(make_record('slow frame', level=logging.WARNING))
+    assert target.messages == ['slow frame']
+    ring.handle(make_record('capture failed', level=logging.ERROR))
+    # Only the last `capacity` records, after a marker, then the error
+    assert target.messages[1:] == ['Log ring dump (error in xfce4_xr_desktop.test): 3 records',
+                                   'frame 2', 'frame 3', 'frame 4', 'capture failed']
+    assert ring.dumps == 1
+    assert len(ring.records) == 0
+
+def test_rate_limited_errors_dump_once():
+    target = CollectingHandler()
+    target.addFilter(RateLimitFilter(rate_per_s=1.0, burst=1, clock=FakeClock()))
+    ring = RingBufferHandler(capacity=10, target=target)
+    ring.handle(make_record('frame', level=logging.DEBUG))
+    for _ in range(5):
+        ring.handle(make_record('capture failed', level=logging.ERROR))
+    assert ring.dumps == 1
+    assert target.messages.count('capture failed') == 1
+
+def test_dump_on_request():
+    target = CollectingHandler()
+    ring = RingBufferHandler(capacity=10, target=target)
+    assert ring.dump() == 0
+    ring.handle(make_record('frame', level=logging.DEBUG))
+    assert ring.dump('diagnostics') == 1
+    assert target.messages == ['Log ring dump (diagnostics): 1 records', 'frame']
+
+@pytest.fixture
+def app_logger():
+    logger = logging.getLogger(APP_LOGGER)
+    level = logger.level
+    yield logger
+    logger.setLevel(level)
+
+def test_stop_writes_out_everything_queued(tmp_path, app_logger):
+    log_path = tmp_path / 'app.log'
+    pipeline = LoggingPipeline(log_path=str(log_path), console=False, hot_loggers=('xfce4_xr_desktop.hot',),
+                               rate_per_s=1000.0, burst=1000).start()
+    logger = logging.getLogger('xfce4_xr_desktop.test')
+    hot = logging.getLogger('xfce4_xr_desktop.hot')
+    for i in range(200):
+        logger.info("record %d", i)
+    hot.debug("buffered per-frame record")
+    assert pipeline.dump_ring() == 1
+    pipeline.stop()
+    lines = log_path.read_text().splitlines()
+    assert len(lines) == 202
+    assert lines[199].endswith('record 199')
+    assert lines[-1].endswith('buffered per-frame record')
+    # Handlers are detached, and stopping again does nothing
+    assert pipeline.queue_handler not in app_logger.handlers
+    assert pipeline.ring not in hot.handlers and hot.propagate
+    pipeline.stop()
@@ -0,0 +1,82 @@
+"""Display mesh geometry and the mesh cache."""
+import math
+import numpy as np
+import pytest
+from core.mesh import (MeshCache, REFERENCE_DISTANCE_M, display_size, generate_mesh, mesh_nbytes)
+
+RESOLUTION = (1920, 1080)
+FOV_DEG = 46.0
+
+def corner_half_tangent(mesh):
+    """tan of half the diagonal angle the display spans."""
+    x, y, z = mesh.vertices[0].astype(np.float64)
+    return math.hypot(x, y) / -z
+
+def test_display_fills_the_fov_at_the_reference_distance():
+    mesh = generate_mesh(RESOLUTION, FOV_DEG, REFERENCE_DISTANCE_M)
+    assert corner_half_tangent(mesh) == pytest.approx(math.tan(math.radians(FOV_DEG) / 2), rel=1e-6)
+    width, height = display_size(RESOLUTION, FOV_DEG)
+    assert width / height == pytest.approx(16 / 9)
+    assert math.hypot(width, height) / 2 == pytest.approx(math.tan(math.radians(FOV_DEG) / 2) * REFERENCE_DISTANCE_M)
+
+@pytest.mark.parametrize('distance', [0.5, 1.05, 2.0, 4.0])
+def test_angular_size_shrinks_with_distance(distance):
+    mesh = generate_mesh(RESOLUTION, FOV_DEG, distance)
+    reference = generate_mesh(RESOLUTION, FOV_DEG, REFERENCE_DISTANCE_M)
+    np.testing.assert_allclose(mesh.vertices[:, :2], reference.vertices[:, :2])
+    np.testing.assert_allclose(mesh.vertices[:, 2], -distance)
+    assert corner_half_tangent(mesh) == pytest.approx(
+        corner_half_tangent(reference) * REFERENCE_DISTANCE_M / distance, rel=1e-6)
+
+def test_curved_display_keeps_distance_and_width():
+    distance = 1.5
+    curved = generate_mesh(RESOLUTION, FOV_DEG, distance, curvature=1.0, subdivisions=64)
+    np.testing.assert_allclose(np.hypot(curved.vertices[:, 0], curved.vertices[:, 2]), distance, rtol=1e-5)
+    top_row = curved.vertices[:65].astype(np.float64)
+    arc = np.sum(np.hypot(np.diff(top_row[:, 0]), np.diff(top_row[:, 2])))
+    assert arc == pytest.approx(display_size(RESOLUTION, FOV_DEG)[0], rel=1e-3)
+
+def test_buffers():
+    mesh = generate_mesh(RESOLUTION, FOV_DEG, 1.05, subdivisions=32)
+    assert mesh.vertices.shape == (33 * 33, 3) and mesh.vertices.dtype == np.float32
+    assert mesh.indices.shape == (32 * 32 * 2, 3) and mesh.indices.dtype == np.uint16
+    assert mesh.indices.max() == 33 * 33 - 1
+    assert mesh.uvs[0].tolist() == [0.0, 0.0] and mesh.uvs[-1].tolist() == [1.0, 1.0]
+    assert not mesh.vertices.flags.writeable
+
+def test_cache_hits_on_quantized_geometry():
+    cache = MeshCache()
+    mesh = cache.get(RESOLUTION, FOV_DEG, 1.05)
+    # Within the distance quantization step
+    assert cache.get(RESOLUTION, FOV_DEG, 1.0501) is mesh
+    assert cache.get(RESOLUTION, FOV_DEG, 1.1) is not mesh
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.nbytes == 2 * mesh_nbytes(mesh)
+
+def test_cache_evicts_least_recently_used():
+    cache = MeshCache(max_entries=2)
+    first = cache.get(RESOLUTION, FOV_DEG, 1.0)
+    cache.get(RESOLUTION, FOV_DEG, 1.5)
+    assert cache.get(RESOLUTION, FOV_DEG, 1.0) is first
+    cache.get(RESOLUTION, FOV_DEG, 2.0)
+    assert len(cache) == 2 and cache.evictions == 1
+    # 1.5 was the least recently used
+    assert cache.get(RESOLUTION, FOV_DEG, 1.0) is first
+    misses = cache.misses
+    cache.get(RESOLUTION, FOV_DEG, 1.5)
+    assert cache.misses == misses + 1
+
+def test_cache_is_bounded_in_bytes():
+    size = mesh_nbytes(generate_mesh(RESOLUTION, FOV_DEG, 1.0, subdivisions=16))
+    cache = MeshCache(max_bytes=int(size * 2.5))
+    for distance in (1.0, 1.1, 1.2, 1.3):
+        cache.get(RESOLUTION, FOV_DEG, distance, subdivisions=16)
+    assert len(cache) == 2 and cache.nbytes == 2 * size and cache.evictions == 2
+
+def test_prefetch_around_fills_the_cache():
+    cache = MeshCache()
+    cache.prefetch_around(1.0, radius=2, resolution=RESOLUTION, fov_deg=FOV_DEG, subdivisions=8)
+    cache.wait_idle()
+    assert cache.prefetched == 5
+    cache.get(RESOLUTION, FOV_DEG, 1.1, subdivisions=8)
+    assert cache.hits == 1 and cache.misses == 0
@@ -0,0 +1,86 @@
+"""Golden values from Breezy Desktop's math.js, and the batched paths against the scalar port."""
+import math
+import numpy as np
+import pytest
+from benchmarks.bench_pose_math import scalar_rotate
+from core import pose_math
+
+SQRT_HALF = math.sqrt(0.5)
+
+# (diagonal FOV in degrees, aspect ratio) -> (horizontal, vertical) from diagonalToCrossFOVs
+CROSS_FOVS = (
+    ((46, 16 / 9), (0.7086927531214866, 0.4103503074706673)),
+    ((52, 16 / 9), (0.8039035641011618, 0.4694186423580695)),
+    ((90, 1.0), (1.2309594173407745, 1.2309594173407745)),
+)
+
+# (quaternion, vector) -> applyQuaternionToVector
+ROTATIONS = (
+    ((0, 0, SQRT_HALF, SQRT_HALF), (1, 0, 0), (0, 1, 0)),
+    ((SQRT_HALF, 0, 0, SQRT_HALF), (0, 1, 0), (0, 0, 1)),
+    ((0, 1, 0, 0), (1, 2, 3), (-1, 2, -3)),
+    ((0.1, 0.2, 0.3, math.sqrt(0.86)), (1.0, -2.0, 0.5),
+     (1.9883065893693983, -1.0363190752252147, -0.4718894796396564)),
+)
+
+def random_quaternions(rng, count):
+    quaternions = rng.normal(size=(count, 4))
+    return quaternions / np.linalg.norm(quaternions, axis=1)[:, np.newaxis]
+
+@pytest.mark.parametrize('inputs, expected', CROSS_FOVS)
+def test_diagonal_to_cross_fovs(inputs, expected):
+    diagonal, aspect = inputs
+    result = pose_math.diagonal_to_cross_fovs(math.radians(diagonal), aspect)
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-12)
+
+def test_diagonal_to_cross_fovs_batch():
+    diagonals = np.radians([inputs[0] for inputs, _ in CROSS_FOVS])
+    aspects = np.array([inputs[1] for inputs, _ in CROSS_FOVS])
+    out = np.empty((len(CROSS_FOVS), 2))
+    result = pose_math.diagonal_to_cross_fovs(diagonals, aspects, out=out)
+    assert result is out
+    np.testing.assert_allclose(result, [expected for _, expected in CROSS_FOVS], rtol=0, atol=1e-12)
+
+@pytest.mark.parametrize('quaternion, vector, expected', ROTATIONS)
+def test_apply_quaternion_to_vector(quaternion, vector, expected):
+    result = pose_math.apply_quaternion_to_vector(quaternion, [vector])
+    np.testing.assert_allclose(result[0], expected, rtol=0, atol=1e-12)
+
+def test_quaternion_multiply_and_conjugate():
+    i, j, k = (1, 0, 0, 0), (0, 1, 0, 0), (0, 0, 1, 0)
+    np.testing.assert_array_equal(pose_math.quaternion_multiply(i, j), k)
+    np.testing.assert_array_equal(pose_math.quaternion_multiply(j, i), np.negative(k))
+    np.testing.assert_array_equal(pose_math.quaternion_conjugate([[0.1, -0.2, 0.3, 0.9]]),
+                                  [[-0.1, 0.2, -0.3, 0.9]])
+
+def test_quaternion_multiply_out_aliases_input():
+    rng = np.random.default_rng(1)
+    a = random_quaternions(rng, 8)
+    b = random_quaternions(rng, 8)
+    expected = pose_math.quaternion_multiply(a, b)
+    pose_math.quaternion_multiply(a, b, out=a)
+    np.testing.assert_allclose(a, expected, rtol=0, atol=1e-15)
+
+def test_nwu_to_esu():
+    np.testing.assert_array_equal(pose_math.nwu_to_esu([[1, 2, 3]]), [[-2, 3, -1]])
+
+def test_normalize_vector_keeps_zero_vectors():
+    np.testing.assert_allclose(pose_math.normalize_vector([[3, 0, 4], [0, 0, 0]]),
+                               [[0.6, 0, 0.8], [0, 0, 0]])
+
+def test_flat_and_curved_fov():
+    edge = pose_math.FlatFOV.center_to_fov_edge_distance(1.0, 2.0)
+    assert edge == pytest.approx(math.sqrt(2))
+    assert pose_math.FlatFOV.fov_edge_to_screen_center_distance(edge, 2.0) == pytest.approx(1.0)
+    assert pose_math.FlatFOV.length_to_radians(None, 2.0, edge, 2.0) == pytest.approx(math.pi / 2)
+    assert pose_math.FlatFOV.radians_to_length(None, 2.0, edge, math.pi / 2) == pytest.approx(2.0)
+    assert pose_math.CurvedFOV.length_to_radians(1.2, 2.0, 1.0, 1.0) == pytest.approx(0.6)
+    assert pose_math.CurvedFOV.radians_to_length(1.2, 2.0, 1.0, 0.6) == pytest.approx(1.0)
+
+def test_vectorized_matches_scalar_port():
+    rng = np.random.default_rng(0)
+    quaternions = random_quaternions(rng, 16)
+    vectors = rng.uniform(-2, 2, size=(153, 3))
+    result = pose_math.Workspace().rotate(quaternions, vectors)
+    expected = [[scalar_rotate(q, v) for v in vectors] for q in quaternions]
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-12)
@@ -0,0 +1,43 @@
+"""Pose prediction replayed over a synthetic head-motion trace."""
+import os
+import pytest
+from benchmarks.bench_tuning import head_motion, write_trace
+from core import prediction
+
+HORIZONS_MS = (8, 16, 33)
+
+@pytest.fixture(scope='module')
+def motion():
+    return head_motion(duration_s=10)
+
+def test_history_span_and_velocity():
+    history = prediction.PoseHistory(capacity=8)
+    for i in range(6):
+        history.push(i * 0.001, prediction._rotvec_to_quat((0.0, 0.0, 0.002 * i)))
+    assert history.span(0.0025) == 3
+    assert history.span(1.0) == 5
+    assert history.span(0.001, age=5) == 0
+    assert history.angular_velocity(0, 3)[2] == pytest.approx(2.0)
+
+@pytest.mark.parametrize('name', ['constant_velocity', 'angular_acceleration'])
+def test_prediction_beats_no_prediction(motion, name):
+    comparison = prediction.compare(*motion, prediction.PREDICTORS[name](), HORIZONS_MS)
+    assert sorted(comparison) == list(HORIZONS_MS)
+    for horizon, (predicted, unpredicted) in comparison.items():
+        assert predicted['samples'] == unpredicted['samples']
+        assert predicted['mean_deg'] <= unpredicted['mean_deg'], f"worse at {horizon} ms"
+
+def test_follow_clamps_prediction(motion):
+    timestamps, quaternions = motion
+    free = prediction.evaluate(timestamps, quaternions, prediction.ConstantVelocityPredictor(), [33])
+    clamped = prediction.evaluate(timestamps, quaternions, prediction.ConstantVelocityPredictor(), [33],
+                                  follow_mode=True, follow_threshold=0.0)
+    none = prediction.evaluate(timestamps, quaternions, prediction.NoPrediction(), [33])
+    assert clamped[33]['mean_deg'] == pytest.approx(none[33]['mean_deg'])
+    assert free[33]['mean_deg'] < clamped[33]['mean_deg']
+
+def test_main_replays_trace(tmp_path, motion, capsys):
+    path = os.path.join(tmp_path, 'head.trace')
+    write_trace(path, *motion)
+    assert prediction.main([path, '--predictor', 'angular_acceleration', '--horizons', '8,16']) == 0
+    assert 'none_mean' in capsys.readouterr().out
@@ -0,0 +1,97 @@
+"""StateWatcher against a state file, driven from the default GLib main context."""
+import os
+import time
+import pytest
+
+pytest.importorskip('gi')
+
+from gi.repository import GLib, Gio
+from core.state_watcher import StateWatcher
+
+TIMEOUT_S = 5.0
+
+def write_state(path, state):
+    with open(path, 'w') as f:
+        f.write(''.join(f"{key}={value}\n" for key, value in state.items()))
+
+def spin_until(predicate, timeout=TIMEOUT_S):
+    context = GLib.MainContext.default()
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            return False
+        context.iteration(False)
+        time.sleep(0.001)
+    return True
+
+@pytest.fixture
+def state_path(tmp_path):
+    path = os.path.join(tmp_path, 'xr_driver_state')
+    write_state(path, {'device_connected': 'false', 'sbs_mode_enabled': 'false'})
+    return path
+
+@pytest.fixture
+def watcher(state_path):
+    watcher = StateWatcher(state_path, min_interval_ms=10, poll_interval_s=1)
+    yield watcher
+    watcher.stop()
+
+def test_initial_read(watcher):
+    watcher.start()
+    assert spin_until(lambda: watcher.get('device_connected') == 'false')
+    assert watcher.state == {'device_connected': 'false', 'sbs_mode_enabled': 'false'}
+
+def test_changes_are_emitted_per_key_with_detail(watcher, state_path):
+    watcher.start()
+    assert spin_until(lambda: watcher.parse_count > 0)
+    detailed = []
+    every = []
+    watcher.connect('state-changed::device_connected', lambda w, key, value: detailed.append((key, value)))
+    watcher.connect('state-changed', lambda w, key, value: every.append((key, value)))
+
+    write_state(state_path, {'device_connected': 'true', 'sbs_mode_enabled': 'false', 'external_mode': 'none'})
+    assert spin_until(lambda: detailed)
+    assert detailed == [('device_connected', 'true')]
+    assert sorted(every) == [('device_connected', 'true'), ('external_mode', 'none')]
+
+    # A key that disappears is reported with an empty value
+    every.clear()
+    write_state(state_path, {'device_connected': 'true', 'sbs_mode_enabled': 'false'})
+    assert spin_until(lambda: every)
+    assert every == [('external_mode', '')]
+    assert detailed == [('device_connected', 'true')]
+
+def test_unchanged_rewrite_emits_nothing(watcher, state_path):
+    watcher.start()
+    assert spin_until(lambda: watcher.parse_count > 0)
+    changes = []
+    watcher.connect('state-changed', lambda w, key, value: changes.append(key))
+    write_state(state_path, {'device_connected': 'false', 'sbs_mode_enabled': 'false'})
+    polled = []
+    watcher.connect('polled', lambda w: polled.append(True))
+    assert spin_until(lambda: polled)
+    assert changes == []
+
+def test_burst_of_writes_is_coalesced(state_path):
+    watcher = StateWatcher(state_path, min_interval_ms=200, poll_interval_s=60)
+    watcher.start()
+    assert spin_until(lambda: watcher.parse_count > 0)
+    parses = watcher.parse_count
+    for i in range(20):
+        write_state(state_path, {'device_connected': 'true', 'counter': 'x' * (i + 1)})
+    assert spin_until(lambda: watcher.get('counter') == 'x' * 20)
+    watcher.stop()
+    assert watcher.parse_count - parses < 20
+
+def test_poll_covers_a_missing_monitor(watcher, state_path, monkeypatch):
+    def no_monitor(path):
+        raise GLib.Error("no inotify")
+    monkeypatch.setattr(Gio.File, 'new_for_path', no_monitor)
+    watcher.start()
+    assert spin_until(lambda: watcher.parse_count > 0)
+    polled = []
+    watcher.connect('polled', lambda w: polled.append(True))
+    write_state(state_path, {'device_connected': 'true', 'sbs_mode_enabled': 'false'})
+    assert spin_until(lambda: watcher.get('device_connected') == 'true')
+    assert polled
+    assert watcher.events_received == 0
@@ -0,0 +1,65 @@
+"""TelemetrySampler's rates and gauges, on a fake clock."""
+from types import SimpleNamespace
+import pytest
+from benchmarks.bench_telemetry import check_rates, make_sources
+from utils.latency import LatencyTracer
+from utils.telemetry import TelemetrySampler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_sampler(imu=True):
+    xr_manager, config, imu_reader = make_sources()
+    clock = FakeClock()
+    sampler = TelemetrySampler(xr_manager, config, imu_reader=imu_reader if imu else None,
+                               tracer=LatencyTracer(), clock=clock)
+    return sampler, clock, xr_manager, imu_reader
+
+def test_benchmark_rate_checks_pass():
+    assert check_rates() == []
+
+def test_rates_are_differences_over_the_elapsed_time():
+    sampler, clock, xr_manager, imu_reader = make_sampler()
+    imu_reader.samples_seen = 1000
+    first = sampler.sample()
+    assert first['imu_hz'] is None and first['state_updates_hz'] is None
+    clock.now = 0.25
+    imu_reader.samples_seen += 250
+    xr_manager.state_watcher.parse_count += 15
+    metrics = sampler.sample()
+    assert metrics['imu_hz'] == pytest.approx(1000.0)
+    assert metrics['state_updates_hz'] == pytest.approx(60.0)
+    assert metrics['commands_hz'] == 0.0
+    # Each rate is over the interval since the previous sample only
+    clock.now = 1.25
+    imu_reader.samples_seen += 100
+    assert sampler.sample()['imu_hz'] == pytest.approx(100.0)
+
+def test_no_elapsed_time_keeps_the_rates_unknown():
+    sampler, clock, xr_manager, imu_reader = make_sampler()
+    sampler.sample()
+    imu_reader.samples_seen += 10
+    assert sampler.sample()['imu_hz'] is None
+    # The sample without elapsed time becomes the new reference
+    clock.now = 1.0
+    assert sampler.sample()['imu_hz'] == 0.0
+
+def test_imu_rate_needs_a_reader():
+    sampler, clock, xr_manager, imu_reader = make_sampler(imu=False)
+    sampler.sample()
+    clock.now = 1.0
+    metrics = sampler.sample()
+    assert metrics['imu_hz'] is None
+    assert metrics['state_updates_hz'] == 0.0
+
+def test_gauges_are_read_as_is():
+    sampler, clock, xr_manager, imu_reader = make_sampler()
+    xr_manager.control_queue.pending_count = 3
+    xr_manager.control_queue.ring = SimpleNamespace(backlog=5)
+    metrics = sampler.sample()
+    assert (metrics['queue_depth'], metrics['ring_backlog'], metrics['config_saves']) == (3, 5, 0)
+    assert metrics['latency'] is None
@@ -0,0 +1,34 @@
+"""Recording the IMU segment through IMUReader."""
+import os
+from benchmarks.fake_driver import FakeIMUWriter
+from core.imu_reader import IMU_DTYPE
+from core.trace import SOURCE_FILES, SOURCE_IMU, TraceRecorder, read_trace
+
+def record(shm_dir, path, duration=0.03):
+    recorder = TraceRecorder(path, shm_dir, imu_rate_hz=2000)
+    recorder.run(duration)
+    return recorder, [record for record in read_trace(path) if record[0] == SOURCE_IMU]
+
+def test_records_valid_imu_samples(tmp_path):
+    writer = FakeIMUWriter(os.path.join(tmp_path, SOURCE_FILES[SOURCE_IMU]))
+    writer.write((0.0, 0.0, 0.0, 1.0), epoch_ms=1)
+    recorder, records = record(tmp_path, os.path.join(tmp_path, 'valid.trace'))
+    writer.close()
+    assert recorder.torn_skips == 0
+    assert len(records) == 1
+    assert len(records[0][2]) == IMU_DTYPE.itemsize
+
+def test_skips_and_counts_torn_reads(tmp_path):
+    writer = FakeIMUWriter(os.path.join(tmp_path, SOURCE_FILES[SOURCE_IMU]))
+    writer.write((0.0, 0.0, 0.0, 1.0), epoch_ms=1)
+    # A parity byte that never matches: the writer is forever mid-update
+    writer._raw[-1] ^= 0xff
+    recorder, records = record(tmp_path, os.path.join(tmp_path, 'torn.trace'))
+    writer.close()
+    assert records == []
+    assert recorder.torn_skips > 0
+
+def test_missing_segment_is_not_an_error(tmp_path):
+    recorder, records = record(tmp_path, os.path.join(tmp_path, 'empty.trace'), duration=0.01)
+    assert records == []
+    assert recorder.torn_skips == 0
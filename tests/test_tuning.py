@@ -0,0 +1,46 @@
+"""Follow-setting sweep over a synthetic head-motion trace."""
+import os
+import numpy as np
+import pytest
+from benchmarks.bench_tuning import head_motion, write_trace
+from core import tuning
+from core.mesh import REFERENCE_DISTANCE_M
+
+THRESHOLDS = [0.04, 0.1, 0.3]
+TIME_CONSTANTS = [0.1, 0.25]
+
+@pytest.fixture(scope='module')
+def motion():
+    return head_motion(duration_s=20)
+
+def test_display_fills_the_view_at_the_reference_distance():
+    margins = tuning.view_margins([REFERENCE_DISTANCE_M, 2 * REFERENCE_DISTANCE_M])
+    assert margins[0] == pytest.approx([0.0, 0.0], abs=1e-12)
+    assert (margins[1] > 0).all()
+    assert tuning.feasible_distances([0.6, 0.8, 1.05, 2.0]) == [1.05, 2.0]
+
+def test_sweep_drops_distances_where_the_display_overflows(motion):
+    results = tuning.sweep(*motion, THRESHOLDS, [0.8, 1.5, 3.0], TIME_CONSTANTS, jobs=1)
+    assert {result.distance for result in results} == {1.5, 3.0}
+    assert len(results) == len(THRESHOLDS) * len(TIME_CONSTANTS) * 2
+    with pytest.raises(ValueError):
+        tuning.sweep(*motion, THRESHOLDS, [0.5, 0.8], jobs=1)
+
+def test_recommendation_keeps_the_display_in_view(motion):
+    results = tuning.sweep(*motion, THRESHOLDS, [1.05, 1.5, 3.0], TIME_CONSTANTS, jobs=1)
+    assert results[0].off_view <= tuning.MAX_OFF_VIEW
+    # Rows over the limit only come after every row within it
+    over = [result.off_view > tuning.MAX_OFF_VIEW for result in results]
+    assert over == sorted(over)
+
+def test_pool_ranks_like_in_process(motion):
+    in_process = tuning.sweep(*motion, THRESHOLDS, [1.5, 3.0], jobs=1)
+    pooled = tuning.sweep(*motion, THRESHOLDS, [1.5, 3.0], jobs=2)
+    assert [tuple(result) for result in pooled] == [tuple(result) for result in in_process]
+
+def test_load_imu_trace_round_trip(tmp_path, motion):
+    path = os.path.join(tmp_path, 'head.trace')
+    write_trace(path, *motion)
+    timestamps, quaternions = tuning.load_imu_trace(path)
+    assert len(timestamps) == len(motion[0])
+    np.testing.assert_allclose(quaternions, motion[1], atol=1e-6)
@@ -0,0 +1,106 @@
+"""CVT modelines, xrandr query parsing and provisioning plans."""
+import pytest
+from core.virtual_display import (Modeline, ModelineCache, VirtualDisplay, VirtualDisplayProvisioner,
+                                  cvt_modeline, parse_xrandr_query, plan_changes, _without_newmodes)
+from benchmarks.fake_xrandr import FakeXrandr
+
+# Modelines printed by `cvt` (and `cvt -r`) for the same arguments
+@pytest.mark.parametrize('width, height, refresh_hz, reduced, expected', [
+    (1920, 1080, 60, False, '1920x1080_60.00 173.00 1920 2048 2248 2576 1080 1083 1088 1120 -hsync +vsync'),
+    (1280, 720, 60, False, '1280x720_60.00 74.50 1280 1344 1472 1664 720 723 728 748 -hsync +vsync'),
+    (1920, 1080, 60, True, '1920x1080R_60.00 138.50 1920 1968 2000 2080 1080 1083 1088 1111 +hsync -vsync'),
+])
+def test_cvt_matches_cvt(width, height, refresh_hz, reduced, expected):
+    assert ' '.join(cvt_modeline(width, height, refresh_hz, reduced).xrandr_args()) == expected
+
+def test_refresh_rate_of_a_modeline():
+    assert cvt_modeline(1920, 1080, 60).refresh_hz == pytest.approx(59.96, abs=0.01)
+
+MODE = cvt_modeline(1920, 1080, 60)
+
+QUERY = f"""Screen 0: minimum 8 x 8, current 3840 x 1080, maximum 32767 x 32767
+eDP-1 connected primary 1920x1080+0+0 (normal left inverted right x axis y axis) 344mm x 194mm
+   1920x1080     60.01*+  59.97
+   1280x720      60.00
+VIRTUAL1 disconnected 1920x1080+1920+0 (normal left inverted right x axis y axis) 0mm x 0mm
+  {MODE.name}  59.96*
+VIRTUAL2 disconnected (normal left inverted right x axis y axis) 0mm x 0mm
+"""
+
+def test_parse_query():
+    outputs = parse_xrandr_query(QUERY)
+    assert list(outputs) == ['eDP-1', 'VIRTUAL1', 'VIRTUAL2']
+    assert outputs['eDP-1'].connected
+    assert outputs['eDP-1'].current_mode == '1920x1080'
+    assert outputs['eDP-1'].modes == ['1920x1080', '1280x720']
+    assert outputs['VIRTUAL1'].geometry == (1920, 1080, 1920, 0)
+    assert outputs['VIRTUAL1'].current_mode == MODE.name
+    assert outputs['VIRTUAL2'] == ('VIRTUAL2', False, None, [], None)
+
+def test_matching_layout_plans_nothing():
+    display = VirtualDisplay('VIRTUAL1', 1920, 1080, 60, x=1920)
+    assert plan_changes([display], parse_xrandr_query(QUERY), [MODE]) == []
+
+def test_missing_mode_is_defined_attached_and_set():
+    display = VirtualDisplay('VIRTUAL2', 1920, 1080, 60, x=3840)
+    outputs = parse_xrandr_query(QUERY.replace(f"  {MODE.name}  59.96*\n", ''))
+    assert plan_changes([display], outputs, [MODE]) == [
+        '--newmode', *MODE.xrandr_args(),
+        '--addmode', 'VIRTUAL2', MODE.name,
+        '--output', 'VIRTUAL2', '--mode', MODE.name, '--pos', '3840x0',
+    ]
+
+def test_mode_of_another_output_is_only_attached():
+    display = VirtualDisplay('VIRTUAL2', 1920, 1080, 60, x=3840)
+    assert plan_changes([display], parse_xrandr_query(QUERY), [MODE]) == [
+        '--addmode', 'VIRTUAL2', MODE.name,
+        '--output', 'VIRTUAL2', '--mode', MODE.name, '--pos', '3840x0',
+    ]
+
+def test_moved_display_is_only_repositioned():
+    display = VirtualDisplay('VIRTUAL1', 1920, 1080, 60, x=0, y=1080)
+    assert plan_changes([display], parse_xrandr_query(QUERY), [MODE]) == [
+        '--output', 'VIRTUAL1', '--mode', MODE.name, '--pos', '0x1080',
+    ]
+
+def test_unknown_output_is_an_error():
+    with pytest.raises(ValueError):
+        plan_changes([VirtualDisplay('HDMI-9', 1920, 1080, 60)], parse_xrandr_query(QUERY), [MODE])
+
+def test_without_newmodes_drops_whole_modelines():
+    # An interlaced mode has one more flag than the CVT ones
+    interlaced = Modeline('1920x1080i', 74.25, 1920, 2008, 2052, 2200, 1080, 1084, 1094, 1125,
+                          ('+hsync', '+vsync', 'Interlace'))
+    args = ['--newmode', *interlaced.xrandr_args(), '--newmode', *MODE.xrandr_args(),
+            '--addmode', 'VIRTUAL1', interlaced.name, '--addmode', 'VIRTUAL2', MODE.name]
+    assert _without_newmodes(args, [interlaced, MODE]) == [
+        '--addmode', 'VIRTUAL1', interlaced.name, '--addmode', 'VIRTUAL2', MODE.name]
+
+@pytest.fixture
+def xrandr(tmp_path):
+    fake = FakeXrandr()
+    provisioner = VirtualDisplayProvisioner(fake.path, cache=ModelineCache(str(tmp_path / 'modelines.json')))
+    yield fake, provisioner
+    fake.remove()
+
+def test_provision_applies_once_then_is_a_noop(xrandr):
+    fake, provisioner = xrandr
+    displays = [VirtualDisplay('VIRTUAL1', 1920, 1080, 60), VirtualDisplay('VIRTUAL2', 1920, 1080, 60, x=1920)]
+    assert provisioner.provision(displays)
+    assert provisioner.provision(displays)
+    assert (provisioner.applied_count, provisioner.noop_count) == (1, 1)
+    # Two queries and one change
+    assert len(fake.invocations()) == 3
+    state = fake.state()
+    assert state['outputs']['VIRTUAL2'] == {'modes': [MODE.name], 'current': MODE.name, 'pos': [1920, 0]}
+
+def test_provision_reuses_a_detached_mode(xrandr):
+    fake, provisioner = xrandr
+    display = VirtualDisplay('VIRTUAL1', 1920, 1080, 60)
+    assert provisioner.provision([display])
+    # Left defined by an earlier session, but attached to no output
+    assert provisioner._apply(['--output', 'VIRTUAL1', '--off', '--delmode', 'VIRTUAL1', MODE.name])
+    assert provisioner.provision([display])
+    last_run = fake.invocations()[-1]
+    assert '--newmode' not in last_run
+    assert fake.state()['outputs']['VIRTUAL1']['current'] == MODE.name
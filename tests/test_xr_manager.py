@@ -0,0 +1,99 @@
+"""XRManager's display settings and their persistence."""
+import json
+import os
+import pytest
+
+pytest.importorskip('gi')
+
+from core.xr_manager import XRManager
+from benchmarks.fake_driver import FakeIMUWriter
+from utils.config import Config
+
+def write_config(config_dir, data):
+    with open(os.path.join(config_dir, 'config.json'), 'w') as f:
+        json.dump(data, f)
+
+def read_config(config_dir):
+    with open(os.path.join(config_dir, 'config.json')) as f:
+        return json.load(f)
+
+def make_manager(tmp_path):
+    config = Config(config_dir=str(tmp_path), save_delay=3600)
+    return XRManager(shm_dir=str(tmp_path), config=config), config
+
+def test_legacy_keys_migrate_to_the_primary_display(tmp_path):
+    write_config(tmp_path, {'display_distance': 1.6, 'follow_mode': False, 'follow_threshold': 0.25,
+                            'widescreen_mode': True})
+    manager, config = make_manager(tmp_path)
+    assert (manager.display_distance, manager.follow_mode, manager.follow_threshold) == (1.6, False, 0.25)
+    assert manager.widescreen_mode
+    config.flush()
+    saved = read_config(tmp_path)
+    assert not {'display_distance', 'follow_mode', 'follow_threshold'} & set(saved)
+    assert saved['displays'][0]['distance'] == 1.6
+    assert saved['widescreen_mode'] is True
+
+    # Loaded from the displays from then on
+    manager, _ = make_manager(tmp_path)
+    assert (manager.display_distance, manager.follow_mode, manager.follow_threshold) == (1.6, False, 0.25)
+
+def test_saved_displays_win_over_stale_legacy_keys(tmp_path):
+    write_config(tmp_path, {'display_distance': 2.5, 'displays': [
+        {'id': 0, 'distance': 1.2, 'follow': True, 'follow_threshold': 0.1}]})
+    manager, config = make_manager(tmp_path)
+    assert manager.display_distance == 1.2
+    config.flush()
+    assert 'display_distance' not in read_config(tmp_path)
+
+def test_setters_persist_through_the_registry_only(tmp_path):
+    manager, config = make_manager(tmp_path)
+    manager.set_display_distance(1.4)
+    manager.set_follow_threshold(0.3)
+    manager.toggle_follow_mode()
+    manager.toggle_widescreen_mode()
+    config.flush()
+    saved = read_config(tmp_path)
+    primary = saved['displays'][0]
+    assert (primary['distance'], primary['follow_threshold'], primary['follow']) == (1.4, 0.3, False)
+    assert saved['widescreen_mode'] is True
+    assert not {'display_distance', 'follow_mode', 'follow_threshold'} & set(saved)
+
+def test_apply_profile_updates_the_primary_display(tmp_path):
+    manager, config = make_manager(tmp_path)
+    config.set_profile('calm', {'display_distance': 1.5, 'follow_threshold': 0.2, 'tuning': {'jerk': 1.0}})
+    changes = []
+    manager.connect('displays-changed', lambda manager, change: changes.append(change))
+    assert manager.apply_profile('calm')
+    assert (manager.display_distance, manager.follow_threshold) == (1.5, 0.2)
+    # One change set for the whole profile
+    assert len(changes) == 1
+    assert not manager.apply_profile('missing')
+    config.flush()
+    saved = read_config(tmp_path)
+    assert saved['displays'][0]['distance'] == 1.5
+    assert 'display_distance' not in saved
+
+def test_cleanup_runs_once(tmp_path):
+    manager, config = make_manager(tmp_path)
+    manager.cleanup()
+    submitted = manager.control_queue.submitted_count
+    with open(os.path.join(tmp_path, 'xr_driver_control')) as f:
+        written = f.read()
+    manager.cleanup()
+    assert manager.control_queue.submitted_count == submitted
+    with open(os.path.join(tmp_path, 'xr_driver_control')) as f:
+        assert f.read() == written
+
+def test_imu_reader_maps_the_segment_in_shm_dir(tmp_path):
+    writer = FakeIMUWriter(os.path.join(tmp_path, 'breezy_desktop_imu'))
+    try:
+        manager, config = make_manager(tmp_path)
+        reader = manager.imu_reader
+        for epoch_ms in (1000, 1004):
+            writer.write((0.0, 0.0, 0.0, 1.0), epoch_ms=epoch_ms)
+            assert reader.read()
+        assert reader.samples_seen == 2
+        manager.cleanup()
+        assert not reader.is_open
+    finally:
+        writer.close()
@@ -0,0 +1,114 @@
+import logging
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, GLib
+from utils.latency import TRACER, default_export_path
+
+# Spans shown in the panel; all spans are exported
+DISPLAYED_SPANS = (
+    ('ui_to_written', 'UI → written'),
+    ('written_to_acknowledged', 'written → driver'),
+    ('ui_to_acknowledged', 'UI → driver'),
+)
+REFRESH_INTERVAL_S = 1
+
+class LatencyPanel(Gtk.Expander):
+    """Collapsible view of command latency percentiles.
+
+    Only refreshes while expanded and on screen, so it costs nothing when
+    collapsed or when the window is hidden.
+    """
+
+    def __init__(self, config):
+        super().__init__(label="Latency Diagnostics")
+        self.logger = logging.getLogger('xfce4_xr_desktop.latency_panel')
+        self.config = config
+        self._refresh_source = 0
+
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        self.add(box)
+
+        self.enable_check = Gtk.CheckButton(label="Trace command latency")
+        self.enable_check.set_active(TRACER.enabled)
+        box.pack_start(self.enable_check, False, False, 6)
+
+        self.summary_label = Gtk.Label()
+        self.summary_label.set_xalign(0)
+        self.summary_label.set_selectable(True)
+        box.pack_start(self.summary_label, False, False, 6)
+
+        button_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        self.export_json_button = Gtk.Button(label="Export JSON")
+        self.export_prometheus_button = Gtk.Button(label="Export Prometheus")
+        self.reset_button = Gtk.Button(label="Reset")
+        for button in (self.export_json_button, self.export_prometheus_button, self.reset_button):
+            button_box.pack_start(button, True, True, 6)
+        box.pack_start(button_box, False, False, 6)
+
+        self.connect('notify::expanded', self._on_visibility_changed)
+        self.connect('map', self._on_visibility_changed)
+        self.connect('unmap', self._on_visibility_changed)
+        self.connect('destroy', self._on_destroy)
+        self.enable_check.connect('toggled', self._on_enable_toggled)
+        self.export_json_button.connect('clicked', self._on_export_clicked, 'json')
+        self.export_prometheus_button.connect('clicked', self._on_export_clicked, 'prom')
+        self.reset_button.connect('clicked', self._on_reset_clicked)
+
+    def refresh(self):
+        """Update the summary text from the tracer's histograms."""
+        if not TRACER.enabled:
+            self.summary_label.set_text("Tracing is off.")
+            return
+        summaries = TRACER.summaries()
+        if not summaries:
+            self.summary_label.set_text("No commands traced yet.")
+            return
+        lines = []
+        for key, spans in summaries.items():
+            lines.append(key)
+            for span, label in DISPLAYED_SPANS:
+                summary = spans.get(span)
+                if summary:
+                    lines.append(f"  {label}: p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, "
+                                 f"p99 {summary['p99_ms']:.1f} ms (n={summary['count']})")
+        self.summary_label.set_text('\n'.join(lines))
+
+    def _on_visibility_changed(self, *args):
+        if self.get_expanded() and self.get_mapped():
+            if not self._refresh_source:
+                self.refresh()
+                self._refresh_source = GLib.timeout_add_seconds(REFRESH_INTERVAL_S, self._on_refresh_timeout)
+        else:
+            self._stop_refresh()
+
+    def _on_refresh_timeout(self):
+        self.refresh()
+        return GLib.SOURCE_CONTINUE
+
+    def _stop_refresh(self):
+        if self._refresh_source:
+            GLib.source_remove(self._refresh_source)
+            self._refresh_source = 0
+
+    def _on_destroy(self, widget):
+        self._stop_refresh()
+
+    def _on_enable_toggled(self, button):
+        TRACER.enabled = button.get_active()
+        self.config.set('latency_tracing', TRACER.enabled)
+        self.refresh()
+
+    def _on_export_clicked(self, button, extension):
+        path = default_export_path(extension)
+        try:
+            if extension == 'json':
+                TRACER.export_json(path)
+            else:
+                TRACER.export_prometheus(path)
+            self.logger.info("Latency histograms exported to %s", path)
+        except Exception as e:
+            self.logger.error("Error exporting latency histograms: %s", e)
+
+    def _on_reset_clicked(self, button):
+        TRACER.reset()
+        self.refresh()
@@ -2,15 +2,20 @@ import logging
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, Gdk, GObject
-from core.xr_manager import XRManager
+from core.xr_manager import (XRManager, CONTROL_DISPLAY_DISTANCE, CONTROL_SMOOTH_FOLLOW,
+                             CONTROL_FOLLOW_THRESHOLD, CONTROL_SBS_MODE, CONTROL_RECENTER)
+from ui.latency_panel import LatencyPanel
+from ui.telemetry_panel import TelemetryPanel
 from utils.config import Config
+from utils.latency import TRACER, STAGE_UI
 
 class MainWindow(Gtk.Window):
-    def __init__(self, xr_manager: XRManager, config: Config):
+    def __init__(self, xr_manager: XRManager, config: Config, hide_on_close: bool = False):
         super().__init__(title="XFCE4 XR Desktop")
         self.logger = logging.getLogger('xfce4_xr_desktop.main_window')
         self.xr_manager = xr_manager
         self.config = config
+        self.hide_on_close = hide_on_close
         
         self.setup_ui()
         self.setup_signals()
@@ -29,7 +34,8 @@ class MainWindow(Gtk.Window):
         main_box.pack_start(status_frame, False, False, 6)
 
         # Device status
-        self.device_status = Gtk.Label(label="Device: Not Connected")
+        self.device_status = Gtk.Label()
+        self._update_device_status()
         status_box.pack_start(self.device_status, False, False, 6)
 
         # Controls section
@@ -44,7 +50,7 @@ class MainWindow(Gtk.Window):
         self.distance_scale = Gtk.Scale(
             orientation=Gtk.Orientation.HORIZONTAL,
             adjustment=Gtk.Adjustment(
-                value=self.config.display_distance,
+                value=self.xr_manager.display_distance,
                 lower=0.5,
                 upper=3.0,
                 step_increment=0.05
@@ -56,7 +62,7 @@ class MainWindow(Gtk.Window):
 
         # Widescreen mode
         self.widescreen_switch = Gtk.Switch()
-        self.widescreen_switch.set_active(self.config.widescreen_mode)
+        self.widescreen_switch.set_active(self.xr_manager.widescreen_mode)
         widescreen_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
         widescreen_label = Gtk.Label(label="Widescreen Mode:")
         widescreen_box.pack_start(widescreen_label, False, False, 6)
@@ -65,7 +71,7 @@ class MainWindow(Gtk.Window):
 
         # Follow mode
         self.follow_switch = Gtk.Switch()
-        self.follow_switch.set_active(self.config.follow_mode)
+        self.follow_switch.set_active(self.xr_manager.follow_mode)
         follow_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
         follow_label = Gtk.Label(label="Follow Mode:")
         follow_box.pack_start(follow_label, False, False, 6)
@@ -78,7 +84,7 @@ class MainWindow(Gtk.Window):
         self.threshold_scale = Gtk.Scale(
             orientation=Gtk.Orientation.HORIZONTAL,
             adjustment=Gtk.Adjustment(
-                value=self.config.follow_threshold,
+                value=self.xr_manager.follow_threshold,
                 lower=0.01,
                 upper=0.5,
                 step_increment=0.01
@@ -118,6 +124,13 @@ class MainWindow(Gtk.Window):
             keybinding_box.pack_start(keybinding_value, True, True, 6)
             keybindings_box.pack_start(keybinding_box, False, False, 6)
 
+        # Diagnostics section
+        self.telemetry_panel = TelemetryPanel(self.xr_manager, self.config,
+                                              imu_reader=self.xr_manager.imu_reader)
+        main_box.pack_start(self.telemetry_panel, False, False, 6)
+        self.latency_panel = LatencyPanel(self.config)
+        main_box.pack_start(self.latency_panel, False, False, 6)
+
         # Set window properties
         self.set_default_size(400, 500)
         self.set_position(Gtk.WindowPosition.CENTER)
@@ -129,8 +142,11 @@ class MainWindow(Gtk.Window):
 
         # Connect to XR manager signals
         self.xr_manager.connect('device-connected', self._on_device_connected)
+        self.xr_manager.connect('driver-ready', self._on_driver_ready)
         self.xr_manager.connect('display-distance-changed', self._on_display_distance_changed)
         self.xr_manager.connect('widescreen-mode-changed', self._on_widescreen_mode_changed)
+        self.xr_manager.connect('follow-mode-changed', self._on_follow_mode_changed)
+        self.xr_manager.connect('follow-threshold-changed', self._on_follow_threshold_changed)
 
         # Connect UI signals
         self.distance_scale.connect('value-changed', self._on_distance_changed)
@@ -145,9 +161,20 @@ class MainWindow(Gtk.Window):
         # TODO: Implement XFCE4 keybinding integration
         pass
 
+    def _update_device_status(self):
+        if not self.xr_manager.driver_ready:
+            self.device_status.set_text("Device: Connecting...")
+        else:
+            connected = self.xr_manager.device_connected
+            self.device_status.set_text(f"Device: {'Connected' if connected else 'Not Connected'}")
+
     def _on_device_connected(self, xr_manager, connected):
         """Handle device connection status changes."""
-        self.device_status.set_text(f"Device: {'Connected' if connected else 'Not Connected'}")
+        self._update_device_status()
+
+    def _on_driver_ready(self, xr_manager):
+        """Handle the driver finishing its startup handshake."""
+        self._update_device_status()
 
     def _on_display_distance_changed(self, xr_manager, distance):
         """Handle display distance changes."""
@@ -157,32 +184,47 @@ class MainWindow(Gtk.Window):
         """Handle widescreen mode changes."""
         self.widescreen_switch.set_active(enabled)
 
+    def _on_follow_mode_changed(self, xr_manager, enabled):
+        """Handle follow mode changes (e.g. from xfce4-xr-ctl)."""
+        self.follow_switch.set_active(enabled)
+
+    def _on_follow_threshold_changed(self, xr_manager, threshold):
+        """Handle follow threshold changes."""
+        self.threshold_scale.set_value(threshold)
+
     def _on_distance_changed(self, scale):
         """Handle display distance slider changes."""
-        distance = scale.get_value()
-        self.xr_manager.set_display_distance(distance)
-        self.config.display_distance = distance
+        if TRACER.enabled:
+            TRACER.mark(CONTROL_DISPLAY_DISTANCE, STAGE_UI)
+        self.xr_manager.set_display_distance(scale.get_value())
 
     def _on_widescreen_toggled(self, switch, param):
         """Handle widescreen mode toggle."""
         enabled = switch.get_active()
-        self.xr_manager.toggle_widescreen_mode()
-        self.config.widescreen_mode = enabled
+        # The switch also follows changes made elsewhere; only toggle on a real difference
+        if enabled != self.xr_manager.widescreen_mode:
+            if TRACER.enabled:
+                TRACER.mark(CONTROL_SBS_MODE, STAGE_UI)
+            self.xr_manager.toggle_widescreen_mode()
 
     def _on_follow_toggled(self, switch, param):
         """Handle follow mode toggle."""
         enabled = switch.get_active()
-        self.xr_manager.toggle_follow_mode()
-        self.config.follow_mode = enabled
+        if enabled != self.xr_manager.follow_mode:
+            if TRACER.enabled:
+                TRACER.mark(CONTROL_SMOOTH_FOLLOW, STAGE_UI)
+            self.xr_manager.toggle_follow_mode()
 
     def _on_threshold_changed(self, scale):
         """Handle follow threshold slider changes."""
-        threshold = scale.get_value()
-        self.xr_manager.set_follow_threshold(threshold)
-        self.config.follow_threshold = threshold
+        if TRACER.enabled:
+            TRACER.mark(CONTROL_FOLLOW_THRESHOLD, STAGE_UI)
+        self.xr_manager.set_follow_threshold(scale.get_value())
 
     def _on_recenter_clicked(self, button):
         """Handle recenter button click."""
+        if TRACER.enabled:
+            TRACER.mark(CONTROL_RECENTER, STAGE_UI)
         self.xr_manager.recenter_display()
 
     def _on_refresh_clicked(self, button):
@@ -191,8 +233,10 @@ class MainWindow(Gtk.Window):
 
     def _on_window_delete(self, widget, event):
         """Handle window close event."""
-        self.logger.info("Window closing, cleaning up...")
-        if self.xr_manager:
-            self.xr_manager.cleanup()
+        if self.hide_on_close:
+            self.hide()
+            return True
+        # The application cleans up the XR manager once the main loop returns
+        self.logger.info("Window closing")
         Gtk.main_quit()
         return False  # Allow the window to be destroyed
@@ -0,0 +1,104 @@
+import logging
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, GLib
+from utils.telemetry import TelemetrySampler
+
+# Fixed refresh rate of the panel, whatever the rate of the data
+REFRESH_INTERVAL_MS = 500
+
+# How often the IMU segment is read while the panel refreshes; nothing
+# else in the app reads it, so the IMU rate is counted here and is
+# capped at 1000 / IMU_POLL_INTERVAL_MS samples per second
+IMU_POLL_INTERVAL_MS = 4
+
+ROWS = (
+    ('imu_hz', "IMU samples"),
+    ('state_updates_hz', "State file updates"),
+    ('commands_hz', "Control commands"),
+    ('control_writes_hz', "Control writes"),
+    ('queue_depth', "Pending commands"),
+    ('ring_backlog', "Control ring backlog"),
+    ('config_saves', "Config saves"),
+    ('latency', "Command latency"),
+)
+
+def format_value(name, value):
+    if value is None:
+        return "n/a" if name in ('imu_hz', 'ring_backlog', 'latency') else "…"
+    if name.endswith('_hz'):
+        return f"{value:.1f}/s"
+    if name == 'latency':
+        return f"p50 {value['p50_ms']:.1f} ms, p95 {value['p95_ms']:.1f} ms, p99 {value['p99_ms']:.1f} ms"
+    return str(value)
+
+class TelemetryPanel(Gtk.Expander):
+    """Collapsible live view of system health.
+
+    Samples on a fixed timer, and only while expanded and on screen, so
+    it costs nothing when collapsed or when the window is hidden.
+    """
+
+    def __init__(self, xr_manager, config, imu_reader=None):
+        super().__init__(label="Telemetry")
+        self.logger = logging.getLogger('xfce4_xr_desktop.telemetry_panel')
+        self.sampler = TelemetrySampler(xr_manager, config, imu_reader=imu_reader)
+        self._imu_reader = imu_reader
+        self._refresh_source = 0
+        self._imu_poll_source = 0
+
+        grid = Gtk.Grid(column_spacing=12, row_spacing=4)
+        self.add(grid)
+        self.value_labels = {}
+        for row, (name, title) in enumerate(ROWS):
+            title_label = Gtk.Label(label=f"{title}:")
+            title_label.set_xalign(0)
+            value_label = Gtk.Label()
+            value_label.set_xalign(0)
+            grid.attach(title_label, 0, row, 1, 1)
+            grid.attach(value_label, 1, row, 1, 1)
+            self.value_labels[name] = value_label
+
+        self.connect('notify::expanded', self._on_visibility_changed)
+        self.connect('map', self._on_visibility_changed)
+        self.connect('unmap', self._on_visibility_changed)
+        self.connect('destroy', self._on_destroy)
+
+    def refresh(self):
+        """Sample the counters and update the labels whose text changed."""
+        metrics = self.sampler.sample()
+        for name, label in self.value_labels.items():
+            text = format_value(name, metrics[name])
+            if label.get_text() != text:
+                label.set_text(text)
+
+    def _on_visibility_changed(self, *args):
+        if self.get_expanded() and self.get_mapped():
+            if not self._refresh_source:
+                # Rates restart from now rather than averaging over the hidden time
+                self.sampler.reset()
+                self.refresh()
+                self._refresh_source = GLib.timeout_add(REFRESH_INTERVAL_MS, self._on_refresh_timeout)
+                if self._imu_reader is not None:
+                    self._imu_poll_source = GLib.timeout_add(IMU_POLL_INTERVAL_MS, self._on_imu_poll)
+        else:
+            self._stop_refresh()
+
+    def _on_refresh_timeout(self):
+        self.refresh()
+        return GLib.SOURCE_CONTINUE
+
+    def _on_imu_poll(self):
+        self._imu_reader.read()
+        return GLib.SOURCE_CONTINUE
+
+    def _stop_refresh(self):
+        if self._refresh_source:
+            GLib.source_remove(self._refresh_source)
+            self._refresh_source = 0
+        if self._imu_poll_source:
+            GLib.source_remove(self._imu_poll_source)
+            self._imu_poll_source = 0
+
+    def _on_destroy(self, widget):
+        self._stop_refresh()
@@ -1,19 +1,29 @@
 import os
+import copy
 import json
 import logging
-from gi.repository import GObject
+import tempfile
+import threading
 
-class Config(GObject.Object):
-    def __init__(self):
-        super().__init__()
+class Config:
+    """Application settings with lazy loading and write-behind persistence.
+
+    Changes only mark the config dirty; saves are coalesced over
+    ``save_delay`` seconds and written from a timer thread through a temp
+    file and an atomic rename. Call ``flush()`` to write synchronously.
+    """
+    def __init__(self, config_dir=None, save_delay=0.5):
         self.logger = logging.getLogger('xfce4_xr_desktop.config')
-        self._config_dir = os.path.expanduser('~/.config/xfce4-xr-desktop')
+        self._config_dir = config_dir or os.path.expanduser('~/.config/xfce4-xr-desktop')
         self._config_file = os.path.join(self._config_dir, 'config.json')
         self._default_config = {
-            'display_distance': 1.05,
             'widescreen_mode': False,
-            'follow_mode': True,
-            'follow_threshold': 0.1,
+            'control_rate_hz': 30,
+            'latency_tracing': False,
+            # Virtual displays, as saved by core.displays.DisplayRegistry
+            'displays': [],
+            # Named sets of settings, e.g. written by core.tuning
+            'profiles': {},
             'keybindings': {
                 'toggle_xr': '<Control><Super>backslash',
                 'recenter': '<Control><Super>space',
@@ -21,43 +31,124 @@ class Config(GObject.Object):
                 'toggle_follow': '<Control><Super>f'
             }
         }
-        self._config = self._load_config()
+        self._save_delay = save_delay
+        self._data = None
+        self._dirty = False
+        self._save_timer = None
+        # _lock guards the settings dict and dirty flag, _write_lock
+        # serializes writers so an older snapshot never lands last
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self.save_count = 0
+
+    @property
+    def _config(self):
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self._load_config()
+        return self._data
 
     def _load_config(self):
-        """Load configuration from file or create default."""
+        """Load configuration from file or fall back to the defaults."""
         try:
-            if not os.path.exists(self._config_dir):
-                os.makedirs(self._config_dir)
-
             if os.path.exists(self._config_file):
                 with open(self._config_file, 'r') as f:
                     config = json.load(f)
                     # Merge with default config to ensure all keys exist
-                    return {**self._default_config, **config}
+                    return _deep_merge(self._default_config, config)
             else:
-                self._save_config(self._default_config)
-                return self._default_config.copy()
+                # Written out by the next save
+                self._dirty = True
+                self._schedule_save()
+                return copy.deepcopy(self._default_config)
 
         except Exception as e:
-            self.logger.error(f"Error loading config: {str(e)}")
-            return self._default_config.copy()
-
-    def _save_config(self, config):
-        """Save configuration to file."""
+            self.logger.error("Error loading config: %s", e)
+            return copy.deepcopy(self._default_config)
+
+    def _schedule_save(self):
+        """Mark the config dirty and start the coalescing timer if needed."""
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self._save_delay, self._on_save_timer)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def _on_save_timer(self):
+        with self._lock:
+            self._save_timer = None
+        self._save_if_dirty()
+
+    def _save_if_dirty(self):
+        """Save configuration to file if it changed since the last save."""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty or self._data is None:
+                    return
+                # Stored values are never mutated in place (nested settings
+                # are replaced whole), so a shallow snapshot is consistent
+                # and set() is not held up by the serialization
+                snapshot = dict(self._data)
+                self._dirty = False
+            try:
+                self._write_atomic(json.dumps(snapshot, indent=4))
+                self.save_count += 1
+            except Exception as e:
+                self.logger.error("Error saving config: %s", e)
+                with self._lock:
+                    self._dirty = True
+
+    def _write_atomic(self, data):
+        os.makedirs(self._config_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.config.', suffix='.tmp', dir=self._config_dir)
         try:
-            with open(self._config_file, 'w') as f:
-                json.dump(config, f, indent=4)
-        except Exception as e:
-            self.logger.error(f"Error saving config: {str(e)}")
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._config_file)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def flush(self):
+        """Write any pending changes synchronously."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        self._save_if_dirty()
+
+    @property
+    def dirty(self):
+        return self._dirty
 
     def get(self, key, default=None):
         """Get a configuration value."""
         return self._config.get(key, default)
 
     def set(self, key, value):
-        """Set a configuration value and save to file."""
-        self._config[key] = value
-        self._save_config(self._config)
+        """Set a configuration value and schedule a save."""
+        config = self._config
+        with self._lock:
+            if key in config and config[key] == value:
+                return
+            config[key] = value
+        self._schedule_save()
+
+    def remove(self, key):
+        """Remove a configuration value and schedule a save."""
+        config = self._config
+        with self._lock:
+            if key not in config:
+                return
+            del config[key]
+        self._schedule_save()
 
     def get_keybinding(self, action):
         """Get a keybinding for a specific action."""
@@ -65,16 +156,21 @@ class Config(GObject.Object):
 
     def set_keybinding(self, action, keybinding):
         """Set a keybinding for a specific action."""
-        self._config['keybindings'][action] = keybinding
-        self._save_config(self._config)
-
-    @property
-    def display_distance(self):
-        return self.get('display_distance')
-
-    @display_distance.setter
-    def display_distance(self, value):
-        self.set('display_distance', float(value))
+        config = self._config
+        with self._lock:
+            config['keybindings'] = dict(config['keybindings'], **{action: keybinding})
+        self._schedule_save()
+
+    def get_profile(self, name):
+        """Get a named profile of settings, or None."""
+        return self._config['profiles'].get(name)
+
+    def set_profile(self, name, settings):
+        """Store a named profile of settings."""
+        config = self._config
+        with self._lock:
+            config['profiles'] = dict(config['profiles'], **{name: copy.deepcopy(settings)})
+        self._schedule_save()
 
     @property
     def widescreen_mode(self):
@@ -84,18 +180,12 @@ class Config(GObject.Object):
     def widescreen_mode(self, value):
         self.set('widescreen_mode', bool(value))
 
-    @property
-    def follow_mode(self):
-        return self.get('follow_mode')
-
-    @follow_mode.setter
-    def follow_mode(self, value):
-        self.set('follow_mode', bool(value))
-
-    @property
-    def follow_threshold(self):
-        return self.get('follow_threshold')
-
-    @follow_threshold.setter
-    def follow_threshold(self, value):
-        self.set('follow_threshold', float(value)) 
\ No newline at end of file
+def _deep_merge(defaults, overrides):
+    """Merge overrides into a copy of defaults, recursing into nested dicts."""
+    merged = copy.deepcopy(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _deep_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
@@ -0,0 +1,113 @@
+"""Minimal client for the xfce4-xr-desktop control socket.
+
+Deliberately imports nothing from GTK/GObject (or the rest of the
+application) so that a keyboard shortcut bound to it starts in a few
+milliseconds. Examples::
+
+    xfce4-xr-ctl recenter
+    xfce4-xr-ctl set-distance 1.3 toggle-follow
+    xfce4-xr-ctl apply-profile calm
+    xfce4-xr-ctl subscribe device_connected
+
+The protocol is newline-delimited JSON over a Unix stream socket. A
+request is ``{"commands": [{"cmd": ..., "value": ...}, ...]}`` and is
+answered with ``{"ok": ..., "results": [...]}``; ``{"subscribe": [keys]}``
+(an empty list for all keys) streams ``{"event": "state", ...}`` lines.
+"""
+import os
+import sys
+import json
+import socket
+
+# Commands taking a value, with the type of that value
+VALUE_COMMANDS = {
+    'set-distance': float,
+    'set-follow-threshold': float,
+    'apply-profile': str,
+}
+COMMANDS = ('recenter', 'toggle-follow', 'toggle-widescreen', 'get-state', 'present') + tuple(VALUE_COMMANDS)
+
+def socket_path():
+    """Path of the control socket for the current user."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or f"/tmp/xfce4-xr-desktop-{os.getuid()}"
+    return os.path.join(runtime_dir, 'xfce4-xr-desktop.sock')
+
+def connect(path=None, timeout=2.0):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(path or socket_path())
+    return sock
+
+def send_commands(commands, path=None, timeout=2.0):
+    """Send a batch of commands and return the decoded response.
+
+    ``commands`` is a list of dicts such as ``{'cmd': 'recenter'}``.
+    Raises OSError if no instance is listening.
+    """
+    with connect(path, timeout) as sock:
+        sock.sendall(json.dumps({'commands': commands}).encode() + b'\n')
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("control socket closed without a response")
+    return json.loads(line)
+
+def subscribe(keys=(), path=None):
+    """Yield state events for keys (all keys if empty) until the server goes away."""
+    with connect(path, timeout=None) as sock:
+        sock.sendall(json.dumps({'subscribe': list(keys)}).encode() + b'\n')
+        with sock.makefile('rb') as reader:
+            for line in reader:
+                yield json.loads(line)
+
+def parse_commands(args):
+    """Turn command line words into protocol commands."""
+    commands = []
+    words = list(args)
+    while words:
+        word = words.pop(0)
+        if word not in COMMANDS:
+            raise ValueError(f"unknown command '{word}' (expected one of: {', '.join(COMMANDS)})")
+        command = {'cmd': word.replace('-', '_')}
+        if word in VALUE_COMMANDS:
+            if not words:
+                raise ValueError(f"'{word}' needs a value")
+            command['value'] = VALUE_COMMANDS[word](words.pop(0))
+        commands.append(command)
+    return commands
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    path = None
+    if len(args) >= 2 and args[0] == '--socket':
+        path = args[1]
+        args = args[2:]
+    if not args or args[0] in ('-h', '--help'):
+        print(f"usage: xfce4-xr-ctl [--socket PATH] COMMAND [VALUE] [COMMAND [VALUE] ...]\n"
+              f"       xfce4-xr-ctl [--socket PATH] subscribe [KEY ...]\n"
+              f"commands: {', '.join(COMMANDS)}")
+        return 0 if args else 2
+    try:
+        if args[0] == 'subscribe':
+            for event in subscribe(args[1:], path):
+                print(json.dumps(event), flush=True)
+            return 0
+        response = send_commands(parse_commands(args), path)
+    except ValueError as e:
+        print(f"xfce4-xr-ctl: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        return 0
+    except OSError as e:
+        print(f"xfce4-xr-ctl: cannot reach xfce4-xr-desktop: {e}", file=sys.stderr)
+        return 1
+    for result in response.get('results', []):
+        if result is not None and result is not True:
+            print(json.dumps(result))
+    if not response.get('ok'):
+        print(f"xfce4-xr-ctl: {response.get('error', 'command failed')}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""End-to-end latency tracing for driver control commands.
+
+Every command key is stamped with a monotonic time at each stage it goes
+through: the UI event, queueing in XRManager, the control file write and
+the driver state reflecting it. Intervals between stages go into
+fixed-size log-scale histograms per key. Call sites check
+``TRACER.enabled`` before calling in, so tracing costs one attribute
+lookup when it is off.
+"""
+import os
+import json
+import time
+import bisect
+import logging
+
+STAGE_UI = 'ui'
+STAGE_QUEUED = 'queued'
+STAGE_WRITTEN = 'written'
+STAGE_ACKNOWLEDGED = 'acknowledged'
+
+# Histogram names: the interval between two stages
+SPANS = (
+    ('ui_to_queued', STAGE_UI, STAGE_QUEUED),
+    ('queued_to_written', STAGE_QUEUED, STAGE_WRITTEN),
+    ('written_to_acknowledged', STAGE_WRITTEN, STAGE_ACKNOWLEDGED),
+    ('ui_to_written', STAGE_UI, STAGE_WRITTEN),
+    ('ui_to_acknowledged', STAGE_UI, STAGE_ACKNOWLEDGED),
+)
+_SPANS_ENDING = {stage: [(name, start) for name, start, end in SPANS if end == stage]
+                 for stage in (STAGE_QUEUED, STAGE_WRITTEN, STAGE_ACKNOWLEDGED)}
+
+# Control keys whose effect the driver reports in its state file
+ACK_STATE_KEYS = {
+    'sbs_mode': 'sbs_mode_enabled',
+    'enable_breezy_desktop_smooth_follow': 'breezy_desktop_smooth_follow_enabled',
+    'breezy_desktop_display_distance': 'breezy_desktop_display_distance',
+    'breezy_desktop_follow_threshold': 'breezy_desktop_follow_threshold',
+}
+
+# Bucket upper bounds in seconds: 1 us to ~10 s, 8 buckets per decade
+BUCKET_BOUNDS = tuple(10 ** (-6 + i / 8) for i in range(57))
+
+class LatencyHistogram:
+    """Fixed-memory log-scale histogram of durations in seconds."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (p in 0-100)."""
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(BUCKET_BOUNDS[index], self.max) if index < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.sum / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+class LatencyTracer:
+    """Stage timestamps and per-key latency histograms."""
+
+    def __init__(self):
+        self.logger = logging.getLogger('xfce4_xr_desktop.latency')
+        self.enabled = False
+        # key -> {stage: monotonic time} for the latest command of that key
+        self._stages = {}
+        self._histograms = {}
+        self._ack_keys = {state_key: control_key for control_key, state_key in ACK_STATE_KEYS.items()}
+
+    def mark(self, key, stage, now=None):
+        """Stamp a stage for the latest command on key."""
+        now = time.monotonic() if now is None else now
+        stages = self._stages.get(key)
+        if stage == STAGE_UI or stages is None or stage in stages:
+            # A new command starts at the UI, or at queueing if it didn't come from the UI
+            stages = self._stages[key] = {}
+        stages[stage] = now
+        for name, start in _SPANS_ENDING.get(stage, ()):
+            started = stages.get(start)
+            if started is not None:
+                self._histogram(key, name).record(now - started)
+        if stage == STAGE_ACKNOWLEDGED:
+            del self._stages[key]
+
+    def state_changed(self, state_key, now=None):
+        """Acknowledge a written command whose effect showed up in the driver state."""
+        control_key = self._ack_keys.get(state_key)
+        if control_key is None:
+            return
+        stages = self._stages.get(control_key)
+        if stages is not None and STAGE_WRITTEN in stages:
+            self.mark(control_key, STAGE_ACKNOWLEDGED, now)
+
+    def reset(self):
+        self._stages.clear()
+        self._histograms.clear()
+
+    def _histogram(self, key, span):
+        histogram = self._histograms.get((key, span))
+        if histogram is None:
+            histogram = self._histograms[(key, span)] = LatencyHistogram()
+        return histogram
+
+    def summaries(self):
+        """Return {key: {span: summary}} for all recorded spans."""
+        result = {}
+        for (key, span), histogram in sorted(self._histograms.items()):
+            result.setdefault(key, {})[span] = histogram.summary()
+        return result
+
+    def combined(self, span):
+        """One histogram of a span over all keys."""
+        combined = LatencyHistogram()
+        for (key, name), histogram in self._histograms.items():
+            if name != span:
+                continue
+            combined.counts = [a + b for a, b in zip(combined.counts, histogram.counts)]
+            combined.count += histogram.count
+            combined.sum += histogram.sum
+            combined.max = max(combined.max, histogram.max)
+        return combined
+
+    def export_json(self, path):
+        """Write percentile summaries and raw buckets as JSON."""
+        keys = {}
+        for (key, span), histogram in sorted(self._histograms.items()):
+            keys.setdefault(key, {})[span] = dict(histogram.summary(), buckets=histogram.counts)
+        data = {'bucket_bounds_s': BUCKET_BOUNDS, 'keys': keys}
+        self._write(path, json.dumps(data, indent=4))
+
+    def export_prometheus(self, path):
+        """Write histograms in the Prometheus text exposition format."""
+        lines = [
+            '# HELP xr_command_latency_seconds Latency between stages of XR driver control commands.',
+            '# TYPE xr_command_latency_seconds histogram',
+        ]
+        for (key, span), histogram in sorted(self._histograms.items()):
+            labels = f'key="{key}",span="{span}"'
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKET_BOUNDS, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'xr_command_latency_seconds_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'xr_command_latency_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'xr_command_latency_seconds_sum{{{labels}}} {histogram.sum:.9f}')
+            lines.append(f'xr_command_latency_seconds_count{{{labels}}} {histogram.count}')
+        self._write(path, '\n'.join(lines) + '\n')
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+# Shared by the UI, XRManager, the control queue and the state watcher
+TRACER = LatencyTracer()
+
+def default_export_path(extension):
+    return os.path.expanduser(f'~/.cache/xfce4-xr-desktop/latency.{extension}')
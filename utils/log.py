@@ -0,0 +1,199 @@
+"""Logging pipeline that keeps I/O off the GTK and render threads.
+
+Records are put on a queue by the calling thread and written to the
+console and a rotating file in ``~/.cache/xfce4-xr-desktop`` by a
+listener thread. Per-frame subsystems log into a fixed-size in-memory
+ring instead: their records are kept, unformatted, until an error or a
+dump_ring() call writes out the recent history. Each logger is rate
+limited, so a subsystem failing every frame (e.g. a disconnected device)
+logs a burst and then a count of what it suppressed.
+
+Log calls should use %-style arguments, ``logger.debug("x=%s", x)``,
+so that nothing is formatted for a disabled level.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import collections
+import logging.handlers
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+APP_LOGGER = 'xfce4_xr_desktop'
+
+# Subsystems that log per frame; their records go to the ring
+HOT_LOGGERS = (
+    'xfce4_xr_desktop.capture',
+    'xfce4_xr_desktop.frame_scheduler',
+    'xfce4_xr_desktop.imu_reader',
+    'xfce4_xr_desktop.prediction',
+)
+
+RING_CAPACITY = 2048
+LOG_FILE_MAX_BYTES = 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+# Per-logger rate limit: a sustained rate plus a burst allowance
+RATE_LIMIT_PER_S = 10.0
+RATE_LIMIT_BURST = 20
+
+def default_log_path():
+    return os.path.expanduser('~/.cache/xfce4-xr-desktop/xfce4-xr-desktop.log')
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per logger name.
+
+    Records over the limit are dropped and counted; the next record let
+    through from that logger carries the count. Records at or above
+    ``exempt_level`` are never dropped.
+    """
+
+    def __init__(self, rate_per_s=RATE_LIMIT_PER_S, burst=RATE_LIMIT_BURST,
+                 exempt_level=logging.CRITICAL, clock=time.monotonic):
+        super().__init__()
+        self.rate_per_s = rate_per_s
+        self._burst = burst
+        self._exempt_level = exempt_level
+        self._clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.suppressed = 0
+
+    def filter(self, record):
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [float(self._burst), now, 0]
+            tokens = min(self._burst, bucket[0] + (now - bucket[1]) * self.rate_per_s)
+            bucket[1] = now
+            if tokens < 1 and record.levelno < self._exempt_level:
+                bucket[0] = tokens
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] = max(0.0, tokens - 1)
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.args = (record.getMessage(), dropped)
+            record.msg = '%s (%d similar messages suppressed)'
+        return True
+
+class RingBufferHandler(logging.Handler):
+    """Keep the last ``capacity`` records in memory.
+
+    Records at or above ``forward_level`` are also passed on to target
+    as they arrive. One at or above ``flush_level`` first dumps the
+    buffered history, so an error is logged with the frames leading up
+    to it.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY, target=None,
+                 forward_level=logging.WARNING, flush_level=logging.ERROR):
+        super().__init__()
+        self.records = collections.deque(maxlen=capacity)
+        self.target = target
+        self.forward_level = forward_level
+        self.flush_level = flush_level
+
+        # Counters
+        self.dumps = 0
+
+    def emit(self, record):
+        if self.target is None or record.levelno < self.forward_level:
+            self.records.append(record)
+            return
+        # Rate limit before dumping, so a failure every frame dumps once
+        if not self.target.filter(record):
+            return
+        if record.levelno >= self.flush_level:
+            self._dump(f"error in {record.name}")
+        self.target.emit(record)
+
+    def dump(self, reason='requested'):
+        """Pass the buffered records to target and clear the ring. Returns how many were dumped."""
+        self.acquire()
+        try:
+            return self._dump(reason)
+        finally:
+            self.release()
+
+    def _dump(self, reason):
+        records = list(self.records)
+        self.records.clear()
+        if self.target is None or not records:
+            return 0
+        self.dumps += 1
+        marker = logging.LogRecord(APP_LOGGER, logging.INFO, __file__, 0,
+                                   "Log ring dump (%s): %d records", (reason, len(records)), None)
+        # The history bypasses the target's filters: it was bounded by the ring
+        self.target.emit(marker)
+        for record in records:
+            self.target.emit(record)
+        return len(records)
+
+class LoggingPipeline:
+    """Queue, listener thread, console and file output, ring and rate limiting for the app's loggers."""
+
+    def __init__(self, level=logging.DEBUG, log_path=None, console=True,
+                 ring_capacity=RING_CAPACITY, hot_loggers=HOT_LOGGERS,
+                 rate_per_s=RATE_LIMIT_PER_S, burst=RATE_LIMIT_BURST):
+        self.logger = logging.getLogger(APP_LOGGER)
+        self._level = level
+        self._log_path = log_path or default_log_path()
+        self._console = console
+        self._hot_loggers = hot_loggers
+        self._queue = queue.SimpleQueue()
+        self.rate_limit = RateLimitFilter(rate_per_s, burst)
+        self.queue_handler = logging.handlers.QueueHandler(self._queue)
+        self.queue_handler.addFilter(self.rate_limit)
+        self.ring = RingBufferHandler(ring_capacity, target=self.queue_handler)
+        self._listener = None
+
+    def _output_handlers(self):
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = []
+        if self._console:
+            handlers.append(logging.StreamHandler())
+        try:
+            os.makedirs(os.path.dirname(self._log_path), exist_ok=True)
+            handlers.append(logging.handlers.RotatingFileHandler(
+                self._log_path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS))
+        except OSError as e:
+            self.logger.warning("Not logging to %s: %s", self._log_path, e)
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        return handlers
+
+    def start(self):
+        handlers = self._output_handlers()
+        self._listener = logging.handlers.QueueListener(self._queue, *handlers)
+        self._listener.start()
+        self.logger.setLevel(self._level)
+        self.logger.addHandler(self.queue_handler)
+        for name in self._hot_loggers:
+            hot = logging.getLogger(name)
+            hot.propagate = False
+            hot.addHandler(self.ring)
+        return self
+
+    def dump_ring(self, reason='requested'):
+        """Write out the buffered per-frame records."""
+        return self.ring.dump(reason)
+
+    def stop(self):
+        """Detach the handlers and write out everything queued so far."""
+        if self._listener is None:
+            return
+        for name in self._hot_loggers:
+            hot = logging.getLogger(name)
+            hot.removeHandler(self.ring)
+            hot.propagate = True
+        self.logger.removeHandler(self.queue_handler)
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
@@ -0,0 +1,65 @@
+import os
+import json
+import time
+import logging
+
+def _process_start_time():
+    """Process start time on the CLOCK_BOOTTIME scale, or None if unknown."""
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            # The command name may contain spaces, so split after its ')'
+            fields = f.read().rsplit(')', 1)[1].split()
+        # starttime is field 22 of stat, i.e. index 19 after pid and comm
+        return int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _now():
+    return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+class StartupTimer:
+    """Record startup milestones relative to process start.
+
+    Times are seconds since the kernel started the process (so interpreter
+    and import time are included), falling back to the creation of the
+    timer when /proc is unavailable.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger('xfce4_xr_desktop.startup')
+        self._start = _process_start_time()
+        if self._start is None:
+            self._start = _now()
+        self.marks = {}
+
+    def mark(self, name):
+        """Record a milestone; only the first occurrence counts."""
+        if name not in self.marks:
+            self.marks[name] = _now() - self._start
+            self.logger.info("Startup: %s at %.1f ms", name, self.marks[name] * 1000)
+        return self.marks[name]
+
+    def mark_first_frame(self, widget, name='first-frame', on_marked=None):
+        """Mark when widget's frame clock finishes painting its first frame."""
+        def on_after_paint(clock):
+            clock.disconnect(handler_id)
+            self.mark(name)
+            if on_marked:
+                on_marked()
+
+        clock = widget.get_frame_clock()
+        if clock is None:
+            self.mark(name)
+            return
+        handler_id = clock.connect('after-paint', on_after_paint)
+
+    def save(self, path=None):
+        """Write the marks to a JSON file so regressions can be tracked."""
+        path = path or os.path.expanduser('~/.cache/xfce4-xr-desktop/startup.json')
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump({'timestamp': time.time(),
+                           'marks_ms': {name: t * 1000 for name, t in self.marks.items()}}, f, indent=4)
+        except Exception as e:
+            self.logger.error("Error saving startup times: %s", e)
@@ -0,0 +1,66 @@
+"""Live health metrics, sampled from counters the subsystems already keep.
+
+Producers only increment integer counters (``IMUReader.samples_seen``,
+``ControlQueue.submitted_count``, ``Config.save_count``...), so watching
+them costs nothing on their side. TelemetrySampler reads the counters
+when asked and turns the differences since its previous sample into
+rates; how often that happens is up to the consumer, independent of how
+fast the data comes in.
+"""
+import time
+from utils.latency import TRACER
+
+# Span summarized for the command latency line
+LATENCY_SPAN = 'ui_to_written'
+
+class TelemetrySampler:
+    """Rates and gauges from an XRManager, a Config and optionally an IMUReader."""
+
+    def __init__(self, xr_manager, config, imu_reader=None, tracer=TRACER, clock=time.monotonic):
+        self._xr_manager = xr_manager
+        self._config = config
+        self._imu_reader = imu_reader
+        self._tracer = tracer
+        self._clock = clock
+        self._last_time = None
+        self._last_counts = None
+
+    def _counts(self):
+        queue = self._xr_manager.control_queue
+        return (
+            self._imu_reader.samples_seen if self._imu_reader is not None else 0,
+            self._xr_manager.state_watcher.parse_count,
+            queue.submitted_count,
+            queue.write_count,
+            self._config.save_count,
+        )
+
+    def reset(self):
+        """Forget the previous sample, e.g. after a period nobody was watching."""
+        self._last_time = None
+        self._last_counts = None
+
+    def sample(self):
+        """Return the current metrics. Rates are None until a second sample."""
+        now = self._clock()
+        counts = self._counts()
+        rates = (None,) * len(counts)
+        if self._last_counts is not None and now > self._last_time:
+            elapsed = now - self._last_time
+            rates = tuple((count - last) / elapsed for count, last in zip(counts, self._last_counts))
+        self._last_time = now
+        self._last_counts = counts
+
+        queue = self._xr_manager.control_queue
+        ring = queue.ring
+        latency = self._tracer.combined(LATENCY_SPAN) if self._tracer.enabled else None
+        return {
+            'imu_hz': rates[0] if self._imu_reader is not None else None,
+            'state_updates_hz': rates[1],
+            'commands_hz': rates[2],
+            'control_writes_hz': rates[3],
+            'queue_depth': queue.pending_count,
+            'ring_backlog': ring.backlog if ring is not None else None,
+            'config_saves': counts[4],
+            'latency': latency.summary() if latency is not None and latency.count else None,
+        }